@@ -20,6 +20,7 @@ const UserActivity = ({ business, user }) => {
     const [selectedUser, setSelectedUser] = useState(null);
     const [showDetails, setShowDetails] = useState(false);
     const [loadingActivities, setLoadingActivities] = useState(false);
+    const [nextCursor, setNextCursor] = useState(null);
     const navigate = useNavigate();
 
     const handleSearch = (e) => {
@@ -52,20 +53,24 @@ const UserActivity = ({ business, user }) => {
         fetchUsers();
     }, []);
 
-    const fetchUserActivities = async (username) => {
+    const fetchUserActivities = async (username, cursor = null) => {
         setLoadingActivities(true);
+        if (!cursor) setNextCursor(null);
         try {
             const response = await api.post('fetch_user_activities', { 
                 business, 
                 username,
-                user
+                user,
+                cursor
             });
 
             if (response.status === 'error'){
                 toast.error(response.message || "fetching history failed");
+                setLoadingActivities(false);
                 return;
             }
-            setActivities(response.data);
+            setActivities(prev => cursor ? [...prev, ...response.data.activities] : response.data.activities);
+            setNextCursor(response.data.has_more ? response.data.next_cursor : null);
             setLoadingActivities(false);
         } catch (error) {
             toast.error()
@@ -177,7 +182,7 @@ const UserActivity = ({ business, user }) => {
                             </button>
                         </div>
 
-                        {loadingActivities ? (
+                        {loadingActivities && !nextCursor ? (
                             <div className="loading-spinner">Loading activities...</div>
                         ) : (
                             <div className="activity-content">
@@ -218,6 +223,16 @@ const UserActivity = ({ business, user }) => {
                                                 </tbody>
                                             </table>
                                         </div>
+
+                                        {nextCursor && (
+                                            <button
+                                                className="action-button"
+                                                disabled={loadingActivities}
+                                                onClick={() => fetchUserActivities(selectedUser.user_name, nextCursor)}
+                                            >
+                                                {loadingActivities ? 'Loading...' : 'Load more'}
+                                            </button>
+                                        )}
                                     </>
                                 ) : (
                                     <div className="no-activities">
@@ -16,4 +16,24 @@ app.conf.beat_schedule = {
         "task": "react_work.account_closure.auto_close_periods",
         "schedule": crontab(hour=0, minute=0, day_of_month=1),
     },
+    "cleanup-export-jobs-hourly": {
+        "task": "react_work.export_jobs.cleanup_export_jobs",
+        "schedule": crontab(minute=15),
+    },
+    "reconcile-item-balances-nightly": {
+        "task": "react_work.item_valuation.reconcile_item_balances",
+        "schedule": crontab(hour=2, minute=30),
+    },
+    "cleanup-idempotency-keys-hourly": {
+        "task": "react_work.idempotency.cleanup_idempotency_keys",
+        "schedule": crontab(minute=45),
+    },
+    "resume-tenant-purges": {
+        "task": "react_work.tenant_purge.resume_tenant_purges",
+        "schedule": crontab(minute='*/10'),
+    },
+    "archive-activity-log-daily": {
+        "task": "react_work.activity_log.archive_activity_log",
+        "schedule": crontab(hour=3, minute=30),
+    },
 }
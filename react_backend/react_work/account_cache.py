@@ -0,0 +1,116 @@
+from datetime import date, datetime, time, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from . import models
+import logging
+
+logger = logging.getLogger(__name__)
+
+# the chart of accounts changes only when an account is created, so the code -> account map
+# of a business is kept in the cache until signals.py drops it on a change.
+COA_TTL = getattr(settings, 'COA_CACHE_TTL', 60 * 60)
+
+FIELDS = (
+    'pk', 'code', 'name', 'description',
+    'account_type_id', 'account_type__code', 'account_type__name',
+    'account_type__account_type_id', 'account_type__account_type__code', 'account_type__account_type__name',
+)
+
+
+def _accounts_key(business_id):
+    return f'coa:accounts:{business_id}'
+
+
+def _period_key(business_id, day):
+    return f'coa:period:{business_id}:{day.isoformat()}'
+
+
+def _get(key):
+    try:
+        return cache.get(key)
+    except Exception as error:
+        logger.warning(error)
+        return None
+
+
+def _set(key, value, timeout):
+    try:
+        cache.set(key, value, timeout)
+    except Exception as error:
+        logger.warning(error)
+
+
+def chart(business_id):
+    """Returns {code: row} for every real account of the business; row is a dict of FIELDS."""
+    key = _accounts_key(business_id)
+    accounts = _get(key)
+
+    if accounts is None:
+        accounts = {
+            row['code']: row
+            for row in models.real_account.objects.filter(bussiness_name_id=business_id).order_by('pk').values(*FIELDS)
+        }
+        _set(key, accounts, COA_TTL)
+
+    return accounts
+
+
+def by_id(business_id, ids):
+    """Returns {account id: row} for ids; a cached chart missing one of them is reloaded once."""
+    accounts = {row['pk']: row for row in chart(business_id).values()}
+
+    if not set(ids) <= accounts.keys():
+        _delete([_accounts_key(business_id)])
+        accounts = {row['pk']: row for row in chart(business_id).values()}
+
+    return accounts
+
+
+def _instance(business_id, row):
+    parent = models.account(id=row['account_type__account_type_id'], code=row['account_type__account_type__code'],
+                            name=row['account_type__account_type__name'], bussiness_name_id=business_id)
+    sub = models.sub_account(id=row['account_type_id'], code=row['account_type__code'], name=row['account_type__name'],
+                             account_type=parent, bussiness_name_id=business_id)
+    account = models.real_account(id=row['pk'], code=row['code'], name=row['name'], description=row['description'],
+                                  account_type=sub, bussiness_name_id=business_id)
+
+    for instance in (parent, sub, account):
+        instance._state.adding = False
+        instance._state.db = 'default'
+
+    return account
+
+
+def account(business_id, code):
+    """Returns the real_account with code, with its sub and parent account attached, or None."""
+    row = chart(business_id).get(str(code))
+    return _instance(business_id, row) if row else None
+
+
+def current_period(business_id):
+    """Returns the month_period holding today, or None; cached until the end of the day."""
+    today = date.today()
+    key = _period_key(business_id, today)
+    cached = _get(key)
+
+    if cached is not None:
+        return cached[0]
+
+    period = models.month_period.objects.filter(start__lte=today, end__gte=today, business_id=business_id).first()
+    midnight = datetime.combine(today + timedelta(days=1), time.min)
+    _set(key, (period,), min(COA_TTL, max(int((midnight - datetime.now()).total_seconds()), 1)))
+
+    return period
+
+
+def _delete(keys):
+    try:
+        cache.delete_many(keys)
+    except Exception as error:
+        logger.warning(error)
+
+
+def invalidate(business_id):
+    # dropping before the commit would let a concurrent request cache the old rows again
+    transaction.on_commit(lambda: _delete([_accounts_key(business_id), _period_key(business_id, date.today())]))
@@ -1,7 +1,8 @@
 import logging
-from celery import shared_task
+from celery import shared_task, chord
 from datetime import datetime
-from django.db import transaction
+from django.conf import settings
+from django.db import transaction, OperationalError
 from .models import year_period, month_period, quarter_period, bussiness
 from .month_closure import close_month_period
 from .quarter_closure import close_quarter_period
@@ -9,41 +10,131 @@ from .year_closure import close_year_period
 
 logger = logging.getLogger("celery")
 
+# how many businesses close at once: route the sub-tasks to their own queue and give that
+# queue's workers the concurrency the database can take (celery worker -Q <queue> -c <n>)
+CLOSE_QUEUE = getattr(settings, 'PERIOD_CLOSE_QUEUE', None)
+
+# celery rate limit per worker for the sub-tasks, e.g. '60/m'; None runs them as fast as they come
+CLOSE_RATE_LIMIT = getattr(settings, 'PERIOD_CLOSE_RATE_LIMIT', None)
+
+
 @shared_task(name="react_work.account_closure.auto_close_periods")
 def auto_close_periods():
     today = datetime.now().date()
     logger.info("Auto-close task started for %s", today)
 
+    # businesses being purged are left alone
+    business_ids = list(bussiness.objects.filter(pending_deletion=False).order_by('pk').values_list('pk', flat=True))
+    if not business_ids:
+        logger.info("Auto-close task finished, no businesses")
+        return {"businesses": 0}
+
+    subtask = close_business_periods.s(today.isoformat())
+    if CLOSE_QUEUE:
+        subtask = subtask.set(queue=CLOSE_QUEUE)
+
+    # one sub-task per business so a failing tenant does not hold back or roll back the others
+    chord(subtask.clone((business_id,)) for business_id in business_ids)(summarize_period_closing.s(today.isoformat()))
+
+    return {"businesses": len(business_ids)}
+
+
+@shared_task(
+    bind=True,
+    name="react_work.account_closure.close_business_periods",
+    autoretry_for=(OperationalError,),
+    retry_backoff=True,
+    max_retries=3,
+    rate_limit=CLOSE_RATE_LIMIT,
+)
+def close_business_periods(self, business_id, today):
+    today = datetime.strptime(today, "%Y-%m-%d").date()
+    summary = {"business": business_id, "status": "success", "months": [], "quarters": [], "years": []}
+
     try:
-        with transaction.atomic():
-            for biz in bussiness.objects.all():
-                yp, created = year_period.objects.update_or_create(
-                    bussiness_name=biz,
-                    year=str(today.year),
-                    defaults={"is_closed": False, "closing_date": None}
-                )
-                if created:
-                    logger.info("Created new year period for business=%s year=%s", biz, today.year)
-                else:
-                    logger.info("Year period already exists for business=%s year=%s", biz, today.year)
-
-            months = month_period.objects.filter(end__lt=today, is_closed=False).order_by('-end').first()
-            if months:
-                close_month_period(month=months)
-                logger.info("Closed month period: %s", months)
-
-            quarters = quarter_period.objects.filter(end__lt=today, is_closed=False).order_by('-end').first()
-            if quarters and not month_period.objects.filter(quarter=quarters, is_closed=False).exists():
-                close_quarter_period(quarter=quarters)
-                logger.info("Closed quarter period: %s", quarters)
-
-            years = year_period.objects.filter(year__lt=today.year, is_closed=False).order_by('-year').first()
-            if years and not quarter_period.objects.filter(year=years, is_closed=False).exists():
-                close_year_period(year=years)
-                logger.info("Closed year period: %s", years)
-
-        logger.info("Auto-close task finished successfully")
-
-    except Exception as e:
-        logger.exception("Auto-close task failed: %s", e)
-        raise 
+        biz = bussiness.objects.get(pk=business_id)
+
+        # the purge may have started after the chord was sent
+        if biz.pending_deletion:
+            logger.info("Skipped closing periods for business=%s pending deletion", business_id)
+            return summary
+
+        yp, created = year_period.objects.get_or_create(bussiness_name=biz, year=str(today.year))
+        if created:
+            logger.info("Created new year period for business=%s year=%s", biz, today.year)
+
+        overdue = month_period.objects.filter(business=biz, end__lt=today, is_closed=False).order_by('start').values_list('pk', flat=True)
+
+        for month_id in list(overdue):
+            with transaction.atomic():
+                month = month_period.objects.select_for_update().get(pk=month_id)
+
+                # another run may have closed it since the list was read
+                if month.is_closed:
+                    continue
+
+                close_month_period(month=month)
+                summary["months"].append(month.name)
+
+        overdue = quarter_period.objects.filter(bussiness_name=biz, end__lt=today, is_closed=False).order_by('start').values_list('pk', flat=True)
+
+        for quarter_id in list(overdue):
+            with transaction.atomic():
+                quarter = quarter_period.objects.select_for_update().get(pk=quarter_id)
+
+                if quarter.is_closed or month_period.objects.filter(quarter=quarter, is_closed=False).exists():
+                    continue
+
+                close_quarter_period(quarter=quarter)
+                summary["quarters"].append(quarter.name)
+
+        overdue = year_period.objects.filter(bussiness_name=biz, year__lt=str(today.year), is_closed=False).order_by('year').values_list('pk', flat=True)
+
+        for year_id in list(overdue):
+            with transaction.atomic():
+                year = year_period.objects.select_for_update().get(pk=year_id)
+
+                if year.is_closed or quarter_period.objects.filter(year=year, is_closed=False).exists():
+                    continue
+
+                close_year_period(year=year)
+                summary["years"].append(year.year)
+
+        logger.info("Closed periods for business=%s: %s", business_id, summary)
+        return summary
+
+    except OperationalError as error:
+        # retried while retries are left; the last failure is reported so the chord still completes
+        if self.request.retries < self.max_retries:
+            raise
+
+        logger.exception("Closing periods failed for business=%s after %s retries: %s", business_id, self.max_retries, error)
+        summary["status"] = "error"
+        summary["message"] = str(error)
+        return summary
+
+    except Exception as error:
+        logger.exception("Closing periods failed for business=%s: %s", business_id, error)
+        summary["status"] = "error"
+        summary["message"] = str(error)
+        return summary
+
+
+@shared_task(name="react_work.account_closure.summarize_period_closing")
+def summarize_period_closing(results, today):
+    failed = [r["business"] for r in results if r.get("status") != "success"]
+    result = {
+        "date": today,
+        "businesses": len(results),
+        "months_closed": sum(len(r.get("months", [])) for r in results),
+        "quarters_closed": sum(len(r.get("quarters", [])) for r in results),
+        "years_closed": sum(len(r.get("years", [])) for r in results),
+        "failed": failed,
+    }
+
+    if failed:
+        logger.warning("Auto-close finished with failures: %s", result)
+    else:
+        logger.info("Auto-close task finished successfully: %s", result)
+
+    return result
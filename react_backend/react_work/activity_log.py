@@ -0,0 +1,174 @@
+from celery import shared_task
+from celery.signals import task_postrun
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+from . import models, keyset
+import atexit
+import gzip
+import json
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# rows are written in one INSERT at the end of the request or task, or once this many are waiting
+BUFFER_SIZE = getattr(settings, 'ACTIVITY_LOG_BUFFER_SIZE', 500)
+
+RETENTION = timedelta(days=getattr(settings, 'ACTIVITY_LOG_RETENTION_DAYS', 365))
+
+ARCHIVE_BATCH_SIZE = getattr(settings, 'ACTIVITY_LOG_ARCHIVE_BATCH_SIZE', 5000)
+
+# newest first; the id breaks ties between rows written in the same instant
+KEYS = [('date', True), ('id', True)]
+
+# rows returned by a read without a cursor, newest first
+PAGE_SIZE = getattr(settings, 'ACTIVITY_LOG_PAGE_SIZE', 50)
+
+_local = threading.local()
+
+
+def _pending():
+    if not hasattr(_local, 'rows'):
+        _local.rows = []
+
+    return _local.rows
+
+
+def _keep(*new_rows):
+    rows = _pending()
+    rows.extend(new_rows)
+
+    if len(rows) >= BUFFER_SIZE:
+        flush()
+
+
+def record(user, bussiness_name, area='', head=''):
+    """Queues a tracking_history row; it is only kept if the surrounding transaction commits.
+
+    Takes the same fields as tracking_history.objects.create(). The time is taken now, not
+    when the row is written.
+    """
+    row = models.tracking_history(user=user, bussiness_name=bussiness_name, area=area, head=head, date=timezone.now())
+
+    # a callback registered inside a savepoint that rolls back is dropped along with it
+    transaction.on_commit(lambda: _keep(row))
+
+
+def record_many(user, bussiness_name, areas, head=''):
+    """record() for a batch of actions of one user, one row per entry of areas."""
+    now = timezone.now()
+    rows = [models.tracking_history(user=user, bussiness_name=bussiness_name, area=area, head=head, date=now) for area in areas]
+
+    if rows:
+        transaction.on_commit(lambda: _keep(*rows))
+
+
+def flush():
+    rows = _pending()
+
+    if not rows:
+        return 0
+
+    _local.rows = []
+
+    try:
+        models.tracking_history.objects.bulk_create(rows, batch_size=BUFFER_SIZE)
+    except Exception:
+        logger.exception(f"Failed to write {len(rows)} activity log rows")
+        return 0
+
+    return len(rows)
+
+
+@receiver(request_finished, dispatch_uid='activity_log_request_finished')
+def _flush_after_request(sender, **kwargs):
+    flush()
+
+
+@task_postrun.connect(dispatch_uid='activity_log_task_postrun')
+def _flush_after_task(*args, **kwargs):
+    flush()
+
+
+# management commands and the shell have no request to end
+atexit.register(flush)
+
+
+def activities(business, user=None, area=None, start=None, end=None):
+    """tracking_history rows of a business as values(), newest first, optionally narrowed by user,
+    area text and date range."""
+    rows = models.tracking_history.objects.filter(bussiness_name=business)
+
+    if user is not None:
+        rows = rows.filter(user=user)
+
+    if area:
+        rows = rows.filter(area__icontains=area)
+
+    if start:
+        rows = rows.filter(date__date__gte=start)
+
+    if end:
+        rows = rows.filter(date__date__lte=end)
+
+    return rows.order_by('-date', '-id').values('date', 'area', 'head', 'user__user_name')
+
+
+def page(rows, cursor, page_quantity=PAGE_SIZE):
+    return keyset.keyset_page(rows, KEYS, cursor, page_quantity)
+
+
+def _write_archive(business_id, month, rows):
+    lines = (json.dumps(row, cls=JSONEncoder) + '\n' for row in rows)
+    content = gzip.compress(''.join(lines).encode('utf-8'))
+
+    archive = models.activity_archive(business_id=business_id, month=month, rows=len(rows))
+    archive.file.save(f"{business_id}/{month:%Y-%m}.jsonl.gz", ContentFile(content), save=False)
+    archive.save()
+
+    return archive
+
+
+def archive_business(business_id, cutoff):
+    """Moves the business's rows older than cutoff to one gzipped JSON-lines file per month."""
+    old = models.tracking_history.objects.filter(bussiness_name_id=business_id, date__lt=cutoff)
+    months = old.annotate(month=TruncMonth('date')).values_list('month', flat=True).distinct().order_by('month')
+    archived = 0
+
+    for month in list(months):
+        month_rows = old.filter(date__gte=month, date__lt=(month + timedelta(days=32)).replace(day=1))
+        rows = list(month_rows.order_by('id').values('id', 'date', 'area', 'head', 'user_id', 'user__user_name'))
+
+        with transaction.atomic():
+            _write_archive(business_id, month.date(), rows)
+
+            ids = [row['id'] for row in rows]
+            for index in range(0, len(ids), ARCHIVE_BATCH_SIZE):
+                models.tracking_history.objects.filter(pk__in=ids[index:index + ARCHIVE_BATCH_SIZE]).delete()
+
+        archived += len(rows)
+
+    return archived
+
+
+@shared_task(name="react_work.activity_log.archive_activity_log")
+def archive_activity_log():
+    cutoff = timezone.now() - RETENTION
+    businesses = models.tracking_history.objects.filter(date__lt=cutoff).values_list('bussiness_name_id', flat=True).distinct()
+    archived = 0
+
+    for business_id in list(businesses):
+        try:
+            archived += archive_business(business_id, cutoff)
+        except Exception:
+            logger.exception(f"Archiving the activity log of business {business_id} failed")
+
+    logger.info(f"Archived {archived} activity log rows older than {cutoff:%Y-%m-%d}")
+    return archived
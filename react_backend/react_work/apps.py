@@ -7,3 +7,4 @@ class ReactWorkConfig(AppConfig):
 
     def ready(self):
         import react_work.signals
+        import react_work.activity_log
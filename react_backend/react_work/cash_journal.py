@@ -1,4 +1,4 @@
-from . import models
+from . import models, tenant_context, keyset, activity_log
 from decimal import Decimal
 from django.core.paginator import Paginator
 from django.db.models import Sum
@@ -8,13 +8,15 @@ from django.db.models import Q
 import logging
 from datetime import date, datetime
 from .coa import retrive_real_account
+from .journal_batch import JournalBatch, LEDGER_FOR_TYPE
 
 logger = logging.getLogger(__name__)
 
-def fetch_cash_for_main_view(search, date_search, business, company, page, user, page_quantity=30):
+def fetch_cash_for_main_view(search, date_search, business, company, page, user, page_quantity=30, cursor=None, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
        
         if not user_query.admin and not user_query.payment_access:
             return {'status':'error', 'message':f'User {user} has no access to cash journal'}
@@ -47,6 +49,12 @@ def fetch_cash_for_main_view(search, date_search, business, company, page, user,
             'code', 'date', 'ref_type', 'external_no', 'description', 'transaction_number', 'from_account', 'to_account', 'amount', 'is_reversed',
         )
         
+        if cursor is not None:
+            payment, next_cursor = keyset.keyset_page(payment, keyset.BY_CODE_DESC, cursor, page_quantity)
+            result = {'payment':payment, 'has_more':next_cursor is not None, 'next_cursor':next_cursor}
+
+            return {'status':'success', 'data':result}
+
         paginator = Paginator(payment, page_quantity)
         current_page = paginator.get_page(page)
 
@@ -54,6 +62,9 @@ def fetch_cash_for_main_view(search, date_search, business, company, page, user,
 
         return {'status':'success', 'data':result}
 
+    except keyset.InvalidCursor as error:
+        return {'status': 'error', 'message': str(error)}
+
     except models.bussiness.DoesNotExist:
         logger.warning(f"Business '{business}' not found.")
         return {'status': 'error', 'message': f'Business {business} not found'}
@@ -66,10 +77,11 @@ def fetch_cash_for_main_view(search, date_search, business, company, page, user,
         logger.exception(error)
         return {'status': 'error', 'message': 'something happened'}
     
-def view_cash_receipt(business, user, company, code):
+def view_cash_receipt(business, user, company, code, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(user_name=user, bussiness_name=business_query)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not user_query.admin and not user_query.cash_access:
             return {'status':'error', 'message':f'User {user} has no access to view cash receipt'}
@@ -99,10 +111,11 @@ def view_cash_receipt(business, user, company, code):
         logger.exception(error)
         return {'status': 'error', 'message': 'something happened'}
     
-def add_cash_receipt(company, user, business, data):
+def add_cash_receipt(company, user, business, data, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not user_query.admin and not user_query.create_access and not user_query.cash_access:
             return {'status':'error', 'message':f'User {user} has no access to create cash receipt'}
@@ -120,17 +133,9 @@ def add_cash_receipt(company, user, business, data):
                 if current_date > today:
                     return {'status': 'error', 'message': 'User has no access to future dates'}
         
-        ledger_map = {
-            'Assets': models.asset_ledger,
-            'Liabilities': models.liabilities_ledger,
-            'Equity': models.equity_ledger,
-            'Revenue': models.revenue_ledger,
-            'Expenses': models.expenses_ledger,
-        }
-        
         with transaction.Atomic(savepoint=False, durable=False, using='default'):
+            # every entry is checked before any is written, as the batch posts them together
             for i in data:
-                print(i)
                 validate_data = (isinstance(i['amount'], (float, int)) and isinstance(i['credit_account'], str) and isinstance(i['debit_account'], str) and
                                  i['credit_account'].strip() and i['debit_account'].strip() and i['reference_type'].strip() and isinstance(i['reference_type'], str) and
                                  isinstance(i['date'], str) and i['date'].strip() and isinstance(i['description'], str) and isinstance(i['reference'], str)
@@ -144,20 +149,23 @@ def add_cash_receipt(company, user, business, data):
 
                 if current_date.month != today.month:
                     return {'status': 'error', 'message': 'Transaction date must be within the current month'}
-                
+
+            batch = JournalBatch(business_query, user_query)
+            codes = []
+
+            for i in data:
                 accounts = {'receivable':10401, 'debit':i['debit_account'], 'credit':i['credit_account'], 'discount':50801}
 
-                result = retrive_real_account(code_map=accounts, business=business, company=company).get_real_accounts()
+                result = retrive_real_account(code_map=accounts, business=business_query, company=company).get_real_accounts()
 
                 cash = models.cash_receipt.objects.create(transaction_number=i['reference'], description=i['description'], to_account=i['debit_account'], from_account=i['credit_account'],
                                                   bussiness_name=business_query, amount=i['amount'], created_by=user_query, ref_type=i['reference_type'], external_no=i['external'])
+                codes.append(cash.code)
                     
-                head = models.journal_head.objects.create(entry_type="Cash Receipt", transaction_number=cash.code, amount=cash.amount, created_by=user_query, bussiness_name=business_query,
-                                                    description=cash.description)
-                   
+                head = batch.head(entry_type="Cash Receipt", transaction_number=cash.code, amount=cash.amount, description=cash.description)
                     
-                models.journal.objects.create(entry_type="Cash Receipt", description=f'Crediting Source Account for the payment of {cash.transaction_number}', credit=i['credit_account'], head=head,
-                                            amount=cash.amount, bussiness_name=business_query, date=i['date'], transaction_number=cash.code)
+                batch.journal(head, entry_type="Cash Receipt", description=f'Crediting Source Account for the payment of {cash.transaction_number}', credit=i['credit_account'],
+                              amount=cash.amount, date=i['date'], transaction_number=cash.code)
                     
                 if (i['reference_type']).lower() == 'sales':
                     credit_real_account = result.get('receivable')
@@ -165,18 +173,18 @@ def add_cash_receipt(company, user, business, data):
                 else:
                     credit_real_account = result.get('credit')
 
-                ledger_map.get(credit_real_account.account_type.account_type.name).objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=credit_real_account, transaction_number=cash.code, date=i['date'], type="Cash Receipt",
-                                                    description=cash.description, credit=cash.amount, head=head)
+                batch.ledger(LEDGER_FOR_TYPE[credit_real_account.account_type.account_type.name], head, period=result.get('period'),
+                             account=credit_real_account, transaction_number=cash.code, date=i['date'], type="Cash Receipt",
+                             description=cash.description, credit=cash.amount)
                     
-                models.journal.objects.create(entry_type="Cash Receipt", description=f'Debiting Account used to receive the payment of {cash.transaction_number}', debit=i['debit_account'], head=head,
-                                            amount=Decimal(str(cash.amount)), bussiness_name=business_query, date=i['date'], transaction_number=cash.code)
+                batch.journal(head, entry_type="Cash Receipt", description=f'Debiting Account used to receive the payment of {cash.transaction_number}', debit=i['debit_account'],
+                              amount=Decimal(str(cash.amount)), date=i['date'], transaction_number=cash.code)
                 
                 debit_real_account = result.get('debit')
 
-                ledger_map.get(debit_real_account.account_type.account_type.name).objects.create(bussiness_name=business_query, period=result.get('period'),
-                                            account=debit_real_account, transaction_number=cash.code, date=i['date'], type="Cash Receipt",
-                                            description=cash.description, debit=Decimal(str(cash.amount)), head=head)
+                batch.ledger(LEDGER_FOR_TYPE[debit_real_account.account_type.account_type.name], head, period=result.get('period'),
+                             account=debit_real_account, transaction_number=cash.code, date=i['date'], type="Cash Receipt",
+                             description=cash.description, debit=Decimal(str(cash.amount)))
                     
                 if i['reference_type'].lower() == 'sales':
                     invoice = models.sale.objects.get(code=i['reference'], bussiness_name=business_query)
@@ -185,9 +193,9 @@ def add_cash_receipt(company, user, business, data):
                     customer.credit += Decimal(str(cash.amount))
                     customer.save()
 
-                    models.customer_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=customer, transaction_number=cash.code, date=i['date'], type="Cash Receipt",
-                                                    description=cash.description, credit=cash.amount, head=head)
+                    batch.ledger('customer', head, period=result.get('period'),
+                                 account=customer, transaction_number=cash.code, date=i['date'], type="Cash Receipt",
+                                 description=cash.description, credit=cash.amount)
 
                     amount_paid = models.cash_receipt.objects.filter(bussiness_name=business_query, transaction_number=i['reference'])
                     total_amount = sum([j.amount for j in amount_paid])
@@ -196,12 +204,15 @@ def add_cash_receipt(company, user, business, data):
                         if invoice.discount > 0:
                             discount_allowed_real_account = result.get('discount')
 
-                            models.journal.objects.create(entry_type="Sale", description=invoice.description, debit=50800, head=head,
-                                                amount=invoice.discount, bussiness_name=business_query, date=i['date'], transaction_number=invoice.code)
+                            batch.journal(head, entry_type="Sale", description=invoice.description, debit=50800,
+                                          amount=invoice.discount, date=i['date'], transaction_number=invoice.code)
                             
-                            ledger_map.get(discount_allowed_real_account.account_type.account_type.name).objects.create(period=result.get('period'),
-                                                        bussiness_name=business_query, hit_account=discount_allowed_real_account, transaction_number=invoice.code, date=i['date'], type="Sale",
-                                                        description=invoice.description, debit=invoice.discount, head=head)
+                            batch.ledger(LEDGER_FOR_TYPE[discount_allowed_real_account.account_type.account_type.name], head, period=result.get('period'),
+                                         account=discount_allowed_real_account, transaction_number=invoice.code, date=i['date'], type="Sale",
+                                         description=invoice.description, debit=invoice.discount)
+
+                            # settles the discount the credit invoice left open
+                            batch.carry(head, invoice.discount)
 
                     if float(total_amount) >= float(invoice.gross_total):
                         invoice.status = 'Full Payment'
@@ -211,9 +222,10 @@ def add_cash_receipt(company, user, business, data):
 
                     invoice.save()
 
-                models.tracking_history.objects.create(user=user_query, bussiness_name=business_query, area='Posted Cash Receipt', head=head.code)
+            for head in batch.save():
+                activity_log.record(user=user_query, bussiness_name=business_query, area='Posted Cash Receipt', head=head.code)
 
-                return {'status': 'success', 'message': f'Cash receipt {cash.code} created successfully'}
+            return {'status': 'success', 'message': f'Cash receipt {", ".join(codes)} created successfully'}
                 
     except models.bussiness.DoesNotExist:
         logger.warning(f"Business '{business}' not found.")
@@ -232,10 +244,11 @@ def add_cash_receipt(company, user, business, data):
         logger.exception(error)
         return {'status': 'error', 'message': 'something happened'}
     
-def reverse_cash_receipt(company, user, number, business):
+def reverse_cash_receipt(company, user, number, business, context=None):
     try:    
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not user_query.admin and not user_query.create_access:
             return {'status':'error', 'message':f'User {user} has no access to reverse cash receipt'}
@@ -255,94 +268,9 @@ def reverse_cash_receipt(company, user, number, business):
             journal_head.reversed = True
             journal_head.save()
 
-            journal = models.journal.objects.filter(head=journal_head, bussiness_name=business_query)
-            for entry in journal:
-                models.journal.objects.create(
-                    entry_type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    amount=entry.amount,
-                    bussiness_name=business_query,
-                    date=date.today(),
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    head=entry.head
-                )
-
-            asset_entries = models.asset_ledger.objects.filter(head=journal_head, bussiness_name=business_query)
-            for entry in asset_entries:
-                models.asset_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=entry.account,
-                    period=entry.period,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
-                        
-            liabilities_entries = models.liabilities_ledger.objects.filter(head=journal_head, bussiness_name=business_query)
-            for entry in liabilities_entries:
-                models.liabilities_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=entry.account,
-                    period=entry.period,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
-
-            revenue_entries = models.revenue_ledger.objects.filter(head=journal_head, bussiness_name=business_query)
-            for entry in revenue_entries:
-                models.revenue_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=entry.account,
-                    period=entry.period,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
-                        
-            expense_entries = models.expenses_ledger.objects.filter(head=journal_head, bussiness_name=business_query)
-            for entry in expense_entries:
-                models.expenses_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=entry.account,
-                    period=entry.period,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
-
-            customer_entries = models.customer_ledger.objects.filter(head=journal_head, bussiness_name=business_query)
-            for entry in customer_entries:
-                models.customer_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=entry.account,
-                    period=entry.period,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
+            batch = JournalBatch(business_query, user_query)
+            batch.reverse(head=journal_head)
+            batch.save()
 
             if cash.ref_type.lower() == 'sales':
                 invoice = models.sale.objects.get(code=cash.transaction_number, bussiness_name=business_query)
@@ -358,7 +286,7 @@ def reverse_cash_receipt(company, user, number, business):
                 customer.debit += cash.amount
                 customer.save()
 
-            models.tracking_history.objects.create(user=user_query, bussiness_name=business_query, area='Reversed Cash Receipt entry', head=journal_head.code)
+            activity_log.record(user=user_query, bussiness_name=business_query, area='Reversed Cash Receipt entry', head=journal_head.code)
 
             return {'status': 'success', 'message': f'Cash receipt {number} reversed successfully'}
         
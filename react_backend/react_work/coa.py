@@ -1,4 +1,4 @@
-from . import models
+from . import models, account_cache, activity_log, tenant_context
 from decimal import Decimal
 from django.db.models import Sum, F, Value, IntegerField,  CharField
 from collections import defaultdict
@@ -10,14 +10,30 @@ from datetime import date, datetime
 logger = logging.getLogger(__name__)
 
 
-def fetch_coa(business, company, user):
-    try:
-        business_query = models.bussiness.objects.get(
-            bussiness_name=business
+def _with_structure(business_id, rows):
+    """Adds the code, name, sub and parent account from the cached chart to balance rows keyed by account_id."""
+    rows = list(rows)
+    accounts = account_cache.by_id(business_id, {row['account_id'] for row in rows})
+
+    for row in rows:
+        account = accounts[row.pop('account_id')]
+        row.update(
+            account_code=account['code'],
+            account_name=account['name'],
+            sub_code=account['account_type__code'],
+            sub_name=account['account_type__name'],
+            parent_code=account['account_type__account_type__code'],
+            parent_name=account['account_type__account_type__name'],
         )
-        user_query = models.current_user.objects.filter(
-            user_name=user, bussiness_name=business_query
-        ).first()
+
+    return rows
+
+
+def fetch_coa(business, company, user, context=None):
+    try:
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not user_query.admin and not user_query.coa_acess:
             return {
@@ -31,31 +47,14 @@ def fetch_coa(business, company, user):
             end__lt=today, business=business_query, is_closed=True
         ).order_by('-end').first()
 
-        current_period = models.month_period.objects.filter(
-            start__lt=today, end__gt=today,
-            is_closed=False, business=business_query
-        ).first()
-        
-        ledgers = {
-            'Assets': models.asset_ledger.objects.filter(period=current_period),
-            'Liabilities': models.liabilities_ledger.objects.filter(period=current_period),
-            'Equity': models.equity_ledger.objects.filter(period=current_period),
-            'Revenue': models.revenue_ledger.objects.filter(period=current_period),
-            'Expenses': models.expenses_ledger.objects.filter(period=current_period),
-        }
-
-        closed_account_balance = models.account_balance.objects.filter(
+        current_period = account_cache.current_period(business_query.pk)
+
+        if current_period is not None and current_period.is_closed:
+            current_period = None
+
+        closed_account_balance = _with_structure(business_query.pk, models.account_balance.objects.filter(
             period=closed_period
-        ).values('account__code').annotate(
-            account_code=F('account__code'),
-            parent_name=F('account__account_type__account_type__name'),
-            parent_code=F('account__account_type__account_type__code'),
-            sub_name=F('account__account_type__name'),
-            sub_code=F('account__account_type__code'),
-            account_name=F('account__name'),
-            credit=F('credit_total'),
-            debit=F('debit_total')
-        )
+        ).values('account_id', credit=F('credit_total'), debit=F('debit_total')))
 
         closed_customer_balance = models.customer_balance.objects.filter(
             period=closed_period
@@ -83,63 +82,19 @@ def fetch_coa(business, company, user):
             debit=F('debit_total')
         )
 
-        current_account_balance = []
-        current_customer_balance = []
-        current_supplier_balance = []
-
-        for key, value in ledgers.items():
-            if key == 'Customer':
-                balance = value.values('account__account').annotate(
-                    account_code=F('account__account'),
-                    account_name=F('account__name'),
-                    sub_code=Value(10400, output_field=IntegerField()),
-                    sub_name=Value('Receivables', output_field=CharField()),
-                    parent_code=Value(10000, output_field=IntegerField()),
-                    parent_name=Value('Assets', output_field=CharField()),
-                    credit=Sum('credit'),
-                    debit=Sum('debit'),
-                )
-                current_customer_balance.append(balance)
-
-            elif key == 'Supplier':
-                balance = value.values('account__account','account__name').annotate(
-                    account_code=F('account__account'),
-                    account_name=F('account__name'),
-                    sub_code=Value(20100, output_field=IntegerField()),
-                    sub_name=Value('Payable', output_field=CharField()),
-                    parent_code=Value(20000, output_field=IntegerField()),
-                    parent_name=Value('Liabilities', output_field=CharField()),
-                    credit=Sum('credit'),
-                    debit=Sum('debit'),
-                )
-                current_supplier_balance.append(balance)
-
-            else:
-                balance = value.values('account__code').annotate(
-                    account_code=F('account__code'),
-                    account_name=F('account__name'),
-                    sub_code=F('account__account_type__code'),
-                    sub_name=F('account__account_type__name'),
-                    parent_code=F('account__account_type__account_type__code'),
-                    parent_name=F('account__account_type__account_type__name'),
-                    credit=Sum('credit'),
-                    debit=Sum('debit'),
-                )
-                current_account_balance.append(balance)
+        # every account class in one grouped scan of the general ledger
+        current_account_balance = _with_structure(business_query.pk, models.gl_entry.objects.filter(
+            period=current_period
+        ).values('account_id').annotate(credit=Sum('credit'), debit=Sum('debit')).order_by())
 
         closed_balances = chain(
             closed_account_balance,
             closed_customer_balance,
             closed_supplier_balance
         )
-        current_balances = chain(
-            *current_account_balance,
-            *current_customer_balance,
-            *current_supplier_balance
-        )
 
         merged_balances = {}
-        for entry in chain(closed_balances, current_balances):
+        for entry in chain(closed_balances, current_account_balance):
             acc_code = entry["account_code"]
             debit = entry["debit"] or Decimal("0")
             credit = entry["credit"] or Decimal("0")
@@ -222,12 +177,20 @@ def fetch_coa(business, company, user):
         
         return nested_result
     
+    except models.bussiness.DoesNotExist:
+        logger.warning(f"Business '{business}' not found.")
+        return {'status': 'error', 'message': f"Business '{business}' not found"}
+
+    except models.current_user.DoesNotExist:
+        logger.warning(f"User '{user}' not found.")
+        return {'status': 'error', 'message': f"User '{user}' not found"}
+
     except Exception as error:
         logger.warning(error)
         return {'status': 'error', 'message': 'something happened'}
 
 
-def create_account(data, company):
+def create_account(data, company, context=None):
     business_name = data['business']
     account = data['account']
     sub = data['sub']
@@ -240,8 +203,13 @@ def create_account(data, company):
     
     try:
     
-        business = models.bussiness.objects.get(company_id=company, bussiness_name=business_name)
-        user_query = models.current_user.objects.get(user_name=user, bussiness_name=business)
+        context = tenant_context.resolve(business_name, user, context, company)
+        business = context.business
+        user_query = context.user
+
+        # accounts are only added under the account that owns the business
+        if business.company_id != company:
+            raise models.bussiness.DoesNotExist(f'{business_name} does not belong to the signed in account')
 
         if not user_query.admin and not user_query.create_access and not user_query.coa_acess:
             return {'status':'error', 'message':f'User {user} has no access to create accounts'}
@@ -261,7 +229,7 @@ def create_account(data, company):
             
             models.real_account.objects.create(account_type=sub, name=real, description=description, bussiness_name=business)
 
-            models.tracking_history.objects.create(user=user_query, bussiness_name=business, area='Created gl account', head=real)
+            activity_log.record(user=user_query, bussiness_name=business, area='Created gl account', head=real)
 
             return {'status': 'success', 'message': f'Account {real} created successfully'}
         
@@ -276,25 +244,16 @@ def create_account(data, company):
 class retrive_real_account:
     def __init__(self, company, business, code_map: dict):
         self.code_map = code_map
-        self.business = models.bussiness.objects.filter(bussiness_name=business).first()
+
+        if isinstance(business, models.bussiness):
+            self.business = business
+        else:
+            self.business = models.bussiness.objects.filter(bussiness_name=business).first()
 
     def get_real_accounts(self) -> dict:
+        if self.business is None:
+            return {**{name: None for name in self.code_map}, 'period': None}
 
-        result = {}
-        for name, code in self.code_map.items():
-            try:
-                acc = models.real_account.objects.get(code=code, bussiness_name=self.business)
-            except models.real_account.DoesNotExist:
-                acc = None
-            result[name] = acc
-
-        current_month = models.month_period.objects.filter(
-            start__lte=date.today(),
-            end__gte=date.today(),
-            business=self.business
-        ).first()
-
-        result["period"] = current_month
+        result = {name: account_cache.account(self.business.pk, code) for name, code in self.code_map.items()}
+        result["period"] = account_cache.current_period(self.business.pk)
         return result
-
-    
@@ -0,0 +1,257 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction, IntegrityError
+from django.db.models import Sum, F, Count, Value, DecimalField
+from django.db.models.functions import Coalesce, ExtractWeekDay
+from datetime import date, timedelta
+from decimal import Decimal
+from collections import defaultdict
+from . import models
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_TTL = getattr(settings, 'DASHBOARD_CACHE_TTL', 300)
+
+CENT = Decimal('0.01')
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def _bump(model, keys, deltas):
+    """Adds deltas to the row for keys, creating it on first use."""
+    changes = {field: F(field) + value for field, value in deltas.items()}
+
+    if model.objects.filter(**keys).update(**changes):
+        return
+
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas)
+
+    except IntegrityError:
+        # another transaction created the row between our update and insert
+        model.objects.filter(**keys).update(**changes)
+
+
+def _sale_lines(sale_ids):
+    return models.sale_history.objects.filter(sales_id__in=sale_ids).values(
+        'sales__bussiness_name_id', 'sales__location_address_id', 'sales__date', 'item_name_id'
+    ).annotate(
+        qty=Sum('quantity'),
+        value=Sum(F('quantity') * F('sales_price')),
+    )
+
+
+def record_sale(sale, sign=1):
+    """Adds (sign=1) or removes (sign=-1) a posted sale from the daily tables."""
+    head = models.sale.objects.filter(pk=sale.pk).values(
+        'bussiness_name_id', 'location_address_id', 'date', 'gross_total', 'total_quantity', 'cog'
+    ).get()
+
+    keys = {'business_id': head['bussiness_name_id'], 'location_id': head['location_address_id'], 'date': head['date']}
+
+    _bump(models.daily_stock_summary, keys, {
+        'sales_value': _money(head['gross_total']) * sign,
+        'sales_quantity': _money(head['total_quantity']) * sign,
+        'sales_count': sign,
+        'cogs': _money(head['cog']) * sign,
+    })
+
+    for line in _sale_lines([sale.pk]):
+        _bump(models.daily_item_sales, dict(keys, item_id=line['item_name_id']), {
+            'quantity': _money(line['qty']) * sign,
+            'value': _money(line['value']) * sign,
+        })
+
+    invalidate_dashboard(head['bussiness_name_id'])
+
+
+def record_purchase(purchase, sign=1):
+    head = models.purchase.objects.filter(pk=purchase.pk).values(
+        'bussiness_name_id', 'location_address_id', 'date', 'gross_total', 'total_quantity'
+    ).get()
+
+    keys = {'business_id': head['bussiness_name_id'], 'location_id': head['location_address_id'], 'date': head['date']}
+
+    _bump(models.daily_stock_summary, keys, {
+        'purchase_value': _money(head['gross_total']) * sign,
+        'purchase_quantity': _money(head['total_quantity']) * sign,
+        'purchase_count': sign,
+    })
+
+    invalidate_dashboard(head['bussiness_name_id'])
+
+
+def rebuild(business, start=None, end=None):
+    """Recomputes the daily tables for a business from posted, non-reversed documents."""
+    sales = models.sale.objects.filter(bussiness_name=business, is_reversed=False)
+    purchases = models.purchase.objects.filter(bussiness_name=business, is_reversed=False)
+    summaries = models.daily_stock_summary.objects.filter(business=business)
+    item_rows = models.daily_item_sales.objects.filter(business=business)
+
+    if start:
+        sales, purchases = sales.filter(date__gte=start), purchases.filter(date__gte=start)
+        summaries, item_rows = summaries.filter(date__gte=start), item_rows.filter(date__gte=start)
+
+    if end:
+        sales, purchases = sales.filter(date__lte=end), purchases.filter(date__lte=end)
+        summaries, item_rows = summaries.filter(date__lte=end), item_rows.filter(date__lte=end)
+
+    rows = defaultdict(lambda: models.daily_stock_summary(business=business))
+
+    for entry in sales.values('location_address_id', 'date').annotate(
+        value=Sum('gross_total'), quantity=Sum('total_quantity'), count=Count('pk'), cost=Sum('cog')
+    ):
+        row = rows[(entry['location_address_id'], entry['date'])]
+        row.sales_value = _money(entry['value'])
+        row.sales_quantity = _money(entry['quantity'])
+        row.sales_count = entry['count']
+        row.cogs = _money(entry['cost'])
+
+    for entry in purchases.values('location_address_id', 'date').annotate(
+        value=Sum('gross_total'), quantity=Sum('total_quantity'), count=Count('pk')
+    ):
+        row = rows[(entry['location_address_id'], entry['date'])]
+        row.purchase_value = _money(entry['value'])
+        row.purchase_quantity = _money(entry['quantity'])
+        row.purchase_count = entry['count']
+
+    for (location_id, day), row in rows.items():
+        row.location_id = location_id
+        row.date = day
+
+    new_items = [
+        models.daily_item_sales(
+            business=business, location_id=line['sales__location_address_id'], date=line['sales__date'],
+            item_id=line['item_name_id'], quantity=_money(line['qty']), value=_money(line['value'])
+        )
+        for line in _sale_lines(sales.values('pk'))
+    ]
+
+    with transaction.atomic():
+        summaries.delete()
+        item_rows.delete()
+        models.daily_stock_summary.objects.bulk_create(rows.values(), batch_size=1000)
+        models.daily_item_sales.objects.bulk_create(new_items, batch_size=1000)
+
+    invalidate_dashboard(business.pk)
+
+    return {'days': len(rows), 'items': len(new_items)}
+
+
+def dashboard_values(business, location_names, today=None):
+    """Same shape as Dashboard_Report.dashboard_data, read from the daily tables."""
+    today = today or date.today()
+    month_start = today.replace(day=1)
+    week_start = today - timedelta(days=today.weekday())
+
+    summaries = models.daily_stock_summary.objects.filter(
+        business=business, location__location_name__in=location_names, date__range=(month_start, today)
+    )
+
+    zero = Value(Decimal('0'), output_field=DecimalField())
+
+    def totals(queryset):
+        return queryset.aggregate(
+            sales=Coalesce(Sum('sales_value'), zero), sales_quantity=Coalesce(Sum('sales_quantity'), zero),
+            purchases=Coalesce(Sum('purchase_value'), zero), purchase_quantity=Coalesce(Sum('purchase_quantity'), zero),
+        )
+
+    month = totals(summaries)
+    day = totals(summaries.filter(date=today))
+
+    week = list(summaries.filter(date__range=(week_start, today)).annotate(
+        weekday=ExtractWeekDay('date')
+    ).values('weekday').annotate(
+        sales_value=Coalesce(Sum('sales_value'), zero),
+        sales_quantity=Coalesce(Sum('sales_quantity'), zero),
+        purchase_value=Coalesce(Sum('purchase_value'), zero),
+        purchase_quantity=Coalesce(Sum('purchase_quantity'), zero),
+    ).order_by('weekday'))
+
+    WEEKDAYS = {1: 'Sun', 2: 'Mon', 3: 'Tue', 4: 'Wed', 5: 'Thu', 6: 'Fri', 7: 'Sat'}
+
+    merged = {
+        i: {'day': WEEKDAYS[i], 'sales_value': 0, 'purchase_value': 0, 'sales_quantity': 0, 'purchase_quantity': 0}
+        for i in range(1, 8)
+    }
+
+    for row in week:
+        merged[row['weekday']].update({key: row[key] for key in ('sales_value', 'sales_quantity', 'purchase_value', 'purchase_quantity')})
+
+    top_items = models.daily_item_sales.objects.filter(
+        business=business, location__location_name__in=location_names, date__range=(month_start, today)
+    ).values('item_id').annotate(
+        total_quantity=Sum('quantity')
+    ).filter(total_quantity__gt=0).order_by('-total_quantity').values(
+        'total_quantity', 'item__item_name', 'item__brand', 'item__code', 'item__category__name'
+    )[:10]
+
+    return {
+        'month_in': month['purchase_quantity'],
+        'month_out': month['sales_quantity'],
+        'day_in': day['purchase_quantity'],
+        'day_out': day['sales_quantity'],
+        'month_purchase': month['purchases'],
+        'month_sales': month['sales'],
+        'day_purchase': day['purchases'],
+        'day_sales': day['sales'],
+        'week_trend': [
+            {'weekday': row['weekday'], 'sales_value': row['sales_value'], 'sales_quantity': row['sales_quantity']}
+            for row in week if row['sales_value'] or row['sales_quantity']
+        ],
+        'purchase_vs_sales': [merged[i] for i in range(2, 8)] + [merged[1]],
+        'top_items': [
+            {
+                'item_name__item_name': row['item__item_name'], 'name': row['item__item_name'],
+                'brand': row['item__brand'], 'code': row['item__code'],
+                'category': row['item__category__name'], 'total_quantity': row['total_quantity'],
+            }
+            for row in top_items
+        ],
+    }
+
+
+def _dashboard_version_key(business_id):
+    return f'dashboard:version:{business_id}'
+
+
+def invalidate_dashboard(business_id):
+    def bump():
+        key = _dashboard_version_key(business_id)
+        try:
+            cache.add(key, 0, None)
+            cache.incr(key)
+        except Exception as error:
+            logger.warning(error)
+
+    transaction.on_commit(bump)
+
+
+def cached_dashboard(business_id, scope, build):
+    """Returns build() through the cache; scope is anything that changes the result for the same business."""
+    digest = hashlib.sha1(repr(scope).encode('utf-8')).hexdigest()
+
+    try:
+        version = cache.get(_dashboard_version_key(business_id), 0)
+        key = f'dashboard:{business_id}:{version}:{digest}'
+        result = cache.get(key)
+    except Exception as error:
+        logger.warning(error)
+        return build()
+
+    if result is not None:
+        return result
+
+    result = build()
+
+    try:
+        cache.set(key, result, DASHBOARD_TTL)
+    except Exception as error:
+        logger.warning(error)
+
+    return result
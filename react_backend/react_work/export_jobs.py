@@ -0,0 +1,187 @@
+from celery import shared_task
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from rest_framework.utils.encoders import JSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from . import models, report, tenant_context, export_stream
+import tempfile
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXPORT_TTL = timedelta(hours=getattr(settings, 'EXPORT_JOB_TTL_HOURS', 24))
+EXPORT_QUEUE = getattr(settings, 'EXPORT_QUEUE', None)
+
+PENDING = 'Pending'
+RUNNING = 'Running'
+COMPLETED = 'Completed'
+FAILED = 'Failed'
+
+
+def _report_args(context, params):
+    return {'business': context.business_name, 'user': context.user_name, 'company': context.user.user_id, 'context': context}
+
+
+# report name -> callable(context, params) using the same service functions as the report endpoints
+REPORTS = {
+    'items': lambda c, p: report.fetch_items_for_report(location=p.get('selectedLocation', ''), **_report_args(c, p)),
+    'movements': lambda c, p: report.fetch_data_for_report_movements(location=p.get('selectedLocation', ''), start=p.get('startDate'), end=p.get('endDate'), **_report_args(c, p)),
+    'sales_performance': lambda c, p: report.fetch_data_for_sales_performance(location=p.get('selectedLocation', ''), start=p.get('startDate'), end=p.get('endDate'), reference='sales_performance', **_report_args(c, p)),
+    'sales_records': lambda c, p: report.fetch_data_for_sales_performance(location=p.get('selectedLocation', ''), start=p.get('startDate'), end=p.get('endDate'), category=p.get('category', ''), brand=p.get('brand', ''), reference='sales_records', **_report_args(c, p)),
+    'purchase_records': lambda c, p: report.fetch_data_for_sales_performance(location=p.get('selectedLocation', ''), start=p.get('startDate'), end=p.get('endDate'), category=p.get('category', ''), brand=p.get('brand', ''), supplier=p.get('supplier', ''), reference='purchase_records', **_report_args(c, p)),
+    'customer_aging': lambda c, p: report.fetch_data_for_sales_performance(location=p.get('selectedLocation', ''), start='', end=p.get('endDate'), reference='customer_aging', **_report_args(c, p)),
+    'purchase_metric': lambda c, p: report.fetch_data_for_sales_performance(location=p.get('selectedLocation', ''), start=p.get('startDate'), end=p.get('endDate'), reference='purchase_metric', **_report_args(c, p)),
+    'supplier_performance': lambda c, p: report.fetch_data_for_sales_performance(location=p.get('selectedLocation', ''), start='', end=p.get('endDate'), reference='supplier_performance', **_report_args(c, p)),
+    'profit_loss': lambda c, p: report.fetch_pl_report(start=p.get('startDate'), end=p.get('endDate'), period_type=p.get('timeframe'),
+                                                      compare=p.get('compare') or None, budget=p.get('budget'), **_report_args(c, p)),
+    'inventory_valuation': lambda c, p: report.fetch_iv_report(start=p.get('startDate'), end=p.get('endDate'), category=p.get('category', ''), **_report_args(c, p)),
+    'trial_balance': lambda c, p: report.fetch_tb_report(start=p.get('startDate'), end=p.get('endDate'), **_report_args(c, p)),
+}
+
+
+def _params_hash(kind, format, params):
+    payload = json.dumps({'kind': kind, 'format': format, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def job_status(job):
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'format': job.format,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'filename': job.filename,
+        'created_at': job.created_at,
+        'expires_at': job.expires_at,
+    }
+
+
+def submit(context, kind, format, params):
+    """Queues an export, or returns the job already running for the same user and parameters."""
+    format = export_stream.normalize_format(format)
+
+    if kind == 'report':
+        if params.get('report') not in REPORTS:
+            return {'status': 'error', 'message': 'Invalid report submitted'}
+        format = 'json'
+
+    elif kind not in export_stream.SPECS:
+        return {'status': 'error', 'message': 'Invalid export submitted'}
+
+    elif format not in export_stream.WRITERS:
+        return {'status': 'error', 'message': 'Invalid export format'}
+
+    else:
+        user_query = context.user
+        if not user_query.admin and not getattr(user_query, export_stream.EXPORT_ACCESS[kind]):
+            return {'status': 'error', 'message': f'{user_query.user_name} has no access'}
+
+    params_hash = _params_hash(kind, format, params)
+
+    with transaction.atomic():
+        # serialises submits per user so two clicks cannot both miss the in-flight job
+        models.current_user.objects.select_for_update().filter(pk=context.user.pk).first()
+
+        job = models.export_job.objects.filter(
+            user=context.user, params_hash=params_hash, status__in=[PENDING, RUNNING]
+        ).order_by('-pk').first()
+
+        if job is not None:
+            return {'status': 'success', 'data': job_status(job)}
+
+        job = models.export_job.objects.create(
+            business=context.business, user=context.user, kind=kind, format=format,
+            params=params, params_hash=params_hash,
+        )
+
+        task = run_export_job.s(job.pk)
+        if EXPORT_QUEUE:
+            task = task.set(queue=EXPORT_QUEUE)
+
+        transaction.on_commit(task.delay)
+
+    return {'status': 'success', 'data': job_status(job)}
+
+
+def _write_table(job, context, tmp):
+    queryset, location = export_stream.export_queryset(job.kind, context, job.params)
+    total = queryset.count()
+
+    def progress(count):
+        models.export_job.objects.filter(pk=job.pk).update(progress=min(99, int(count * 100 / max(total, 1))))
+
+    export_stream.WRITERS[job.format](tmp, job.kind, queryset, context.user, location, progress)
+    return export_stream.filename_for(job.kind, job.format)
+
+
+@shared_task(name="react_work.export_jobs.run_export_job")
+def run_export_job(job_id):
+    # claiming the row first keeps a redelivered message from running the export twice
+    claimed = models.export_job.objects.filter(pk=job_id, status=PENDING).update(status=RUNNING)
+    if not claimed:
+        return None
+
+    job = models.export_job.objects.select_related('business', 'user').get(pk=job_id)
+
+    try:
+        context = tenant_context.get_context(job.business.bussiness_name, job.user.user_name)
+
+        if job.kind == 'report':
+            data = REPORTS[job.params['report']](context, job.params)
+
+            if isinstance(data, str):
+                raise PermissionError(data)
+
+            filename = f"{job.params['report']}_report_{timezone.now().strftime('%Y%m%d_%H%M%S')}.json"
+            job.file.save(filename, ContentFile(json.dumps(data, cls=JSONEncoder).encode('utf-8')), save=False)
+
+        else:
+            if not context.user.admin and not getattr(context.user, export_stream.EXPORT_ACCESS[job.kind]):
+                raise PermissionError(f'{context.user.user_name} has no access')
+
+            with tempfile.TemporaryFile() as tmp:
+                filename = _write_table(job, context, tmp)
+                tmp.seek(0)
+                job.file.save(filename, File(tmp), save=False)
+
+        job.filename = filename
+        job.status = COMPLETED
+        job.progress = 100
+        job.message = ''
+
+    except Exception as error:
+        logger.exception(f"Export job {job_id} failed: {error}")
+        job.status = FAILED
+        job.message = str(error)[:255]
+
+    job.finished_at = timezone.now()
+    job.expires_at = job.finished_at + EXPORT_TTL
+    job.save(update_fields=['file', 'filename', 'status', 'progress', 'message', 'finished_at', 'expires_at'])
+
+    return job.status
+
+
+@shared_task(name="react_work.export_jobs.cleanup_export_jobs")
+def cleanup_export_jobs():
+    now = timezone.now()
+    expired = models.export_job.objects.filter(expires_at__lt=now)
+
+    # jobs whose worker died never get an expiry, so age them out by creation time
+    stale = models.export_job.objects.filter(expires_at__isnull=True, created_at__lt=now - EXPORT_TTL)
+
+    removed = 0
+    for job in list(expired) + list(stale):
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        removed += 1
+
+    logger.info(f"Removed {removed} expired export jobs")
+    return removed
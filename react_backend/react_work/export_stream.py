@@ -0,0 +1,416 @@
+from reportlab.platypus import Frame, Table as RLTable, TableStyle, Paragraph, Spacer
+from reportlab.pdfgen import canvas
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+from django.conf import settings
+from django.http import StreamingHttpResponse, FileResponse
+from datetime import datetime
+from decimal import Decimal
+from . import models, inventory_item, inventory_sales, inventory_purchase, transfer
+import tempfile
+import json
+import csv
+
+CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+# rows per table; about a page, so splitting a table across pages stays cheap
+PDF_TABLE_ROWS = 100
+PDF_MARGIN = 40
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf',
+}
+
+
+def _locations_title(user):
+    return user.per_location_access if user.admin is False else "All Locations"
+
+
+def _date(value):
+    return value.strftime('%Y-%m-%d') if value else ''
+
+
+def _amount(value):
+    return Decimal(str(value or 0))
+
+
+def _sales_row(item):
+    return [
+        item.get('code', ''),
+        _date(item.get('date')),
+        item.get('description', ''),
+        item.get('customer_name', '') if item.get('customer_info__name') == 'Regular Customer' else item.get('customer_info__name', ''),
+        item.get('location_address__location_name', ''),
+        _amount(item.get('sub_total')),
+        _amount(item.get('discount')),
+        _amount(item.get('tax_levy')),
+        _amount(item.get('gross_total')),
+        item.get('status', ''),
+    ]
+
+
+def _purchase_row(item):
+    return [
+        item.get('code', ''),
+        _date(item.get('date')),
+        item.get('description', ''),
+        item.get('supplier__name', ''),
+        item.get('location_address__location_name', ''),
+        _amount(item.get('gross_total')),
+        item.get('status', ''),
+    ]
+
+
+def _transfer_row(item):
+    return [
+        item.get('code', ''),
+        _date(item.get('date')),
+        item.get('description', ''),
+        item.get('from_loc__location_name', ''),
+        item.get('to_loc__location_name', ''),
+        _amount(item.get('total_quantity')),
+        item.get('status', ''),
+    ]
+
+
+def _item_row(item):
+    qty = _amount(item.get('quantity'))
+    cost = _amount(item.get('purchase_price'))
+
+    return [
+        item.get('code', ''),
+        item.get('item_name', '') if isinstance(item.get('item_name', ''), str) else item.get('item_name_1', ''),
+        item.get('category__name', ''),
+        item.get('brand__name', ''),
+        item.get('model', ''),
+        qty,
+        item.get('unit__suffix', ''),
+        cost,
+        _amount(item.get('sales_price')),
+        qty * cost,
+    ]
+
+
+# title, file prefix, headers, row builder, columns to total and pdf column widths per export
+SPECS = {
+    'sales': {
+        'title': lambda user, location: f"Sales Report for {_locations_title(user)}",
+        'filename': 'sales_report',
+        'headers': ['Sales ID', 'Date', 'Description', 'Customer', 'Location', 'Gross Amount', 'Discount', 'Tax Levy', 'Net Amount', 'Status'],
+        'row': _sales_row,
+        'totals': [5, 6, 7, 8],
+        'widths': [62, 52, 90, 62, 62, 50, 44, 44, 50, 42],
+    },
+    'purchase': {
+        'title': lambda user, location: f"Purchase Report for {_locations_title(user)}",
+        'filename': 'purchase_report',
+        'headers': ['Purchase ID', 'Date', 'Description', 'Supplier', 'Location', 'Total Amount', 'Status'],
+        'row': _purchase_row,
+        'totals': [5],
+        'widths': [82, 68, 130, 80, 80, 80, 70],
+    },
+    'transfer': {
+        'title': lambda user, location: f"Transfer Report for {_locations_title(user)}",
+        'filename': 'transfer_report',
+        'headers': ['Transfer ID', 'Date', 'Description', 'Source', 'Destination', 'Quantity', 'Status'],
+        'row': _transfer_row,
+        'totals': [5],
+        'widths': [82, 68, 130, 80, 80, 60, 70],
+    },
+    'items': {
+        'title': lambda user, location: f"Inventory Items Report for {location or 'All Locations'}",
+        'filename': 'inventory_items',
+        'headers': ['Item Code', 'Item Name', 'Category', 'Brand', 'Model', 'Quantity', 'Unit', 'Cost', 'Price', 'Total Value'],
+        'row': _item_row,
+        'totals': [5, 9],
+        'widths': [50, 100, 60, 55, 50, 42, 30, 45, 45, 55],
+    },
+}
+
+
+def normalize_format(format):
+    format = (format or '').strip().lower()
+    return 'xlsx' if format == 'excel' else format
+
+
+def filename_for(kind, format):
+    return f"{SPECS[kind]['filename']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+
+
+def _rows(kind, queryset, progress=None):
+    row = SPECS[kind]['row']
+
+    for count, item in enumerate(queryset.iterator(chunk_size=CHUNK_SIZE), start=1):
+        yield row(item)
+
+        if progress is not None and count % CHUNK_SIZE == 0:
+            progress(count)
+
+
+def _preamble(kind, user, location):
+    return [
+        [SPECS[kind]['title'](user, location)],
+        [f"Generated by: {user.user_name} on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"],
+        [],
+    ]
+
+
+def _cell(value):
+    return f"{value:.2f}" if isinstance(value, Decimal) else value
+
+
+def _totals_row(kind, totals):
+    spec = SPECS[kind]
+    row = [''] * len(spec['headers'])
+    row[1] = 'TOTALS'
+
+    for index in spec['totals']:
+        row[index] = totals[index]
+
+    return row
+
+
+def csv_lines(kind, queryset, user, location=None, progress=None):
+    """Yields encoded csv lines; totals are kept as running sums so rows are never held in memory."""
+    spec = SPECS[kind]
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer)
+    totals = {index: Decimal('0') for index in spec['totals']}
+
+    for line in _preamble(kind, user, location):
+        yield writer.writerow(line)
+
+    yield writer.writerow(spec['headers'])
+
+    for row in _rows(kind, queryset, progress):
+        for index in spec['totals']:
+            totals[index] += row[index]
+
+        yield writer.writerow([_cell(value) for value in row])
+
+    yield writer.writerow([_cell(value) for value in _totals_row(kind, totals)])
+
+
+class _LineBuffer:
+    def write(self, value):
+        return value.encode('utf-8')
+
+
+def write_csv(file, kind, queryset, user, location=None, progress=None):
+    for line in csv_lines(kind, queryset, user, location, progress):
+        file.write(line)
+
+
+def write_xlsx(file, kind, queryset, user, location=None, progress=None):
+    spec = SPECS[kind]
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=spec['filename'].replace('_', ' ').title()[:31])
+
+    for index, width in enumerate(spec['widths'], start=1):
+        ws.column_dimensions[get_column_letter(index)].width = max(12, width // 4)
+
+    bold = Font(bold=True)
+
+    def bold_row(values):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.font = bold
+            cells.append(cell)
+        return cells
+
+    preamble = _preamble(kind, user, location)
+    ws.append(bold_row(preamble[0]))
+    for line in preamble[1:]:
+        ws.append(line)
+
+    ws.append(bold_row(spec['headers']))
+    first_row = len(preamble) + 2
+    last_row = first_row - 1
+
+    for row in _rows(kind, queryset, progress):
+        ws.append([float(value) if isinstance(value, Decimal) else value for value in row])
+        last_row += 1
+
+    totals = [''] * len(spec['headers'])
+    totals[1] = 'TOTALS'
+    for index in spec['totals']:
+        column = get_column_letter(index + 1)
+        totals[index] = f"=SUM({column}{first_row}:{column}{max(first_row, last_row)})"
+    ws.append(bold_row(totals))
+
+    wb.save(file)
+
+
+class _PdfPages:
+    """Lays flowables out on letter pages and finishes each page as soon as it is full, so only
+    the page being filled is held as flowables (SimpleDocTemplate.build needs them all at once)."""
+
+    def __init__(self, file):
+        self.canvas = canvas.Canvas(file, pagesize=letter)
+        self.frame = self._frame()
+
+    def _frame(self):
+        width, height = letter
+        return Frame(PDF_MARGIN, PDF_MARGIN, width - 2 * PDF_MARGIN, height - 2 * PDF_MARGIN,
+                     leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0)
+
+    def _next_page(self):
+        self.canvas.showPage()
+        self.frame = self._frame()
+
+    def add(self, flowable):
+        pending = [flowable]
+
+        while pending:
+            flowable = pending.pop(0)
+
+            if self.frame.add(flowable, self.canvas, trySplit=1):
+                continue
+
+            parts = self.frame.split(flowable, self.canvas)
+
+            if parts:
+                self.frame.add(parts[0], self.canvas, trySplit=1)
+                pending[:0] = parts[1:]
+            elif self.frame._atTop:
+                raise ValueError('A PDF row does not fit on an empty page')
+            else:
+                pending.insert(0, flowable)
+
+            self._next_page()
+
+    def save(self):
+        # save() finishes the last page when anything is drawn on it
+        self.canvas.save()
+
+
+def write_pdf(file, kind, queryset, user, location=None, progress=None):
+    spec = SPECS[kind]
+    pages = _PdfPages(file)
+    styles = getSampleStyleSheet()
+    preamble = _preamble(kind, user, location)
+
+    for flowable in (
+        Paragraph(preamble[0][0], styles['Heading2']),
+        Spacer(1, 12),
+        Paragraph(preamble[1][0], styles['Normal']),
+        Spacer(1, 12),
+    ):
+        pages.add(flowable)
+
+    style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#CCCCCC')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('ALIGN', (2, 1), (2, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 7),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 3),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+    ])
+
+    def table(rows):
+        rl_table = RLTable([spec['headers']] + rows, colWidths=spec['widths'], repeatRows=1)
+        rl_table.setStyle(style)
+        return rl_table
+
+    # fixed-size tables keep reportlab from re-splitting one huge table on every page
+    totals = {index: Decimal('0') for index in spec['totals']}
+    chunk = []
+
+    for row in _rows(kind, queryset, progress):
+        for index in spec['totals']:
+            totals[index] += row[index]
+
+        chunk.append([_cell(value) for value in row])
+
+        if len(chunk) >= PDF_TABLE_ROWS:
+            pages.add(table(chunk))
+            chunk = []
+
+    chunk.append([_cell(value) for value in _totals_row(kind, totals)])
+    pages.add(table(chunk))
+    pages.save()
+
+
+EXPORT_ACCESS = {
+    'sales': 'sales_access',
+    'purchase': 'purchase_access',
+    'transfer': 'transfer_access',
+    'items': 'item_access',
+}
+
+
+def export_queryset(kind, context, data):
+    business_query = context.business
+    user_query = context.user
+    search = str(data.get('searchQuery', '')).lower().strip()
+
+    if kind == 'items':
+        location = data.get('location', '')
+
+        if not user_query.admin:
+            locations_access = user_query.per_location_access
+        else:
+            locations_access = ['All Locations']
+            locations_access.extend(models.inventory_location.objects.filter(bussiness_name=business_query).values_list('location_name', flat=True))
+
+        if not (user_query.admin and (not location or location.lower() == 'all locations')):
+            if len(locations_access) < 1:
+                raise PermissionError(f'{user_query.user_name} does not have access to any location')
+
+            if not location:
+                location = locations_access[0]
+            elif location not in locations_access:
+                raise PermissionError(f'{user_query.user_name} does not have access to {location}')
+
+        queryset = inventory_item.items_main_queryset(business_query, user_query, locations_access, location, search,
+                                                      bool(data.get('count')), data.get('category', ''), data.get('brand', ''))
+        return queryset, location
+
+    date_search = data.get('parsed') or '{}'
+    date_search = json.loads(date_search) if isinstance(date_search, str) else date_search
+
+    if not isinstance(date_search, dict):
+        raise ValueError('Invalid date range submitted')
+
+    builders = {
+        'sales': inventory_sales.sales_main_queryset,
+        'purchase': inventory_purchase.purchase_main_queryset,
+        'transfer': transfer.transfer_main_queryset,
+    }
+
+    return builders[kind](business_query, user_query, search, date_search), None
+
+
+WRITERS = {
+    'csv': write_csv,
+    'xlsx': write_xlsx,
+    'pdf': write_pdf,
+}
+
+
+def export_response(kind, format, queryset, user, location=None):
+    format = normalize_format(format)
+    filename = filename_for(kind, format)
+
+    if format == 'csv':
+        response = StreamingHttpResponse(csv_lines(kind, queryset, user, location), content_type=CONTENT_TYPES['csv'])
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    # xlsx and pdf need the whole document before the first byte can go out, so spool to disk
+    file = tempfile.TemporaryFile()
+    WRITERS[format](file, kind, queryset, user, location)
+    file.seek(0)
+
+    return FileResponse(file, as_attachment=True, filename=filename, content_type=CONTENT_TYPES[format])
@@ -1,4 +1,4 @@
-from . import models
+from . import models, tenant_context, keyset, activity_log
 from decimal import Decimal
 from django.core.paginator import Paginator
 from django.db.models import Sum, F
@@ -9,13 +9,15 @@ import logging
 import json
 from datetime import date, datetime
 from .coa import retrive_real_account
+from .journal_batch import JournalBatch
 
 logger = logging.getLogger(__name__)
 
-def fetch_journal_for_main_view(search, date_search, business, company, page, user, page_quantity=30):
+def fetch_journal_for_main_view(search, date_search, business, company, page, user, page_quantity=30, cursor=None, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
        
         if not user_query.admin and not user_query.journal_access:
             return {'status':'error', 'message':f'User {user} has no access to view journal'}
@@ -46,6 +48,12 @@ def fetch_journal_for_main_view(search, date_search, business, company, page, us
             'created_by__user_name', 'reversed'
         )
         
+        if cursor is not None:
+            journal, next_cursor = keyset.keyset_page(journal, keyset.BY_CODE_DESC, cursor, page_quantity)
+            result = {'journals':journal, 'has_more':next_cursor is not None, 'next_cursor':next_cursor}
+
+            return {'status':'success', 'data':result}
+
         paginator = Paginator(journal, page_quantity)
         current_page = paginator.get_page(page)
 
@@ -53,6 +61,9 @@ def fetch_journal_for_main_view(search, date_search, business, company, page, us
 
         return {'status':'success', 'data':result}
 
+    except keyset.InvalidCursor as error:
+        return {'status': 'error', 'message': str(error)}
+
     except models.bussiness.DoesNotExist:
         logger.warning(f"Business '{business}' not found.")
         return {'status': 'error', 'message': f'Business {business} not found'}
@@ -65,10 +76,11 @@ def fetch_journal_for_main_view(search, date_search, business, company, page, us
         logger.exception(error)
         return {'status': 'error', 'message': 'something happened'}
     
-def view_gl_journal(business, user, company, code):
+def view_gl_journal(business, user, company, code, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(user_name=user, bussiness_name=business_query)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not user_query.admin and not user_query.journal_access:
             return {'status':'error', 'message':f'User {user} has no access to view journal'}
@@ -101,10 +113,11 @@ def view_gl_journal(business, user, company, code):
         logger.exception(error)
         return {'status': 'error', 'message': 'something happened'}
     
-def add_gl_journal(company, user, business, data):
+def add_gl_journal(company, user, business, data, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not user_query.admin and not user_query.create_access and not user_query.journal_access:
             return {'status':'error', 'message':f'User {user} has no access to create general journal'}
@@ -149,7 +162,7 @@ def add_gl_journal(company, user, business, data):
                 
                 accounts = {'debit':i['debit_account'], 'credit':i['credit_account']}
 
-                result = retrive_real_account(code_map=accounts, business=business, company=company).get_real_accounts()
+                result = retrive_real_account(code_map=accounts, business=business_query, company=company).get_real_accounts()
 
                 head = models.journal_head.objects.create(entry_type="Manual Entry", transaction_number=i['reference'], amount=i['amount'], created_by=user_query, 
                                                         bussiness_name=business_query, description=i['description'])
@@ -172,7 +185,7 @@ def add_gl_journal(company, user, business, data):
                             account=debit_real_account, transaction_number=head.code, date=i['date'], type="Manuel Entry",
                             description=head.description, debit=Decimal(str(head.amount)), head=head)
 
-                models.tracking_history.objects.create(user=user_query, bussiness_name=business_query, area='Posted GL entry', head=head.code)
+                activity_log.record(user=user_query, bussiness_name=business_query, area='Posted GL entry', head=head.code)
 
             return {'status':'success', 'message':'General journal entries added successfully'}
 
@@ -196,10 +209,11 @@ def add_gl_journal(company, user, business, data):
         logger.warning(error)
         return {'status': 'error', 'message': 'something happened'}
     
-def reverse_gl_journal(company, user, number, business):
+def reverse_gl_journal(company, user, number, business, context=None):
     try:    
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not user_query.admin and not user_query.create_access:
             return {'status':'error', 'message':f'User {user} has no access to reverse general journal'}
@@ -215,96 +229,14 @@ def reverse_gl_journal(company, user, number, business):
             head.reversed = True
             head.save()
 
-            journal = models.journal.objects.filter(bussiness_name=business_query, head=head)
-            for entry in journal:
-                models.journal.objects.create(
-                    entry_type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    amount=entry.amount,
-                    bussiness_name=business_query,
-                    date=date.today(),
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    head=entry.head
-                )
-
-            asset_entries = models.asset_ledger.objects.filter(head=head, bussiness_name=business_query)
-            for entry in asset_entries:
-                models.asset_ledger.objects.create(
-                    sub_account=entry.sub_account,
-                    bussiness_name=business_query,
-                    hit_account=entry.hit_account,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
-                            
-            liabilities_entries = models.liabilities_ledger.objects.filter(head=head, bussiness_name=business_query)
-            for entry in liabilities_entries:
-                models.liabilities_ledger.objects.create(
-                    sub_account=entry.sub_account,
-                    bussiness_name=business_query,
-                    hit_account=entry.hit_account,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
-
-            revenue_entries = models.revenue_ledger.objects.filter(head=head, bussiness_name=business_query)
-            for entry in revenue_entries:
-                models.revenue_ledger.objects.create(
-                    sub_account=entry.sub_account,
-                    bussiness_name=business_query,
-                    hit_account=entry.hit_account,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
-                            
-            expense_entries = models.expenses_ledger.objects.filter(head=head, bussiness_name=business_query)
-            for entry in expense_entries:
-                models.expenses_ledger.objects.create(
-                    sub_account=entry.sub_account,
-                    bussiness_name=business_query,
-                    hit_account=entry.hit_account,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
-
-            equity_entries = models.equity_ledger.objects.filter(head=head, bussiness_name=business_query)
-            for entry in equity_entries:
-                models.equity_ledger.objects.create(
-                    sub_account=entry.sub_account,
-                    bussiness_name=business_query,
-                    hit_account=entry.hit_account,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
-
-            models.tracking_history.objects.create(user=user_query, bussiness_name=business_query, area='Reversed GL entry', head=head.code)
+            today = date.today()
+            period = models.month_period.objects.filter(business=business_query, start__lte=today, end__gte=today).first()
+
+            batch = JournalBatch(business_query, user_query)
+            batch.reverse(period=period, head=head)
+            batch.save()
+
+            activity_log.record(user=user_query, bussiness_name=business_query, area='Reversed GL entry', head=head.code)
 
         return {'status': 'success', 'message': f'General journal entry {number} reversed successfully'}
         
@@ -0,0 +1,146 @@
+from django.db import connection, transaction
+from django.db.models import Sum, Count, Value, DecimalField
+from django.db.models.functions import Coalesce
+from decimal import Decimal
+from . import models
+import logging
+
+logger = logging.getLogger(__name__)
+
+# account class -> name of the account type it belongs to in the chart of accounts
+CLASS_NAMES = dict(models.gl_entry.ACCOUNT_CLASSES)
+
+# per-class tables the ledger rows lived in before gl_entry
+LEGACY_TABLES = {account_class: f'react_work_{account_class}_ledger' for account_class in CLASS_NAMES}
+
+COLUMNS = [
+    'head_id', 'account_id', 'period_id', 'transaction_number', 'date', 'type',
+    'description', 'debit', 'credit', 'balance', 'bussiness_name_id',
+]
+
+BATCH_SIZE = 20000
+
+ZERO = Value(Decimal('0.00'), output_field=DecimalField())
+
+
+def movements(business, periods, fields=('account_id',)):
+    """Debit/credit totals of every account class in one grouped scan over gl_entry.
+
+    periods is a month_period, a list of them or a queryset; rows are grouped by
+    account_class plus the given fields.
+    """
+    entries = models.gl_entry.objects.filter(bussiness_name=business)
+
+    if isinstance(periods, models.month_period):
+        entries = entries.filter(period=periods)
+    else:
+        entries = entries.filter(period__in=periods)
+
+    return entries.values('account_class', *fields).annotate(
+        debit=Coalesce(Sum('debit'), ZERO),
+        credit=Coalesce(Sum('credit'), ZERO),
+    ).order_by()
+
+
+def _legacy_tables(using):
+    existing = set(using.introspection.table_names())
+    return {account_class: table for account_class, table in LEGACY_TABLES.items() if table in existing}
+
+
+def backfill(account_classes=None, batch_size=BATCH_SIZE, using=None):
+    """Copies rows from the old per-class ledger tables into gl_entry.
+
+    Rows already copied are skipped through legacy_id, so it can be rerun to pick up rows
+    written by processes still running the old code. Copies in legacy id order so running
+    balances keep their sequence. Returns {account_class: rows copied}.
+    """
+    using = using or connection
+    quote = using.ops.quote_name
+    target = quote(models.gl_entry._meta.db_table)
+    columns = ', '.join(quote(column) for column in COLUMNS)
+    source_columns = ', '.join(f'l.{quote(column)}' for column in COLUMNS)
+    copied = {}
+
+    for account_class, table in _legacy_tables(using).items():
+        if account_classes and account_class not in account_classes:
+            continue
+
+        source = quote(table)
+        copied[account_class] = 0
+
+        with using.cursor() as cursor:
+            cursor.execute(f'SELECT MIN(id), MAX(id) FROM {source}')
+            low, high = cursor.fetchone()
+
+        if low is None:
+            continue
+
+        for start in range(low, high + 1, batch_size):
+            with transaction.atomic(using=using.alias), using.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {target} (account_class, legacy_id, {columns}) '
+                    f'SELECT %s, l.id, {source_columns} FROM {source} l '
+                    f'WHERE l.id >= %s AND l.id < %s AND NOT EXISTS ('
+                    f'SELECT 1 FROM {target} g WHERE g.account_class = %s AND g.legacy_id = l.id'
+                    f') ORDER BY l.id',
+                    [account_class, start, start + batch_size, account_class],
+                )
+                copied[account_class] += max(cursor.rowcount, 0)
+
+        logger.info(f"Backfilled {copied[account_class]} {account_class} ledger rows into gl_entry")
+
+    return copied
+
+
+def compare_legacy(using=None):
+    """Row count and debit/credit totals per class in the old tables and in gl_entry, for checking a backfill."""
+    using = using or connection
+    quote = using.ops.quote_name
+    result = {}
+
+    for account_class, table in _legacy_tables(using).items():
+        with using.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*), SUM(debit), SUM(credit) FROM {quote(table)}')
+            count, debit, credit = cursor.fetchone()
+
+        copied = models.gl_entry.objects.filter(account_class=account_class, legacy_id__isnull=False).aggregate(
+            rows=Count('pk'), debit=Coalesce(Sum('debit'), ZERO), credit=Coalesce(Sum('credit'), ZERO),
+        )
+
+        result[account_class] = {
+            'legacy_rows': count,
+            'legacy_debit': Decimal(str(debit or 0)),
+            'legacy_credit': Decimal(str(credit or 0)),
+            'copied_rows': copied['rows'],
+            'copied_debit': copied['debit'],
+            'copied_credit': copied['credit'],
+        }
+
+    return result
+
+
+def drop_legacy(account_classes=None, using=None):
+    """Drops the old per-class tables whose rows are all in gl_entry. Returns the tables dropped."""
+    using = using or connection
+    dropped = []
+
+    for account_class, totals in compare_legacy(using).items():
+        if account_classes and account_class not in account_classes:
+            continue
+
+        matches = (
+            totals['legacy_rows'] == totals['copied_rows']
+            and totals['legacy_debit'] == totals['copied_debit']
+            and totals['legacy_credit'] == totals['copied_credit']
+        )
+
+        if not matches:
+            logger.warning(f"Not dropping {LEGACY_TABLES[account_class]}: gl_entry does not match it")
+            continue
+
+        with using.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {using.ops.quote_name(LEGACY_TABLES[account_class])}')
+
+        dropped.append(LEGACY_TABLES[account_class])
+
+    return dropped
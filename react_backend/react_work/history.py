@@ -1,4 +1,4 @@
-from . import models
+from . import models, tenant_context
 from django.db.models import F, When, Case, Value, CharField, IntegerField
 from decimal import Decimal
 from django.db.models import Q
@@ -8,13 +8,15 @@ import logging
 logger = logging.getLogger(__name__)
 
 class FetchHistory:
-    def __init__(self, business, company, user, reference, location=None):
-        self.business = models.bussiness.objects.filter(
-            bussiness_name=business
-        ).first()
-        self.user = models.current_user.objects.filter(
-            user_name=user, bussiness_name=self.business
-        ).first()
+    def __init__(self, business, company, user, reference, location=None, context=None):
+        try:
+            context = tenant_context.resolve(business, user, context, company)
+            self.business = context.business
+            self.user = context.user
+        except (models.bussiness.DoesNotExist, models.current_user.DoesNotExist):
+            # without a user every fetch answers that there is no access
+            self.business = None
+            self.user = None
         self.reference = reference
         self.location = location
 
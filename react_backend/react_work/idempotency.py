@@ -0,0 +1,119 @@
+from celery import shared_task
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+from . import models, tenant_context
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+
+KEY_TTL = timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 48))
+
+
+def _fingerprint(request):
+    data = request.data
+
+    if hasattr(data, 'getlist'):
+        data = {name: data.getlist(name) for name in data}
+
+    payload = json.dumps({'path': request.path, 'data': data}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _replay(claim, fingerprint):
+    if claim.fingerprint != fingerprint:
+        return Response({'status': 'error', 'message': 'Idempotency key was already used for a different request', 'data': {}})
+
+    if claim.response is None:
+        return Response({'status': 'error', 'message': 'A request with this idempotency key is still being processed', 'data': {}})
+
+    return Response(claim.response, headers={'Idempotent-Replayed': 'true'})
+
+
+def _claim(business, scope, key, fingerprint):
+    """Returns (claim, created); an expired claim on the same key is replaced.
+
+    Called inside the request's transaction, so a concurrent request with the same key waits
+    on the unique index until this one commits or rolls back.
+    """
+    models.idempotency_key.objects.filter(
+        business=business, scope=scope, key=key, created_at__lt=timezone.now() - KEY_TTL
+    ).delete()
+
+    try:
+        with transaction.atomic():
+            return models.idempotency_key.objects.create(business=business, scope=scope, key=key, fingerprint=fingerprint), True
+
+    except IntegrityError:
+        return models.idempotency_key.objects.get(business=business, scope=scope, key=key), False
+
+
+def idempotent(view):
+    """Makes a posting view safe to retry with an Idempotency-Key header.
+
+    The claim, the view's writes and the stored result share one transaction, so a key is
+    either saved with the response of a committed request or not saved at all; a worker
+    dying half way leaves nothing behind to block the retry. A successful result is returned
+    as is to every retry with the same key, while a failed one rolls back and releases the
+    key so the client can try again. A user of another account is refused; requests without
+    the header, or whose business and user cannot be found, reach the view unchanged. Place it below @api_view so the view
+    gets the DRF request.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER, '').strip()
+
+        if request.method != 'POST' or not key:
+            return view(request, *args, **kwargs)
+
+        if len(key) > models.idempotency_key._meta.get_field('key').max_length:
+            return Response({'status': 'error', 'message': 'Idempotency key is too long', 'data': {}})
+
+        try:
+            context = tenant_context.from_request(request)
+
+        except tenant_context.ForeignUser as error:
+            logger.warning(error)
+            return Response({'status': 'error', 'message': f"User '{request.data.get('user')}' not found", 'data': {}})
+
+        except (models.bussiness.DoesNotExist, models.current_user.DoesNotExist, ValueError):
+            context = None
+
+        if context is None:
+            return view(request, *args, **kwargs)
+
+        fingerprint = _fingerprint(request)
+
+        with transaction.atomic():
+            claim, created = _claim(context.business, view.__name__, key, fingerprint)
+
+            if not created:
+                return _replay(claim, fingerprint)
+
+            response = view(request, *args, **kwargs)
+            result = getattr(response, 'data', None)
+
+            if isinstance(result, dict) and result.get('status') == 'success':
+                claim.response = result
+                claim.save(update_fields=['response'])
+            else:
+                transaction.set_rollback(True)
+
+        return response
+
+    return wrapper
+
+
+@shared_task(name="react_work.idempotency.cleanup_idempotency_keys")
+def cleanup_idempotency_keys():
+    removed, _ = models.idempotency_key.objects.filter(created_at__lt=timezone.now() - KEY_TTL).delete()
+    logger.info(f"Removed {removed} expired idempotency keys")
+    return removed
@@ -2,47 +2,35 @@ from re import T
 from . import models
 from decimal import Decimal
 from django.core.paginator import Paginator
-from django.db.models import Sum, Q, F
+from django.db.models import Sum, Q, F, Value
+from django.db.models.functions import Coalesce
 from collections import defaultdict
 from django.db import transaction
 from django.db.models import Q
 import logging
 from . import export_format
+from . import tenant_context, keyset, activity_log, search_index, item_catalogue
 
 logger = logging.getLogger(__name__)
 
-def fetch_items_for_main_view(business, page, company, search, user, location, format, count,category, brand, page_quantity=30):
-    try:
-        business_obj = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_obj, user_name=user)
+def items_main_queryset(business_obj, user_query, locations_access, location, search, count, category, brand):
+    if user_query.admin and (not location or location.lower() == 'all locations'):
 
-        if not user_query.item_access and not user_query.admin:
-            logger.warning(f"User '{user}' does not have access to view items")
-            return {'status': 'error', 'message': f'{user} does not have access to view items'}
-        
-        if not user_query.admin:
-            locations_access = user_query.per_location_access
-        else:
-            locations = [{'value': 'All Locations', 'label': 'All Locations'}]
-            location_query = models.inventory_location.objects.filter(bussiness_name=business_obj)
-            locations.extend([{'value': i.location_name, 'label': i.location_name} for i in location_query])
-            locations_access = ['All Locations']
-            locations_access.extend([loc.location_name for loc in location_query])
-           
-        if user_query.admin and (not location or location.lower() == 'all locations'):
+        items = models.items.objects.filter(bussiness_name=business_obj)
 
-            items = models.items.objects.filter(bussiness_name=business_obj)
+        if count:
+            items = items.filter(quantity__gt=0)
 
-            if count:
-                items = items.filter(quantity__gt=0)
+        if category and category.lower() != 'all categories':
+            items = items.filter(category__name=category)
 
-            if category and category.lower() != 'all categories':
-                items = items.filter(category__name=category)
+        if brand and brand.lower() != 'all brands':
+            items = items.filter(brand__name=brand)
 
-            if brand and brand.lower() != 'all brands':
-                items = items.filter(brand__name=brand)
+        if search.strip():
+            ids = search_index.search(business_obj, 'item', search)
 
-            if search.strip():
+            if ids is None:
                 search_filter = (
                     Q(item_name__icontains=search) |
                     Q(code__icontains=search) |
@@ -51,41 +39,42 @@ def fetch_items_for_main_view(business, page, company, search, user, location, f
                     Q(brand__name__icontains=search)
                 )
                 items = items.filter(search_filter)
-        
-            items = items.order_by(
-                '-is_active','category__name', 'brand__name', 'item_name'
-            ).values(
-                'code', 'brand__name', 'item_name', 'quantity',
-                'unit__suffix', 'purchase_price', 'sales_price',
-                'category__name', 'model', 'reorder_level', 'is_active'
+            else:
+                items = items.filter(pk__in=ids)
+    
+        return items.order_by(
+            '-is_active','category__name', 'brand__name', 'item_name'
+        ).values(
+            'code', 'brand__name', 'item_name', 'quantity',
+            'unit__suffix', 'purchase_price', 'sales_price',
+            'category__name', 'model', 'reorder_level', 'is_active'
+        )
+    else:
+        if not location:
+            items = models.location_items.objects.filter(
+                bussiness_name=business_obj,
+                location__location_name=locations_access[0],
             )
-        else:
-            if len(locations_access) < 1:
-                logger.warning(f"User '{user}' does not have access to any location")
-                return {'status': 'error', 'message': f'{user} does not have access to any location'}
 
-            if not location:
-                items = models.location_items.objects.filter(
-                    bussiness_name=business_obj,
-                    location__location_name=locations_access[0],
-                )
+        else:
+            items = models.location_items.objects.filter(
+                bussiness_name=business_obj,
+                location__location_name=location
+            )
 
-            else:
-                items = models.location_items.objects.filter(
-                    bussiness_name=business_obj,
-                    location__location_name=location
-                )
+        if count:
+            items = items.filter(quantity__gt=0)
 
-            if count:
-                items = items.filter(quantity__gt=0)
+        if category and category.lower() != 'all categories':
+            items = items.filter(item_name__category__name=category)
 
-            if category and category.lower() != 'all categories':
-                items = items.filter(item_name__category__name=category)
+        if brand and brand.lower() != 'all brands':
+            items = items.filter(item_name__brand__name=brand)
 
-            if brand and brand.lower() != 'all brands':
-                items = items.filter(item_name__brand__name=brand)
+        if search.strip():
+            ids = search_index.search(business_obj, 'item', search)
 
-            if search.strip():
+            if ids is None:
                 search_filter = (
                     Q(item_name__item_name__icontains=search) |
                     Q(item_name__code__icontains=search) |
@@ -94,31 +83,76 @@ def fetch_items_for_main_view(business, page, company, search, user, location, f
                     Q(item_name__brand__name__icontains=search)
                 )
                 items = items.filter(search_filter)
+            else:
+                items = items.filter(item_name_id__in=ids)
+
+        return items.order_by(
+            '-item_name__is_active','item_name__category__name', 'item_name__brand__name', 'item_name__item_name'
+        ).annotate(
+            code=F('item_name__code'),
+            brand__name=F('item_name__brand__name'),
+            item_name_1=F('item_name__item_name'),
+            unit__suffix=F('item_name__unit__suffix'),
+            category__name=F('item_name__category__name'),
+            model=F('item_name__model'),
+            is_active=F('item_name__is_active'),
+        ).values(
+            'code', 'brand__name', 'item_name', 'quantity',
+            'unit__suffix', 'purchase_price', 'sales_price',
+            'category__name', 'model', 'reorder_level', 'is_active', 'item_name_1'
+        )
+
+
+def items_keyset(user_query, location):
+    prefix = '' if user_query.admin and (not location or location.lower() == 'all locations') else 'item_name__'
+
+    return [
+        (f'{prefix}is_active', True),
+        (f'{prefix}category__name', False),
+        (Coalesce(f'{prefix}brand__name', Value('')), False),
+        (f'{prefix}item_name', False),
+        ('pk', False),
+    ]
+
+
+def fetch_items_for_main_view(business, page, company, search, user, location, format, count,category, brand, page_quantity=30, context=None, cursor=None):
+    try:
+        context = tenant_context.resolve(business, user, context, company)
+        business_obj = context.business
+        user_query = context.user
+
+        if not user_query.item_access and not user_query.admin:
+            logger.warning(f"User '{user}' does not have access to view items")
+            return {'status': 'error', 'message': f'{user} does not have access to view items'}
+        
+        if not user_query.admin:
+            locations_access = user_query.per_location_access
+        else:
+            locations = [{'value': 'All Locations', 'label': 'All Locations'}]
+            location_query = models.inventory_location.objects.filter(bussiness_name=business_obj)
+            locations.extend([{'value': i.location_name, 'label': i.location_name} for i in location_query])
+            locations_access = ['All Locations']
+            locations_access.extend([loc.location_name for loc in location_query])
+           
+        if not (user_query.admin and (not location or location.lower() == 'all locations')):
+            if len(locations_access) < 1:
+                logger.warning(f"User '{user}' does not have access to any location")
+                return {'status': 'error', 'message': f'{user} does not have access to any location'}
 
-            items = items.order_by(
-                '-item_name__is_active','item_name__category__name', 'item_name__brand__name', 'item_name__item_name'
-            ).annotate(
-                code=F('item_name__code'),
-                brand__name=F('item_name__brand__name'),
-                item_name_1=F('item_name__item_name'),
-                unit__suffix=F('item_name__unit__suffix'),
-                category__name=F('item_name__category__name'),
-                model=F('item_name__model'),
-                is_active=F('item_name__is_active'),
-            ).values(
-                'code', 'brand__name', 'item_name', 'quantity',
-                'unit__suffix', 'purchase_price', 'sales_price',
-                'category__name', 'model', 'reorder_level', 'is_active', 'item_name_1'
-            )
-            
             locations = [{'value': i, 'label': i} for i in locations_access]
 
+        items = items_main_queryset(business_obj, user_query, locations_access, location, search, count, category, brand)
+
         if page != 0 and not format:
-            paginator = Paginator(items, page_quantity)
-            current_page = paginator.get_page(page)
+            if cursor is not None:
+                items, next_cursor = keyset.keyset_page(items, items_keyset(user_query, location), cursor, page_quantity)
+                has_more = next_cursor is not None
+            else:
+                paginator = Paginator(items, page_quantity)
+                current_page = paginator.get_page(page)
 
-            
-            items = list(current_page.object_list)
+                items = list(current_page.object_list)
+                has_more = current_page.has_next()
 
             cagetories = [{'value': 'All Categories', 'label': 'All Categories'}]
             category_query = models.inventory_category.objects.filter(bussiness_name=business_obj).order_by('name')
@@ -128,8 +162,12 @@ def fetch_items_for_main_view(business, page, company, search, user, location, f
             brand_query = models.inventory_brand.objects.filter(bussiness_name=business_obj).order_by('name')
             brands.extend([{'value': i.name, 'label': i.name} for i in brand_query])
 
-            result = {"items": items, 'has_more': current_page.has_next(), 'locations': locations, 
+            result = {"items": items, 'has_more': has_more, 'locations': locations, 
                       'categories': cagetories, 'brands': brands}
+
+            if cursor is not None:
+                result['next_cursor'] = next_cursor
+
             logger.info(f"Items fetched for user '{user}' in business '{business}'")
             return {"status": "success", "data": result}
 
@@ -164,15 +202,39 @@ def fetch_items_for_main_view(business, page, company, search, user, location, f
         return {"status": "error", "message": 'Something went wrong'}
 
 
-def fetch_items_for_select(business, user, company, search, location):
+SELECT_LIMIT = 30
+
+
+def _in_rank_order(queryset, ranked, key):
+    """Returns the first SELECT_LIMIT rows of queryset whose key is in ranked, in the order of ranked."""
+    position = {pk: index for index, pk in enumerate(ranked)}
+    found = queryset.filter(**{f'{key}__in': ranked}).values_list('pk', key)
+    pks = [pk for pk, item in sorted(found, key=lambda row: position[row[1]])[:SELECT_LIMIT]]
+    rows = {row.pk: row for row in queryset.filter(pk__in=pks)}
+
+    return [rows[pk] for pk in pks]
+
+
+def fetch_items_for_select(business, user, company, search, location, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
+        business_query = tenant_context.resolve(business, user, context, company).business
         
+        catalogued = item_catalogue.select(business_query.pk, search, SELECT_LIMIT, location=location)
+
+        if catalogued is not None:
+            logger.info(f"Select items fetched for user '{user}' in business '{business}'")
+            return {"status": "success", "data": catalogued}
+
         if not location:
-            items_query = models.items.objects.filter(bussiness_name=business_query)
-            if search:
-                items_query = items_query.filter(item_name__icontains=search)
-            items_query = items_query.order_by('item_name')[:30]
+            items_query = models.items.objects.filter(bussiness_name=business_query).select_related('brand', 'category', 'unit')
+            ranked = search_index.search(business_query, 'item', search) if search else None
+
+            if ranked is not None:
+                items_query = _in_rank_order(items_query, ranked[:SELECT_LIMIT], 'pk')
+            else:
+                if search:
+                    items_query = items_query.filter(item_name__icontains=search)
+                items_query = items_query.order_by('item_name')[:SELECT_LIMIT]
             items_query = [
                 {
                     'value': i.item_name, 'label': i.item_name,
@@ -193,11 +255,18 @@ def fetch_items_for_select(business, user, company, search, location):
                 logger.warning(f"Location '{location}' not found in business '{business}'")
                 return {"status": "error", "message": f"Location '{location}' not found.", "data": []}
             
-            items_query = models.location_items.objects.filter(bussiness_name=business_query, location=location_query)
-            if search:
-                items_query = items_query.filter(item_name__item_name__icontains=search)
+            items_query = models.location_items.objects.filter(bussiness_name=business_query, location=location_query).select_related(
+                'item_name__brand', 'item_name__category', 'item_name__unit'
+            )
+            ranked = search_index.search(business_query, 'item', search) if search else None
 
-            items_query = items_query.order_by('item_name__item_name')[:30]
+            if ranked is not None:
+                # a location may lack rows for some of the items, so the first SELECT_LIMIT are picked from what it has
+                items_query = _in_rank_order(items_query, ranked, 'item_name_id')
+            else:
+                if search:
+                    items_query = items_query.filter(item_name__item_name__icontains=search)
+                items_query = items_query.order_by('item_name__item_name')[:SELECT_LIMIT]
             
             items_query = [
                 {
@@ -281,7 +350,7 @@ def add_inventory_item(business, user, price, name, reorder, model, category, su
                     unit=unit_query,
                 )
 
-                models.tracking_history.objects.create(
+                activity_log.record(
                     user=user_query,
                     area=f'Created item: {i}',
                     head='Item creation',
@@ -356,7 +425,7 @@ def update_item(data, company):
             loc_item.sales_price = item.sales_price
             loc_item.save()
 
-        models.tracking_history.objects.create(
+        activity_log.record(
             user=user_query,
             area=f'Edited {item.item_name}',
             head='Item edit',
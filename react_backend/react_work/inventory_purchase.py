@@ -1,5 +1,5 @@
-from . import models
-from decimal import Decimal
+from . import models, keyset, activity_log
+from decimal import Decimal, ROUND_HALF_UP
 from django.core.paginator import Paginator
 from django.db.models import Sum
 from collections import defaultdict
@@ -9,10 +9,66 @@ import logging
 import json
 from datetime import date, datetime
 from .coa import retrive_real_account
+from . import tenant_context, daily_summary, item_valuation, item_catalogue
+from .stock_movement import StockMovement
+from .journal_batch import JournalBatch
 
 logger = logging.getLogger(__name__)
 
-def fetch_purchase_for_main_view(search, date_search, business, company, page, user, format, page_quantity=30):
+CENT = Decimal('0.01')
+
+
+def _layered_cost(history, quantity):
+    """Average unit cost of the newest `quantity` units across purchase lines given newest first.
+
+    Returns None when the lines hold fewer units than that.
+    """
+    quantity = Decimal(str(quantity))
+    remaining = quantity
+    total = Decimal('0')
+
+    for line in history:
+        take = min(remaining, Decimal(str(line.quantity)))
+        total += take * line.purchase_price
+        remaining -= take
+
+        if remaining == 0:
+            return (total / quantity).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    return None
+
+def purchase_main_queryset(business_query, user_query, search, date_search):
+    purchase = models.purchase.objects.filter(bussiness_name=business_query)
+
+    if not user_query.admin:
+        purchase = purchase.filter(location_address__location_name__in=user_query.per_location_access)
+
+    if search.strip():
+        search_filter= (
+            Q(description__icontains=search) |
+            Q(location_address__location_name__icontains=search) |
+            Q(supplier__name__icontains=search) |
+            Q(code__icontains=search) |
+            Q(status__icontains=search)
+        )
+
+        purchase = purchase.filter(search_filter)
+    
+    if date_search:
+
+        if date_search.get('start') and date_search.get('end'):
+            start_date = date_search.get('start')
+            end_date = date_search.get('end')
+
+            purchase = purchase.filter(date__range=(start_date, end_date))
+    
+    return purchase.order_by('-code').values(
+        'code', 'date', 'supplier__name', 'created_by__user_name', 'description', 'sub_total', 'discount', 'tax_levy', 'gross_total', 'status',
+        'location_address__location_name'
+    )
+
+
+def fetch_purchase_for_main_view(search, date_search, business, company, page, user, format, page_quantity=30, cursor=None):
     try:
         business_query = models.bussiness.objects.get(bussiness_name=business)
         user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
@@ -20,34 +76,7 @@ def fetch_purchase_for_main_view(search, date_search, business, company, page, u
         if not user_query.admin and not user_query.purchase_access:
             return {'status': 'error', 'message': f'User {user} has no access'}
 
-        purchase = models.purchase.objects.filter(bussiness_name=business_query)
-
-        if not user_query.admin:
-            purchase = purchase.filter(location_address__location_name__in=user_query.per_location_access)
-
-        if search.strip():
-            search_filter= (
-                Q(description__icontains=search) |
-                Q(location_address__location_name__icontains=search) |
-                Q(supplier__name__icontains=search) |
-                Q(code__icontains=search) |
-                Q(status__icontains=search)
-            )
-
-            purchase = purchase.filter(search_filter)
-        
-        if date_search:
-
-            if date_search.get('start') and date_search.get('end'):
-                start_date = date_search.get('start')
-                end_date = date_search.get('end')
-
-                purchase = purchase.filter(date__range=(start_date, end_date))
-        
-        purchase = purchase.order_by('-code').values(
-            'code', 'date', 'supplier__name', 'created_by__user_name', 'description', 'sub_total', 'discount', 'tax_levy', 'gross_total', 'status',
-            'location_address__location_name'
-        )
+        purchase = purchase_main_queryset(business_query, user_query, search, date_search)
 
         if format.strip():
             from .export_format import XLSX, PDF, CSV
@@ -83,6 +112,12 @@ def fetch_purchase_for_main_view(search, date_search, business, company, page, u
                 }
                 
         
+        if cursor is not None:
+            purchase, next_cursor = keyset.keyset_page(purchase, keyset.BY_CODE_DESC, cursor, page_quantity)
+            result = {'purchases':purchase, 'has_more':next_cursor is not None, 'next_cursor':next_cursor}
+
+            return {'status': 'success', 'data': result}
+
         paginator = Paginator(purchase, page_quantity)
         current_page = paginator.get_page(page)
 
@@ -90,6 +125,9 @@ def fetch_purchase_for_main_view(search, date_search, business, company, page, u
 
         return {'status': 'success', 'data': result}
 
+    except keyset.InvalidCursor as error:
+        return {'status': 'error', 'message': str(error)}
+
     except models.bussiness.DoesNotExist:
         logger.warning(f"Business '{business}' not found.")
         return {'status': 'error', 'message': f'Business {business} not found'}
@@ -102,10 +140,11 @@ def fetch_purchase_for_main_view(search, date_search, business, company, page, u
         logger.exception(error)
         return {'status': 'error', 'message': 'something happened'}
     
-def post_and_save_purchase(business, user, company, location, data, totals, items, levy, real_levy, supplier):
+def post_and_save_purchase(business, user, company, location, data, totals, items, levy, real_levy, supplier, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
        
         if not user_query.admin and not user_query.create_access and not user_query.purchase_access:
             return {'status': 'error', 'message': f'User {user} has no access'}
@@ -139,7 +178,16 @@ def post_and_save_purchase(business, user, company, location, data, totals, item
         else:
             amount_paid = 0
 
-        with transaction.atomic(savepoint=False, durable=True, using='default'):
+        lines = [json.loads(i) for i in items]
+
+        # not durable: add_purchase runs it inside the idempotency key's transaction
+        with transaction.atomic(savepoint=False, using='default'):
+            stock = StockMovement(business=business_query, location=location_query).lock(names=[item['name'] for item in lines])
+            errors = stock.validate(lines, outgoing=False)
+
+            if errors:
+                return {'status': 'error', 'message': errors[0]['message'], 'data': {'errors': errors}}
+
             p = models.purchase(bussiness_name=business_query, creation_date=datetime.now())
             new_code = p.generate_next_code()
             purchase_info = models.purchase.objects.create( code=new_code, created_by=user_query, bussiness_name=business_query, supplier=supplier_query, date=data['date'], amount_paid=amount_paid,
@@ -147,189 +195,132 @@ def post_and_save_purchase(business, user, company, location, data, totals, item
                                             description=data['description'], sub_total=totals['subtotal'], gross_total=totals['grandTotal'], payment_term=data['terms'],
                                             discount=totals['discountAmount'], net_total=totals['netTotal'], tax_levy=totals['levyAmount'], tax_levy_types=levy)
                 
-            total_purchase = 0
-            total_quantity = 0
+            total_purchase = Decimal('0')
+            total_quantity = Decimal('0')
 
-            for i in items:
-                item = json.loads(i)
-                item_info = models.items.objects.get(item_name=item['name'], bussiness_name=business_query)
+            running_quantity = {}
+            costs = {item.pk: item.purchase_price for item in stock.items.values()}
 
-                if item_info.is_active is False:
-                    raise Exception({'status': 'error', 'message': f'Item {item_info.item_name} is inactive'})
+            for item in lines:
+                item_info = stock.items[item['name']]
+                quantity = running_quantity.get(item_info.pk, item_info.quantity)
 
                 models.purchase_history.objects.create(item_name=item_info, purchase=purchase_info, quantity=item['qty'], purchase_price=item['price'],
                                                                bussiness_name=business_query) 
                 
-                total_purchase += float(item['qty']) * float(item['price'])
-                total_quantity += float(item['qty'])
+                total_purchase += Decimal(str(item['qty'])) * Decimal(str(item['price']))
+                total_quantity += Decimal(str(item['qty']))
 
-                if item_info.quantity <= 0:
-                    item_info.purchase_price = Decimal(str(float(item['price'])))
-                    item_info.quantity += int(item['qty'])
-                    item_info.save()
+                if quantity <= 0:
+                    item_info.purchase_price = Decimal(str(item['price'])).quantize(CENT, rounding=ROUND_HALF_UP)
 
                 else:
-                    total_value = 0
-                    target_qty = item_info.quantity + int(item['qty'])
-
                     history = models.purchase_history.objects.filter(item_name=item_info, bussiness_name=business_query).exclude(purchase__is_reversed=True).order_by('-id')
-                        
-                    for j in history:
-                        cost = Decimal(str(min(target_qty, j.quantity))) * j.purchase_price
-                        total_value += float(cost)
-                        target_qty -= min(target_qty, j.quantity)
-
-                        if target_qty == 0:
-                            item_info.purchase_price = Decimal(str(total_value/(item_info.quantity + int(item['qty']))))
-                            item_info.quantity += int(item['qty'])
-                            item_info.save()
-                            break
-                        
-
-
-                loc_item = models.location_items.objects.get(item_name__item_name=item['name'], location=location_query,  bussiness_name=business_query)
-                loc_item.quantity += Decimal(str(float(item['qty'])))
-                loc_item.purchase_price = item_info.purchase_price
-                loc_item.save()
+                    cost = _layered_cost(history, quantity + int(item['qty']))
+
+                    if cost is not None:
+                        item_info.purchase_price = cost
 
-            purchase_info.total_quantity = Decimal(str(total_quantity))
+                running_quantity[item_info.pk] = quantity + int(item['qty'])
+
+            models.items.objects.bulk_update(stock.items.values(), ['purchase_price'])
+            stock.apply(stock.deltas(lines, sign=1), sync_purchase_price=True)
+
+            if any(item.purchase_price != costs[item.pk] for item in stock.items.values()):
+                item_catalogue.invalidate(business_query.pk)
+
+            purchase_info.total_quantity = total_quantity
             purchase_info.save()
+            daily_summary.record_purchase(purchase_info)
+            item_valuation.record_purchase(purchase_info)
 
-            discount = total_purchase * (float(data['discount']) / 100)
+            discount = total_purchase * Decimal(str(data['discount'])) / 100
             taxable_amount = total_purchase - discount
-            tax = 0
+            tax = Decimal('0')
             for i in real_levy:
-                tax += taxable_amount * (float(i['rate']) / 100)
+                tax += taxable_amount * Decimal(str(i['rate'])) / 100
 
             final_total = taxable_amount + tax
 
             accounts = {'inventory':10301, 'tax_received':10601, 'payment':data['account'].split()[0], 
                         'discount':40201, 'payable':20101, 'tax_paid':20301}
             
-            result = retrive_real_account(code_map=accounts, business=business, company=company).get_real_accounts()
+            result = retrive_real_account(code_map=accounts, business=business_query, company=company).get_real_accounts()
 
-            head = models.journal_head.objects.create(entry_type="Purchase", transaction_number=new_code, 
-                                                        amount=final_total, created_by=user_query, bussiness_name=business_query,
-                                                        description=data['description'])
-            
-            models.journal.objects.create(entry_type="Purchase", description=f'crediting Supplier {supplier_query.name} Account with invoice {new_code} amount', credit=supplier_query.account,
-                                            amount=final_total, bussiness_name=business_query, date=data['date'], transaction_number=new_code, head=head)
-            
-            models.journal.objects.create(entry_type="Purchase", description=f'debiting Inventory Account - {new_code}', debit=10300,
-                                            amount=total_purchase, bussiness_name=business_query, date=data['date'], transaction_number=new_code, head=head)
-                
-            models.liabilities_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=result.get('payable'), transaction_number=new_code, date=data['date'], type="Purchase",
-                                                    description=data['description'], credit=final_total, head=head)
-            
-            models.supplier_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=supplier_query, transaction_number=new_code, date=data['date'], type="Purchase",
-                                                    description=data['description'], credit=final_total, head=head)
-            
-            models.asset_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                account=result.get('inventory'), transaction_number=new_code, date=data['date'], type="Purchase",
-                                                description=data['description'], debit=total_purchase, head=head)
+            batch = JournalBatch(business_query, user_query)
+            period = result.get('period')
+
+            head = batch.head(entry_type="Purchase", transaction_number=new_code, amount=final_total, description=data['description'])
+
+            batch.journal(head, entry_type="Purchase", description=f'crediting Supplier {supplier_query.name} Account with invoice {new_code} amount', credit=supplier_query.account,
+                          amount=final_total, date=data['date'], transaction_number=new_code)
+            batch.journal(head, entry_type="Purchase", description=f'debiting Inventory Account - {new_code}', debit=10300,
+                          amount=total_purchase, date=data['date'], transaction_number=new_code)
+
+            batch.ledger('liabilities', head, period=period, account=result.get('payable'), transaction_number=new_code, date=data['date'], type="Purchase",
+                         description=data['description'], credit=final_total)
+            batch.ledger('supplier', head, period=period, account=supplier_query, transaction_number=new_code, date=data['date'], type="Purchase",
+                         description=data['description'], credit=final_total)
+            batch.ledger('asset', head, period=period, account=result.get('inventory'), transaction_number=new_code, date=data['date'], type="Purchase",
+                         description=data['description'], debit=total_purchase)
 
             if supplier_query.credit is None:
                 supplier_query.credit = Decimal('0')
             supplier_query.credit += Decimal(str(final_total))
 
-            if data['terms'] == 'Full Payment':
-                payment = models.payment.objects.create(transaction_number=new_code, description=f'Payment of {new_code} to {supplier_query.account}', from_account=(data['account'].split())[0],
-                                                to_account=supplier_query.account,
-                                                bussiness_name=business_query, amount=final_total, created_by=user_query, status='None', ref_type='purchase', external_no=new_code)
-                
-                if supplier_query.debit is None:
-                    supplier_query.debit = Decimal('0')
-                supplier_query.debit += Decimal(str(final_total))
-                supplier_query.save()
+            if data['terms'] in ('Full Payment', 'Part Payment'):
+                if data['terms'] == 'Full Payment':
+                    payment = models.payment.objects.create(transaction_number=new_code, description=f'Payment of {new_code} to {supplier_query.account}', from_account=(data['account'].split())[0],
+                                                    to_account=supplier_query.account,
+                                                    bussiness_name=business_query, amount=final_total, created_by=user_query, status='None', ref_type='purchase', external_no=new_code)
+                    label = 'payment'
+                else:
+                    payment = models.payment.objects.create(transaction_number=new_code, description=f'Part Payment of {new_code} to {supplier_query.name}', from_account=(data['account'].split())[0], to_account=supplier_query.account,
+                                                      bussiness_name=business_query, amount=data['partpayment'], created_by=user_query, status='None', ref_type='purchase', external_no=new_code)
+                    label = 'part payment'
 
-                models.journal.objects.create(entry_type="Payment", description=f'Debiting Supplier {supplier_query.name} for payment of {new_code}', debit=supplier_query.account,
-                                            amount=payment.amount, bussiness_name=business_query, date=data['date'], transaction_number=new_code, head=head)
-                
-                models.liabilities_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=result.get('payable'), transaction_number=new_code, date=data['date'], type="Payment",
-                                                    description=data['description'], debit=payment.amount, head=head)
-                
-                models.supplier_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=supplier_query, transaction_number=new_code, date=data['date'], type="Payment",
-                                                    description=data['description'], debit=payment.amount, head=head)
-                    
-                models.journal.objects.create(entry_type="Payment", description=f'Crediting Account used for payment of {new_code}', credit=(data['account'].split())[0],
-                                            amount=payment.amount, bussiness_name=business_query, date=data['date'], transaction_number=new_code, head=head)
-                
-                models.asset_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=result.get('payment'), transaction_number=new_code, date=data['date'], type="Payment",
-                                                    description=data['description'], credit=payment.amount, head=head)
-                if tax != 0:
-                    models.journal.objects.create(entry_type="Purchase", description=f'debiting Tax Receivable Account - {new_code}', debit=10600,
-                                            amount=tax, bussiness_name=business_query, date=data['date'], transaction_number=new_code, head=head)
-                    
-                    models.asset_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=result.get('tax_received'), transaction_number=new_code, date=data['date'], type="Purchase",
-                                                    description=data['description'], debit=tax, head=head)
-                if discount != 0:
-                    models.journal.objects.create(entry_type="Purchase", description=f'crediting Discount Received Account - {new_code}', credit=40200,
-                                            amount=discount, bussiness_name=business_query, date=data['date'], transaction_number=new_code, head=head)
-                                        
-                    models.revenue_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=result.get('discount'), transaction_number=new_code, date=data['date'], type="Purchase",
-                                                    description=data['description'], credit=discount, head=head)
-                    
-            elif data['terms'] == 'Credit':          
-                if tax != 0:
-                    models.journal.objects.create(entry_type="Purchase", description=f'debiting Tax Payable Account - {new_code}', debit=20300,
-                                            amount=tax, bussiness_name=business_query, date=data['date'], transaction_number=new_code, head=head)
-                    
-                    models.liabilities_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=result.get('tax_paid'), transaction_number=new_code, date=data['date'], type="Purchase",
-                                                    description=data['description'], debit=tax, head=head)
-                
-            elif data['terms'] == 'Part Payment':              
-                payment = models.payment.objects.create(transaction_number=new_code, description=f'Part Payment of {new_code} to {supplier_query.name}', from_account=(data['account'].split())[0], to_account=supplier_query.account,
-                                                  bussiness_name=business_query, amount=data['partpayment'], created_by=user_query, status='None', ref_type='purchase', external_no=new_code)
                 if supplier_query.debit is None:
                     supplier_query.debit = Decimal('0')
                 supplier_query.debit += Decimal(str(payment.amount))
-                supplier_query.save()
 
-                models.journal.objects.create(entry_type="Payment", description=f'Debiting Supplier {supplier_query.name} for part payment of {new_code}', debit=supplier_query.account,
-                                            amount=payment.amount, bussiness_name=business_query, date=data['date'], transaction_number=new_code, head=head)
-                
-                models.liabilities_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=result.get('payable'), transaction_number=new_code, date=data['date'], type="Payment",
-                                                    description=data['description'], debit=payment.amount, head=head)
-                
-                models.supplier_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=supplier_query, transaction_number=new_code, date=data['date'], type="Payment",
-                                                    description=data['description'], debit=payment.amount, head=head)
-                    
-                models.journal.objects.create(entry_type="Payment", description=f'Crediting Account used for part payment of {new_code}', credit=(data['account'].split())[0],
-                                            amount=payment.amount, bussiness_name=business_query, date=data['date'], transaction_number=new_code, head=head)
-                
-                models.asset_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=result.get('payment'), transaction_number=new_code, date=data['date'], type="Payment",
-                                                    description=data['description'], credit=payment.amount, head=head)
+                batch.journal(head, entry_type="Payment", description=f'Debiting Supplier {supplier_query.name} for {label} of {new_code}', debit=supplier_query.account,
+                              amount=payment.amount, date=data['date'], transaction_number=new_code)
+                batch.ledger('liabilities', head, period=period, account=result.get('payable'), transaction_number=new_code, date=data['date'], type="Payment",
+                             description=data['description'], debit=payment.amount)
+                batch.ledger('supplier', head, period=period, account=supplier_query, transaction_number=new_code, date=data['date'], type="Payment",
+                             description=data['description'], debit=payment.amount)
+
+                batch.journal(head, entry_type="Payment", description=f'Crediting Account used for {label} of {new_code}', credit=(data['account'].split())[0],
+                              amount=payment.amount, date=data['date'], transaction_number=new_code)
+                batch.ledger('asset', head, period=period, account=result.get('payment'), transaction_number=new_code, date=data['date'], type="Payment",
+                             description=data['description'], credit=payment.amount)
 
-                if tax != 0:
-                    models.journal.objects.create(entry_type="Purchase", description=f'debiting Tax Payable Account - {new_code}', debit=20300,
-                                            amount=tax, bussiness_name=business_query, date=data['date'], transaction_number=new_code, head=head)
-                    
-                    models.liabilities_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=result.get('tax_paid'), transaction_number=new_code, date=data['date'], type="Purchase",
-                                                    description=data['description'], debit=tax, head=head)
-                    
                 if discount != 0:
-                    models.journal.objects.create(entry_type="Purchase", description=f'crediting Discount Received Account - {new_code}', credit=40200,
-                                            amount=discount, bussiness_name=business_query, date=data['date'], transaction_number=new_code, head=head)
-                                         
-                    models.revenue_ledger.objects.create(bussiness_name=business_query, period=result.get('period'),
-                                                    account=result.get('discount'), transaction_number=new_code, date=data['date'], type="Purchase",
-                                                    description=data['description'], credit=discount, head=head)       
-                    
+                    batch.journal(head, entry_type="Purchase", description=f'crediting Discount Received Account - {new_code}', credit=40200,
+                                  amount=discount, date=data['date'], transaction_number=new_code)
+                    batch.ledger('revenue', head, period=period, account=result.get('discount'), transaction_number=new_code, date=data['date'], type="Purchase",
+                                 description=data['description'], credit=discount)
+
+            elif data['terms'] == 'Credit':
+                # the discount of a credit purchase is booked by the payment that settles it
+                batch.carry(head, discount)
+
+            if tax != 0 and data['terms'] == 'Full Payment':
+                batch.journal(head, entry_type="Purchase", description=f'debiting Tax Receivable Account - {new_code}', debit=10600,
+                              amount=tax, date=data['date'], transaction_number=new_code)
+                batch.ledger('asset', head, period=period, account=result.get('tax_received'), transaction_number=new_code, date=data['date'], type="Purchase",
+                             description=data['description'], debit=tax)
+
+            elif tax != 0 and data['terms'] in ('Credit', 'Part Payment'):
+                batch.journal(head, entry_type="Purchase", description=f'debiting Tax Payable Account - {new_code}', debit=20300,
+                              amount=tax, date=data['date'], transaction_number=new_code)
+                batch.ledger('liabilities', head, period=period, account=result.get('tax_paid'), transaction_number=new_code, date=data['date'], type="Purchase",
+                             description=data['description'], debit=tax)
+
+            batch.save()
             supplier_query.save()
 
-        models.tracking_history.objects.create(user=user_query, head=new_code, area='Create Purchase', bussiness_name=business_query)          
+        activity_log.record(user=user_query, head=new_code, area='Create Purchase', bussiness_name=business_query)          
         return {'status': 'success', 'message': 'Purchase invoice created successfully', 'data': {'code': new_code, 'address': business_query.address, 'phone': business_query.telephone, 'email': business_query.email, 'time': purchase_info.creation_date.strftime('%H:%M:%S')}}
 
     except models.bussiness.DoesNotExist:
@@ -374,21 +365,13 @@ def reverse_purchase(business, user, company, number):
                 if item.quantity - i.quantity < 0:
                     return {'status': 'error', 'message': f'Cannot reverse purchase because item {item.item_name} has insufficient stock'}
                 
-                if item.purchase_price != i.purchase_price:
-                    total = 0
-                    target = item.quantity - i.quantity
-
+                if item.purchase_price != i.purchase_price and item.quantity - i.quantity > 0:
                     history = models.purchase_history.objects.filter(item_name=item, bussiness_name=business_query).exclude(Q(purchase=purchase) | Q(purchase__is_reversed=True)).order_by('-id')
+                    cost = _layered_cost(history, item.quantity - i.quantity)
 
-                    for j in history:
-                        cost = Decimal(str(min(target, j.quantity))) * j.purchase_price
-                        total += float(cost)
-                        target -= min(target, j.quantity)
-
-                        if target == 0:
-                            item.purchase_price = Decimal(str(total/(item.quantity - i.quantity)))
-                            item.save()
-                            break
+                    if cost is not None:
+                        item.purchase_price = cost
+                        item.save()
 
                 item.quantity -= i.quantity
                 item.save()  
@@ -410,94 +393,9 @@ def reverse_purchase(business, user, company, number):
                 entry.reversed = True
                 entry.save()
 
-            journal_entries = models.journal.objects.filter(transaction_number=purchase.code, bussiness_name=business_query)
-            for entry in journal_entries:
-                models.journal.objects.create(
-                    entry_type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    amount=entry.amount,
-                    bussiness_name=business_query,
-                    date=date.today(),
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    head=entry.head
-                )
-
-            asset_entries = models.asset_ledger.objects.filter(transaction_number=purchase.code, bussiness_name=business_query)
-            for entry in asset_entries:
-                models.asset_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=entry.account,
-                    period=entry.period,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
-                    
-            liabilities_entries = models.liabilities_ledger.objects.filter(transaction_number=purchase.code, bussiness_name=business_query)
-            for entry in liabilities_entries:
-                models.liabilities_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=entry.account,
-                    period=entry.period,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
-
-            revenue_entries = models.revenue_ledger.objects.filter(transaction_number=purchase.code, bussiness_name=business_query)
-            for entry in revenue_entries:
-                models.revenue_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=entry.account,
-                    period=entry.period,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
-                        
-            expense_entries = models.expenses_ledger.objects.filter(transaction_number=purchase.code, bussiness_name=business_query)
-            for entry in expense_entries:
-                models.expenses_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=entry.account,
-                    period=entry.period,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
-
-            supplier_entries = models.supplier_ledger.objects.filter(transaction_number=purchase.code, bussiness_name=business_query)
-            for entry in supplier_entries:
-                models.supplier_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=entry.account,
-                    period=entry.period,
-                    transaction_number=f'Rev - {entry.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {entry.description}',
-                    debit=entry.credit,
-                    credit=entry.debit,
-                    head=entry.head
-                )
+            batch = JournalBatch(business_query, user_query)
+            batch.reverse(transaction_number=purchase.code)
+            batch.save()
 
             payments = models.payment.objects.filter(transaction_number=purchase.code, bussiness_name=business_query, is_reversed=False)
             for pay in payments:
@@ -516,8 +414,10 @@ def reverse_purchase(business, user, company, number):
             purchase.status = 'Reversed'
             purchase.is_reversed = True
             purchase.save()
+            daily_summary.record_purchase(purchase, sign=-1)
+            item_valuation.record_purchase(purchase, sign=-1)
 
-        models.tracking_history.objects.create(user=user_query, head=purchase.code, area='Reverse purchase', bussiness_name=business_query)
+        activity_log.record(user=user_query, head=purchase.code, area='Reverse purchase', bussiness_name=business_query)
         return {'status': 'success' , 'message': f'Purchase invoice {number} has been reversed successfully'}
 
     except models.bussiness.DoesNotExist:
@@ -1,33 +1,34 @@
-from . import models
+from . import models, keyset, activity_log, search_index
 from decimal import Decimal
 from django.core.paginator import Paginator
 from django.db.models import Sum
 from collections import defaultdict
 from django.db import transaction
+from django.conf import settings
 from django.db.models import Q
+import hashlib
 import logging
 import json
 from datetime import date, datetime
 from .coa import retrive_real_account
 from .export_format import PDF, XLSX, CSV
+from . import tenant_context, daily_summary, item_valuation
+from .stock_movement import StockMovement
+from .journal_batch import JournalBatch
 
 logger = logging.getLogger(__name__)
 
 
-def fetch_sales_for_main_view(search, date_search, business, company, page, user, format, page_quantity=30):
-    try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+def sales_main_queryset(business_query, user_query, search, date_search):
+    sales = models.sale.objects.filter(bussiness_name=business_query)
 
-        if not user_query.admin and not user_query.sales_access:
-            return {"status": "error", "message": "User has no access", "data": []}
+    if not user_query.admin:
+        sales = sales.filter(location_address__location_name__in=user_query.per_location_access)
 
-        sales = models.sale.objects.filter(bussiness_name=business_query)
+    if search and search.strip():
+        ids = search_index.search(business_query, 'sale', search)
 
-        if not user_query.admin:
-            sales = sales.filter(location_address__location_name__in=user_query.per_location_access)
-
-        if search and search.strip():
+        if ids is None:
             search_filter = (
                 Q(description__icontains=search) |
                 Q(location_address__location_name__icontains=search) |
@@ -37,19 +38,32 @@ def fetch_sales_for_main_view(search, date_search, business, company, page, user
                 Q(status__icontains=search)
             )
             sales = sales.filter(search_filter)
-        
-        if date_search:
-            if date_search.get('start') and date_search.get('end'):
-                start_date = date_search.get('start')
-                end_date = date_search.get('end')
+        else:
+            sales = sales.filter(pk__in=ids)
+    
+    if date_search:
+        if date_search.get('start') and date_search.get('end'):
+            start_date = date_search.get('start')
+            end_date = date_search.get('end')
+
+            sales = sales.filter(date__range=(start_date, end_date))
+
+    return sales.order_by('-code').values(
+        'code', 'date', 'customer_name', 'customer_info__name', 'created_by__user_name',
+        'description', 'sub_total', 'discount', 'tax_levy', 'gross_total', 'status',
+        'location_address__location_name', 'customer_contact', 'customer_info__contact'
+    )
 
-                sales = sales.filter(date__range=(start_date, end_date))
 
-        sales = sales.order_by('-code').values(
-            'code', 'date', 'customer_name', 'customer_info__name', 'created_by__user_name',
-            'description', 'sub_total', 'discount', 'tax_levy', 'gross_total', 'status',
-            'location_address__location_name', 'customer_contact', 'customer_info__contact'
-        )
+def fetch_sales_for_main_view(search, date_search, business, company, page, user, format, page_quantity=30, cursor=None):
+    try:
+        business_query = models.bussiness.objects.get(bussiness_name=business)
+        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+
+        if not user_query.admin and not user_query.sales_access:
+            return {"status": "error", "message": "User has no access", "data": []}
+
+        sales = sales_main_queryset(business_query, user_query, search, date_search)
 
         if format.strip():
             if format.lower() == 'pdf':
@@ -83,6 +97,15 @@ def fetch_sales_for_main_view(search, date_search, business, company, page, user
                 }
             
 
+        if cursor is not None:
+            sales, next_cursor = keyset.keyset_page(sales, keyset.BY_CODE_DESC, cursor, page_quantity)
+
+            return {
+                "status": "success",
+                "message": "Sales fetched",
+                "data": {"sales": sales, "has_more": next_cursor is not None, "next_cursor": next_cursor}
+            }
+
         paginator = Paginator(sales, page_quantity)
         current_page = paginator.get_page(page)
 
@@ -92,6 +115,9 @@ def fetch_sales_for_main_view(search, date_search, business, company, page, user
             "data": {"sales": list(current_page.object_list), "has_more": current_page.has_next()}
         }
 
+    except keyset.InvalidCursor as error:
+        return {"status": "error", "message": str(error), "data": []}
+
     except models.bussiness.DoesNotExist:
         logger.warning(f"Business '{business}' not found.")
         return {"status": "error", "message": f"Business '{business}' not found", "data": []}
@@ -105,414 +131,457 @@ def fetch_sales_for_main_view(search, date_search, business, company, page, user
         return {"status": "error", "message": "Something went wrong", "data": []}
 
 
-def post_and_save_sales(business, user, company, location, data, totals, items, levy, real_levy):
+SALES_BATCH_SCOPE = 'pos_sale'
+
+SALES_BATCH_LIMIT = getattr(settings, 'SALES_BATCH_LIMIT', 200)
+
+SALE_ACCOUNTS = {
+    'inventory': 10301,
+    'tax': 20301,
+    'receivable': 10401,
+    'revenue': 40101,
+    'cog': 50101,
+    'discount': 50801,
+}
+
+
+def _sale_date_error(user_query, data):
+    current_date = datetime.strptime(data['date'], "%Y-%m-%d").date()
+    today = date.today()
+
+    if not (user_query.admin or (user_query.date_access and user_query.sales_access)):
+        if current_date < today:
+            return {"status": "error", "message": "User has no access to past dates", "data": {}}
+
+        if current_date > today:
+            return {"status": "error", "message": "User has no access to future dates", "data": {}}
+
+    if current_date.month != today.month:
+        return {"status": "error", "message": "Cannot post to other period", "data": {}}
+
+    return None
+
+
+def _sale_accounts(business_query, company, data, resolved=None):
+    """Real accounts a sale posts to; resolved caches them per payment account across a batch."""
+    payment = str(data.get('account', '')).split()[0] if data.get('account') else None
+
+    if resolved is not None and payment in resolved:
+        return resolved[payment]
+
+    accounts = dict(SALE_ACCOUNTS, payment=payment)
+    result = retrive_real_account(code_map=accounts, business=business_query, company=company).get_real_accounts()
+
+    if resolved is not None:
+        resolved[payment] = result
+
+    return result
+
+
+def _post_sale(context, location_query, data, totals, lines, levy, real_levy, result, stock):
+    """Posts one sale whose items are already locked in stock; returns the API result.
+
+    Runs in a savepoint, so a sale that fails leaves the rest of a batch untouched.
+    """
+    business_query = context.business
+    user_query = context.user
+    business = context.business_name
+
+    if data.get('terms') == 'Full Payment':
+        amount_paid = totals.get('grandTotal', 0)
+    elif data.get('terms') == 'Part Payment':
+        amount_paid = data.get('partpayment', 0)
+    else:
+        amount_paid = 0
+
+    with transaction.atomic():
+        if data.get('type') == 'regular':
+            try:
+                customer_query = models.customer.objects.get(name='Regular Customer', bussiness_name=business_query)
+            except models.customer.DoesNotExist:
+                logger.warning(f"Customer 'Regular Customer' not found for business '{business}'.")
+                return {"status": "error", "message": "Customer 'Regular Customer' not found", "data": {}}
+
+            from_account = customer_query.account
+            sale_info = models.sale(
+                created_by=user_query, bussiness_name=business_query,
+                customer_name=data.get('customer', ''), date=data['date'], customer_info=customer_query,
+                due_date=data.get('dueDate', ''), location_address=location_query,
+                discount_percentage=data.get('discount', 0), status=data.get('terms', ''),
+                sub_total=totals.get('subtotal', 0), gross_total=totals.get('grandTotal', 0),
+                payment_term=data.get('terms', ''), type=data.get('type', ''), amount_paid=amount_paid,
+                discount=totals.get('discountAmount', 0), net_total=totals.get('netTotal', 0),
+                tax_levy=totals.get('levyAmount', 0), tax_levy_types=levy, customer_contact=data.get('contact', '')
+            )
+        elif data.get('type') == 'registered':
+            try:
+                customer_query = models.customer.objects.get(name=data.get('customer', ''), bussiness_name=business_query)
+            except models.customer.DoesNotExist:
+                logger.warning(f"Customer '{data.get('customer', '')}' not found for business '{business}'.")
+                return {"status": "error", "message": f"Customer '{data.get('customer', '')}' not found", "data": {}}
+
+            from_account = customer_query.account
+            sale_info = models.sale(
+                created_by=user_query, bussiness_name=business_query,
+                customer_info=customer_query, date=data['date'], amount_paid=amount_paid,
+                due_date=data.get('dueDate', ''), location_address=location_query,
+                discount_percentage=data.get('discount', 0), status=data.get('terms', ''),
+                description=data.get('description', ''), sub_total=totals.get('subtotal', 0),
+                gross_total=totals.get('grandTotal', 0), payment_term=data.get('terms', ''),
+                discount=totals.get('discountAmount', 0), net_total=totals.get('netTotal', 0),
+                tax_levy=totals.get('levyAmount', 0), tax_levy_types=levy, type=data.get('type', '')
+            )
+        else:
+            logger.error("Invalid sale type supplied.")
+            return {"status": "error", "message": "Must select sales type", "data": {}}
+
+        cogs = Decimal("0")
+        total_sales = 0.0
+        total_quantity = 0.0
+        histories = []
+
+        errors = stock.validate(lines, outgoing=True)
+
+        if errors:
+            logger.warning(f"Sale rejected for business '{business}': {errors}")
+            return {"status": "error", "message": errors[0]['message'], "data": {"errors": errors}}
+
+        for item in lines:
+            item_info = stock.items[item['name']]
+
+            cogs += Decimal(str(item['qty'])) * item_info.purchase_price
+            total_quantity += float(item['qty'])
+            total_sales += float(item['qty']) * float(item['price'])
+
+            histories.append({
+                "item_name": item_info,
+                "quantity": item['qty'],
+                "sales_price": item['price'],
+                "purchase_price": item_info.purchase_price,
+                "bussiness_name": business_query,
+            })
+
+        stock.apply(stock.deltas(lines, sign=-1), last_sales=data['date'], sync_purchase_price=True)
+
+        sale_info.total_quantity = Decimal(str(total_quantity))
+        sale_info.cog = cogs
+        sale_info.save()
+        new_code = sale_info.code
+
+        sale_histories = [
+            models.sale_history(
+                sales=sale_info,
+                **h
+            )
+            for h in histories
+        ]
+        models.sale_history.objects.bulk_create(sale_histories)
+        daily_summary.record_sale(sale_info)
+        item_valuation.record_sale(sale_info)
+
+        discount = total_sales * (float(data.get('discount', 0)) / 100.0)
+        taxable_amount = total_sales - discount
+        tax = 0.0
+        for levy_item in real_levy:
+            tax += taxable_amount * (levy_item.get('rate', 0.0) / 100.0)
+        final_total = taxable_amount + tax
+
+        batch = JournalBatch(business_query, user_query)
+        period = result.get('period')
+        description = data.get('description', '')
+
+        head = batch.head(entry_type="Sale", transaction_number=new_code, amount=final_total, description=description)
+
+        batch.journal(head, entry_type="Sale", description=f'Crediting Inventory with {new_code} Amount', credit=10300,
+                      amount=cogs, date=data['date'], transaction_number=new_code)
+        batch.ledger('asset', head, period=period, account=result.get('inventory'), transaction_number=new_code,
+                     date=data['date'], type="Sale", description=description, credit=cogs)
+
+        batch.journal(head, entry_type="Sale", description=f'Debiting COGS with {new_code} Amount', debit=50100,
+                      amount=cogs, date=data['date'], transaction_number=new_code)
+        batch.ledger('expenses', head, period=period, account=result.get('cog'), transaction_number=new_code,
+                     date=data['date'], type="Sales", description=description, debit=cogs)
+
+        batch.journal(head, entry_type="Sale", description=f'Crediting Sales Account with {new_code} Amount', credit=40100,
+                      amount=total_sales, date=data['date'], transaction_number=new_code)
+        batch.ledger('revenue', head, period=period, account=result.get('revenue'), transaction_number=new_code,
+                     date=data['date'], type="Sale", description=description, credit=total_sales)
+
+        batch.journal(head, entry_type="Sale", description=f'Debiting {customer_query.name} for {new_code} on credit',
+                      debit=customer_query.account, amount=final_total, date=data['date'], transaction_number=new_code)
+        batch.ledger('asset', head, period=period, account=result.get('receivable'), transaction_number=new_code,
+                     date=data['date'], type="Sale", description=description, debit=final_total)
+        batch.ledger('customer', head, period=period, account=customer_query, transaction_number=new_code,
+                     date=data['date'], type="Sale", description=description, debit=final_total)
+
+        if customer_query.debit is None:
+            customer_query.debit = Decimal("0")
+        customer_query.debit += Decimal(str(final_total))
+        customer_query.save()
+
+        if data.get('terms') in ('Full Payment', 'Part Payment'):
+            if data.get('terms') == 'Full Payment':
+                payment_account = (data.get('account', '').split())[0] if data.get('account') else None
+                amount, label = final_total, 'payment'
+            else:
+                payment_account = (data.get('account', '').split('-'))[0] if data.get('account') else None
+                amount, label = data.get('partpayment', 0), 'part payment'
+
+            cash = models.cash_receipt.objects.create(
+                transaction_number=new_code,
+                description=f"{label} of {new_code} from {from_account}",
+                to_account=payment_account,
+                from_account=from_account,
+                bussiness_name=business_query,
+                amount=amount,
+                created_by=user_query,
+                status='None',
+                ref_type='sales',
+                external_no=new_code
+            )
+
+            batch.journal(head, entry_type="Cash Receipt", description=f'Debiting Account used to receive the {label} of {new_code}',
+                          debit=payment_account, amount=cash.amount, date=data['date'], transaction_number=new_code)
+            batch.ledger('asset', head, period=period, account=result.get('payment'), transaction_number=new_code,
+                         date=data['date'], type="Cash Receipt", description=description, debit=cash.amount)
+
+            batch.journal(head, entry_type="Cash Receipt", description=f'Crediting {customer_query.name} for {label} of {new_code}',
+                          credit=customer_query.account, amount=cash.amount, date=data['date'], transaction_number=new_code)
+            batch.ledger('asset', head, period=period, account=result.get('receivable'), transaction_number=new_code,
+                         date=data['date'], type="Cash Receipt", description=description, credit=cash.amount)
+            batch.ledger('customer', head, period=period, account=customer_query, transaction_number=new_code,
+                         date=data['date'], type="Cash Receipt", description=description, credit=cash.amount)
+
+            if customer_query.credit is None:
+                customer_query.credit = Decimal("0")
+            customer_query.credit += Decimal(str(cash.amount))
+            customer_query.save()
+
+            if discount != 0:
+                batch.journal(head, entry_type="Sale", description=description, debit=50800, amount=discount,
+                              date=data['date'], transaction_number=new_code)
+                batch.ledger('expenses', head, period=period, account=result.get('discount'), transaction_number=new_code,
+                             date=data['date'], type="Sale", description=description, debit=discount)
+
+        elif data.get('terms') == 'Credit':
+            # the discount of a credit sale is booked by the cash receipt that settles it
+            batch.carry(head, -Decimal(str(discount)))
+
+        if data.get('terms') in ('Full Payment', 'Part Payment', 'Credit') and tax != 0:
+            batch.journal(head, entry_type="Sale", description=description, credit=20300, amount=tax,
+                          date=data['date'], transaction_number=new_code)
+            batch.ledger('liabilities', head, period=period, account=result.get('tax'), transaction_number=new_code,
+                         date=data['date'], type="Sales", description=description, credit=tax)
+
+        batch.save()
+
+    return {"status": "success", "message": "Sales created successfully", "data": {"code": new_code, "address": business_query.address, "phone": business_query.telephone, "email": business_query.email, 'time': sale_info.creation_date.strftime('%H:%M:%S')}}
+
+
+def post_and_save_sales(business, user, company, location, data, totals, items, levy, real_levy, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not user_query.admin and not user_query.create_access and not user_query.sales_access:
             return {"status": "error", "message": "User has no access", "data": {}}
         
-        if not (user_query.admin or (user_query.date_access and user_query.sales_access)):
-            current_date = datetime.strptime(data['date'], "%Y-%m-%d").date()
-            today = date.today()
+        date_error = _sale_date_error(user_query, data)
 
-            if current_date < today:
-                return {"status": "error", "message": "User has no access to past dates", "data": {}}
-            
-            if current_date > today:
-                return {"status": "error", "message": "User has no access to future dates", "data": {}}
+        if date_error:
+            return date_error
 
         if not user_query.admin:
             if location not in user_query.per_location_access:
                 return {"status": "error", "message": f"User has no access to location '{location}'", "data": {}}
 
-        current_date = datetime.strptime(data['date'], "%Y-%m-%d").date()
-        today = date.today()
-
-        if current_date.month != today.month:
-            return {"status": "error", "message": "Cannot post to other period", "data": {}}
-
         try:
             location_query = models.inventory_location.objects.get(bussiness_name=business_query, location_name=location)
         except models.inventory_location.DoesNotExist:
             logger.warning(f"Location '{location}' not found for business '{business}'.")
             return {"status": "error", "message": f"Location '{location}' not found", "data": {}}
 
-        if data.get('terms') == 'Full Payment':
-            amount_paid = totals.get('grandTotal', 0)
-        elif data.get('terms') == 'Part Payment':
-            amount_paid = data.get('partpayment', 0)
-        else:
-            amount_paid = 0
+        lines = []
+
+        for raw_item in items:
+            try:
+                lines.append(json.loads(raw_item))
+            except Exception:
+                logger.exception("Failed to parse item JSON.")
+                return {"status": "error", "message": f"Invalid item format: {raw_item}", "data": {}}
+
+        result = _sale_accounts(business_query, company, data)
 
         with transaction.atomic():
-            p = models.sale(bussiness_name=business_query, creation_date=datetime.now())
-            new_code = p.generate_next_code()
+            stock = StockMovement(business=business_query, location=location_query).lock(names=[line.get('name', '') for line in lines])
+            posted = _post_sale(context, location_query, data, totals, lines, levy, real_levy, result, stock)
 
-            if data.get('type') == 'regular':
-                try:
-                    customer_query = models.customer.objects.get(name='Regular Customer', bussiness_name=business_query)
-                except models.customer.DoesNotExist:
-                    logger.warning(f"Customer 'Regular Customer' not found for business '{business}'.")
-                    return {"status": "error", "message": "Customer 'Regular Customer' not found", "data": {}}
-
-                from_account = customer_query.account
-                sale_info = models.sale(
-                    code=new_code, created_by=user_query, bussiness_name=business_query,
-                    customer_name=data.get('customer', ''), date=data['date'], customer_info=customer_query,
-                    due_date=data.get('dueDate', ''), location_address=location_query,
-                    discount_percentage=data.get('discount', 0), status=data.get('terms', ''),
-                    sub_total=totals.get('subtotal', 0), gross_total=totals.get('grandTotal', 0),
-                    payment_term=data.get('terms', ''), type=data.get('type', ''), amount_paid=amount_paid,
-                    discount=totals.get('discountAmount', 0), net_total=totals.get('netTotal', 0),
-                    tax_levy=totals.get('levyAmount', 0), tax_levy_types=levy, customer_contact=data.get('contact', '')
-                )
-            elif data.get('type') == 'registered':
-                try:
-                    customer_query = models.customer.objects.get(name=data.get('customer', ''), bussiness_name=business_query)
-                except models.customer.DoesNotExist:
-                    logger.warning(f"Customer '{data.get('customer', '')}' not found for business '{business}'.")
-                    return {"status": "error", "message": f"Customer '{data.get('customer', '')}' not found", "data": {}}
-
-                from_account = customer_query.account
-                sale_info = models.sale(
-                    code=new_code, created_by=user_query, bussiness_name=business_query,
-                    customer_info=customer_query, date=data['date'], amount_paid=amount_paid,
-                    due_date=data.get('dueDate', ''), location_address=location_query,
-                    discount_percentage=data.get('discount', 0), status=data.get('terms', ''),
-                    description=data.get('description', ''), sub_total=totals.get('subtotal', 0),
-                    gross_total=totals.get('grandTotal', 0), payment_term=data.get('terms', ''),
-                    discount=totals.get('discountAmount', 0), net_total=totals.get('netTotal', 0),
-                    tax_levy=totals.get('levyAmount', 0), tax_levy_types=levy, type=data.get('type', '')
-                )
-            else:
-                logger.error("Invalid sale type supplied.")
-                return {"status": "error", "message": "Must select sales type", "data": {}}
+        if posted['status'] != 'success':
+            return posted
 
-            cogs = Decimal("0")
-            total_sales = 0.0
-            total_quantity = 0.0
-            histories = []
+        activity_log.record(user=user_query, head=posted['data']['code'], area='Create Sales', bussiness_name=business_query)
 
-            for raw_item in items:
-                try:
-                    item = json.loads(raw_item)
-                except Exception:
-                    logger.exception("Failed to parse item JSON.")
-                    return {"status": "error", "message": f"Invalid item format: {raw_item}", "data": {}}
+        return posted
 
-                try:
-                    item_info = models.items.objects.get(item_name=item['name'], bussiness_name=business_query)
-                except models.items.DoesNotExist:
-                    logger.warning(f"Item '{item.get('name', '')}' not found for business '{business}'.")
-                    return {"status": "error", "message": f"Item '{item.get('name', '')}' not found", "data": {}}
-                
-                try:
-                    loc_item = models.location_items.objects.get(item_name=item_info, location=location_query, bussiness_name=business_query)
-                    
-                except models.location_items.DoesNotExist:
-                    logger.warning(f"Location item for '{item.get('name', '')}' not found at location '{location}'.")
-                    return {"status": "error", "message": f"Item '{item.get('name', '')}' not found in location '{location}'", "data": {}}
-
-                if loc_item.item_name.is_active is False:
-                    logger.warning(f"Item '{item.get('name', '')}' is inactive.")
-                    return {"status": "error", "message": f"Item '{item_info.item_name}' is inactive", "data": {}}
-
-                if (loc_item.quantity - Decimal(str(item['qty']))) < 0:
-                    logger.warning(f"Insufficient stock for item '{item.get('name', '')}'.")
-                    return {"status": "error", "message": f"{item_info.item_name} does not have enough quantity at {location}", "data": {}}
-                
-                else:
-                    item_info.quantity -= int(item['qty'])
-                    item_info.last_sales = data['date']
-
-                    cogs += Decimal(str(item['qty'])) * item_info.purchase_price
-                    total_quantity += float(item['qty'])
-                    total_sales += float(item['qty']) * float(item['price'])
-                    
-                    histories.append({
-                        "item_name": item_info,
-                        "quantity": item['qty'],
-                        "sales_price": item['price'],
-                        "purchase_price": item_info.purchase_price,
-                        "bussiness_name": business_query,
-                    })
-
-                    loc_item.quantity -= Decimal(str(item['qty']))
-                    loc_item.purchase_price = Decimal(str(item_info.purchase_price))
-                    loc_item.last_sales = data['date']
-                    item_info.save()
-                    loc_item.save()
-
-            sale_info.total_quantity = Decimal(str(total_quantity))
-            sale_info.cog = cogs
-            sale_info.save()
-
-            sale_histories = [
-                models.sale_history(
-                    sales=sale_info,
-                    **h
-                )
-                for h in histories
-            ]
-            models.sale_history.objects.bulk_create(sale_histories)
-
-            discount = total_sales * (float(data.get('discount', 0)) / 100.0)
-            taxable_amount = total_sales - discount
-            tax = 0.0
-            for levy_item in real_levy:
-                tax += taxable_amount * (levy_item.get('rate', 0.0) / 100.0)
-            final_total = taxable_amount + tax
-
-            accounts = {
-                'inventory': 10301,
-                'tax': 20301,
-                'payment': str(data.get('account', '')).split()[0] if data.get('account') else None,
-                'receivable': 10401,
-                'revenue': 40101,
-                'cog': 50101,
-                'discount': 50801
-            }
+    except models.bussiness.DoesNotExist:
+        logger.warning(f"Business '{business}' not found.")
+        return {"status": "error", "message": f"Business '{business}' not found", "data": {}}
 
-            result = retrive_real_account(code_map=accounts, business=business, company=company).get_real_accounts()
+    except models.current_user.DoesNotExist:
+        logger.warning(f"User '{user}' not found.")
+        return {"status": "error", "message": f"User '{user}' not found", "data": {}}
 
-            head = models.journal_head.objects.create(
-                entry_type="Sale", transaction_number=new_code, amount=final_total,
-                created_by=user_query, bussiness_name=business_query, description=data.get('description', '')
-            )
+    except Exception:
+        logger.exception("Unhandled error in post_and_save_sales")
+        return {"status": "error", "message": "Something went wrong, please try again", "data": {}}
 
-            models.journal.objects.create(
-                entry_type="Sale",
-                description=f'Crediting Inventory with {new_code} Amount',
-                credit=10300, head=head, amount=cogs, bussiness_name=business_query,
-                date=data['date'], transaction_number=new_code
-            )
 
-            models.asset_ledger.objects.create(
-                bussiness_name=business_query, period=result.get('period'),
-                account=result.get('inventory'), transaction_number=new_code, date=data['date'],
-                type="Sale", description=data.get('description', ''), credit=cogs, head=head
-            )
+def _sale_lines(items):
+    lines = []
 
-            models.journal.objects.create(
-                entry_type="Sale",
-                description=f'Debiting COGS with {new_code} Amount',
-                debit=50100, head=head, amount=cogs, bussiness_name=business_query,
-                date=data['date'], transaction_number=new_code
-            )
+    for raw_item in items:
+        lines.append(json.loads(raw_item) if isinstance(raw_item, str) else dict(raw_item))
 
-            models.expenses_ledger.objects.create(
-                bussiness_name=business_query, period=result.get('period'),
-                account=result.get('cog'), transaction_number=new_code, date=data['date'],
-                type="Sales", description=data.get('description', ''), debit=cogs, head=head
-            )
+    return lines
 
-            models.journal.objects.create(
-                entry_type="Sale",
-                description=f'Crediting Sales Account with {new_code} Amount',
-                credit=40100, head=head, amount=total_sales, bussiness_name=business_query,
-                date=data['date'], transaction_number=new_code
-            )
 
-            models.revenue_ledger.objects.create(
-                bussiness_name=business_query, period=result.get('period'),
-                account=result.get('revenue'), transaction_number=new_code, date=data['date'],
-                type="Sale", description=data.get('description', ''), credit=total_sales, head=head
-            )
+def _replayed(key, response):
+    return {"key": key, **response, "replayed": True}
 
-            models.journal.objects.create(
-                entry_type="Sale",
-                description=f'Debiting {customer_query.name} for {new_code} on credit',
-                debit=customer_query.account, head=head, amount=final_total,
-                bussiness_name=business_query, date=data['date'], transaction_number=new_code
-            )
 
-            models.asset_ledger.objects.create(
-                bussiness_name=business_query, period=result.get('period'),
-                account=result.get('receivable'), transaction_number=new_code, date=data['date'],
-                type="Sale", description=data.get('description', ''), debit=final_total, head=head
-            )
+def _sale_fingerprint(sale):
+    payload = json.dumps({name: sale.get(name) for name in ('data', 'totals', 'items', 'levy')}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
 
-            models.customer_ledger.objects.create(
-                bussiness_name=business_query, period=result.get('period'),
-                account=customer_query, transaction_number=new_code, date=data['date'],
-                type="Sale", description=data.get('description', ''), debit=final_total, head=head
+def _key_reused(key):
+    return {"key": key, "status": "error", "message": "Idempotency key was already used for a different request", "data": {}, "replayed": False}
+
+
+def post_sales_batch(business, user, company, location, sales, context=None):
+    """Posts a batch of POS sales for one location.
+
+    Each sale is {'key', 'data', 'totals', 'items', 'levy'}; key is the client's idempotency
+    key, so a batch sent again returns the stored results instead of posting twice; a key sent
+    with a different sale is refused for that sale. Stock is
+    locked once for the whole batch and every sale runs in its own savepoint, so a rejected
+    sale does not undo the others. Returns one result per sale, in order.
+    """
+    try:
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
+
+        if not user_query.admin and not user_query.create_access and not user_query.sales_access:
+            return {"status": "error", "message": "User has no access", "data": {}}
+
+        if not user_query.admin:
+            if location not in user_query.per_location_access:
+                return {"status": "error", "message": f"User has no access to location '{location}'", "data": {}}
+
+        if len(sales) > SALES_BATCH_LIMIT:
+            return {"status": "error", "message": f"A batch can hold at most {SALES_BATCH_LIMIT} sales", "data": {}}
+
+        try:
+            location_query = models.inventory_location.objects.get(bussiness_name=business_query, location_name=location)
+        except models.inventory_location.DoesNotExist:
+            logger.warning(f"Location '{location}' not found for business '{business}'.")
+            return {"status": "error", "message": f"Location '{location}' not found", "data": {}}
+
+        keys = [str(sale.get('key') or '').strip() for sale in sales]
+        fingerprints = [_sale_fingerprint(sale) for sale in sales]
+        stored = {
+            key: (fingerprint, response)
+            for key, fingerprint, response in models.idempotency_key.objects.filter(
+                business=business_query, scope=SALES_BATCH_SCOPE, key__in=[key for key in keys if key], response__isnull=False
+            ).values_list('key', 'fingerprint', 'response')
+        }
+
+        results = [None] * len(sales)
+        pending = []
+
+        for index, (key, fingerprint, sale) in enumerate(zip(keys, fingerprints, sales)):
+            if not key:
+                results[index] = {"key": key, "status": "error", "message": "Missing idempotency key", "data": {}, "replayed": False}
+            elif key in stored:
+                results[index] = _replayed(key, stored[key][1]) if stored[key][0] == fingerprint else _key_reused(key)
+            else:
+                try:
+                    pending.append((index, key, fingerprint, sale, _sale_lines(sale.get('items') or [])))
+                except Exception:
+                    logger.warning(f"Invalid item format in batch sale '{key}' for business '{business}'.")
+                    results[index] = {"key": key, "status": "error", "message": "Invalid item format", "data": {}, "replayed": False}
+
+        resolved = {}
+        posted_codes = []
+
+        with transaction.atomic():
+            stock = StockMovement(business=business_query, location=location_query).lock(
+                names=[line.get('name', '') for *_, lines in pending for line in lines]
             )
 
-            if customer_query.debit is None:
-                customer_query.debit = Decimal("0")
-            customer_query.debit += Decimal(str(final_total))
-            customer_query.save()
+            for index, key, fingerprint, sale, lines in pending:
+                if key in stored:
+                    # the same key twice in one batch posts once
+                    results[index] = _replayed(key, stored[key][1]) if stored[key][0] == fingerprint else _key_reused(key)
+                    continue
 
-            if data.get('terms') == 'Full Payment':
-                cash = models.cash_receipt.objects.create(
-                    transaction_number=new_code,
-                    description=f"payment of {new_code} from {from_account}",
-                    to_account=(data.get('account', '').split())[0] if data.get('account') else None,
-                    from_account=from_account,
-                    bussiness_name=business_query,
-                    amount=final_total,
-                    created_by=user_query,
-                    status='None',
-                    ref_type='sales',
-                    external_no=new_code
-                )
-
-                models.journal.objects.create(
-                    entry_type="Cash Receipt",
-                    description=f'Debiting Account used to receive the payment of {new_code}',
-                    debit=(data.get('account', '').split())[0] if data.get('account') else None,
-                    head=head, amount=cash.amount, bussiness_name=business_query,
-                    date=data['date'], transaction_number=new_code
-                )
-
-                models.asset_ledger.objects.create(
-                    bussiness_name=business_query, period=result.get('period'),
-                    account=result.get('payment'), transaction_number=new_code, date=data['date'],
-                    type="Cash Receipt", description=data.get('description', ''), debit=cash.amount, head=head
-                )
-
-                models.journal.objects.create(
-                    entry_type="Cash Receipt",
-                    description=f'Crediting {customer_query.name} for payment of {new_code}',
-                    credit=customer_query.account, head=head, amount=cash.amount,
-                    bussiness_name=business_query, date=data['date'], transaction_number=new_code
-                )
-
-                models.asset_ledger.objects.create(
-                    bussiness_name=business_query, period=result.get('period'),
-                    account=result.get('receivable'), transaction_number=new_code, date=data['date'],
-                    type="Cash Receipt", description=data.get('description', ''), credit=cash.amount, head=head
-                )
-
-                models.customer_ledger.objects.create(
-                    bussiness_name=business_query, period=result.get('period'),
-                    account=customer_query, transaction_number=new_code, date=data['date'],
-                    type="Cash Receipt", description=data.get('description', ''), credit=cash.amount, head=head
-                )
-
-                if customer_query.credit is None:
-                    customer_query.credit = Decimal("0")
-                customer_query.credit += Decimal(str(cash.amount))
-                customer_query.save()
-
-                if discount != 0:
-                    models.journal.objects.create(
-                        entry_type="Sale", description=data.get('description', ''), debit=50800, head=head,
-                        amount=discount, bussiness_name=business_query, date=data['date'], transaction_number=new_code
-                    )
-
-                    models.expenses_ledger.objects.create(
-                        bussiness_name=business_query, period=result.get('period'),
-                        account=result.get('discount'), transaction_number=new_code, date=data['date'],
-                        type="Sale", description=data.get('description', ''), debit=discount, head=head
-                    )
-
-                if tax != 0:
-                    models.journal.objects.create(
-                        entry_type="Sale", description=data.get('description', ''), credit=20300, head=head,
-                        amount=tax, bussiness_name=business_query, date=data['date'], transaction_number=new_code
-                    )
-
-                    models.liabilities_ledger.objects.create(
-                        bussiness_name=business_query, period=result.get('period'),
-                        account=result.get('tax'), transaction_number=new_code, date=data['date'],
-                        type="Sales", description=data.get('description', ''), credit=tax, head=head
-                    )
-
-            elif data.get('terms') == 'Credit':
-                if tax != 0:
-                    models.journal.objects.create(
-                        entry_type="Sale", description=data.get('description', ''), credit=20300, head=head,
-                        amount=tax, bussiness_name=business_query, date=data['date'], transaction_number=new_code
-                    )
-
-                    models.liabilities_ledger.objects.create(
-                        bussiness_name=business_query, period=result.get('period'),
-                        account=result.get('tax'), transaction_number=new_code, date=data['date'],
-                        type="Sales", description=data.get('description', ''), credit=tax, head=head
-                    )
-
-            elif data.get('terms') == 'Part Payment':
-                cash = models.cash_receipt.objects.create(
-                    transaction_number=new_code,
-                    description=f"part payment of {new_code} from {from_account}",
-                    to_account=(data.get('account', '').split('-'))[0] if data.get('account') else None,
-                    from_account=from_account,
-                    bussiness_name=business_query,
-                    amount=data.get('partpayment', 0),
-                    created_by=user_query,
-                    status='None',
-                    ref_type='sales',
-                    external_no=new_code
-                )
-
-                models.journal.objects.create(
-                    entry_type="Cash Receipt",
-                    description=f'Debiting Account used to receive the part payment of {new_code}',
-                    debit=(data.get('account', '').split('-'))[0] if data.get('account') else None,
-                    head=head, amount=cash.amount, bussiness_name=business_query,
-                    date=data['date'], transaction_number=new_code
-                )
-
-                models.asset_ledger.objects.create(
-                    bussiness_name=business_query, period=result.get('period'),
-                    account=result.get('payment'), transaction_number=new_code, date=data['date'],
-                    type="Cash Receipt", description=data.get('description', ''), debit=cash.amount, head=head
-                )
-
-                models.journal.objects.create(
-                    entry_type="Cash Receipt",
-                    description=f'Crediting {customer_query.name} for part payment of {new_code}',
-                    credit=customer_query.account, head=head, amount=cash.amount,
-                    bussiness_name=business_query, date=data['date'], transaction_number=new_code
-                )
-
-                models.asset_ledger.objects.create(
-                    bussiness_name=business_query, period=result.get('period'),
-                    account=result.get('receivable'), transaction_number=new_code, date=data['date'],
-                    type="Cash Receipt", description=data.get('description', ''), credit=cash.amount, head=head
-                )
-
-                models.customer_ledger.objects.create(
-                    bussiness_name=business_query, period=result.get('period'),
-                    account=customer_query, transaction_number=new_code, date=data['date'],
-                    type="Cash Receipt", description=data.get('description', ''), credit=cash.amount, head=head
-                )
-
-                if customer_query.credit is None:
-                    customer_query.credit = Decimal("0")
-                customer_query.credit += Decimal(str(cash.amount))
-                customer_query.save()
-
-                if discount != 0:
-                    models.journal.objects.create(
-                        entry_type="Sale", description=data.get('description', ''), debit=50800, head=head,
-                        amount=discount, bussiness_name=business_query, date=data['date'], transaction_number=new_code
-                    )
-
-                    models.expenses_ledger.objects.create(
-                        bussiness_name=business_query, period=result.get('period'),
-                        account=result.get('discount'), transaction_number=new_code, date=data['date'],
-                        type="Sale", description=data.get('description', ''), debit=discount, head=head
-                    )
-
-                if tax != 0:
-                    models.journal.objects.create(
-                        entry_type="Sale", description=data.get('description', ''), credit=20300, head=head,
-                        amount=tax, bussiness_name=business_query, date=data['date'], transaction_number=new_code
-                    )
-
-                    models.liabilities_ledger.objects.create(
-                        bussiness_name=business_query, period=result.get('period'),
-                        account=result.get('tax'), transaction_number=new_code, date=data['date'],
-                        type="Sales", description=data.get('description', ''), credit=tax, head=head
-                    )
-
-        models.tracking_history.objects.create(user=user_query, head=new_code, area='Create Sales', bussiness_name=business_query)
-
-        return {"status": "success", "message": "Sales created successfully", "data": {"code": new_code, "address": business_query.address, "phone": business_query.telephone, "email": business_query.email, 'time': sale_info.creation_date.strftime('%H:%M:%S')}}
+                data = sale.get('data') or {}
+                levy_items = sale.get('levy') or []
+                snapshot = {row: row.quantity for row in [*stock.items.values(), *stock.location_items.values()]}
+
+                try:
+                    posted = _sale_date_error(user_query, data)
+
+                    if posted:
+                        results[index] = {"key": key, **posted, "replayed": False}
+                        continue
+
+                    with transaction.atomic():
+                        claim, created = models.idempotency_key.objects.get_or_create(
+                            business=business_query, scope=SALES_BATCH_SCOPE, key=key, defaults={'fingerprint': fingerprint}
+                        )
+
+                        if not created and claim.fingerprint != fingerprint:
+                            results[index] = _key_reused(key)
+                            continue
+
+                        if not created and claim.response is not None:
+                            stored[key] = (fingerprint, claim.response)
+                            results[index] = _replayed(key, claim.response)
+                            continue
+
+                        accounts = _sale_accounts(business_query, company, data, resolved)
+                        posted = _post_sale(context, location_query, data, sale.get('totals') or {}, lines,
+                                            [json.dumps(levy_items)], levy_items, accounts, stock)
+
+                        if posted['status'] != 'success':
+                            transaction.set_rollback(True)
+                        else:
+                            claim.response = posted
+                            claim.save(update_fields=['response'])
+                            stored[key] = (fingerprint, posted)
+                            posted_codes.append(posted['data']['code'])
+
+                except Exception:
+                    logger.exception(f"Failed to post batch sale '{key}' for business '{business}'")
+                    posted = {"status": "error", "message": "Something went wrong, please try again", "data": {}}
+
+                if posted['status'] != 'success':
+                    # the savepoint rolled the stock back; the locked rows in memory follow it
+                    for row, quantity in snapshot.items():
+                        row.quantity = quantity
+
+                results[index] = {"key": key, **posted, "replayed": False}
+
+        for code in posted_codes:
+            activity_log.record(user=user_query, head=code, area='Create Sales', bussiness_name=business_query)
+
+        failed = sum(1 for result in results if result['status'] != 'success')
+        message = f"{len(results) - failed} of {len(results)} sales posted"
+
+        return {"status": "success", "message": message, "data": {"results": results}}
 
     except models.bussiness.DoesNotExist:
         logger.warning(f"Business '{business}' not found.")
@@ -523,7 +592,7 @@ def post_and_save_sales(business, user, company, location, data, totals, items,
         return {"status": "error", "message": f"User '{user}' not found", "data": {}}
 
     except Exception:
-        logger.exception("Unhandled error in post_and_save_sales")
+        logger.exception("Unhandled error in post_sales_batch")
         return {"status": "error", "message": "Something went wrong, please try again", "data": {}}
 
 
@@ -545,22 +614,20 @@ def reverse_sales(business, user, company, number):
             return {"status": "error", "message": "Already reversed", "data": {}}
     
 
-        history = models.sale_history.objects.filter(sales=sale, bussiness_name=business_query)
+        history = list(models.sale_history.objects.filter(sales=sale, bussiness_name=business_query).select_related('item_name'))
 
         with transaction.atomic():
-            for entry in history:
-                item = entry.item_name
-                item.quantity += entry.quantity
-                item.save()
+            if models.sale.objects.select_for_update().filter(pk=sale.pk, is_reversed=True).exists():
+                return {"status": "error", "message": "Already reversed", "data": {}}
 
-                try:
-                    loc_item = models.location_items.objects.get(item_name=item, location=sale.location_address, bussiness_name=business_query)
-                except models.location_items.DoesNotExist:
-                    logger.warning(f"Location item '{item.item_name}' not found at location '{sale.location_address}'.")
-                    return {"status": "error", "message": f"Location item '{item.item_name}' not found at sale's location", "data": {}}
+            stock = StockMovement(business=business_query, location=sale.location_address).lock(item_ids=[entry.item_name_id for entry in history])
+
+            for entry in history:
+                if entry.item_name_id not in stock.location_items:
+                    logger.warning(f"Location item '{entry.item_name.item_name}' not found at location '{sale.location_address}'.")
+                    return {"status": "error", "message": f"Location item '{entry.item_name.item_name}' not found at sale's location", "data": {}}
 
-                loc_item.quantity += Decimal(str(entry.quantity))
-                loc_item.save()
+            stock.apply(stock.deltas([{'name': entry.item_name.item_name, 'qty': entry.quantity} for entry in history], sign=1))
 
             try:
                 if sale.type.lower() == 'regular':
@@ -589,94 +656,9 @@ def reverse_sales(business, user, company, number):
                 head.reversed = True
                 head.save()
 
-            journal_entries = models.journal.objects.filter(transaction_number=sale.code, bussiness_name=business_query)
-            for j in journal_entries:
-                models.journal.objects.create(
-                    entry_type="Reversal",
-                    description=f'Rev - {j.description}',
-                    debit=j.credit,
-                    credit=j.debit,
-                    amount=j.amount,
-                    bussiness_name=business_query,
-                    date=date.today(),
-                    transaction_number=f'Rev - {j.transaction_number}',
-                    head=j.head
-                )
-
-            asset_entries = models.asset_ledger.objects.filter(transaction_number=sale.code, bussiness_name=business_query)
-            for a in asset_entries:
-                models.asset_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=a.account,
-                    period=a.period,
-                    transaction_number=f'Rev - {a.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {a.description}',
-                    debit=a.credit,
-                    credit=a.debit,
-                    head=a.head
-                )
-
-            liabilities_entries = models.liabilities_ledger.objects.filter(transaction_number=sale.code, bussiness_name=business_query)
-            for l in liabilities_entries:
-                models.liabilities_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=l.account,
-                    period=l.period,
-                    transaction_number=f'Rev - {l.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {l.description}',
-                    debit=l.credit,
-                    credit=l.debit,
-                    head=l.head
-                )
-
-            revenue_entries = models.revenue_ledger.objects.filter(transaction_number=sale.code, bussiness_name=business_query)
-            for r in revenue_entries:
-                models.revenue_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=r.account,
-                    period=r.period,
-                    transaction_number=f'Rev - {r.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {r.description}',
-                    debit=r.credit,
-                    credit=r.debit,
-                    head=r.head
-                )
-
-            expense_entries = models.expenses_ledger.objects.filter(transaction_number=sale.code, bussiness_name=business_query)
-            for ex in expense_entries:
-                models.expenses_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=ex.account,
-                    period=ex.period,
-                    transaction_number=f'Rev - {ex.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {ex.description}',
-                    debit=ex.credit,
-                    credit=ex.debit,
-                    head=ex.head
-                )
-
-            customer_entries = models.customer_ledger.objects.filter(transaction_number=sale.code, bussiness_name=business_query)
-            for ce in customer_entries:
-                models.customer_ledger.objects.create(
-                    bussiness_name=business_query,
-                    account=ce.account,
-                    period=ce.period,
-                    transaction_number=f'Rev - {ce.transaction_number}',
-                    date=date.today(),
-                    type="Reversal",
-                    description=f'Rev - {ce.description}',
-                    debit=ce.credit,
-                    credit=ce.debit,
-                    head=ce.head
-                )
+            batch = JournalBatch(business_query, user_query)
+            batch.reverse(transaction_number=sale.code)
+            batch.save()
 
             payments = models.cash_receipt.objects.filter(transaction_number=sale.code, bussiness_name=business_query, is_reversed=False)
             for pay in payments:
@@ -698,8 +680,10 @@ def reverse_sales(business, user, company, number):
             sale.status = 'Reversed'
             sale.is_reversed = True
             sale.save()
+            daily_summary.record_sale(sale, sign=-1)
+            item_valuation.record_sale(sale, sign=-1)
 
-        models.tracking_history.objects.create(user=user_query, head=sale.code, area='Reverse sales', bussiness_name=business_query)
+        activity_log.record(user=user_query, head=sale.code, area='Reverse sales', bussiness_name=business_query)
         return {"status": "success", "message": f"Sale invoice {number} reversed", "data": {"code": sale.code}}
 
     except models.bussiness.DoesNotExist:
@@ -0,0 +1,244 @@
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from . import models, search_index
+import logging
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+# The item select of the sales and purchase forms runs on every keystroke, so each worker
+# keeps the items of the businesses it serves in memory. A catalogue is built on first use
+# and is valid while the business' version in the shared cache is the one it was built
+# with; invalidate() bumps that version when an item, its lookups or its prices change,
+# so every worker rebuilds on its next lookup. Stock quantities are not held, so sales
+# leave the catalogue alone.
+
+MAX_BUSINESSES = getattr(settings, 'ITEM_CATALOGUE_MAX_BUSINESSES', 20)
+
+# an item record: (pk, item_name, brand, code, category, unit suffix, model, cost, price, is_active)
+FIELDS = (
+    'pk', 'item_name', 'brand__name', 'code', 'category__name', 'unit__suffix',
+    'model', 'purchase_price', 'sales_price', 'is_active',
+)
+
+# record position of each field indexed for search, with search_index's weight for it
+WORD_FIELDS = {1: 3, 3: 3, 6: 1, 4: 1, 2: 1}
+
+# the columns shown in the select; a save that changes none of them keeps the catalogue
+WATCHED = {
+    models.items: ('item_name', 'code', 'model', 'brand_id', 'category_id', 'unit_id', 'purchase_price', 'sales_price', 'is_active'),
+    models.location_items: ('purchase_price', 'sales_price'),
+}
+
+_MISSING = object()
+
+_catalogues = OrderedDict()
+_lock = threading.Lock()
+
+
+def _version_key(business_id):
+    return f'item_catalogue:version:{business_id}'
+
+
+def _version(business_id):
+    try:
+        return cache.get(_version_key(business_id), 0)
+    except Exception as error:
+        logger.warning(error)
+        return None
+
+
+class Catalogue:
+    """The items of one business in name order, with a sorted index of the words they are searched by."""
+
+    def __init__(self, business_id, version):
+        self.business_id = business_id
+        self.version = version
+        self.records = list(
+            models.items.objects.filter(bussiness_name_id=business_id).order_by('item_name', 'pk').values_list(*FIELDS)
+        )
+        self.positions = {record[0]: position for position, record in enumerate(self.records)}
+        self.location_ids = dict(
+            models.inventory_location.objects.filter(bussiness_name_id=business_id).values_list('location_name', 'pk')
+        )
+        self.locations = {}
+
+        entries = sorted(
+            (sys.intern(word), position, weight)
+            for position, record in enumerate(self.records)
+            for field, weight in WORD_FIELDS.items()
+            for word in search_index.words(record[field])
+        )
+
+        # parallel arrays keep the index compact: the word, the record it is in and its weight
+        self.words = [word for word, position, weight in entries]
+        self.word_positions = array('l', (position for word, position, weight in entries))
+        self.word_weights = array('b', (weight for word, position, weight in entries))
+
+    def location(self, location_id):
+        """Returns {record position: (cost, price)} of the items with a row at location_id."""
+        prices = self.locations.get(location_id)
+
+        if prices is None:
+            rows = models.location_items.objects.filter(
+                bussiness_name_id=self.business_id, location_id=location_id
+            ).values_list('item_name_id', 'purchase_price', 'sales_price')
+
+            prices = {self.positions[item]: (cost, price) for item, cost, price in rows if item in self.positions}
+            self.locations[location_id] = prices
+
+        return prices
+
+    def _prefixed(self, word):
+        scores = {}
+        start = bisect_left(self.words, word)
+
+        for index in range(start, len(self.words)):
+            term = self.words[index]
+
+            if not term.startswith(word):
+                break
+
+            score = (3 if term == word else 2) * self.word_weights[index]
+            position = self.word_positions[index]
+            scores[position] = max(scores.get(position, 0), score)
+
+        return scores
+
+    def search(self, query, limit, allowed=None):
+        """Returns the positions of the records matching every word of query, best first.
+
+        Without words the first records in name order are returned. allowed limits the
+        result to a set of positions.
+        """
+        query_words = list(dict.fromkeys(search_index.words(query)))[:search_index.MAX_QUERY_WORDS]
+
+        if not query_words:
+            positions = range(len(self.records)) if allowed is None else sorted(allowed)
+            return list(positions[:limit])
+
+        scores = None
+
+        for word in query_words:
+            matched = self._prefixed(word)
+            scores = matched if scores is None else {position: score + matched[position] for position, score in scores.items() if position in matched}
+
+            if not scores:
+                return []
+
+        if allowed is not None:
+            scores = {position: score for position, score in scores.items() if position in allowed}
+
+        return sorted(scores, key=lambda position: (-scores[position], position))[:limit]
+
+
+def get(business_id):
+    """Returns the business' catalogue, building it when missing or out of date; None without the shared cache."""
+    version = _version(business_id)
+
+    if version is None:
+        return None
+
+    with _lock:
+        catalogue = _catalogues.get(business_id)
+
+        if catalogue is not None and catalogue.version == version:
+            _catalogues.move_to_end(business_id)
+            return catalogue
+
+    catalogue = Catalogue(business_id, version)
+
+    with _lock:
+        _catalogues[business_id] = catalogue
+        _catalogues.move_to_end(business_id)
+
+        while len(_catalogues) > MAX_BUSINESSES:
+            _catalogues.popitem(last=False)
+
+    return catalogue
+
+
+def select(business_id, search, limit, location=None):
+    """Returns the rows of fetch_items_for_select for search, with the prices of location
+    when one is named, or None when the catalogue cannot answer.
+
+    A search with no match and an unknown location are left to the database, which also
+    tries close spellings and reports the missing location.
+    """
+    catalogue = get(business_id)
+
+    if catalogue is None:
+        return None
+
+    prices = None
+
+    if location:
+        if location not in catalogue.location_ids:
+            return None
+
+        prices = catalogue.location(catalogue.location_ids[location])
+
+    positions = catalogue.search(search, limit, allowed=prices)
+
+    if not positions:
+        return None if search else []
+
+    rows = []
+
+    for position in positions:
+        pk, name, brand, code, category, suffix, model, cost, price, is_active = catalogue.records[position]
+
+        if prices is not None:
+            cost, price = prices[position]
+
+        rows.append({
+            'value': name, 'label': name, 'item_name': name, 'brand': brand or '', 'code': code,
+            'category__name': category, 'unit__suffix': suffix, 'model': model,
+            'cost': cost, 'price': price, 'is_active': is_active,
+        })
+
+    return rows
+
+
+def _bump(business_id):
+    version_key = _version_key(business_id)
+
+    try:
+        cache.add(version_key, 0, None)
+        cache.incr(version_key)
+    except Exception as error:
+        logger.warning(error)
+
+
+def invalidate(business_id):
+    # bumped after the commit so a worker rebuilding meanwhile cannot keep the old rows
+    transaction.on_commit(lambda: _bump(business_id))
+
+
+def remember(sender, instance, **kwargs):
+    # __dict__ rather than getattr so a deferred field is not loaded just to be remembered
+    instance._catalogue_state = {field: instance.__dict__.get(field, _MISSING) for field in WATCHED[sender]}
+
+
+def on_save(sender, instance, created, **kwargs):
+    before = getattr(instance, '_catalogue_state', {})
+    changed = any(
+        before.get(field, _MISSING) is not _MISSING and before[field] != instance.__dict__.get(field, _MISSING)
+        for field in WATCHED.get(sender, ())
+    )
+
+    if created or changed or sender not in WATCHED:
+        invalidate(instance.bussiness_name_id)
+
+    if sender in WATCHED:
+        remember(sender, instance)
+
+
+def on_delete(sender, instance, **kwargs):
+    if not search_index.is_suspended():
+        invalidate(instance.bussiness_name_id)
@@ -0,0 +1,223 @@
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db import transaction
+from openpyxl import load_workbook
+from . import models, sequence, daily_summary, account_cache, search_index, item_catalogue, activity_log
+import csv
+import io
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = getattr(settings, 'ITEM_IMPORT_CHUNK_SIZE', 1000)
+
+# the same fields add_items takes, one column each
+COLUMNS = ('name', 'price', 'brand', 'model', 'description', 'reorder', 'category', 'unit', 'status')
+
+
+def read_rows(upload, filename=''):
+    """Yields one dict per data row of a CSV or XLSX upload, keyed by the lowercased header."""
+    if filename.lower().endswith('.xlsx'):
+        sheet = load_workbook(upload, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(cell or '').strip().lower() for cell in next(rows, ())]
+
+        for values in rows:
+            if any(value not in (None, '') for value in values):
+                yield dict(zip(header, ['' if value is None else str(value).strip() for value in values]))
+
+        return
+
+    text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='') if not isinstance(upload, io.TextIOBase) else upload
+
+    for row in csv.DictReader(text):
+        row = {str(key or '').strip().lower(): str(value or '').strip() for key, value in row.items()}
+
+        if any(row.values()):
+            yield row
+
+
+def _chunks(rows, size):
+    chunk = []
+
+    for number, row in enumerate(rows, start=2):
+        chunk.append((number, row))
+
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+class _Lookups:
+    def __init__(self, business):
+        self.business = business
+        self.categories = {c.name: c for c in models.inventory_category.objects.filter(bussiness_name=business)}
+        self.units = {u.suffix: u for u in models.inventory_unit.objects.filter(bussiness_name=business)}
+        self.brands = {b.name: b for b in models.inventory_brand.objects.filter(bussiness_name=business)}
+        self.names = set(models.items.objects.filter(bussiness_name=business).values_list('item_name', flat=True))
+        self.locations = list(models.inventory_location.objects.filter(bussiness_name=business))
+
+
+def _validate(row, lookups):
+    """Returns (item fields, None) or (None, error message) for one row."""
+    name = row.get('name', '')
+
+    if not name:
+        return None, 'Item name is required'
+
+    if name in lookups.names:
+        return None, f"Item '{name}' already exists"
+
+    category = lookups.categories.get(row.get('category', ''))
+    if category is None:
+        return None, f"Category '{row.get('category', '')}' not found"
+
+    unit = lookups.units.get(row.get('unit', ''))
+    if unit is None:
+        return None, f"Unit '{row.get('unit', '')}' not found"
+
+    try:
+        reorder = float(row.get('reorder') or 0)
+        price = Decimal(row.get('price') or 0).quantize(Decimal('0.01'))
+    except (ValueError, InvalidOperation):
+        return None, 'Invalid reorder level or price'
+
+    if reorder < 0 or price < 0:
+        return None, 'Invalid reorder level or price'
+
+    return {
+        'item_name': name,
+        'brand': lookups.brands.get(row.get('brand', '')),
+        'model': row.get('model', ''),
+        'description': row.get('description', ''),
+        'reorder_level': reorder,
+        'sales_price': price,
+        'is_active': (row.get('status') or 'active').lower() == 'active',
+        'category': category,
+        'unit': unit,
+    }, None
+
+
+def _reserve_codes(business, new_items):
+    by_prefix = {}
+
+    for item in new_items:
+        by_prefix.setdefault(models.items.code_prefix(item.category), []).append(item)
+
+    for prefix, group in by_prefix.items():
+        seed = models.items.code_seed(business, prefix, group[0].category)
+        first = sequence.reserve(business, f'ITEM-{prefix}', 0, len(group), seed=seed)
+
+        for offset, item in enumerate(group):
+            item.code = f"{prefix}{first + offset:05d}"
+
+
+def _save_chunk(business, user_query, new_items, lookups, period):
+    _reserve_codes(business, new_items)
+    models.items.objects.bulk_create(new_items, batch_size=1000)
+
+    # without RETURNING (MySQL) bulk_create leaves the ids unset
+    if any(item.pk is None for item in new_items):
+        ids = dict(models.items.objects.filter(bussiness_name=business, code__in=[i.code for i in new_items]).values_list('code', 'pk'))
+
+        for item in new_items:
+            item.pk = ids[item.code]
+
+    # what the post_save signal and items.save() would have created one row at a time
+    if not business.lazy_location_items:
+        models.location_items.objects.bulk_create([
+            models.location_items(item_name=item, location=location, quantity=0, bussiness_name=business, sales_price=item.sales_price)
+            for item in new_items for location in lookups.locations
+        ], batch_size=1000)
+
+    search_index.index(business.pk, 'item', [item.pk for item in new_items], replace=False)
+    item_catalogue.invalidate(business.pk)
+
+    if period is not None:
+        models.item_balance.objects.bulk_create([
+            models.item_balance(item=item, business=business, period=period) for item in new_items
+        ], batch_size=1000)
+
+    activity_log.record_many(
+        user_query, business, [f'Created item: {item.item_name}' for item in new_items], head='Item creation'
+    )
+
+
+def import_items(business, user, rows, chunk_size=CHUNK_SIZE):
+    """Creates items from rows of COLUMNS, chunk_size rows per transaction.
+
+    Invalid rows are reported and skipped; the others are created with their location_items
+    and current month item_balance rows in bulk, without the per-item signals.
+    """
+    try:
+        business_query = models.bussiness.objects.get(bussiness_name=business)
+        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+
+        if not user_query.admin and not user_query.create_access:
+            logger.warning(f"User '{user}' does not have permission to create items")
+            return {"status": "error", "message": f"{user} does not have permission to create items", "data": {}}
+
+        started = time.monotonic()
+        lookups = _Lookups(business_query)
+        period = account_cache.current_period(business_query.pk)
+
+        if period is not None and period.is_closed:
+            period = None
+
+        created = 0
+        total = 0
+        errors = []
+
+        for chunk in _chunks(rows, chunk_size):
+            new_items = []
+            total += len(chunk)
+
+            for number, row in chunk:
+                fields, error = _validate(row, lookups)
+
+                if error:
+                    errors.append({'row': number, 'name': row.get('name', ''), 'message': error})
+                    continue
+
+                lookups.names.add(fields['item_name'])
+                new_items.append(models.items(
+                    quantity=0, purchase_price=Decimal('0.00'), created_by=user_query,
+                    bussiness_name=business_query, **fields
+                ))
+
+            if not new_items:
+                continue
+
+            with transaction.atomic():
+                _save_chunk(business_query, user_query, new_items, lookups, period)
+
+            created += len(new_items)
+
+        if created:
+            daily_summary.invalidate_dashboard(business_query.pk)
+
+        elapsed = time.monotonic() - started
+        rate = round(total / elapsed, 1) if elapsed else total
+
+        logger.info(f"Imported {created} of {total} items for business '{business}' in {elapsed:.1f}s ({rate} rows/s)")
+        return {
+            "status": "success",
+            "message": f"{created} of {total} items imported",
+            "data": {"created": created, "rows": total, "errors": errors, "seconds": round(elapsed, 2), "rows_per_second": rate},
+        }
+
+    except models.bussiness.DoesNotExist:
+        logger.warning(f"Business '{business}' not found.")
+        return {"status": "error", "message": f"Business '{business}' not found.", "data": {}}
+
+    except models.current_user.DoesNotExist:
+        logger.warning(f"User '{user}' not found")
+        return {"status": "error", "message": f"User '{user}' not found.", "data": {}}
+
+    except Exception:
+        logger.exception('Unhandled error during item import')
+        return {"status": "error", "message": "Unhandled error during item import", "data": {}}
@@ -0,0 +1,160 @@
+from celery import shared_task
+from datetime import date
+from django.db.models import Sum, F, DecimalField
+from decimal import Decimal
+from collections import defaultdict
+from . import models
+import logging
+
+logger = logging.getLogger(__name__)
+
+# item_balance of an open month is kept current by the posting paths: flows are added
+# when a sale or purchase is posted or reversed and the closing stock is rewritten from
+# the locked item. reconcile() recomputes the same figures from the documents; it runs
+# nightly and when the month is closed, so a missed update is found and corrected there.
+
+FLOWS = ('quantity_sold', 'value_sold', 'cost_sold', 'quantity_purchased', 'value_purchased')
+
+CENT = Decimal('0.01')
+
+LINE_VALUE = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def _open_period(business_id, day):
+    return models.month_period.objects.filter(
+        business_id=business_id, start__lte=day, end__gte=day, is_closed=False
+    ).first()
+
+
+def _post(business_id, day, lines, sign):
+    """Adds signed flows to the item_balance rows of the open month holding day.
+
+    lines is {item id: {flow: amount}}. Rows that do not exist yet are left to
+    reconcile(); the month's closing creates them for every item.
+    """
+    period = _open_period(business_id, day)
+    current = period if period and period.start <= date.today() <= period.end else _open_period(business_id, date.today())
+
+    stock = {pk: (quantity, price) for pk, quantity, price in models.items.objects.filter(pk__in=list(lines)).values_list('pk', 'quantity', 'purchase_price')}
+
+    for item_id, flows in lines.items():
+        quantity, price = stock[item_id]
+        changes = {field: F(field) + _money(flows.get(field)) * sign for field in FLOWS if flows.get(field)}
+        closing = {'closing_quantity': quantity, 'closing_value': _money(quantity * price)}
+
+        if period and current and period.pk == current.pk:
+            models.item_balance.objects.filter(item_id=item_id, period=period).update(**changes, **closing)
+            continue
+
+        if period and changes:
+            models.item_balance.objects.filter(item_id=item_id, period=period).update(**changes)
+
+        if current:
+            models.item_balance.objects.filter(item_id=item_id, period=current).update(**closing)
+
+
+def _sale_flows(lines):
+    return lines.values('item_name_id').annotate(
+        quantity_sold=Sum('quantity'),
+        value_sold=Sum(F('quantity') * F('sales_price'), output_field=LINE_VALUE),
+        cost_sold=Sum(F('quantity') * F('purchase_price'), output_field=LINE_VALUE),
+    ).order_by()
+
+
+def _purchase_flows(lines):
+    return lines.values('item_name_id').annotate(
+        quantity_purchased=Sum('quantity'),
+        value_purchased=Sum(F('quantity') * F('purchase_price'), output_field=LINE_VALUE),
+    ).order_by()
+
+
+def record_sale(sale, sign=1):
+    """Adds (sign=1) or removes (sign=-1) a posted sale from its month's item balances.
+
+    Call after the stock has moved so the closing quantity is the new one.
+    """
+    head = models.sale.objects.filter(pk=sale.pk).values('bussiness_name_id', 'date').get()
+    lines = {row.pop('item_name_id'): row for row in _sale_flows(models.sale_history.objects.filter(sales_id=sale.pk))}
+
+    _post(head['bussiness_name_id'], head['date'], lines, sign)
+
+
+def record_purchase(purchase, sign=1):
+    head = models.purchase.objects.filter(pk=purchase.pk).values('bussiness_name_id', 'date').get()
+    lines = {row.pop('item_name_id'): row for row in _purchase_flows(models.purchase_history.objects.filter(purchase_id=purchase.pk))}
+
+    _post(head['bussiness_name_id'], head['date'], lines, sign)
+
+
+def reconcile(period, fix=False):
+    """Compares a month's item_balance rows with figures recomputed from its documents.
+
+    Returns a list of {'item', 'field', 'stored', 'expected'} differences; with fix the
+    rows are corrected. The closing stock is the items' current stock, so this is only
+    meaningful for the open month or the month being closed.
+    """
+    expected = defaultdict(dict)
+
+    sales = models.sale_history.objects.filter(
+        bussiness_name_id=period.business_id, sales__date__range=[period.start, period.end], sales__is_reversed=False
+    )
+    purchases = models.purchase_history.objects.filter(
+        bussiness_name_id=period.business_id, purchase__date__range=[period.start, period.end], purchase__is_reversed=False
+    )
+
+    for row in _sale_flows(sales):
+        expected[row.pop('item_name_id')].update(row)
+
+    for row in _purchase_flows(purchases):
+        expected[row.pop('item_name_id')].update(row)
+
+    balances = list(models.item_balance.objects.filter(period=period).select_related('item'))
+    drift = []
+
+    for balance in balances:
+        figures = {field: _money(expected[balance.item_id].get(field)) for field in FLOWS}
+        figures['closing_quantity'] = balance.item.quantity
+        figures['closing_value'] = _money(balance.item.quantity * balance.item.purchase_price)
+
+        for field, value in figures.items():
+            if getattr(balance, field) != value:
+                drift.append({'item': balance.item_id, 'field': field, 'stored': getattr(balance, field), 'expected': value})
+                setattr(balance, field, value)
+
+    if fix and drift:
+        models.item_balance.objects.bulk_update(balances, [*FLOWS, 'closing_quantity', 'closing_value'], batch_size=1000)
+
+    return drift
+
+
+def reconcile_open_periods(business=None, fix=True):
+    """Reconciles every open month that has started. Returns {period id: number of differences}."""
+    periods = models.month_period.objects.filter(is_closed=False, start__lte=date.today()).order_by('business_id', 'start')
+
+    if business is not None:
+        periods = periods.filter(business=business)
+
+    result = {}
+
+    for period in periods:
+        drift = reconcile(period, fix=fix)
+        result[period.pk] = len(drift)
+
+        if drift:
+            logger.warning(
+                f"item_balance drift in {period.name} for business {period.business_id}: "
+                f"{len(drift)} figures, e.g. {drift[0]}"
+            )
+
+    return result
+
+
+@shared_task(name="react_work.item_valuation.reconcile_item_balances")
+def reconcile_item_balances():
+    result = reconcile_open_periods()
+    logger.info(f"Reconciled item balances of {len(result)} open months, {sum(result.values())} figures corrected")
+    return result
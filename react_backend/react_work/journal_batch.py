@@ -0,0 +1,179 @@
+from django.db import connection, transaction
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from . import models, ledger_posting
+
+CENT = Decimal('0.01')
+
+# amounts the documents work out in float can leave a cent of rounding between the two sides
+TOLERANCE = CENT
+
+GL_LEDGERS = ('asset', 'liabilities', 'equity', 'revenue', 'expenses')
+
+# account type name in the chart of accounts ('Assets', ...) -> its class ledger
+LEDGER_FOR_TYPE = {name: ledger for ledger, name in models.gl_entry.ACCOUNT_CLASSES}
+
+SUBSIDIARY_LEDGERS = {
+    'customer': models.customer_ledger,
+    'supplier': models.supplier_ledger,
+}
+
+
+class UnbalancedJournal(ValueError):
+    pass
+
+
+def _amount(value):
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def _has_side(value):
+    return value not in (None, '')
+
+
+class JournalBatch:
+    """Collects the heads, journal lines and ledger lines of one or many documents and writes
+    them with one INSERT per table in a single transaction.
+
+    head() queues a journal_head and returns it; journal() and ledger() queue lines on it.
+    save() checks that every head's debits equal its credits, both in the journal and in the
+    five class ledgers, then writes everything and returns the heads in the order queued.
+    """
+
+    def __init__(self, business, user=None):
+        self.business = business
+        self.user = user
+        self.heads = []
+        self.journals = []
+        self.ledgers = defaultdict(list)
+        self.totals = {}
+
+    def _totals(self, head):
+        return self.totals.setdefault(id(head), {'head': head, 'journal': Decimal(0), 'ledger': Decimal(0), 'carried': Decimal(0)})
+
+    def head(self, **fields):
+        head = models.journal_head(bussiness_name=self.business, created_by=self.user, **fields)
+        self.heads.append(head)
+        self._totals(head)
+        return head
+
+    def journal(self, head, **fields):
+        line = models.journal(head=head, bussiness_name=self.business, **fields)
+        self.journals.append(line)
+
+        if _has_side(line.debit):
+            self._totals(head)['journal'] += _amount(line.amount)
+        elif _has_side(line.credit):
+            self._totals(head)['journal'] -= _amount(line.amount)
+
+        return line
+
+    def ledger(self, ledger, head, **fields):
+        """Queues a row of ledger ('asset' ... 'expenses', 'customer' or 'supplier')."""
+        entry = ledger_posting.ledger_model(ledger)(head=head, bussiness_name=self.business, **fields)
+        self.ledgers[ledger].append(entry)
+
+        # customer and supplier rows repeat the receivable/payable line, so only the class ledgers balance
+        if ledger in GL_LEDGERS:
+            self._totals(head)['ledger'] += _amount(entry.debit) - _amount(entry.credit)
+
+        return entry
+
+    def carry(self, head, amount):
+        """Declares debits minus credits of head that another document settles.
+
+        A discount on a credit invoice is only booked when the invoice is paid, so the invoice
+        and the payment each leave that amount open.
+        """
+        self._totals(head)['carried'] += _amount(amount)
+
+    def reverse(self, period=None, **filters):
+        """Queues the mirror of every journal and ledger row of the business matching filters.
+
+        Reversal rows stay on the head of the row they reverse and are dated today; they keep
+        the original period unless one is given. They mirror posted rows, so they are not
+        balance-checked.
+        """
+        today = date.today()
+        filters['bussiness_name'] = self.business
+
+        for line in models.journal.objects.filter(**filters):
+            self.journals.append(models.journal(
+                entry_type="Reversal",
+                description=f'Rev - {line.description}',
+                debit=line.credit,
+                credit=line.debit,
+                amount=line.amount,
+                bussiness_name=self.business,
+                date=today,
+                transaction_number=f'Rev - {line.transaction_number}',
+                head_id=line.head_id,
+            ))
+
+        sources = [('gl', models.gl_entry)] + list(SUBSIDIARY_LEDGERS.items())
+
+        for ledger, model in sources:
+            for entry in model.objects.filter(**filters).order_by('pk'):
+                name = entry.account_class if ledger == 'gl' else ledger
+
+                self.ledgers[name].append(ledger_posting.ledger_model(name)(
+                    bussiness_name=self.business,
+                    account_id=entry.account_id,
+                    period_id=period.pk if period else entry.period_id,
+                    transaction_number=f'Rev - {entry.transaction_number}',
+                    date=today,
+                    type="Reversal",
+                    description=f'Rev - {entry.description}',
+                    debit=entry.credit,
+                    credit=entry.debit,
+                    head_id=entry.head_id,
+                ))
+
+    def validate(self):
+        for totals in self.totals.values():
+            head = totals['head']
+
+            for side in ('journal', 'ledger'):
+                if abs(totals[side] - totals['carried']) > TOLERANCE:
+                    raise UnbalancedJournal(
+                        f"{head.entry_type} {head.transaction_number}: {side} debits and credits differ by "
+                        f"{totals[side] - totals['carried']}"
+                    )
+
+    def _save_heads(self):
+        if not self.heads:
+            return
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            for head in self.heads:
+                head.code = head.code or head.generate_next_code()
+
+            models.journal_head.objects.bulk_create(self.heads)
+            return
+
+        # without RETURNING the new ids are unknown after a bulk insert, and the lines need them
+        for head in self.heads:
+            head.save()
+
+    def save(self):
+        self.validate()
+
+        with transaction.atomic():
+            self._save_heads()
+            models.journal.objects.bulk_create(self.journals, batch_size=1000)
+
+            stale = {ledger: ledger_posting.assign_balances(ledger, entries) for ledger, entries in self.ledgers.items()}
+
+            # the five class ledgers share gl_entry, so their rows go in together
+            models.gl_entry.objects.bulk_create(
+                [entry for ledger in GL_LEDGERS for entry in self.ledgers.get(ledger, [])], batch_size=1000
+            )
+
+            for ledger, model in SUBSIDIARY_LEDGERS.items():
+                model.objects.bulk_create(self.ledgers.get(ledger, []), batch_size=1000)
+
+            for ledger, entries in stale.items():
+                ledger_posting.recompute_stale(ledger, entries)
+
+        return self.heads
@@ -0,0 +1,85 @@
+from django.core import signing
+from django.db.models import F, Q
+from datetime import date, datetime
+from decimal import Decimal
+
+CURSOR_SALT = 'react_work.keyset'
+
+# document codes are unique, so the code alone fixes a row's position
+BY_CODE_DESC = [('code', True)]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _dump(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+
+    if isinstance(value, Decimal):
+        return str(value)
+
+    return value
+
+
+def encode_cursor(values):
+    return signing.dumps([_dump(v) for v in values], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise InvalidCursor('Invalid cursor')
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor('Invalid cursor')
+
+    return values
+
+
+def _after(names, descending, values):
+    """Rows strictly after the cursor row in (name_1, name_2, ...) order."""
+    condition = Q()
+
+    for index, name in enumerate(names):
+        lookup = f"{name}__{'lt' if descending[index] else 'gt'}"
+        step = Q(**{lookup: values[index]})
+
+        for previous in range(index):
+            step &= Q(**{names[previous]: values[previous]})
+
+        condition |= step
+
+    return condition
+
+
+def keyset_page(queryset, keys, cursor, page_quantity=30):
+    """Returns (rows, next_cursor) for a values() queryset.
+
+    keys is the page order as [(expression or field name, descending)], and must end in a unique
+    column so no two rows share a position. An empty cursor starts at the first page.
+    """
+    names = [f'keyset_{index}' for index in range(len(keys))]
+    descending = [desc for _, desc in keys]
+
+    queryset = queryset.annotate(**{
+        name: F(expression) if isinstance(expression, str) else expression
+        for name, (expression, _) in zip(names, keys)
+    }).order_by(*[f"{'-' if desc else ''}{name}" for name, desc in zip(names, descending)])
+
+    if cursor:
+        queryset = queryset.filter(_after(names, descending, decode_cursor(cursor, len(names))))
+
+    rows = list(queryset[:page_quantity + 1])
+    has_more = len(rows) > page_quantity
+    rows = rows[:page_quantity]
+
+    next_cursor = encode_cursor([rows[-1][name] for name in names]) if has_more else None
+
+    for row in rows:
+        for name in names:
+            row.pop(name, None)
+
+    return rows, next_cursor
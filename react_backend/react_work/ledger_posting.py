@@ -0,0 +1,229 @@
+from django.db import transaction
+from django.db.models import Sum, Max, Value, DecimalField
+from django.db.models.functions import Coalesce
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from . import models
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ledger name -> (model name, +1 when the account's normal balance is a debit, -1 when it is a credit)
+LEDGERS = {
+    'asset': ('asset_ledger', 1),
+    'liabilities': ('liabilities_ledger', -1),
+    'equity': ('equity_ledger', -1),
+    'revenue': ('revenue_ledger', -1),
+    'expenses': ('expenses_ledger', 1),
+    'customer': ('customer_ledger', 1),
+    'supplier': ('supplier_ledger', -1),
+}
+
+ZERO = Decimal('0.00')
+
+
+def ledger_model(ledger):
+    return getattr(models, LEDGERS[ledger][0])
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+
+    return value
+
+
+def _movement(ledger, debit, credit):
+    return (Decimal(str(debit or 0)) - Decimal(str(credit or 0))) * LEDGERS[ledger][1]
+
+
+def _lock_heads(ledger, business_id, keys):
+    """Returns the balance heads for keys locked for update, creating missing ones from existing entries."""
+    account_ids = {account_id for account_id, _ in keys}
+    period_ids = {period_id for _, period_id in keys}
+
+    def locked():
+        query = models.ledger_balance_head.objects.select_for_update().filter(
+            ledger=ledger, account_id__in=account_ids, period_id__in=period_ids
+        ).order_by('pk')
+        return {(h.account_id, h.period_id): h for h in query}
+
+    heads = locked()
+    missing = [key for key in keys if key not in heads]
+
+    if not missing:
+        return heads
+
+    # seed new heads from rows written before heads existed so their balances carry on
+    seeds = {
+        (row['account_id'], row['period_id']): row
+        for row in ledger_model(ledger).objects.filter(
+            account_id__in={a for a, _ in missing}, period_id__in={p for _, p in missing}
+        ).values('account_id', 'period_id').annotate(
+            debit_total=Coalesce(Sum('debit'), Value(ZERO, output_field=DecimalField())),
+            credit_total=Coalesce(Sum('credit'), Value(ZERO, output_field=DecimalField())),
+            last_date=Max('date'),
+        )
+    }
+
+    new_heads = []
+    for account_id, period_id in missing:
+        seed = seeds.get((account_id, period_id), {})
+        debit_total = seed.get('debit_total', ZERO)
+        credit_total = seed.get('credit_total', ZERO)
+
+        new_heads.append(models.ledger_balance_head(
+            business_id=business_id, ledger=ledger, account_id=account_id, period_id=period_id,
+            debit_total=debit_total, credit_total=credit_total,
+            balance=_movement(ledger, debit_total, credit_total), last_date=seed.get('last_date'),
+        ))
+
+    # a concurrent poster may have created some of them; the re-select picks theirs up
+    models.ledger_balance_head.objects.bulk_create(new_heads, ignore_conflicts=True)
+
+    return locked()
+
+
+def assign_balances(ledger, entries):
+    """Sets each unsaved entry's running balance from its head and moves the heads forward.
+
+    Returns {(account_id, period_id): earliest date} for entries dated before the latest entry
+    already posted, whose later balances must be recomputed once the entries are saved.
+    Must run inside transaction.atomic().
+    """
+    groups = defaultdict(list)
+    business_id = None
+
+    for entry in entries:
+        # leave incomplete rows alone so the insert fails the way it always has
+        if entry.account_id is None or entry.period_id is None:
+            continue
+
+        groups[(entry.account_id, entry.period_id)].append(entry)
+        business_id = entry.bussiness_name_id
+
+    if not groups:
+        return {}
+
+    heads = _lock_heads(ledger, business_id, list(groups))
+    stale = {}
+
+    for key, group in groups.items():
+        head = heads[key]
+
+        for entry in sorted(group, key=lambda e: _as_date(e.date)):
+            entry_date = _as_date(entry.date)
+
+            if head.last_date and entry_date < head.last_date:
+                stale[key] = min(entry_date, stale.get(key, entry_date))
+
+            head.debit_total += Decimal(str(entry.debit or 0))
+            head.credit_total += Decimal(str(entry.credit or 0))
+            head.balance += _movement(ledger, entry.debit, entry.credit)
+            head.last_date = max(entry_date, head.last_date) if head.last_date else entry_date
+            entry.balance = head.balance
+
+    models.ledger_balance_head.objects.bulk_update(
+        [heads[key] for key in groups], ['debit_total', 'credit_total', 'balance', 'last_date']
+    )
+
+    return stale
+
+
+def recompute_stale(ledger, stale):
+    for (account_id, period_id), from_date in stale.items():
+        recompute(ledger, account_id, period_id, from_date=from_date)
+
+
+def post(ledger, entries):
+    """Inserts many unsaved entries of one ledger with a single INSERT and one head update."""
+    entries = list(entries)
+
+    with transaction.atomic():
+        stale = assign_balances(ledger, entries)
+        ledger_model(ledger).objects.bulk_create(entries)
+        recompute_stale(ledger, stale)
+
+    return entries
+
+
+def save_entry(entry, ledger, save, *args, **kwargs):
+    """save() body for ledger models: inserts go through the balance head, updates save as-is."""
+    if not entry._state.adding:
+        return save(*args, **kwargs)
+
+    with transaction.atomic():
+        stale = assign_balances(ledger, [entry])
+        save(*args, **kwargs)
+        recompute_stale(ledger, stale)
+
+
+def recompute(ledger, account_id, period_id, from_date=None):
+    """Rewrites running balances of one (account, period) from from_date on and resets its head."""
+    model = ledger_model(ledger)
+    zero = Value(ZERO, output_field=DecimalField())
+
+    with transaction.atomic():
+        head = models.ledger_balance_head.objects.select_for_update().filter(
+            ledger=ledger, account_id=account_id, period_id=period_id
+        ).first()
+
+        rows = model.objects.filter(account_id=account_id, period_id=period_id)
+        running = ZERO
+
+        if from_date:
+            before = rows.filter(date__lt=from_date).aggregate(
+                debit=Coalesce(Sum('debit'), zero), credit=Coalesce(Sum('credit'), zero)
+            )
+            running = _movement(ledger, before['debit'], before['credit'])
+            rows = rows.filter(date__gte=from_date)
+
+        changed = []
+        for row in rows.order_by('date', 'id').only('id', 'debit', 'credit', 'balance').iterator(chunk_size=2000):
+            running += _movement(ledger, row.debit, row.credit)
+
+            if row.balance != running:
+                row.balance = running
+                changed.append(row)
+
+        model.objects.bulk_update(changed, ['balance'], batch_size=1000)
+
+        totals = model.objects.filter(account_id=account_id, period_id=period_id).aggregate(
+            debit=Coalesce(Sum('debit'), zero), credit=Coalesce(Sum('credit'), zero),
+            last_date=Max('date'), business_id=Max('bussiness_name_id'),
+        )
+
+        if head is None and totals['business_id'] is None:
+            return len(changed)
+
+        if head is None:
+            head = models.ledger_balance_head(ledger=ledger, account_id=account_id, period_id=period_id,
+                                              business_id=totals['business_id'])
+
+        head.debit_total = totals['debit']
+        head.credit_total = totals['credit']
+        head.balance = _movement(ledger, totals['debit'], totals['credit'])
+        head.last_date = totals['last_date']
+        head.save()
+
+    return len(changed)
+
+
+def recompute_business(business, ledgers=None, start=None):
+    """Recomputes every (account, period) window of a business, optionally only periods ending on/after start."""
+    count = 0
+
+    for ledger in ledgers or LEDGERS:
+        windows = ledger_model(ledger).objects.filter(bussiness_name=business)
+
+        if start:
+            windows = windows.filter(period__end__gte=start)
+
+        for window in windows.values('account_id', 'period_id').distinct().order_by('account_id', 'period_id'):
+            count += recompute(ledger, window['account_id'], window['period_id'], from_date=start)
+
+    return count
@@ -0,0 +1,144 @@
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from . import models, item_catalogue
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = getattr(settings, 'LOCATION_PROVISION_CHUNK_SIZE', 2000)
+
+# a new location with more items than this gets its rows from a worker instead of the request
+ASYNC_THRESHOLD = getattr(settings, 'LOCATION_PROVISION_ASYNC_THRESHOLD', 2000)
+
+PROGRESS_TTL = 60 * 60
+
+
+def _progress_key(location_id):
+    return f'location_provisioning:{location_id}'
+
+
+def _report(location_id, status, done, total):
+    try:
+        cache.set(_progress_key(location_id), {'status': status, 'done': done, 'total': total}, PROGRESS_TTL)
+    except Exception as error:
+        logger.warning(error)
+
+
+def progress(location_id):
+    """Returns {'status', 'done', 'total'} of the last provisioning of a location, or None."""
+    try:
+        return cache.get(_progress_key(location_id))
+    except Exception as error:
+        logger.warning(error)
+        return None
+
+
+def _create(rows):
+    # the unique (item, location) constraint turns rows that already exist into no-ops
+    models.location_items.objects.bulk_create(rows, batch_size=CHUNK_SIZE, ignore_conflicts=True)
+
+
+def provision_item(item):
+    """Creates the item's row in every location of its business."""
+    locations = models.inventory_location.objects.filter(bussiness_name_id=item.bussiness_name_id).values_list('pk', flat=True)
+
+    _create([
+        models.location_items(item_name_id=item.pk, location_id=location, quantity=0,
+                              bussiness_name_id=item.bussiness_name_id, sales_price=item.sales_price)
+        for location in locations
+    ])
+
+
+def provision_location(location, chunk_size=CHUNK_SIZE, on_progress=None):
+    """Creates the location's row for every item of its business, chunk_size items per INSERT.
+
+    Returns the number of items covered; on_progress(done, total) is called after each chunk.
+    """
+    items = models.items.objects.filter(bussiness_name_id=location.bussiness_name_id).order_by('pk')
+    total = items.count()
+    done = 0
+    last = 0
+
+    while True:
+        chunk = list(items.filter(pk__gt=last).values_list('pk', 'sales_price')[:chunk_size])
+
+        if not chunk:
+            break
+
+        _create([
+            models.location_items(item_name_id=pk, location_id=location.pk, quantity=0,
+                                  bussiness_name_id=location.bussiness_name_id, sales_price=price)
+            for pk, price in chunk
+        ])
+
+        last = chunk[-1][0]
+        done += len(chunk)
+
+        if on_progress:
+            on_progress(done, total)
+
+    item_catalogue.invalidate(location.bussiness_name_id)
+
+    return done
+
+
+def materialize(business, location, item_ids):
+    """Creates the missing rows of item_ids at location; used on first movement by lazy businesses."""
+    prices = list(
+        models.items.objects.filter(bussiness_name=business, pk__in=set(item_ids))
+        .exclude(location_items__location=location).values_list('pk', 'sales_price')
+    )
+
+    if not prices:
+        return
+
+    _create([
+        models.location_items(item_name_id=pk, location_id=location.pk, quantity=0, bussiness_name_id=business.pk, sales_price=price)
+        for pk, price in prices
+    ])
+    item_catalogue.invalidate(business.pk)
+
+
+def _is_lazy(business_id):
+    return models.bussiness.objects.filter(pk=business_id, lazy_location_items=True).exists()
+
+
+def on_item_created(item):
+    if not _is_lazy(item.bussiness_name_id):
+        provision_item(item)
+
+
+def on_location_created(location):
+    if _is_lazy(location.bussiness_name_id):
+        return
+
+    total = models.items.objects.filter(bussiness_name_id=location.bussiness_name_id).count()
+
+    if total <= ASYNC_THRESHOLD:
+        provision_location(location)
+        return
+
+    _report(location.pk, 'Pending', 0, total)
+    transaction.on_commit(lambda: provision_location_items.delay(location.pk))
+
+
+@shared_task(name="react_work.location_provisioning.provision_location_items")
+def provision_location_items(location_id):
+    location = models.inventory_location.objects.filter(pk=location_id).first()
+
+    if location is None:
+        logger.warning(f"Location {location_id} was deleted before its items were provisioned")
+        return 0
+
+    try:
+        done = provision_location(location, on_progress=lambda done, total: _report(location_id, 'Running', done, total))
+    except Exception:
+        logger.exception(f"Provisioning items for location {location_id} failed")
+        _report(location_id, 'Failed', 0, 0)
+        raise
+
+    _report(location_id, 'Done', done, done)
+    logger.info(f"Provisioned {done} items for location {location_id}")
+    return done
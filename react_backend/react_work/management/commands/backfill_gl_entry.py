@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from react_work import general_ledger
+
+
+class Command(BaseCommand):
+    help = 'Copies rows from the old per-class ledger tables into gl_entry and checks the copy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--class', dest='classes', action='append', choices=list(general_ledger.CLASS_NAMES),
+                            help='Account class to backfill; may be repeated, all classes when omitted')
+        parser.add_argument('--batch-size', type=int, default=general_ledger.BATCH_SIZE,
+                            help='Legacy ids copied per statement')
+        parser.add_argument('--verify', action='store_true', help='Only compare the old tables with gl_entry')
+        parser.add_argument('--drop-legacy', action='store_true',
+                            help='Drop old tables whose rows and totals match gl_entry after backfilling')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        if not options['verify']:
+            copied = general_ledger.backfill(options['classes'], batch_size=options['batch_size'])
+
+            for account_class, count in copied.items():
+                self.stdout.write(f"{account_class}: {count} rows copied")
+
+        for account_class, totals in general_ledger.compare_legacy().items():
+            if options['classes'] and account_class not in options['classes']:
+                continue
+
+            self.stdout.write(
+                f"{account_class}: legacy {totals['legacy_rows']} rows "
+                f"{totals['legacy_debit']}/{totals['legacy_credit']}, "
+                f"gl_entry {totals['copied_rows']} rows {totals['copied_debit']}/{totals['copied_credit']}"
+            )
+
+        if options['drop_legacy'] and not options['verify']:
+            for table in general_ledger.drop_legacy(options['classes']):
+                self.stdout.write(f"Dropped {table}")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from react_work import item_import
+
+
+class Command(BaseCommand):
+    help = "Creates items in bulk from a CSV or XLSX file with the add_items columns"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='CSV or XLSX file; the first row names the columns')
+        parser.add_argument('--business', required=True, help='Business name')
+        parser.add_argument('--user', required=True, help='User recorded as the creator')
+        parser.add_argument('--chunk-size', type=int, default=item_import.CHUNK_SIZE, help='Rows per transaction')
+
+    def handle(self, *args, **options):
+        try:
+            upload = open(options['file'], 'rb')
+        except OSError as error:
+            raise CommandError(error)
+
+        with upload:
+            result = item_import.import_items(
+                business=options['business'], user=options['user'],
+                rows=item_import.read_rows(upload, options['file']), chunk_size=options['chunk_size'],
+            )
+
+        if result['status'] != 'success':
+            raise CommandError(result['message'])
+
+        for error in result['data']['errors']:
+            self.stderr.write(f"row {error['row']} ({error['name']}): {error['message']}")
+
+        self.stdout.write(f"{result['message']} in {result['data']['seconds']}s ({result['data']['rows_per_second']} rows/s)")
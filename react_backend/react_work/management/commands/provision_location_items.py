@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from react_work import models, location_provisioning, tenant_context
+
+
+class Command(BaseCommand):
+    help = "Creates the missing location_items rows of a business, or switches it to creating them on first movement"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', required=True, help='Business name')
+        parser.add_argument('--location', help='Location name; all locations when omitted')
+        parser.add_argument('--lazy', action='store_true', help='Only create rows when stock first moves to a location')
+        parser.add_argument('--eager', action='store_true', help='Create rows for every item and location again')
+
+    def handle(self, *args, **options):
+        business = models.bussiness.objects.filter(bussiness_name=options['business']).first()
+
+        if business is None:
+            raise CommandError(f"Business '{options['business']}' not found")
+
+        if options['lazy'] and options['eager']:
+            raise CommandError('Use either --lazy or --eager')
+
+        if options['lazy'] or options['eager']:
+            business.lazy_location_items = options['lazy']
+            business.save(update_fields=['lazy_location_items'])
+            tenant_context.invalidate_business(business.bussiness_name)
+
+        if business.lazy_location_items:
+            self.stdout.write(f"{business.bussiness_name} creates location rows on first movement")
+            return
+
+        locations = models.inventory_location.objects.filter(bussiness_name=business)
+
+        if options['location']:
+            locations = locations.filter(location_name=options['location'])
+
+        for location in locations:
+            done = location_provisioning.provision_location(location)
+            self.stdout.write(f"{location.location_name}: {done} items provisioned")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from datetime import datetime
+from react_work import models, daily_summary
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily sales/purchase summary tables used by the dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', help='Business name; all businesses when omitted')
+        parser.add_argument('--start', help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last date to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else None
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else None
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format')
+
+        businesses = models.bussiness.objects.order_by('pk')
+        if options['business']:
+            businesses = businesses.filter(bussiness_name=options['business'])
+
+            if not businesses.exists():
+                raise CommandError(f"Business '{options['business']}' not found")
+
+        for business in businesses:
+            result = daily_summary.rebuild(business, start=start, end=end)
+            self.stdout.write(f"{business.bussiness_name}: {result['days']} days, {result['items']} item rows")
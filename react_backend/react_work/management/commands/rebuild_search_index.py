@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from react_work import models, search_index
+
+
+class Command(BaseCommand):
+    help = "Re-creates the search terms of items, customers, suppliers and sales"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', help='Business name; all businesses when omitted')
+        parser.add_argument('--kind', action='append', choices=list(search_index.KINDS), help='What to index; everything when omitted')
+        parser.add_argument('--chunk-size', type=int, default=search_index.CHUNK_SIZE)
+        parser.add_argument('--missing', action='store_true', help='Only businesses whose index was never built')
+
+    def handle(self, *args, **options):
+        businesses = models.bussiness.objects.filter(pending_deletion=False).order_by('pk')
+
+        if options['business']:
+            businesses = businesses.filter(bussiness_name=options['business'])
+
+            if not businesses.exists():
+                raise CommandError(f"Business '{options['business']}' not found")
+
+        if options['missing']:
+            businesses = businesses.filter(search_indexed=False)
+
+        for business in businesses:
+            result = search_index.rebuild(business, kinds=options['kind'], chunk_size=options['chunk_size'])
+            counts = ', '.join(f'{count} {kind}s' for kind, count in result.items())
+            self.stdout.write(f"{business.bussiness_name}: {counts}")
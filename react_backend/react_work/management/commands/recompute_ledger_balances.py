@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from datetime import datetime
+from react_work import models, ledger_posting
+
+
+class Command(BaseCommand):
+    help = 'Recomputes ledger running balances and balance heads, e.g. after a backdated import'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', help='Business name; all businesses when omitted')
+        parser.add_argument('--ledger', action='append', choices=list(ledger_posting.LEDGERS),
+                            help='Ledger to recompute; may be repeated, all ledgers when omitted')
+        parser.add_argument('--start', help='Only recompute entries dated on/after this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else None
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format')
+
+        businesses = models.bussiness.objects.order_by('pk')
+        if options['business']:
+            businesses = businesses.filter(bussiness_name=options['business'])
+
+            if not businesses.exists():
+                raise CommandError(f"Business '{options['business']}' not found")
+
+        for business in businesses:
+            changed = ledger_posting.recompute_business(business, ledgers=options['ledger'], start=start)
+            self.stdout.write(f"{business.bussiness_name}: {changed} balances corrected")
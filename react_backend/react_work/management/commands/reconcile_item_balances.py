@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from react_work import models, item_valuation
+
+
+class Command(BaseCommand):
+    help = "Checks the open months' item_balance rows against the posted sales and purchases"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', help='Business name; all businesses when omitted')
+        parser.add_argument('--fix', action='store_true', help='Correct the rows that differ')
+
+    def handle(self, *args, **options):
+        business = None
+
+        if options['business']:
+            business = models.bussiness.objects.filter(bussiness_name=options['business']).first()
+
+            if business is None:
+                raise CommandError(f"Business '{options['business']}' not found")
+
+        result = item_valuation.reconcile_open_periods(business=business, fix=options['fix'])
+        periods = {period.pk: period for period in models.month_period.objects.filter(pk__in=list(result)).select_related('business')}
+
+        for period_id, drift in result.items():
+            period = periods[period_id]
+            action = 'corrected' if options['fix'] else 'differ'
+            self.stdout.write(f"{period.business.bussiness_name} {period.name}: {drift} figures {action}")
@@ -0,0 +1,27 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='document_sequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(max_length=20)),
+                ('year', models.IntegerField(default=0)),
+                ('last_value', models.BigIntegerField(default=0)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.bussiness')),
+            ],
+            options={
+                'unique_together': {('business', 'doc_type', 'year')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0002_document_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='export_job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50)),
+                ('format', models.CharField(max_length=10)),
+                ('params', models.JSONField(default=dict)),
+                ('params_hash', models.CharField(max_length=64)),
+                ('status', models.CharField(default='Pending', max_length=20)),
+                ('progress', models.IntegerField(default=0)),
+                ('file', models.FileField(blank=True, upload_to='exports')),
+                ('filename', models.CharField(blank=True, default='', max_length=255)),
+                ('message', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.bussiness')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.current_user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'params_hash', 'status'], name='react_work__user_id_05d827_idx'), models.Index(fields=['expires_at'], name='react_work__expires_434548_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0003_export_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cash_receipt',
+            index=models.Index(fields=['bussiness_name', 'code'], name='react_work__bussine_695b4a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory_transfer',
+            index=models.Index(fields=['bussiness_name', 'code'], name='react_work__bussine_99fd59_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journal_head',
+            index=models.Index(fields=['bussiness_name', 'code'], name='react_work__bussine_d9bc04_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['bussiness_name', 'code'], name='react_work__bussine_5c76b0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['bussiness_name', 'code'], name='react_work__bussine_302415_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['bussiness_name', 'code'], name='react_work__bussine_0a8774_idx'),
+        ),
+    ]
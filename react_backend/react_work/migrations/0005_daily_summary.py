@@ -0,0 +1,51 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:40
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='daily_item_sales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.bussiness')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.items')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.inventory_location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['business', 'date'], name='react_work__busines_0f470f_idx')],
+                'unique_together': {('business', 'location', 'date', 'item')},
+            },
+        ),
+        migrations.CreateModel(
+            name='daily_stock_summary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('sales_value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('sales_quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('sales_count', models.IntegerField(default=0)),
+                ('cogs', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('purchase_value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('purchase_quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('purchase_count', models.IntegerField(default=0)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.bussiness')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.inventory_location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['business', 'date'], name='react_work__busines_9c8d42_idx')],
+                'unique_together': {('business', 'location', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:42
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0005_daily_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ledger_balance_head',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ledger', models.CharField(max_length=20)),
+                ('account_id', models.BigIntegerField()),
+                ('debit_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('credit_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('last_date', models.DateField(blank=True, null=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.bussiness')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.month_period')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['business', 'ledger'], name='react_work__busines_f07933_idx')],
+                'unique_together': {('ledger', 'account_id', 'period')},
+            },
+        ),
+    ]
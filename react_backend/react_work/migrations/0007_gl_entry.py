@@ -0,0 +1,124 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:45
+
+import datetime
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+LEGACY_LEDGERS = ['asset_ledger', 'liabilities_ledger', 'equity_ledger', 'revenue_ledger', 'expenses_ledger']
+
+LEGACY_FOREIGN_KEYS = [
+    ('head', 'react_work.journal_head', django.db.models.deletion.PROTECT),
+    ('account', 'react_work.real_account', django.db.models.deletion.PROTECT),
+    ('period', 'react_work.month_period', django.db.models.deletion.PROTECT),
+    ('bussiness_name', 'react_work.bussiness', django.db.models.deletion.CASCADE),
+]
+
+
+# frozen copies of general_ledger's constants, so later changes there cannot alter this migration
+ACCOUNT_CLASSES = ['asset', 'liabilities', 'equity', 'revenue', 'expenses']
+
+COLUMNS = [
+    'head_id', 'account_id', 'period_id', 'transaction_number', 'date', 'type',
+    'description', 'debit', 'credit', 'balance', 'bussiness_name_id',
+]
+
+BATCH_SIZE = 20000
+
+
+def backfill_gl_entry(apps, schema_editor):
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    target = quote(apps.get_model('react_work', 'gl_entry')._meta.db_table)
+    columns = ', '.join(quote(column) for column in COLUMNS)
+    source_columns = ', '.join(f'l.{quote(column)}' for column in COLUMNS)
+
+    for account_class in ACCOUNT_CLASSES:
+        source = quote(apps.get_model('react_work', f'{account_class}_ledger')._meta.db_table)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT MIN(id), MAX(id) FROM {source}')
+            low, high = cursor.fetchone()
+
+            if low is None:
+                continue
+
+            for start in range(low, high + 1, BATCH_SIZE):
+                cursor.execute(
+                    f'INSERT INTO {target} (account_class, legacy_id, {columns}) '
+                    f'SELECT %s, l.id, {source_columns} FROM {source} l '
+                    f'WHERE l.id >= %s AND l.id < %s ORDER BY l.id',
+                    [account_class, start, start + BATCH_SIZE],
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0006_ledger_balance_head'),
+    ]
+
+    operations = [
+        # the old tables are kept for checking the backfill; without their foreign key
+        # constraints they no longer block deleting journals, accounts or periods
+        *[
+            migrations.AlterField(
+                model_name=ledger,
+                name=name,
+                field=models.ForeignKey(db_constraint=False, on_delete=on_delete, to=to),
+            )
+            for ledger in LEGACY_LEDGERS
+            for name, to, on_delete in LEGACY_FOREIGN_KEYS
+        ],
+        migrations.CreateModel(
+            name='gl_entry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_class', models.CharField(choices=[('asset', 'Assets'), ('liabilities', 'Liabilities'), ('equity', 'Equity'), ('revenue', 'Revenue'), ('expenses', 'Expenses')], max_length=20)),
+                ('transaction_number', models.CharField(max_length=100)),
+                ('date', models.DateField(default=datetime.date.today)),
+                ('type', models.CharField(default='', max_length=100)),
+                ('description', models.CharField(default='', max_length=100)),
+                ('debit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('credit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('legacy_id', models.BigIntegerField(blank=True, null=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='react_work.real_account')),
+                ('bussiness_name', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.bussiness')),
+                ('head', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='react_work.journal_head')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='react_work.month_period')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['bussiness_name', 'period', 'account_class', 'account'], name='react_work__bussine_30b091_idx'),
+                    models.Index(fields=['account', 'period', 'date', 'id'], name='react_work__account_83e248_idx'),
+                    models.Index(fields=['bussiness_name', 'date'], name='react_work__bussine_bc272a_idx'),
+                ],
+                'constraints': [
+                    models.UniqueConstraint(fields=('account_class', 'legacy_id'), name='gl_entry_unique_legacy_row'),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_gl_entry, migrations.RunPython.noop),
+        # the per-class models become filtered proxies of gl_entry; their tables stay in the
+        # database until dropped with `backfill_gl_entry --drop-legacy`
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                *[migrations.DeleteModel(name=ledger) for ledger in LEGACY_LEDGERS],
+                *[
+                    migrations.CreateModel(
+                        name=ledger,
+                        fields=[],
+                        options={
+                            'proxy': True,
+                            'indexes': [],
+                            'constraints': [],
+                        },
+                        bases=('react_work.gl_entry',),
+                    )
+                    for ledger in LEGACY_LEDGERS
+                ],
+            ],
+        ),
+    ]
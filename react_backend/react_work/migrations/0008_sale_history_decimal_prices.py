@@ -0,0 +1,23 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0007_gl_entry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale_history',
+            name='purchase_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='sale_history',
+            name='sales_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:51
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0008_sale_history_decimal_prices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='report_snapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report', models.CharField(max_length=30)),
+                ('filters_hash', models.CharField(default='', max_length=40)),
+                ('filters', models.JSONField(default=dict)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.bussiness')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.month_period')),
+            ],
+            options={
+                'unique_together': {('business', 'report', 'period', 'filters_hash')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:55
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def fill_open_months(apps, schema_editor):
+    # open months only had their flows filled at closing; bring them up to date once
+    from react_work.item_valuation import reconcile_open_periods
+
+    reconcile_open_periods()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0009_report_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item_balance',
+            name='cost_sold',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.RunPython(fill_open_months, migrations.RunPython.noop),
+    ]
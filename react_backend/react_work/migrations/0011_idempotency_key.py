@@ -0,0 +1,30 @@
+# Generated by Django 6.1.2 on 2026-10-18 00:02
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0010_item_balance_cost_sold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='idempotency_key',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=30)),
+                ('key', models.CharField(max_length=100)),
+                ('response', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.bussiness')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='react_work__created_45fc3f_idx')],
+                'unique_together': {('business', 'scope', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-18 00:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0011_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotency_key',
+            name='fingerprint',
+            field=models.CharField(default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.1.2 on 2026-10-18 00:08
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_location_items(apps, schema_editor):
+    # get_or_create(quantity=0) added a second row whenever the first one held stock;
+    # fold each pair's stock into its oldest row before the constraint goes on
+    location_items = apps.get_model('react_work', 'location_items')
+
+    duplicates = location_items.objects.values('item_name_id', 'location_id').annotate(
+        rows=Count('pk'), keep=Min('pk'), total=Sum('quantity')
+    ).filter(rows__gt=1).order_by()
+
+    for pair in duplicates:
+        rows = location_items.objects.filter(item_name_id=pair['item_name_id'], location_id=pair['location_id'])
+        rows.filter(pk=pair['keep']).update(quantity=pair['total'])
+        rows.exclude(pk=pair['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0012_idempotency_key_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bussiness',
+            name='lazy_location_items',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(merge_duplicate_location_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='location_items',
+            constraint=models.UniqueConstraint(fields=('item_name', 'location'), name='location_items_unique_item_location'),
+        ),
+    ]
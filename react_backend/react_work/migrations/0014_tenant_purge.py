@@ -0,0 +1,38 @@
+# Generated by Django 6.1.2 on 2026-10-18 00:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0013_location_items_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bussiness',
+            name='pending_deletion',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='tenant_purge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_id', models.BigIntegerField()),
+                ('business_name', models.CharField(max_length=100)),
+                ('requested_by', models.CharField(default='', max_length=150)),
+                ('user_ids', models.JSONField(default=list)),
+                ('status', models.CharField(default='Pending', max_length=20)),
+                ('step', models.CharField(blank=True, default='', max_length=50)),
+                ('deleted', models.JSONField(default=dict)),
+                ('message', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'updated_at'], name='react_work__status_48a140_idx'), models.Index(fields=['business_id'], name='react_work__busines_97436e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.1.2 on 2026-10-18 00:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0014_tenant_purge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='activity_archive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('rows', models.IntegerField(default=0)),
+                ('file', models.FileField(upload_to='activity_archive')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='tracking_history',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='tracking_history',
+            index=models.Index(fields=['bussiness_name', 'user', 'date'], name='react_work__bussine_01eec1_idx'),
+        ),
+        migrations.AddField(
+            model_name='activity_archive',
+            name='business',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.bussiness'),
+        ),
+        migrations.AddIndex(
+            model_name='activity_archive',
+            index=models.Index(fields=['business', 'month'], name='react_work__busines_baa854_idx'),
+        ),
+    ]
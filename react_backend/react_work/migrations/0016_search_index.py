@@ -0,0 +1,39 @@
+# Generated by Django 6.1.2 on 2026-10-18 00:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0015_activity_log'),
+    ]
+
+    operations = [
+        # existing businesses search the tables until rebuild_search_index has run for them
+        migrations.AddField(
+            model_name='bussiness',
+            name='search_indexed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='bussiness',
+            name='search_indexed',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='search_term',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('term', models.CharField(max_length=40)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='react_work.bussiness')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['business', 'kind', 'term'], name='react_work__busines_95b663_idx'), models.Index(fields=['business', 'kind', 'object_id'], name='react_work__busines_a40779_idx')],
+            },
+        ),
+    ]
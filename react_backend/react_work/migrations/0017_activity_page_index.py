@@ -0,0 +1,21 @@
+# Generated by Django 6.1.2 on 2026-10-18 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('react_work', '0016_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='tracking_history',
+            name='react_work__bussine_e76523_idx',
+        ),
+        migrations.AddIndex(
+            model_name='tracking_history',
+            index=models.Index(fields=['bussiness_name', 'date', 'id'], name='react_work__bussine_6a63cb_idx'),
+        ),
+    ]
@@ -6,6 +6,10 @@ from decimal import Decimal
 import calendar
 from django.utils.translation import gettext_lazy as _
 from django.db.models import Index
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from .sequence import next_number, last_code_seed
+from .ledger_posting import save_entry, recompute
 import re
 
 class company_info(models.Model):
@@ -38,6 +42,10 @@ class bussiness(models.Model):
     user_created = models.CharField(max_length = 100, default='')
     user_deleted = models.CharField(max_length = 100, default='')
     company = models.ForeignKey(User, on_delete=models.CASCADE)
+    lazy_location_items = models.BooleanField(default=False)
+    pending_deletion = models.BooleanField(default=False)
+    # False until rebuild_search_index has filled search_term for the rows created before it existed
+    search_indexed = models.BooleanField(default=True)
 
     def __str__(self):
         return self.bussiness_name
@@ -137,12 +145,15 @@ class tracking_history(models.Model):
     user = models.ForeignKey(current_user, on_delete=models.PROTECT)
     area = models.CharField(max_length=100, default='')
     head = models.CharField(max_length=100, default='')
-    date = models.DateTimeField(auto_now_add=True)
+    # set when the action happens; activity_log writes the row later
+    date = models.DateTimeField(default=timezone.now)
     bussiness_name = models.ForeignKey(bussiness, on_delete=models.CASCADE)
 
     class Meta:
+        # the activity pages are read newest first by (date, id)
         indexes = [
-            Index(fields=['bussiness_name','date']),
+            Index(fields=['bussiness_name','date','id']),
+            Index(fields=['bussiness_name','user','date']),
             Index(fields=['user']),
         ]
 
@@ -169,8 +180,8 @@ class supplier(models.Model):
 
     def generate_next_code(self):
         id = self.bussiness_name.pk
-        last = supplier.objects.filter(bussiness_name=self.bussiness_name).order_by('-id').first()
-        next_code = 1 if not last else int(last.account[-5:]) + 1
+        next_code = next_number(self.bussiness_name, 'SUP', 0,
+                                seed=last_code_seed(supplier, 'account', bussiness_name=self.bussiness_name))
         return f"SUP{id}-{next_code:05d}"
 
     def save(self, *args, **kwargs):
@@ -222,8 +233,8 @@ class customer(models.Model):
 
     def generate_next_code(self):
         id = self.bussiness_name.pk
-        last = customer.objects.filter(bussiness_name=self.bussiness_name).order_by('-id').first()
-        next_code = 1 if not last else int(last.account[-5:]) + 1
+        next_code = next_number(self.bussiness_name, 'CUST', 0,
+                                seed=last_code_seed(customer, 'account', bussiness_name=self.bussiness_name))
         return f"CUST{id}-{next_code:05d}"
 
     def save(self, *args, **kwargs):
@@ -348,29 +359,39 @@ class items(models.Model):
     def __str__(self):
         return self.item_name
     
-    def generate_item_code(self):
-        prefix = 'IT'
+    @staticmethod
+    def code_prefix(category):
         try:
-            if self.category and getattr(self.category, 'name', None):
-                prefix = self.category.name[:2].upper()
+            if category and getattr(category, 'name', None):
+                return category.name[:2].upper()
 
         except Exception:
-            prefix = 'IT'
+            pass
 
-        last = items.objects.filter(
-            bussiness_name=self.bussiness_name,
-            code__startswith=prefix
-        ).order_by('-id').first()
+        return 'IT'
 
-        if last and last.code:
-            m = re.search(r'(\d+)$', last.code)
-            if m:
-                next_num = int(m.group(1)) + 1
+    @staticmethod
+    def code_seed(business, prefix, category):
+        def seed():
+            last = items.objects.filter(
+                bussiness_name=business,
+                code__startswith=prefix
+            ).order_by('-id').first()
 
-            else:
-                next_num = items.objects.filter(bussiness_name=self.bussiness_name, category=self.category).count() + 1
-        else:
-            next_num = 1
+            if last and last.code:
+                m = re.search(r'(\d+)$', last.code)
+                if m:
+                    return int(m.group(1))
+
+                return items.objects.filter(bussiness_name=business, category=category).count()
+
+            return 0
+
+        return seed
+
+    def generate_item_code(self):
+        prefix = self.code_prefix(self.category)
+        next_num = next_number(self.bussiness_name, f'ITEM-{prefix}', 0, seed=self.code_seed(self.bussiness_name, prefix, self.category))
 
         return f"{prefix}{next_num:05d}"
 
@@ -444,6 +465,9 @@ class location_items(models.Model):
             Index(fields=['bussiness_name','location']),
             Index(fields=['item_name']),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=['item_name', 'location'], name='location_items_unique_item_location'),
+        ]
     
 class inventory_transfer(models.Model):
     image = models.ImageField()
@@ -461,8 +485,8 @@ class inventory_transfer(models.Model):
     def generate_next_code(self):
         id = self.bussiness_name.pk
         year = self.creation_date.year if self.creation_date else datetime.now().year
-        last = inventory_transfer.objects.filter(bussiness_name=self.bussiness_name, creation_date__year=year).order_by('-id').first()
-        next_code = 1 if not last else int(last.code[-5:]) + 1
+        next_code = next_number(self.bussiness_name, 'TRF', year,
+                                seed=last_code_seed(inventory_transfer, 'code', bussiness_name=self.bussiness_name, creation_date__year=year))
         return f"TRF{id}-{year}{next_code:05d}"
 
     def save(self, *args, **kwargs):
@@ -474,6 +498,7 @@ class inventory_transfer(models.Model):
         indexes = [
             Index(fields=['bussiness_name','creation_date']),
             Index(fields=['code']),
+            Index(fields=['bussiness_name', 'code']),
             Index(fields=['from_loc','to_loc']),
         ]
 
@@ -527,8 +552,8 @@ class sale(models.Model):
     def generate_next_code(self):
         id = self.bussiness_name.pk
         year = self.creation_date.year if self.creation_date else datetime.now().year
-        last = sale.objects.filter(bussiness_name=self.bussiness_name, creation_date__year=year).order_by('-id').first()
-        next_code = 1 if not last else int(last.code[-5:]) + 1
+        next_code = next_number(self.bussiness_name, 'SAL', year,
+                                seed=last_code_seed(sale, 'code', bussiness_name=self.bussiness_name, creation_date__year=year))
         return f"SAL{id}-{year}{next_code:05d}"
 
     def save(self, *args, **kwargs):
@@ -540,6 +565,7 @@ class sale(models.Model):
         indexes = [
             Index(fields=['bussiness_name','creation_date']),
             Index(fields=['code']),
+            Index(fields=['bussiness_name', 'code']),
             Index(fields=['customer_info']),
             Index(fields=['created_by']),
         ]
@@ -550,8 +576,8 @@ class sale_history(models.Model):
     item_name = models.ForeignKey(items, on_delete=models.CASCADE)
     quantity = models.BigIntegerField(default=0)
     discount = models.CharField(max_length=100)
-    sales_price = models.FloatField()
-    purchase_price = models.FloatField()
+    sales_price = models.DecimalField(max_digits=10, decimal_places=2)
+    purchase_price = models.DecimalField(max_digits=10, decimal_places=2)
     bussiness_name = models.ForeignKey(bussiness, on_delete=models.CASCADE)
 
     class Meta:
@@ -591,8 +617,8 @@ class purchase(models.Model):
     def generate_next_code(self):
         id = self.bussiness_name.pk
         year = self.creation_date.year if self.creation_date else datetime.now().year
-        last = purchase.objects.filter(bussiness_name=self.bussiness_name, creation_date__year=year).order_by('-id').first()
-        next_code = 1 if not last else int(last.code[-5:]) + 1
+        next_code = next_number(self.bussiness_name, 'PUR', year,
+                                seed=last_code_seed(purchase, 'code', bussiness_name=self.bussiness_name, creation_date__year=year))
         return f"PUR{id}-{year}{next_code:05d}"
 
     def save(self, *args, **kwargs):
@@ -604,6 +630,7 @@ class purchase(models.Model):
         indexes = [
             Index(fields=['bussiness_name','creation_date']),
             Index(fields=['code']),
+            Index(fields=['bussiness_name', 'code']),
             Index(fields=['supplier']),
             Index(fields=['created_by']),
         ]
@@ -737,8 +764,8 @@ class journal_head(models.Model):
     def generate_next_code(self):
         id = self.bussiness_name.pk
         year = self.date.year if self.date else datetime.now().year
-        last = journal_head.objects.filter(bussiness_name=self.bussiness_name, date__year=year).order_by('-id').first()
-        next_code = 1 if not last else int(last.code[-5:]) + 1
+        next_code = next_number(self.bussiness_name, 'JNL', year,
+                                seed=last_code_seed(journal_head, 'code', bussiness_name=self.bussiness_name, date__year=year))
         return f"JNL{id}-{year}{next_code:05d}"
 
     def save(self, *args, **kwargs):
@@ -750,6 +777,7 @@ class journal_head(models.Model):
         indexes = [
             Index(fields=['bussiness_name','date']),
             Index(fields=['code']),
+            Index(fields=['bussiness_name', 'code']),
             Index(fields=['created_by']),
         ]
 
@@ -854,35 +882,26 @@ class month_period(models.Model):
             Index(fields=['business','start']),
         ]
 
-class asset_ledger(models.Model):
-    head = models.ForeignKey(journal_head, on_delete=models.PROTECT)
-    account = models.ForeignKey(real_account, on_delete=models.PROTECT)
-    period = models.ForeignKey(month_period, on_delete=models.PROTECT)
-    transaction_number = models.CharField(max_length=100)
-    date = models.DateField(default=date.today)
-    type = models.CharField(default='', max_length=100)
-    description = models.CharField(default='', max_length=100)
-    debit = models.DecimalField(decimal_places=2, max_digits=10, default=Decimal("0.00"))
-    credit = models.DecimalField(decimal_places=2, max_digits=10, default=Decimal("0.00"))
-    balance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"))
-    bussiness_name = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+class class_ledger_manager(models.Manager):
+    """Limits gl_entry to one account class, standing in for the old per-class ledger tables."""
 
-    def update_balance(self):
-        previous = asset_ledger.objects.filter(
-            account=self.account, period=self.period, bussiness_name=self.bussiness_name
-        ).exclude(pk=self.pk).order_by('-date', '-id').first()
-        
-        prev_balance = previous.balance if previous else 0
-        self.balance = prev_balance + (self.debit or 0) - (self.credit or 0)
-        self.save()
+    def __init__(self, account_class):
+        super().__init__()
+        self.account_class = account_class
 
-    class Meta:
-        indexes = [
-            Index(fields=['account','period','bussiness_name','date','id']),
-            Index(fields=['bussiness_name','date']),
-        ]
+    def get_queryset(self):
+        return super().get_queryset().filter(account_class=self.account_class)
+
+class gl_entry(models.Model):
+    ACCOUNT_CLASSES = [
+        ('asset', 'Assets'),
+        ('liabilities', 'Liabilities'),
+        ('equity', 'Equity'),
+        ('revenue', 'Revenue'),
+        ('expenses', 'Expenses'),
+    ]
 
-class liabilities_ledger(models.Model):
+    account_class = models.CharField(max_length=20, choices=ACCOUNT_CLASSES)
     head = models.ForeignKey(journal_head, on_delete=models.PROTECT)
     account = models.ForeignKey(real_account, on_delete=models.PROTECT)
     period = models.ForeignKey(month_period, on_delete=models.PROTECT)
@@ -894,102 +913,67 @@ class liabilities_ledger(models.Model):
     credit = models.DecimalField(decimal_places=2, max_digits=10, default=Decimal("0.00"))
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"))
     bussiness_name = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+    legacy_id = models.BigIntegerField(null=True, blank=True)
 
-    def update_balance(self):
-        previous = liabilities_ledger.objects.filter(
-            account=self.account, period=self.period, bussiness_name=self.bussiness_name
-        ).exclude(pk=self.pk).order_by('-date', '-id').first()
-        
-        prev_balance = previous.balance if previous else 0
-        self.balance = prev_balance + (self.credit or 0) - (self.debit or 0)
-        self.save()
+    # set by the per-class proxies so their rows get the right class
+    default_class = None
 
-    class Meta:
-        indexes = [
-            Index(fields=['account','period','bussiness_name','date','id']),
-        ]
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
 
-class equity_ledger(models.Model):
-    head = models.ForeignKey(journal_head, on_delete=models.PROTECT)
-    account = models.ForeignKey(real_account, on_delete=models.PROTECT)
-    period = models.ForeignKey(month_period, on_delete=models.PROTECT)
-    transaction_number = models.CharField(max_length=100)
-    date = models.DateField(default=date.today)
-    type = models.CharField(default='', max_length=100)
-    description = models.CharField(default='', max_length=100)
-    debit = models.DecimalField(decimal_places=2, max_digits=10, default=Decimal("0.00"))
-    credit = models.DecimalField(decimal_places=2, max_digits=10, default=Decimal("0.00"))
-    balance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"))
-    bussiness_name = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+        if self.default_class and not self.__dict__.get('account_class'):
+            self.account_class = self.default_class
+
+    def save(self, *args, **kwargs):
+        save_entry(self, self.account_class, super().save, *args, **kwargs)
 
     def update_balance(self):
-        previous = equity_ledger.objects.filter(
-            account=self.account, period=self.period, bussiness_name=self.bussiness_name
-        ).exclude(pk=self.pk).order_by('-date', '-id').first()
-        
-        prev_balance = previous.balance if previous else 0
-        self.balance = prev_balance + (self.credit or 0) - (self.debit or 0)
-        self.save()
+        recompute(self.account_class, self.account_id, self.period_id, from_date=self.date)
 
     class Meta:
         indexes = [
-            Index(fields=['account','period','bussiness_name','date','id']),
+            Index(fields=['bussiness_name','period','account_class','account']),
+            Index(fields=['account','period','date','id']),
+            Index(fields=['bussiness_name','date']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['account_class','legacy_id'], name='gl_entry_unique_legacy_row'),
         ]
 
-class revenue_ledger(models.Model):
-    head = models.ForeignKey(journal_head, on_delete=models.PROTECT)
-    account = models.ForeignKey(real_account, on_delete=models.PROTECT)
-    period = models.ForeignKey(month_period, on_delete=models.PROTECT)
-    transaction_number = models.CharField(max_length=100)
-    date = models.DateField(default=date.today)
-    type = models.CharField(default='', max_length=100)
-    description = models.CharField(default='', max_length=100)
-    debit = models.DecimalField(decimal_places=2, max_digits=10, default=Decimal("0.00"))
-    credit = models.DecimalField(decimal_places=2, max_digits=10, default=Decimal("0.00"))
-    balance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"))
-    bussiness_name = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+class asset_ledger(gl_entry):
+    default_class = 'asset'
+    objects = class_ledger_manager('asset')
 
-    def update_balance(self):
-        previous = revenue_ledger.objects.filter(
-            account=self.account, period=self.period, bussiness_name=self.bussiness_name
-        ).exclude(pk=self.pk).order_by('-date', '-id').first()
-        
-        prev_balance = previous.balance if previous else 0
-        self.balance = prev_balance + (self.credit or 0) - (self.debit or 0)
-        self.save()
+    class Meta:
+        proxy = True
+
+class liabilities_ledger(gl_entry):
+    default_class = 'liabilities'
+    objects = class_ledger_manager('liabilities')
 
     class Meta:
-        indexes = [
-            Index(fields=['account','period','bussiness_name','date','id']),
-        ]
+        proxy = True
 
-class expenses_ledger(models.Model):
-    head = models.ForeignKey(journal_head, on_delete=models.PROTECT)
-    account = models.ForeignKey(real_account, on_delete=models.PROTECT)
-    period = models.ForeignKey(month_period, on_delete=models.PROTECT)
-    transaction_number = models.CharField(max_length=100)
-    date = models.DateField(default=date.today)
-    type = models.CharField(default='', max_length=100)
-    description = models.CharField(default='', max_length=100)
-    debit = models.DecimalField(decimal_places=2, max_digits=10, default=Decimal("0.00"))
-    credit = models.DecimalField(decimal_places=2, max_digits=10, default=Decimal("0.00"))
-    balance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"))
-    bussiness_name = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+class equity_ledger(gl_entry):
+    default_class = 'equity'
+    objects = class_ledger_manager('equity')
 
-    def update_balance(self):
-        previous = expenses_ledger.objects.filter(
-            account=self.account, period=self.period, bussiness_name=self.bussiness_name
-        ).exclude(pk=self.pk).order_by('-date', '-id').first()
-        
-        prev_balance = previous.balance if previous else 0
-        self.balance = prev_balance + (self.debit or 0) - (self.credit or 0)
-        self.save()
+    class Meta:
+        proxy = True
+
+class revenue_ledger(gl_entry):
+    default_class = 'revenue'
+    objects = class_ledger_manager('revenue')
 
     class Meta:
-        indexes = [
-            Index(fields=['account','period','bussiness_name','date','id']),
-        ]
+        proxy = True
 
+class expenses_ledger(gl_entry):
+    default_class = 'expenses'
+    objects = class_ledger_manager('expenses')
+
+    class Meta:
+        proxy = True
 
 class customer_ledger(models.Model):
     account = models.ForeignKey(customer, on_delete=models.CASCADE)
@@ -1005,18 +989,7 @@ class customer_ledger(models.Model):
     bussiness_name = models.ForeignKey(bussiness, on_delete=models.CASCADE)
 
     def save(self, *args, **kwargs):
-        last_entry = customer_ledger.objects.filter(
-            account=self.account,
-            bussiness_name=self.bussiness_name,
-            period=self.period,
-            date__lt=self.date
-        ).order_by("-date", "-id").first()
-
-        prev_balance = last_entry.balance if last_entry else 0
-
-        self.balance = prev_balance + Decimal(self.debit or 0) - Decimal(self.credit or 0)
-
-        super().save(*args, **kwargs)
+        save_entry(self, 'customer', super().save, *args, **kwargs)
 
     class Meta:
         indexes = [
@@ -1037,18 +1010,7 @@ class supplier_ledger(models.Model):
     bussiness_name = models.ForeignKey(bussiness, on_delete=models.CASCADE)
 
     def save(self, *args, **kwargs):
-        last_entry = supplier_ledger.objects.filter(
-            account=self.account,
-            bussiness_name=self.bussiness_name,
-            period=self.period,
-            date__lt=self.date
-        ).order_by("-date", "-id").first()
-
-        prev_balance = last_entry.balance if last_entry else 0
-
-        self.balance = prev_balance + Decimal(self.credit or 0) - Decimal(self.debit or 0)
-
-        super().save(*args, **kwargs)
+        save_entry(self, 'supplier', super().save, *args, **kwargs)
 
     class Meta:
         indexes = [
@@ -1091,8 +1053,8 @@ class payment(models.Model):
     def generate_next_code(self):
         id = self.bussiness_name.pk
         year = self.date.year if self.date else datetime.now().year
-        last = payment.objects.filter(bussiness_name=self.bussiness_name, date__year=year).order_by('-id').first()
-        next_code = 1 if not last else int(last.code[-5:]) + 1
+        next_code = next_number(self.bussiness_name, 'PMT', year,
+                                seed=last_code_seed(payment, 'code', bussiness_name=self.bussiness_name, date__year=year))
         return f"PMT{id}-{year}{next_code:05d}"
 
     def save(self, *args, **kwargs):
@@ -1104,6 +1066,7 @@ class payment(models.Model):
         indexes = [
             Index(fields=['bussiness_name','date']),
             Index(fields=['code']),
+            Index(fields=['bussiness_name', 'code']),
             Index(fields=['created_by']),
         ]
 
@@ -1125,8 +1088,8 @@ class cash_receipt(models.Model):
     def generate_next_code(self):
         id = self.bussiness_name.pk
         year = self.date.year if self.date else datetime.now().year
-        last = cash_receipt.objects.filter(bussiness_name=self.bussiness_name, date__year=year).order_by('-id').first()
-        next_code = 1 if not last else int(last.code[-5:]) + 1
+        next_code = next_number(self.bussiness_name, 'CSHR', year,
+                                seed=last_code_seed(cash_receipt, 'code', bussiness_name=self.bussiness_name, date__year=year))
         return f"CSHR{id}-{year}{next_code:05d}"
 
     def save(self, *args, **kwargs):
@@ -1138,6 +1101,7 @@ class cash_receipt(models.Model):
         indexes = [
             Index(fields=['bussiness_name','date']),
             Index(fields=['code']),
+            Index(fields=['bussiness_name', 'code']),
             Index(fields=['created_by']),
         ]
 
@@ -1150,6 +1114,7 @@ class item_balance(models.Model):
     closing_quantity = models.IntegerField(default=0)
     quantity_sold = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     value_sold = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    cost_sold = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     quantity_purchased = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     value_purchased = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     opening_value = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
@@ -1201,3 +1166,153 @@ class supplier_balance(models.Model):
         indexes = [
             Index(fields=['supplier','business','period']),
         ]
+
+class document_sequence(models.Model):
+    business = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+    doc_type = models.CharField(max_length=20)
+    year = models.IntegerField(default=0)
+    last_value = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('business', 'doc_type', 'year')]
+
+class export_job(models.Model):
+    business = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+    user = models.ForeignKey(current_user, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=50)
+    format = models.CharField(max_length=10)
+    params = models.JSONField(default=dict)
+    params_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, default='Pending')
+    progress = models.IntegerField(default=0)
+    file = models.FileField(upload_to='exports', blank=True)
+    filename = models.CharField(max_length=255, blank=True, default='')
+    message = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            Index(fields=['user', 'params_hash', 'status']),
+            Index(fields=['expires_at']),
+        ]
+
+class daily_stock_summary(models.Model):
+    business = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+    location = models.ForeignKey(inventory_location, on_delete=models.CASCADE)
+    date = models.DateField()
+    sales_value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    sales_quantity = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    sales_count = models.IntegerField(default=0)
+    cogs = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    purchase_value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    purchase_quantity = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    purchase_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [('business', 'location', 'date')]
+        indexes = [
+            Index(fields=['business', 'date']),
+        ]
+
+class daily_item_sales(models.Model):
+    business = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+    location = models.ForeignKey(inventory_location, on_delete=models.CASCADE)
+    date = models.DateField()
+    item = models.ForeignKey(items, on_delete=models.CASCADE)
+    quantity = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        unique_together = [('business', 'location', 'date', 'item')]
+        indexes = [
+            Index(fields=['business', 'date']),
+        ]
+
+class ledger_balance_head(models.Model):
+    business = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+    ledger = models.CharField(max_length=20)
+    account_id = models.BigIntegerField()
+    period = models.ForeignKey(month_period, on_delete=models.CASCADE)
+    debit_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    credit_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    last_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        unique_together = [('ledger', 'account_id', 'period')]
+        indexes = [
+            Index(fields=['business', 'ledger']),
+        ]
+
+class report_snapshot(models.Model):
+    business = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+    report = models.CharField(max_length=30)
+    period = models.ForeignKey(month_period, on_delete=models.CASCADE)
+    filters_hash = models.CharField(max_length=40, default='')
+    filters = models.JSONField(default=dict)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [('business', 'report', 'period', 'filters_hash')]
+
+class idempotency_key(models.Model):
+    business = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+    scope = models.CharField(max_length=30)
+    key = models.CharField(max_length=100)
+    fingerprint = models.CharField(max_length=64, default='')
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [('business', 'scope', 'key')]
+        indexes = [
+            Index(fields=['created_at']),
+        ]
+
+class tenant_purge(models.Model):
+    # not a foreign key: the row is the audit record of the deletion and outlives the business
+    business_id = models.BigIntegerField()
+    business_name = models.CharField(max_length=100)
+    requested_by = models.CharField(max_length=150, default='')
+    user_ids = models.JSONField(default=list)
+    status = models.CharField(max_length=20, default='Pending')
+    step = models.CharField(max_length=50, blank=True, default='')
+    deleted = models.JSONField(default=dict)
+    message = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            Index(fields=['status', 'updated_at']),
+            Index(fields=['business_id']),
+        ]
+
+class activity_archive(models.Model):
+    business = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+    month = models.DateField()
+    rows = models.IntegerField(default=0)
+    file = models.FileField(upload_to='activity_archive')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            Index(fields=['business', 'month']),
+        ]
+
+class search_term(models.Model):
+    business = models.ForeignKey(bussiness, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10)
+    object_id = models.BigIntegerField()
+    term = models.CharField(max_length=40)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            Index(fields=['business', 'kind', 'term']),
+            Index(fields=['business', 'kind', 'object_id']),
+        ]
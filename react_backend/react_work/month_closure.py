@@ -1,125 +1,120 @@
 from datetime import date
-from django.db.models import Sum, F, DecimalField, ExpressionWrapper, Value as V
+from django.db import transaction
+from django.db.models import Sum, DecimalField, Value as V
 from django.db.models.functions import Coalesce
 from decimal import Decimal
+from collections import defaultdict
+import logging
+import time
 from .models import (
     item_balance, account_balance, customer_balance, supplier_balance,
-    month_period, items,
-    asset_ledger, liabilities_ledger, equity_ledger,
-    revenue_ledger, expenses_ledger, purchase_history,
-    customer_ledger, supplier_ledger, sale_history
+    month_period, gl_entry,
+    customer_ledger, supplier_ledger,
 )
+from . import report_snapshot, item_valuation
+
+logger = logging.getLogger(__name__)
+
+
+def _ledger_totals(ledgers, month, key='account'):
+    totals = defaultdict(lambda: [Decimal(0), Decimal(0)])
+
+    for ledger in ledgers:
+        rows = (
+            ledger.objects
+            .filter(bussiness_name=month.business, date__gte=month.start, date__lte=month.end)
+            .values(key)
+            .annotate(
+                debits=Coalesce(Sum('debit'), V(0), output_field=DecimalField()),
+                credits=Coalesce(Sum('credit'), V(0), output_field=DecimalField())
+            )
+        )
+
+        for row in rows:
+            totals[row[key]][0] += row['debits']
+            totals[row[key]][1] += row['credits']
+
+    return totals
+
+
+def _roll_forward(model, key, closed, next_month):
+    existing = {
+        getattr(row, f'{key}_id'): row
+        for row in model.objects.filter(period=next_month, **{f'{key}__in': [getattr(b, f'{key}_id') for b in closed]})
+    }
+
+    to_update, to_create = [], []
+
+    for balance in closed:
+        row = existing.get(getattr(balance, f'{key}_id'))
+
+        if row is None:
+            row = model(**{key: getattr(balance, key)}, business=balance.business, period=next_month)
+            to_create.append(row)
+        else:
+            to_update.append(row)
+
+        row.opening_balance = balance.closing_balance
+        row.closing_balance = 0
+        row.debit_total = Decimal(0)
+        row.credit_total = Decimal(0)
+
+    fields = ["opening_balance", "closing_balance", "debit_total", "credit_total"]
+    model.objects.bulk_update(to_update, fields, batch_size=1000)
+    model.objects.bulk_create(to_create, batch_size=1000)
 
 
 def close_month_period(month: month_period):
     if month.is_closed:
         return
 
+    timings = {}
+    started = time.perf_counter()
+
     next_month = month_period.objects.filter(
         year=month.year,
         start__gt=month.end
     ).order_by("start").first()
 
-    sales_info = (
-        sale_history.objects
-        .filter(
-            bussiness_name=month.business,
-            sales__date__range=[month.start, month.end]
-        )
-        .exclude(sales__status="Reversed")
-        .annotate(
-            line_total=ExpressionWrapper(
-                F("quantity") * F("sales_price"),
-                output_field=DecimalField(max_digits=14, decimal_places=2)
-            )
-        )
-        .values("item_name")
-        .annotate(
-            quantity=Sum("quantity"),
-            value=Sum("line_total")
-        )
-    )
-    sales_map = {s["item_name"]: s for s in sales_info}
-
-    purchase_info = (
-        purchase_history.objects
-        .filter(
-            bussiness_name=month.business,
-            purchase__date__range=[month.start, month.end]
-        )
-        .exclude(purchase__status="Reversed")
-        .annotate(
-            line_total=ExpressionWrapper(
-                F("quantity") * F("purchase_price"),
-                output_field=DecimalField(max_digits=14, decimal_places=2)
-            )
-        )
-        .values("item_name")
-        .annotate(
-            quantity=Sum("quantity"),
-            value=Sum("line_total")
-        )
-    )
-    purchase_map = {p["item_name"]: p for p in purchase_info}
-
-    balances = []
-    next_balances = []
-    for ib in item_balance.objects.filter(period=month).select_related("item"):
-        current_item = ib.item
-
-        sales = sales_map.get(current_item.id, {"quantity": 0, "value": 0})
-        purchase = purchase_map.get(current_item.id, {"quantity": 0, "value": 0})
-
-        ib.closing_quantity = current_item.quantity
-        ib.closing_value = current_item.quantity * current_item.purchase_price
-        ib.quantity_purchased = purchase["quantity"] or 0
-        ib.value_purchased = purchase["value"] or 0
-        ib.quantity_sold = sales["quantity"] or 0
-        ib.value_sold = sales["value"] or 0
-
-        balances.append(ib)
-
-        if next_month:
-            next_balances.append(
-                item_balance(
-                    item=ib.item,
-                    business=ib.business,
-                    period=next_month,
-                    opening_quantity=ib.closing_quantity,
-                    closing_quantity=ib.closing_quantity,
-                    opening_value=ib.closing_value,
-                    closing_value=ib.closing_value,
-                )
-            )
-
-    item_balance.objects.bulk_update(
-        balances,
-        ["closing_quantity", "closing_value", "quantity_purchased", "value_purchased", "quantity_sold", "value_sold"]
-    )
-
-    if next_balances:
-        item_balance.objects.bulk_create(next_balances, ignore_conflicts=True)
+    timings['setup'] = time.perf_counter() - started
+    phase = time.perf_counter()
 
-    ledger_models = [
-        asset_ledger, liabilities_ledger, equity_ledger,
-        revenue_ledger, expenses_ledger,
-    ]
+    # the month's flows and closing stock are kept current while it is open; recomputing
+    # them here corrects anything the posting paths or the nightly reconcile missed
+    drift = item_valuation.reconcile(month, fix=True)
+    if drift:
+        logger.warning(f"Corrected {len(drift)} item_balance figures while closing {month.name}")
 
-    for ab in account_balance.objects.filter(period=month):
-        debit_total, credit_total = Decimal(0), Decimal(0)
+    if next_month:
+        # items created after the month ended already have a row in the next month
+        carried = set(item_balance.objects.filter(period=next_month).values_list("item_id", flat=True))
 
-        for ledger in ledger_models:
-            agg = ledger.objects.filter(
-                account=ab.account,
-                date__gte=month.start, date__lte=month.end,
-                bussiness_name=ab.business
-            ).aggregate(
-                debits=Coalesce(Sum('debit'), V(0), output_field=DecimalField()),
-                credits=Coalesce(Sum('credit'), V(0), output_field=DecimalField())
+        item_balance.objects.bulk_create([
+            item_balance(
+                item_id=ib["item_id"],
+                business_id=ib["business_id"],
+                period=next_month,
+                opening_quantity=ib["closing_quantity"],
+                closing_quantity=ib["closing_quantity"],
+                opening_value=ib["closing_value"],
+                closing_value=ib["closing_value"],
             )
+            for ib in item_balance.objects.filter(period=month).values("item_id", "business_id", "closing_quantity", "closing_value")
+            if ib["item_id"] not in carried
+        ], batch_size=1000)
+
+    timings['items'] = time.perf_counter() - phase
+    phase = time.perf_counter()
+
+    # all five account classes live in gl_entry, so this is one grouped scan
+    account_totals = _ledger_totals([gl_entry], month)
+    account_balances = list(
+        account_balance.objects.filter(period=month)
+        .select_related("account__account_type__account_type", "business")
+    )
 
-            debit_total += agg['debits']
-            credit_total += agg['credits']
+    for ab in account_balances:
+        debit_total, credit_total = account_totals.get(ab.account_id, (Decimal(0), Decimal(0)))
 
         ab.debit_total = debit_total
         ab.credit_total = credit_total
@@ -130,77 +125,65 @@ def close_month_period(month: month_period):
         else:
             ab.closing_balance = (ab.opening_balance or 0) + credit_total - debit_total
 
-        ab.save()
+    account_balance.objects.bulk_update(account_balances, ["debit_total", "credit_total", "closing_balance"], batch_size=1000)
 
-        if next_month:
-            account_balance.objects.update_or_create(
-                account=ab.account,
-                business=ab.business,
-                period=next_month,
-                defaults={
-                    "opening_balance": ab.closing_balance,
-                    "closing_balance": 0,
-                    "debit_total": Decimal(0),
-                    "credit_total": Decimal(0),
-                }
-            )
+    if next_month:
+        _roll_forward(account_balance, "account", account_balances, next_month)
 
-    for cb in customer_balance.objects.filter(period=month):
-        agg = customer_ledger.objects.filter(
-            account=cb.customer,
-            date__gte=month.start, date__lte=month.end,
-            bussiness_name=cb.business
-        ).aggregate(
-            debits=Coalesce(Sum('debit'), V(0), output_field=DecimalField()),
-            credits=Coalesce(Sum('credit'), V(0), output_field=DecimalField())
-        )
+    timings['accounts'] = time.perf_counter() - phase
+    phase = time.perf_counter()
 
-        cb.debit_total = agg["debits"]
-        cb.credit_total = agg['credits']
-        cb.closing_balance = (cb.opening_balance or 0) + agg["debits"] - agg["credits"]
-        cb.save()
+    customer_totals = _ledger_totals([customer_ledger], month)
+    customer_balances = list(customer_balance.objects.filter(period=month).select_related("customer", "business"))
 
-        if next_month:
-            customer_balance.objects.update_or_create(
-                customer=cb.customer,
-                business=cb.business,
-                period=next_month,
-                defaults={
-                    "opening_balance": cb.closing_balance,
-                    "closing_balance": 0,
-                    "debit_total": Decimal(0),
-                    "credit_total": Decimal(0),
-                }
-            )
+    for cb in customer_balances:
+        debits, credits = customer_totals.get(cb.customer_id, (Decimal(0), Decimal(0)))
 
-    for sb in supplier_balance.objects.filter(period=month):
-        agg = supplier_ledger.objects.filter(
-            account=sb.supplier,
-            date__gte=month.start, date__lte=month.end,
-            bussiness_name=sb.business
-        ).aggregate(
-            debits=Coalesce(Sum('debit'), V(0), output_field=DecimalField()),
-            credits=Coalesce(Sum('credit'), V(0), output_field=DecimalField())
-        )
+        cb.debit_total = debits
+        cb.credit_total = credits
+        cb.closing_balance = (cb.opening_balance or 0) + debits - credits
 
-        sb.debit_total = agg['debits']
-        sb.credit_total = agg['credits']
-        sb.closing_balance = (sb.opening_balance or 0) + sb.debit_total - sb.credit_total
-        sb.save()
+    customer_balance.objects.bulk_update(customer_balances, ["debit_total", "credit_total", "closing_balance"], batch_size=1000)
 
-        if next_month:
-            supplier_balance.objects.update_or_create(
-                supplier=sb.supplier,
-                business=sb.business,
-                period=next_month,
-                defaults={
-                    "opening_balance": sb.closing_balance,
-                    "closing_balance": 0,
-                    "debit_total": Decimal(0),
-                    "credit_total": Decimal(0),
-                }
-            )
+    if next_month:
+        _roll_forward(customer_balance, "customer", customer_balances, next_month)
+
+    timings['customers'] = time.perf_counter() - phase
+    phase = time.perf_counter()
+
+    supplier_totals = _ledger_totals([supplier_ledger], month)
+    supplier_balances = list(supplier_balance.objects.filter(period=month).select_related("supplier", "business"))
+
+    for sb in supplier_balances:
+        debits, credits = supplier_totals.get(sb.supplier_id, (Decimal(0), Decimal(0)))
+
+        sb.debit_total = debits
+        sb.credit_total = credits
+        sb.closing_balance = (sb.opening_balance or 0) + debits - credits
+
+    supplier_balance.objects.bulk_update(supplier_balances, ["debit_total", "credit_total", "closing_balance"], batch_size=1000)
+
+    if next_month:
+        _roll_forward(supplier_balance, "supplier", supplier_balances, next_month)
+
+    timings['suppliers'] = time.perf_counter() - phase
 
     month.is_closed = True
     month.closing_date = date.today()
     month.save()
+
+    phase = time.perf_counter()
+
+    try:
+        with transaction.atomic():
+            report_snapshot.capture(month)
+    except Exception as error:
+        # reports fill a missing snapshot on first read, so closing does not depend on it
+        logger.warning(f"Could not store report snapshots for {month.name}: {error}")
+
+    timings['snapshots'] = time.perf_counter() - phase
+
+    logger.info(
+        f"Closed {month.name} for business {month.business_id} in {time.perf_counter() - started:.2f}s "
+        + ", ".join(f"{name}={seconds:.2f}s" for name, seconds in timings.items())
+    )
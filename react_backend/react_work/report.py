@@ -7,13 +7,15 @@ from django.db import transaction
 from django.db.models import Q
 import logging
 from . import report_class
+from . import tenant_context
 
 logger = logging.getLogger(__name__)
 
-def fetch_items_for_report(business, company, user, location):
+def fetch_items_for_report(business, company, user, location, context=None):
     try:
-        business_obj = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_obj, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_obj = context.business
+        user_query = context.user
 
         if not (user_query.report_access or user_query.admin):
             return 'no access'
@@ -38,7 +40,9 @@ def fetch_items_for_report(business, company, user, location):
             locations_access = ['All Locations']
             locations_access.extend([loc.location_name for loc in location_query])
 
-        report_permission, created = models.report_permissions.objects.get_or_create(user=user_query, bussiness_name=business_obj)
+        report_permission = context.report_permissions
+        if report_permission is None:
+            report_permission, created = models.report_permissions.objects.get_or_create(user=user_query, bussiness_name=business_obj)
 
         if report_permission is None or not (report_permission.item_summary or report_permission.user.admin):
             return 'no access'
@@ -101,15 +105,18 @@ def fetch_items_for_report(business, company, user, location):
         logger.warning(error)
         return 'something happened'
     
-def fetch_data_for_report_movements(business, company, user, location, start, end):
+def fetch_data_for_report_movements(business, company, user, location, start, end, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not (user_query.report_access or user_query.admin):
             return 'no access'
         
-        report_permission, created = models.report_permissions.objects.get_or_create(user=user_query, bussiness_name=business_query)
+        report_permission = context.report_permissions
+        if report_permission is None:
+            report_permission, created = models.report_permissions.objects.get_or_create(user=user_query, bussiness_name=business_query)
 
         if report_permission is None:
             return 'no access'
@@ -169,15 +176,18 @@ def fetch_data_for_report_movements(business, company, user, location, start, en
         logger.exception('unhandled error')
         return 'something happened'
     
-def fetch_data_for_sales_performance(business, company, user, location, start, end, reference, category=None, brand=None, supplier=None):
+def fetch_data_for_sales_performance(business, company, user, location, start, end, reference, category=None, brand=None, supplier=None, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not (user_query.report_access or user_query.admin):
             return 'no access'
         
-        report_permission, created = models.report_permissions.objects.get_or_create(user=user_query, bussiness_name=business_query)
+        report_permission = context.report_permissions
+        if report_permission is None:
+            report_permission, created = models.report_permissions.objects.get_or_create(user=user_query, bussiness_name=business_query)
 
         if report_permission is None and user_query.admin is False:
             return 'no access'
@@ -322,10 +332,11 @@ def fetch_data_for_sales_performance(business, company, user, location, start, e
         return f'something happened {str(error)}'
     
     
-def fetch_data_for_dashboard(business, company, user, location):
+def fetch_data_for_dashboard(business, company, user, location, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not (user_query.report_access or user_query.admin):
             return 'no access'
@@ -340,6 +351,7 @@ def fetch_data_for_dashboard(business, company, user, location):
         else:
             locations_access = [location]
 
+        # both halves are cached by Dashboard_Report until a posting drops the business's dashboard
         dashboard_items = report_class.Dashboard_Report(
             business=business_query,
             company=company,
@@ -354,7 +366,13 @@ def fetch_data_for_dashboard(business, company, user, location):
             location_access=locations_access
         ).dashboard_data()
 
-        
+        dashboard = {
+            'low_stock': dashboard_items['low_stock'] or [],
+            'category': dashboard_items['category'] or [],
+            'brand': dashboard_items['brand'] or [],
+            'total_quantity': dashboard_items['quantity'] or 0,
+            'dashboard_data': dashboard_values or {},
+        }
 
         locs = [{'value': 'All Locations', 'label': 'All Locations'}]
 
@@ -364,14 +382,7 @@ def fetch_data_for_dashboard(business, company, user, location):
         else:
             locs.extend([{'value': i, 'label': i} for i in user_query.per_location_access])
 
-        result = {
-            'low_stock': dashboard_items['low_stock'] or [],
-            'category': dashboard_items['category'] or [],
-            'brand': dashboard_items['brand'] or [],
-            'total_quantity': dashboard_items['quantity'] or 0,
-            'dashboard_data': dashboard_values or {},
-            'locations': locs or [],
-        }
+        result = dict(dashboard, locations=locs or [])
 
         return result
     
@@ -391,15 +402,18 @@ def fetch_data_for_dashboard(business, company, user, location):
         logger.exception(error)
         return 'something happened'
     
-def fetch_pl_report(business, user, start, end, period_type, company):
+def fetch_pl_report(business, user, start, end, period_type, company, compare=None, budget=None, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not (user_query.report_access or user_query.admin):
             return 'no access'
         
-        report_permission, created = models.report_permissions.objects.get_or_create(user=user_query, bussiness_name=business_query)
+        report_permission = context.report_permissions
+        if report_permission is None:
+            report_permission, created = models.report_permissions.objects.get_or_create(user=user_query, bussiness_name=business_query)
 
         if report_permission is None:
             return 'no access'
@@ -407,7 +421,8 @@ def fetch_pl_report(business, user, start, end, period_type, company):
         if report_permission.profit_and_loss is False and report_permission.user.admin is False:
             return 'no access'
 
-        data = report_class.Financial_Report(business=business_query, start=start, end=end, period_type=period_type).pl_data()
+        data = report_class.Financial_Report(business=business_query, start=start, end=end, period_type=period_type,
+                                             compare=compare, budget=budget).pl_data()
 
         return data
         
@@ -423,15 +438,18 @@ def fetch_pl_report(business, user, start, end, period_type, company):
         logger.exception(error)
         return 'something happened'
     
-def fetch_iv_report(business, user, start, end, category, company):
+def fetch_iv_report(business, user, start, end, category, company, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not user_query.report_access and not user_query.admin:
             return 'no access'
         
-        report_permission, created = models.report_permissions.objects.get_or_create(user=user_query, bussiness_name=business_query)
+        report_permission = context.report_permissions
+        if report_permission is None:
+            report_permission, created = models.report_permissions.objects.get_or_create(user=user_query, bussiness_name=business_query)
 
         if report_permission is None:
             return 'no access'
@@ -455,15 +473,18 @@ def fetch_iv_report(business, user, start, end, category, company):
         logger.exception(error)
         return 'something happened'
     
-def fetch_tb_report(business, user, start, end, company):
+def fetch_tb_report(business, user, start, end, company, context=None):
     try:
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
 
         if not (user_query.report_access or user_query.admin):
             return 'no access'
         
-        report_permission, created = models.report_permissions.objects.get_or_create(user=user_query, bussiness_name=business_query)
+        report_permission = context.report_permissions
+        if report_permission is None:
+            report_permission, created = models.report_permissions.objects.get_or_create(user=user_query, bussiness_name=business_query)
 
         if report_permission is None:
             return 'no access'
@@ -1,9 +1,10 @@
-from . import models
+from . import models, daily_summary, general_ledger, report_math, report_snapshot
 from django.db.models import When, Case, Q, Sum, F, Aggregate, Value, DecimalField, ExpressionWrapper, OuterRef, Subquery, Count
 from django.db.models.functions import Coalesce, ExtractWeekDay, TruncDate
 from datetime import date, timedelta,datetime
 from collections import defaultdict
 from decimal import Decimal
+import numpy as np
 import logging  
 
 logger = logging.getLogger(__name__)
@@ -331,6 +332,11 @@ class Dashboard_Report:
         self.end = date.today()
 
     def fetch_total_item_quantity(self):
+        # the stock figures depend on the location only, so users with different location
+        # access share one entry; stock movements drop it through invalidate_dashboard
+        return daily_summary.cached_dashboard(self.business.pk, ('stock', self.location), self._stock_figures)
+
+    def _stock_figures(self):
         if self.location and self.location.lower() == 'all locations':
             items = models.items.objects.filter(
                 bussiness_name=self.business, is_active=True
@@ -411,268 +417,40 @@ class Dashboard_Report:
                 difference=ExpressionWrapper(F('reorder_level') - F('quantity'), output_field=DecimalField())
             ).values('name', 'reorder', 'stock', 'difference')
         
-        return {'quantity':quantity, 'category':category, 'low_stock':low_stock, 'brand':brand}
-    
-    def fetch_sales(self):
-        sales = models.sale.objects.filter(
-            bussiness_name=self.business, 
-            date__range=(self.start, self.end),
-            location_address__location_name__in=self.location,
-            is_reversed=False
-        )
-
-        today_sales = sales.filter(date=date.today())
-
-        month_sales_total = sales.aggregate(
-            total_sales=Coalesce(Sum('gross_total'), Value(0), output_field=DecimalField()),
-            total_quantity=Coalesce(Sum('total_quantity'), Value(0), output_field=DecimalField())
-        )
-
-        top_items = models.sale_history.objects.filter(
-            bussiness_name=self.business,
-            sales__in=sales
-        ).values(
-            'item_name__item_name'
-        ).annotate(
-            name = F('item_name__item_name'),
-            brand = F('item_name__brand'),
-            code = F('item_name__code'),
-            category = F('item_name__category__name'),
-            total_quantity=Sum('quantity')
-        ).order_by('-total_quantity')[:10]
-
-        today_sales_total = today_sales.aggregate(
-            total_sales=Coalesce(Sum('gross_total'), Value(0), output_field=DecimalField()),
-            total_quantity=Coalesce(Sum('total_quantity'), Value(0), output_field=DecimalField())
-        )
-
-        current_week_sales = sales.filter(date__range=[(self.end - timedelta(days=self.end.weekday())), self.end]).annotate(
-            weekday = ExtractWeekDay('date')
-        ).values('weekday').annotate(
-            sales_value=Coalesce(Sum('gross_total'), Value(0), output_field=DecimalField()),
-            sales_quantity=Coalesce(Sum('total_quantity'), Value(0), output_field=DecimalField())
-        ).order_by('weekday')
-
-        return {
-            'month_sales_total': month_sales_total,
-            'today_sales_total': today_sales_total,
-            'top_items': top_items,
-            'current_week_sales': current_week_sales
-        }
-    
-    def fetch_purchases(self):
-        purchases = models.purchase.objects.filter(
-            bussiness_name=self.business, 
-            date__range=(self.start, self.end),
-            location_address__location_name__in=self.location,
-            is_reversed=False
-        )
-
-        today_purchases = purchases.filter(date=date.today())
-
-        month_purchases_total = purchases.aggregate(
-            total_purchases=Coalesce(Sum('gross_total'), Value(0), output_field=DecimalField()),
-            total_quantity=Coalesce(Sum('total_quantity'), Value(0), output_field=DecimalField())
-        )
-
-        today_purchases_total = today_purchases.aggregate(
-            total_purchases=Coalesce(Sum('gross_total'), Value(0), output_field=DecimalField()),
-            total_quantity=Coalesce(Sum('total_quantity'), Value(0), output_field=DecimalField())
-        )
-
-        current_week_purchases = purchases.filter(date__range=[(self.end - timedelta(days=self.end.weekday())), self.end]).annotate(
-            weekday = ExtractWeekDay('date')
-        ).values('weekday').annotate(
-            purchase_value=Coalesce(Sum('gross_total'), Value(0), output_field=DecimalField()),
-            purchase_quantity=Coalesce(Sum('total_quantity'), Value(0), output_field=DecimalField())
-        ).order_by('weekday')
-
-        return {
-            'month_purchases_total': month_purchases_total,
-            'today_purchases_total': today_purchases_total,
-            'current_week_purchases': current_week_purchases
-        }
+        return {'quantity':quantity, 'category':list(category), 'low_stock':list(low_stock), 'brand':list(brand)}
     
     def dashboard_data(self):
-        WEEKDAYS = {
-            1: 'Sun', 2: 'Mon', 3: 'Tue', 4: 'Wed',
-            5: 'Thu', 6: 'Fri', 7: 'Sat'
-        }
-
-        merged = {
-            i: {
-                'day': WEEKDAYS[i],
-                'sales_value': 0, 'purchase_value': 0,
-                'sales_quantity': 0, 'purchase_quantity': 0
-            }
-            for i in range(1, 8)
-        }
-
-        purchase_data = self.fetch_purchases()
-        sales_data = self.fetch_sales()
-
-        for row in purchase_data['current_week_purchases']:
-            wd = row['weekday']
-            merged[wd]['purchase_value'] = row['purchase_value']
-            merged[wd]['purchase_quantity'] = row['purchase_quantity']
-
-        for row in sales_data['current_week_sales']:
-            wd = row['weekday']
-            merged[wd]['sales_value'] = row['sales_value']
-            merged[wd]['sales_quantity'] = row['sales_quantity']
-
-        merged_data = [merged[i] for i in range(2, 8)] + [merged[1]]
-
-
-        data = {
-            'month_in':purchase_data['month_purchases_total']['total_quantity'],
-            'month_out':sales_data['month_sales_total']['total_quantity'],
-            'day_in':purchase_data['today_purchases_total']['total_quantity'],
-            'day_out':sales_data['today_sales_total']['total_quantity'],
-            'month_purchase':purchase_data['month_purchases_total']['total_purchases'],
-            'month_sales':sales_data['month_sales_total']['total_sales'],
-            'day_purchase':purchase_data['today_purchases_total']['total_purchases'],
-            'day_sales':sales_data['today_sales_total']['total_sales'],
-            'week_trend':sales_data['current_week_sales'],
-            'purchase_vs_sales':merged_data,
-            'top_items':sales_data['top_items'],
-        }
-
-        return data
+        return daily_summary.cached_dashboard(
+            self.business.pk, ('daily', sorted(self.location), self.end),
+            lambda: daily_summary.dashboard_values(self.business, self.location, self.end)
+        )
 
 class Financial_Report:
-    def __init__(self, business, start, end, period_type):
+    # figures compared against the previous year or a budget
+    TOTALS = ("revenue", "cogs", "total_expenses", "net_profit")
+
+    def __init__(self, business, start, end, period_type, compare=None, budget=None):
         self.business = business
         self.start = datetime.strptime(start, "%Y-%m-%d").date()
         self.end = datetime.strptime(end, "%Y-%m-%d").date()
         self.period_type = period_type
+        self.compare = compare
+        self.budget = budget or {}
 
-    def closed_pl_data(self):
-        data = []
+    def _columns(self):
+        """[(label, months)] of the report: closed periods in range, then the open one."""
+        today = date.today()
+        columns = []
 
         if self.period_type == "monthly":
-            closed_periods = models.month_period.objects.filter(
+            closed_months = models.month_period.objects.filter(
                 business=self.business,
                 start__gte=self.start,
                 end__lte=self.end,
                 is_closed=True
             )
+            columns += [(m.name, [m]) for m in closed_months]
 
-            for m in closed_periods:
-                revenue = models.account_balance.objects.filter(
-                    period=m,
-                    account__account_type__account_type__name="Revenue"
-                ).aggregate(total=Sum(F('credit_total') - F('debit_total')))["total"] or 0
-
-                cogs = models.account_balance.objects.filter(
-                    period=m,
-                    account__name__icontains="Cost of Goods Sold"
-                ).aggregate(total=Sum(F('debit_total') - F('credit_total')))["total"] or 0
-
-                other_expenses_qs = models.account_balance.objects.filter(
-                    period=m,
-                    account__account_type__account_type__name="Expenses"
-                ).exclude(account__name__icontains="Cost of Goods Sold") \
-                .values("account__name").annotate(total=Sum(F('debit_total') - F('credit_total')))
-
-                total_expenses = sum(e["total"] for e in other_expenses_qs)
-                net_profit = revenue - cogs - total_expenses
-
-                data.append({
-                    "period": m.name,
-                    "revenue": float(revenue),
-                    "cogs": float(cogs),
-                    "expenses": {e["account__name"]: float(e["total"]) for e in other_expenses_qs},
-                    "total_expenses": float(total_expenses),
-                    "net_profit": float(net_profit),
-                })
-
-        elif self.period_type == "quarterly":
-            closed_quarters = models.quarter_period.objects.filter(
-                bussiness_name=self.business,
-                start__gte=self.start,
-                end__lte=self.end,
-                is_closed=True
-            )
-
-            for q in closed_quarters:
-                months = models.month_period.objects.filter(quarter=q, is_closed=True)
-
-                revenue = models.account_balance.objects.filter(
-                    period__in=months,
-                    account__account_type__account_type__name="Revenue"
-                ).aggregate(total=Sum(F('credit_total') - F('debit_total')))["total"] or 0
-
-                cogs = models.account_balance.objects.filter(
-                    period__in=months,
-                    account__name__icontains="Cost of Goods Sold"
-                ).aggregate(total=Sum(F('debit_total') - F('credit_total')))["total"] or 0
-
-                other_expenses_qs = models.account_balance.objects.filter(
-                    period__in=months,
-                    account__account_type__account_type__name="Expenses"
-                ).exclude(account__name__icontains="Cost of Goods Sold") \
-                .values("account__name").annotate(total=Sum(F('debit_total') - F('credit_total')))
-
-                total_expenses = sum(e["total"] for e in other_expenses_qs)
-                net_profit = revenue - cogs - total_expenses
-
-                data.append({
-                    "period": q.name,
-                    "revenue": float(revenue),
-                    "cogs": float(cogs),
-                    "expenses": {e["account__name"]: float(e["total"]) for e in other_expenses_qs},
-                    "total_expenses": float(total_expenses),
-                    "net_profit": float(net_profit),
-                })
-
-        elif self.period_type == "yearly":
-            closed_years = models.year_period.objects.filter(
-                bussiness_name=self.business,
-                year__gte=self.start.year,
-                year__lte=self.end.year,
-                is_closed=True
-            )
-
-            for y in closed_years:
-                months = models.month_period.objects.filter(year=y, is_closed=True)
-
-                revenue = models.account_balance.objects.filter(
-                    period__in=months,
-                    account__account_type__account_type__name="Revenue"
-                ).aggregate(total=Sum(F('credit_total') - F('debit_total')))["total"] or 0
-
-                cogs = models.account_balance.objects.filter(
-                    period__in=months,
-                    account__name__icontains="Cost of Goods Sold"
-                ).aggregate(total=Sum(F('debit_total') - F('credit_total')))["total"] or 0
-
-                other_expenses_qs = models.account_balance.objects.filter(
-                    period__in=months,
-                    account__account_type__account_type__name="Expenses"
-                ).exclude(account__name__icontains="Cost of Goods Sold") \
-                .values("account__name").annotate(total=Sum(F('debit_total') - F('credit_total')))
-
-                total_expenses = sum(e["total"] for e in other_expenses_qs)
-                net_profit = revenue - cogs - total_expenses
-
-                data.append({
-                    "period": y.year,
-                    "revenue": float(revenue),
-                    "cogs": float(cogs),
-                    "expenses": {e["account__name"]: float(e["total"]) for e in other_expenses_qs},
-                    "total_expenses": float(total_expenses),
-                    "net_profit": float(net_profit),
-                })
-
-        return data
-
-
-    def current_pl_data(self):
-        """Return current open P&L depending on timeframe."""
-        today = date.today()
-
-        if self.period_type == "monthly":
             current_month = models.month_period.objects.filter(
                 start__lte=today,
                 end__gte=today,
@@ -680,13 +458,17 @@ class Financial_Report:
                 is_closed=False
             ).first()
 
-
-            if not current_month or self.end < current_month.start:
-                return []
-
-            return [self._compute_live_period(current_month, label=current_month.name)]
+            if current_month and self.end >= current_month.start:
+                columns.append((current_month.name, [current_month]))
 
         elif self.period_type == "quarterly":
+            closed_quarters = list(models.quarter_period.objects.filter(
+                bussiness_name=self.business,
+                start__gte=self.start,
+                end__lte=self.end,
+                is_closed=True
+            ))
+
             current_quarter = models.quarter_period.objects.filter(
                 start__lt=today,
                 end__gt=today,
@@ -694,111 +476,102 @@ class Financial_Report:
                 is_closed=False
             ).first()
 
-            if not current_quarter or self.end < current_quarter.start:
-                return []
+            if current_quarter and self.end < current_quarter.start:
+                current_quarter = None
 
-            months = models.month_period.objects.filter(
-                quarter=current_quarter
-            )
+            quarters = closed_quarters + ([current_quarter] if current_quarter else [])
+            months = list(models.month_period.objects.filter(quarter__in=quarters))
 
-            revenue, cogs, other_expenses, total_expenses, net_profit = self._aggregate_live_months(months)
+            columns += [(q.name, [m for m in months if m.quarter_id == q.pk and m.is_closed]) for q in closed_quarters]
 
-            return [{
-                "period": current_quarter.name,
-                "revenue": float(revenue),
-                "cogs": float(cogs),
-                "expenses": {e["account__name"]: float(e["total"]) for e in other_expenses},
-                "total_expenses": float(total_expenses),
-                "net_profit": float(net_profit),
-            }]
+            if current_quarter:
+                columns.append((current_quarter.name, [m for m in months if m.quarter_id == current_quarter.pk]))
 
         elif self.period_type == "yearly":
+            closed_years = list(models.year_period.objects.filter(
+                bussiness_name=self.business,
+                year__gte=self.start.year,
+                year__lte=self.end.year,
+                is_closed=True
+            ))
+
             current_year = models.year_period.objects.filter(
                 year=self.end.year,
-                bussiness_name=self.business
+                bussiness_name=self.business,
+                is_closed=False
             ).first()
 
-            if not current_year or self.end.year < int(current_year.year):
-                return []
+            if current_year and self.end.year < int(current_year.year):
+                current_year = None
 
-            months = models.month_period.objects.filter(
-                year=current_year
-            )
+            years = closed_years + ([current_year] if current_year else [])
+            months = list(models.month_period.objects.filter(year__in=years))
 
-            revenue, cogs, other_expenses, total_expenses, net_profit = self._aggregate_live_months(months)
+            columns += [(y.year, [m for m in months if m.year_id == y.pk and m.is_closed]) for y in closed_years]
 
-            return [{
-                "period": current_year.year,
-                "revenue": float(revenue),
-                "cogs": float(cogs),
-                "expenses": {e["account__name"]: float(e["total"]) for e in other_expenses},
-                "total_expenses": float(total_expenses),
-                "net_profit": float(net_profit),
-            }]
+            if current_year:
+                columns.append((current_year.year, [m for m in months if m.year_id == current_year.pk]))
 
-        return []
-    
-    def _compute_live_period(self, period, label=None):
-        revenue = models.revenue_ledger.objects.filter(
-            bussiness_name=self.business,
-            period=period
-        ).aggregate(total=Sum(F("credit") - F("debit")))["total"] or 0
-
-        cogs = models.expenses_ledger.objects.filter(
-            bussiness_name=self.business,
-            period=period,
-            account__name__icontains="Cost of Goods Sold"
-        ).aggregate(total=Sum(F("debit") - F("credit")))["total"] or 0
-
-        other_expenses = models.expenses_ledger.objects.filter(
-            bussiness_name=self.business,
-            period=period
-        ).exclude(account__name__icontains="Cost of Goods Sold") \
-        .values("account__name").annotate(total=Sum(F("debit") - F("credit")))
-
-        total_expenses = sum(e["total"] for e in other_expenses)
-        net_profit = revenue - cogs - total_expenses
+        return columns
 
-        return {
-            "period": label or period.name,
-            "revenue": float(revenue),
-            "cogs": float(cogs),
-            "expenses": {e["account__name"]: float(e["total"]) for e in other_expenses},
-            "total_expenses": float(total_expenses),
-            "net_profit": float(net_profit),
-        }
+    def _month_rows(self, months):
+        """{month id: account rows}; closed months from their snapshots, open ones from one grouped ledger scan."""
+        months = list({m.pk: m for m in months}.values())
+        rows = report_snapshot.closed_data('profit_and_loss', months)
+        open_months = [m for m in months if not m.is_closed]
 
+        if open_months:
+            rows.update({m.pk: [] for m in open_months})
 
-    def _aggregate_live_months(self, months):
-        """Aggregate live ledgers over multiple months (quarter/year)."""
-        revenue = models.revenue_ledger.objects.filter(
-            bussiness_name=self.business,
-            period__in=months
-        ).aggregate(total=Sum(F("credit") - F("debit")))["total"] or 0
+            movements = general_ledger.movements(self.business, open_months, fields=("period_id", "account__name")).filter(
+                account_class__in=["revenue", "expenses"]
+            )
 
-        cogs = models.expenses_ledger.objects.filter(
-            bussiness_name=self.business,
-            period__in=months,
-            account__name__icontains="Cost of Goods Sold"
-        ).aggregate(total=Sum(F("debit") - F("credit")))["total"] or 0
+            for row in movements:
+                rows[row["period_id"]].append({
+                    "account__name": row["account__name"],
+                    "account_type": general_ledger.CLASS_NAMES[row["account_class"]],
+                    "debit": row["debit"],
+                    "credit": row["credit"],
+                })
 
-        other_expenses = models.expenses_ledger.objects.filter(
-            bussiness_name=self.business,
-            period__in=months
-        ).exclude(account__name__icontains="Cost of Goods Sold") \
-        .values("account__name").annotate(total=Sum(F("debit") - F("credit")))
+        return rows
 
-        total_expenses = sum(e["total"] for e in other_expenses)
-        net_profit = revenue - cogs - total_expenses
+    def _prior_year(self, months):
+        """{month id: the same month a year earlier, or None}."""
+        starts = {m.pk: m.start.replace(year=m.start.year - 1) for m in months}
+        earlier = {
+            m.start: m
+            for m in models.month_period.objects.filter(business=self.business, start__in=set(starts.values()))
+        }
 
-        return revenue, cogs, other_expenses, total_expenses, net_profit
+        return {pk: earlier.get(start) for pk, start in starts.items()}
 
+    def pl_data(self):
+        columns = self._columns()
+        months = [m for _, column_months in columns for m in column_months]
+        prior = self._prior_year(months) if self.compare == "yoy" else {}
+        rows = self._month_rows(months + [m for m in prior.values() if m])
 
+        data = []
+        for label, column_months in columns:
+            row = report_math.profit_and_loss([r for m in column_months for r in rows.get(m.pk, [])], label)
 
-    def pl_data(self):
-        closed = self.closed_pl_data()
-        current = self.current_pl_data()
-        return closed + current
+            if self.compare == "yoy":
+                previous = report_math.profit_and_loss(
+                    [r for m in column_months if prior.get(m.pk) for r in rows.get(prior[m.pk].pk, [])], label
+                )
+                row["previous"] = {key: previous[key] for key in self.TOTALS}
+                row["change"] = report_math.difference(row, previous, self.TOTALS)
+
+            budget = self.budget.get(str(label))
+            if budget:
+                row["budget"] = {key: report_math.to_float(report_math.to_fixed(budget.get(key))) for key in self.TOTALS}
+                row["variance"] = report_math.difference(row, budget, self.TOTALS)
+
+            data.append(row)
+
+        return data
 
 class Inventory_Valuation:
     def __init__(self, business, category, start, end):
@@ -815,160 +588,91 @@ class Inventory_Valuation:
                 start__gte=self.start,
                 end__lte=self.end,
             )
-            current = models.month_period.objects.filter(start__lte=today, end__gte=today, is_closed=False, business=self.business).first()
-            current_month = []
+            current_month = models.month_period.objects.filter(start__lte=today, end__gte=today, is_closed=False, business=self.business).first()
 
-            if current and self.end >= current.start:
-                current_month = current
+            if current_month and self.end < current_month.start:
+                current_month = None
 
             closed_months = all_months.filter(is_closed=True)
 
-            filters = {}
-
-            if self.category != "all":
-                filters["item__category__name"] = self.category
-
-            closed_balance = models.item_balance.objects.filter(
-                period__in=closed_months, **filters
-            ).annotate(
-                item_name=F("item__item_name"),
-                code=F("item__code"),
-                category__name=F("item__category__name"),
-                brand__name=F("item__brand__name"),
-                avg_cost=ExpressionWrapper(
-                    (Coalesce(F("opening_value"), 0) + Coalesce(F("closing_value"), 0)) /
-                    Case(
-                        When(Q(opening_quantity=0) & Q(closing_quantity=0), then=None),
-                        default=Coalesce(F("opening_quantity"), 0) + Coalesce(F("closing_quantity"), 0),
-                        output_field=DecimalField()
-                    ),
-                    output_field=DecimalField(max_digits=12, decimal_places=2)
-                ),
-                avg_inv_value=ExpressionWrapper(
-                    (Coalesce(F("opening_value"), 0) + Coalesce(F("closing_value"), 0)) /
-                    Value(2.0, output_field=DecimalField()),
-                    output_field=DecimalField(max_digits=12, decimal_places=2)
-                ),
-            ).annotate(
-                cogs=ExpressionWrapper(F("avg_cost") * F("quantity_sold"), output_field=DecimalField(max_digits=12, decimal_places=2)),
-                quantity=F("quantity_sold"),
-                purchase_price=F("avg_cost") * F("quantity_sold"),
-                sales_price=Case(
-                    When(quantity=0, then=Value(0, output_field=DecimalField())),
-                    default=F("value_sold") / F("quantity_sold"),
-                    output_field=DecimalField(max_digits=12, decimal_places=2)
-                ),
-                turnover_rate=ExpressionWrapper(
-                    Case(
-                        When(avg_inv_value=0, then=Value(None, output_field=DecimalField())),
-                        default=F("cogs") / F("avg_inv_value"),
-                        output_field=DecimalField(max_digits=12, decimal_places=2)
-                    ),
-                    output_field=DecimalField(max_digits=12, decimal_places=2)
-                )
-            ).values("item_name", "code", "category__name", "brand__name", "quantity", "purchase_price", "sales_price", "turnover_rate")
+            filters = {} if self.category == "all" else {"category": self.category}
+
+            # closed months: cost of the quantity sold at the month's average cost
+            closed = [
+                row
+                for rows in report_snapshot.closed_data('inventory_valuation', closed_months, filters).values()
+                for row in rows
+            ]
+
+            stock_value = report_math.column(closed, "opening_value") + report_math.column(closed, "closing_value")
+            stock_quantity = report_math.column(closed, "opening_quantity") + report_math.column(closed, "closing_quantity")
+            quantity = report_math.column(closed, "quantity_sold")
+            cost, _ = report_math.ratio(stock_value * quantity, stock_quantity)
+
+            lines = {
+                "item": [row["item_id"] for row in closed],
+                "quantity": [quantity],
+                "sales": [report_math.column(closed, "value_sold")],
+                "cost": [cost],
+                "average_stock": [report_math.ratio(stock_value, 2)[0]],
+                "months": [np.ones(len(closed), dtype=np.int64)],
+            }
 
-            current_balance = []
+            # open month: item_balance is kept current by the posting paths, with the cost
+            # recorded on each sales line
             if current_month:
+                stock = models.item_balance.objects.filter(period=current_month)
 
-                sales_ss = (
-                    models.sale_history.objects.filter(
-                        item_name=OuterRef("item"), bussiness_name=self.business,
-                        sales__date__range=[self.start, self.end]
-                    )
-                    .exclude(sales__is_reversed=True)
-                    .values("item_name")
-                    .annotate(
-                        sales_value=ExpressionWrapper(Sum(F("quantity") * F("sales_price")), output_field=DecimalField())
-                    )
-                    .values("sales_value")[:1]
-                )
+                if filters:
+                    stock = stock.filter(item__category__name=filters["category"])
 
-                purchase_ss = (
-                    models.sale_history.objects.filter(
-                        item_name=OuterRef("item"), bussiness_name=self.business,
-                        sales__date__range=[self.start, self.end]
-                    )
-                    .exclude(sales__is_reversed=True)
-                    .values("item_name")
-                    .annotate(
-                        purchase_value=ExpressionWrapper(Sum(F("quantity") * F("purchase_price")), output_field=DecimalField())
-                    )
-                    .values("purchase_value")[:1]
-                )
+                stock = list(stock.values(
+                    "item_id", "quantity_sold", "value_sold", "cost_sold", "opening_value", "closing_value"
+                ))
 
-                sales_qs = (
-                    models.sale_history.objects.filter(
-                        item_name=OuterRef("item"), bussiness_name=self.business,
-                        sales__date__range=[self.start, self.end]
-                    )
-                    .exclude(sales__is_reversed=True)
-                    .values("item_name")
-                    .annotate(total_qty=Coalesce(Sum("quantity"), 0))
-                    .values("total_qty")[:1]
+                lines["item"] += [row["item_id"] for row in stock]
+                lines["quantity"].append(report_math.column(stock, "quantity_sold"))
+                lines["sales"].append(report_math.column(stock, "value_sold"))
+                lines["cost"].append(report_math.column(stock, "cost_sold"))
+                lines["average_stock"].append(
+                    report_math.ratio(report_math.column(stock, "opening_value") + report_math.column(stock, "closing_value"), 2)[0]
                 )
+                lines["months"].append(np.ones(len(stock), dtype=np.int64))
 
-                current_balance = (
-                    models.item_balance.objects.filter(period=current_month, **filters)
-                    .annotate(
-                        item_name=F("item__item_name"),
-                        code=F("item__code"),
-                        category__name=F("item__category__name"),
-                        brand__name=F("item__brand__name"),
-
-                        quantity_solds=Subquery(sales_qs, output_field=DecimalField()),
-                        sales_value=Subquery(sales_ss, output_field=DecimalField()),
-                        purchase_value=Subquery(purchase_ss, output_field=DecimalField()),
-
-                        sales_price=Case(
-                            When(quantity_solds=0, then=Value(0, output_field=DecimalField())),
-                            default=F("sales_value"),
-                            output_field=DecimalField(max_digits=12, decimal_places=2),
-                        ),
-
-                        purchase_price=Case(
-                            When(quantity_solds=0, then=Value(0, output_field=DecimalField())),
-                            default=F("purchase_value"),
-                            output_field=DecimalField(max_digits=12, decimal_places=2),
-                        ),
-
-                        avg_inv_value=ExpressionWrapper(
-                            (Coalesce(F("opening_value"), 0) + Coalesce(F("quantity_solds"), 0)) * Coalesce(F("purchase_price"), 0) / Value(2.0),
-                            output_field=DecimalField(max_digits=12, decimal_places=2),
-                        ),
-                    )
-                    .annotate(
-                        cogs=ExpressionWrapper(
-                            F("quantity_solds") * F("item__purchase_price"),
-                            output_field=DecimalField(max_digits=12, decimal_places=2),
-                        ),
-                        quantity=F("quantity_solds"),
-                        turnover_rate=ExpressionWrapper(
-                            Case(
-                                When(avg_inv_value=0, then=Value(None, output_field=DecimalField())),
-                                default=F("cogs") / F("avg_inv_value"),
-                                output_field=DecimalField(max_digits=12, decimal_places=2),
-                            ),
-                            output_field=DecimalField(max_digits=12, decimal_places=2),
-                        ),
-                    )
-                    .values("item_name", "code", "sales_price", "purchase_price", "category__name", "brand__name", "quantity", "cogs", "turnover_rate")
-                )
+            item_ids, _, (quantity, sales, cost, average_stock, months) = report_math.group_sum(
+                lines["item"],
+                *(np.concatenate(lines[key]) for key in ("quantity", "sales", "cost", "average_stock", "months")),
+            )
 
-            merged = {}
-            for row in list(closed_balance) + list(current_balance):
-                key = row["item_name"]
+            average_stock, _ = report_math.ratio(average_stock, months)
+            turnover, has_turnover = report_math.ratio(cost, average_stock, report_math.SCALE)
+            avg_cost, has_avg_cost = report_math.ratio(cost, quantity, report_math.SCALE)
+            margin, has_margin = report_math.ratio(sales - cost, sales, report_math.SCALE * 100)
 
-                if key not in merged:
-                    merged[key] = row.copy()
-                else:
-                    merged[key]["quantity"] = (merged[key].get("quantity") or 0) + (row.get("quantity") or 0)
-                    merged[key]["cogs"] = (merged[key].get("cogs") or 0) + (row.get("cogs") or 0)
-                    merged[key]["purchase_price"] = ((merged[key].get("purchase_price") or 0) + Decimal(row["purchase_price"] or 0))
-                    merged[key]["sales_price"] = ((merged[key].get("sales_price") or 0) + Decimal(row["sales_price"] or 0))
-                    merged[key]["turnover_rate"] = ((merged[key].get("turnover_rate") or 0) + row["turnover_rate"]) / 2 if merged[key].get("turnover_rate") and row.get("turnover_rate") else merged[key].get("turnover_rate") or row.get("turnover_rate")
+            info = {
+                row["id"]: row
+                for row in models.items.objects.filter(pk__in=list(item_ids)).values(
+                    "id", "item_name", "code", category__name=F("category__name"), brand__name=F("brand__name")
+                )
+            }
 
-            return list(merged.values())
+            return [
+                {
+                    "item_name": info[item_id]["item_name"],
+                    "code": info[item_id]["code"],
+                    "category__name": info[item_id]["category__name"],
+                    "brand__name": info[item_id]["brand__name"],
+                    "quantity": report_math.to_float(quantity[i]),
+                    "purchase_price": report_math.to_float(cost[i]),
+                    "sales_price": report_math.to_float(sales[i]),
+                    "cogs": report_math.to_float(cost[i]),
+                    "avg_cost": report_math.to_float(avg_cost[i]) if has_avg_cost[i] else None,
+                    "margin": report_math.to_float(margin[i]) if has_margin[i] else None,
+                    "turnover_rate": report_math.to_float(turnover[i]) if has_turnover[i] else None,
+                }
+                for i, item_id in enumerate(item_ids)
+                if item_id in info
+            ]
         
         except Exception as error:
             logger.warning(error)
@@ -992,7 +696,7 @@ class Trial_Balance:
             return []
 
         if target_period.is_closed:
-            return self._balances_for_period(target_period)
+            return self._merge_balances(self._balances_for_period(target_period), [], period=target_period.name)
 
         prev_closed = models.month_period.objects.filter(
             business=self.business,
@@ -1007,53 +711,16 @@ class Trial_Balance:
         return merged
 
     def _balances_for_period(self, period):
-        balances = models.account_balance.objects.filter(
-            period=period
-        ).values(
+        return report_snapshot.closed_data('trial_balance', [period]).get(period.pk, [])
+
+    def _ledger_movements(self, period):
+        ledgers = general_ledger.movements(self.business, period, fields=(
             "account__id",
             "account__name",
             "account__code",
             "account__account_type__name",
             "account__account_type__account_type__name",
-            "period__name"
-        ).annotate(
-            debit=Coalesce(Sum("debit_total"), Value(0), output_field=DecimalField()),
-            credit=Coalesce(Sum("credit_total"), Value(0), output_field=DecimalField()),
-        )
-
-        return [
-            {
-                "period": period.name,
-                "real_account": b["account__name"],
-                "account_type": b["account__account_type__account_type__name"],
-                "sub_account": b["account__account_type__name"],
-                "debit": float(b["debit"]),
-                "credit": float(b["credit"]),
-                "account_id": b["account__id"],
-            }
-            for b in balances
-        ]
-
-    def _ledger_movements(self, period):
-        ledgers = []
-
-        def collect(qs):
-            return list(qs.values(
-                "account__id",
-                "account__name",
-                "account__code",
-                "account__account_type__name",
-                "account__account_type__account_type__name",
-            ).annotate(
-                debit=Coalesce(Sum("debit"), Value(0), output_field=DecimalField()),
-                credit=Coalesce(Sum("credit"), Value(0), output_field=DecimalField()),
-            ))
-
-        ledgers += collect(models.asset_ledger.objects.filter(bussiness_name=self.business, period=period))
-        ledgers += collect(models.equity_ledger.objects.filter(bussiness_name=self.business, period=period))
-        ledgers += collect(models.liabilities_ledger.objects.filter(bussiness_name=self.business, period=period))
-        ledgers += collect(models.revenue_ledger.objects.filter(bussiness_name=self.business, period=period))
-        ledgers += collect(models.expenses_ledger.objects.filter(bussiness_name=self.business, period=period))
+        ))
 
         return [
             {
@@ -1061,25 +728,20 @@ class Trial_Balance:
                 "real_account": l["account__name"],
                 "account_type": l["account__account_type__account_type__name"],
                 "sub_account": l["account__account_type__name"],
-                "debit": float(l["debit"]),
-                "credit": float(l["credit"]),
+                "debit": l["debit"],
+                "credit": l["credit"],
             }
             for l in ledgers
         ]
 
     def _merge_balances(self, snapshot, movements, period):
-        merged = {b["account_id"]: b for b in snapshot}
+        rows = list(snapshot) + list(movements)
 
-        for move in movements:
-            acc_id = move["account_id"]
-            if acc_id in merged:
-                merged[acc_id]["debit"] += move["debit"]
-                merged[acc_id]["credit"] += move["credit"]
-            else:
-                move["period"] = period
-                merged[acc_id] = move
-
-        for v in merged.values():
-            v["period"] = period
+        _, first, (debit, credit) = report_math.group_sum(
+            [row["account_id"] for row in rows], report_math.column(rows, "debit"), report_math.column(rows, "credit")
+        )
 
-        return list(merged.values())
+        return [
+            dict(rows[index], period=period, debit=report_math.to_float(debit_total), credit=report_math.to_float(credit_total))
+            for index, debit_total, credit_total in zip(first, debit, credit)
+        ]
@@ -0,0 +1,110 @@
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+
+# amounts and quantities are held as int64 hundredths so sums are exact and
+# whole columns can be added, masked and grouped without per-row Python work
+SCALE = 100
+CENT = Decimal('0.01')
+
+
+def to_fixed(value):
+    if value is None:
+        return 0
+
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+
+    return int(value.quantize(CENT, rounding=ROUND_HALF_UP) * SCALE)
+
+
+def column(rows, key):
+    """One field of a list of dicts as an int64 hundredths array."""
+    return np.fromiter((to_fixed(row[key]) for row in rows), dtype=np.int64, count=len(rows))
+
+
+def labels(rows, key):
+    return np.array([row[key] if row[key] is not None else '' for row in rows], dtype=object)
+
+
+def to_decimal(fixed):
+    return Decimal(int(fixed)).scaleb(-2)
+
+
+def to_float(fixed):
+    """API value of a hundredths amount: the float nearest the exact two-place Decimal."""
+    return float(to_decimal(fixed))
+
+
+def ratio(numerator, denominator, factor=1):
+    """Elementwise numerator * factor / denominator rounded half up to an integer.
+
+    With hundredths inputs, factor=SCALE gives a hundredths quotient. Returns (values, defined);
+    defined is False where the denominator is zero and the value there is 0.
+    """
+    numerator = np.asarray(numerator, dtype=np.int64) * factor
+    denominator = np.asarray(denominator, dtype=np.int64)
+    defined = denominator != 0
+    safe = np.where(defined, denominator, 1)
+
+    sign = np.sign(numerator) * np.sign(safe)
+    quotient, remainder = np.divmod(np.abs(numerator), np.abs(safe))
+    quotient += (2 * remainder >= np.abs(safe))
+
+    return np.where(defined, sign * quotient, 0), defined
+
+
+def group_sum(keys, *columns):
+    """Sums columns per distinct key. Returns (unique keys, first row index of each key, summed columns)."""
+    keys = np.asarray(keys, dtype=object)
+
+    if not len(keys):
+        return keys, np.zeros(0, dtype=np.int64), [np.zeros(0, dtype=np.int64) for _ in columns]
+
+    unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    sums = []
+
+    for values in columns:
+        total = np.zeros(len(unique), dtype=np.int64)
+        np.add.at(total, inverse, values)
+        sums.append(total)
+
+    return unique, first, sums
+
+
+COGS_ACCOUNT = 'cost of goods sold'
+
+
+def profit_and_loss(rows, label):
+    """One P&L row from per-account totals.
+
+    rows carry account_type ('Revenue', 'Expenses', ...), account__name, debit and credit.
+    """
+    types = labels(rows, 'account_type')
+    names = labels(rows, 'account__name')
+    debit = column(rows, 'debit')
+    credit = column(rows, 'credit')
+
+    revenue_rows = types == 'Revenue'
+    expense_rows = types == 'Expenses'
+    cogs_rows = expense_rows & np.array([COGS_ACCOUNT in name.lower() for name in names], dtype=bool)
+    other_rows = expense_rows & ~cogs_rows
+
+    revenue = int((credit - debit)[revenue_rows].sum())
+    cogs = int((debit - credit)[cogs_rows].sum())
+
+    expense_names, _, (expense_totals,) = group_sum(names[other_rows], (debit - credit)[other_rows])
+    total_expenses = int(expense_totals.sum())
+
+    return {
+        "period": label,
+        "revenue": to_float(revenue),
+        "cogs": to_float(cogs),
+        "expenses": {name: to_float(total) for name, total in zip(expense_names, expense_totals)},
+        "total_expenses": to_float(total_expenses),
+        "net_profit": to_float(revenue - cogs - total_expenses),
+    }
+
+
+def difference(row, other, keys):
+    """row[key] - other[key] for each key, exact to the cent; missing values count as zero."""
+    return {key: to_float(to_fixed(row.get(key)) - to_fixed(other.get(key))) for key in keys}
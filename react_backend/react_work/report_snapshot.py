@@ -0,0 +1,153 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Sum, F, Value, DecimalField
+from django.db.models.functions import Coalesce
+from . import models
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Figures of a closed month never change, so each report keeps the per-month input it
+# needs in report_snapshot. close_month_period writes them; a month closed before the
+# table existed is filled the first time a report asks for it.
+
+
+def _by_period(rows, periods):
+    found = {period.pk: [] for period in periods}
+
+    for row in rows:
+        found[row.pop("period_id")].append(row)
+
+    return found
+
+
+def _trial_balance(periods):
+    names = {period.pk: period.name for period in periods}
+    balances = models.account_balance.objects.filter(
+        period__in=periods
+    ).values(
+        "period_id",
+        "account__id",
+        "account__name",
+        "account__account_type__name",
+        "account__account_type__account_type__name",
+    ).annotate(
+        debit=Coalesce(Sum("debit_total"), Value(0), output_field=DecimalField()),
+        credit=Coalesce(Sum("credit_total"), Value(0), output_field=DecimalField()),
+    ).order_by()
+
+    found = {period.pk: [] for period in periods}
+
+    for b in balances:
+        found[b["period_id"]].append({
+            "period": names[b["period_id"]],
+            "real_account": b["account__name"],
+            "account_type": b["account__account_type__account_type__name"],
+            "sub_account": b["account__account_type__name"],
+            "debit": b["debit"],
+            "credit": b["credit"],
+            "account_id": b["account__id"],
+        })
+
+    return found
+
+
+def _profit_and_loss(periods):
+    rows = models.account_balance.objects.filter(period__in=periods).values(
+        "period_id", "account__name", account_type=F("account__account_type__account_type__name")
+    ).annotate(
+        debit=Coalesce(Sum("debit_total"), Value(0), output_field=DecimalField()),
+        credit=Coalesce(Sum("credit_total"), Value(0), output_field=DecimalField()),
+    ).order_by()
+
+    return _by_period(rows, periods)
+
+
+def _inventory_valuation(periods, category=None):
+    rows = models.item_balance.objects.filter(period__in=periods)
+
+    if category is not None:
+        rows = rows.filter(item__category__name=category)
+
+    rows = rows.values(
+        "period_id", "item_id", "opening_quantity", "closing_quantity", "opening_value", "closing_value",
+        "quantity_sold", "value_sold", category=F("item__category__name"),
+    ).order_by()
+
+    return _by_period(rows, periods)
+
+
+# report -> builder taking a list of periods and returning {period id: data} in one grouped
+# query; a builder's keyword arguments are the filters a report can be narrowed by
+REPORTS = {
+    'trial_balance': _trial_balance,
+    'profit_and_loss': _profit_and_loss,
+    'inventory_valuation': _inventory_valuation,
+}
+
+
+def _filters_hash(filters):
+    if not filters:
+        return ''
+
+    return hashlib.sha1(json.dumps(filters, sort_keys=True, cls=DjangoJSONEncoder).encode('utf-8')).hexdigest()
+
+
+def _as_stored(data):
+    # what comes back from the JSON column, so fresh and cached data look the same
+    return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+
+
+def store(report, period, data, filters=None):
+    models.report_snapshot.objects.update_or_create(
+        business_id=period.business_id, report=report, period=period, filters_hash=_filters_hash(filters),
+        defaults={'filters': filters or {}, 'data': data},
+    )
+
+
+def closed_data(report, periods, filters=None):
+    """{period id: data} of a report for the closed periods among periods, one query when all are cached.
+
+    filters are passed to the report's builder, and each set of them is stored apart.
+    """
+    periods = [period for period in periods if period.is_closed]
+    filters_hash = _filters_hash(filters)
+
+    found = {
+        snapshot.period_id: snapshot.data
+        for snapshot in models.report_snapshot.objects.filter(
+            report=report, period__in=[period.pk for period in periods], filters_hash=filters_hash
+        ).only('period_id', 'data')
+    }
+
+    missing = [period for period in periods if period.pk not in found]
+
+    if not missing:
+        return found
+
+    built = REPORTS[report](missing, **(filters or {}))
+
+    for period in missing:
+        data = _as_stored(built[period.pk])
+        found[period.pk] = data
+
+        try:
+            with transaction.atomic():
+                models.report_snapshot.objects.create(
+                    business_id=period.business_id, report=report, period=period,
+                    filters_hash=filters_hash, filters=filters or {}, data=data,
+                )
+
+        except IntegrityError:
+            # filled by a concurrent request
+            pass
+
+    return found
+
+
+def capture(month):
+    """Stores every report's snapshot of a month that has just been closed."""
+    for report, build in REPORTS.items():
+        store(report, month, build([month])[month.pk])
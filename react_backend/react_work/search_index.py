@@ -0,0 +1,284 @@
+from difflib import SequenceMatcher, get_close_matches
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, F, Case, When, Value, Max, FloatField
+from . import models
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# search_term holds one row per distinct word of a searchable row, so a search is a range
+# scan on (business, kind, term) instead of icontains over the joined columns. A word
+# matches the terms it prefixes; a word that prefixes nothing falls back to the closest
+# terms sharing its first letter. Rows must match every word of the query and are ranked
+# by how well (exact 3, prefix 2, fuzzy the similarity) and where (the field's weight).
+
+KINDS = {
+    'item': (models.items, {
+        'item_name': 3, 'code': 3, 'model': 1, 'category__name': 1, 'brand__name': 1,
+    }),
+    'customer': (models.customer, {
+        'name': 3, 'account': 3, 'contact': 1, 'email': 1, 'address': 1,
+    }),
+    'supplier': (models.supplier, {
+        'name': 3, 'account': 3, 'contact': 1, 'email': 1, 'address': 1,
+    }),
+    'sale': (models.sale, {
+        'code': 3, 'customer_name': 2, 'customer_info__name': 2, 'description': 1,
+        'location_address__location_name': 1, 'status': 1,
+    }),
+}
+
+# the instance's own columns behind the indexed text; a save that changes none of them is not re-indexed
+WATCHED = {
+    'item': ('item_name', 'code', 'model', 'category_id', 'brand_id'),
+    'customer': ('name', 'account', 'contact', 'email', 'address'),
+    'supplier': ('name', 'account', 'contact', 'email', 'address'),
+    'sale': ('code', 'customer_name', 'customer_info_id', 'description', 'location_address_id', 'status'),
+}
+
+# a rename of these shows in the indexed text of other rows: model -> (field, kind, foreign key)
+DEPENDENTS = {
+    models.inventory_category: ('name', 'item', 'category'),
+    models.inventory_brand: ('name', 'item', 'brand'),
+    models.inventory_location: ('location_name', 'sale', 'location_address'),
+    models.customer: ('name', 'sale', 'customer_info'),
+}
+
+MODEL_KINDS = {model: kind for kind, (model, fields) in KINDS.items()}
+
+TERM_LENGTH = models.search_term._meta.get_field('term').max_length
+
+CHUNK_SIZE = getattr(settings, 'SEARCH_INDEX_CHUNK_SIZE', 2000)
+
+# rows a query word may match; a word shorter than a couple of letters prefixes most of a large tenant
+MATCH_LIMIT = getattr(settings, 'SEARCH_MATCH_LIMIT', 2000)
+
+MAX_QUERY_WORDS = 5
+
+FUZZY_MIN_LENGTH = 3
+FUZZY_CANDIDATES = getattr(settings, 'SEARCH_FUZZY_CANDIDATES', 5000)
+FUZZY_MATCHES = 5
+FUZZY_CUTOFF = 0.75
+
+WORD = re.compile(r'\w+')
+
+_MISSING = object()
+
+_local = threading.local()
+
+
+def words(text):
+    return [word[:TERM_LENGTH] for word in WORD.findall(str(text or '').lower())]
+
+
+def _terms(business_id, kind, row):
+    weights = {}
+
+    for field, weight in KINDS[kind][1].items():
+        for word in words(row[field]):
+            weights[word] = max(weights.get(word, 0), weight)
+
+    return [
+        models.search_term(business_id=business_id, kind=kind, object_id=row['pk'], term=term, weight=weight)
+        for term, weight in weights.items()
+    ]
+
+
+def index(business_id, kind, ids, replace=True):
+    """Writes the terms of the rows of kind with the given ids, replacing what they had."""
+    model, fields = KINDS[kind]
+    ids = list(ids)
+
+    if not ids:
+        return
+
+    terms = []
+
+    for row in model.objects.filter(pk__in=ids).values('pk', *fields):
+        terms.extend(_terms(business_id, kind, row))
+
+    with transaction.atomic():
+        if replace:
+            remove(business_id, kind, ids)
+
+        models.search_term.objects.bulk_create(terms, batch_size=CHUNK_SIZE)
+
+
+def remove(business_id, kind, ids):
+    models.search_term.objects.filter(business_id=business_id, kind=kind, object_id__in=list(ids)).delete()
+
+
+def _reindex_where(business_id, kind, chunk_size=CHUNK_SIZE, **filters):
+    rows = KINDS[kind][0].objects.filter(bussiness_name_id=business_id, **filters).order_by('pk')
+    last = 0
+    done = 0
+
+    while True:
+        chunk = list(rows.filter(pk__gt=last).values_list('pk', flat=True)[:chunk_size])
+
+        if not chunk:
+            return done
+
+        index(business_id, kind, chunk)
+        last = chunk[-1]
+        done += len(chunk)
+
+
+def rebuild(business, kinds=None, chunk_size=CHUNK_SIZE):
+    """Re-creates the business' terms of kinds (all when None). Returns {kind: rows indexed}.
+
+    The business searches without the index until the rebuild is done.
+    """
+    from . import tenant_context
+
+    business.search_indexed = False
+    business.save(update_fields=['search_indexed'])
+    tenant_context.invalidate_business(business.bussiness_name)
+
+    result = {}
+
+    for kind in kinds or KINDS:
+        models.search_term.objects.filter(business=business, kind=kind).delete()
+        result[kind] = _reindex_where(business.pk, kind, chunk_size)
+
+    business.search_indexed = True
+    business.save(update_fields=['search_indexed'])
+    tenant_context.invalidate_business(business.bussiness_name)
+
+    return result
+
+
+def _score(terms, word):
+    """Returns the SQL score of a term row for word, or None when no term matches it.
+
+    Exact 3 and prefix 2 times the weight; a word that prefixes nothing scores the
+    similarity of its closest terms instead.
+    """
+    # terms are lower case, and MySQL's case-insensitive LIKE 'word%' is a range scan of the index
+    if terms.filter(term__istartswith=word).exists():
+        return Q(term__istartswith=word), Case(
+            When(term=word, then=F('weight') * 3.0),
+            When(term__istartswith=word, then=F('weight') * 2.0),
+            default=Value(0.0), output_field=FloatField(),
+        )
+
+    if len(word) < FUZZY_MIN_LENGTH:
+        return None
+
+    candidates = terms.filter(term__istartswith=word[0]).values_list('term', flat=True).distinct()[:FUZZY_CANDIDATES]
+    close = get_close_matches(word, list(candidates), n=FUZZY_MATCHES, cutoff=FUZZY_CUTOFF)
+
+    if not close:
+        return None
+
+    return Q(term__in=close), Case(
+        *[When(term=term, then=F('weight') * SequenceMatcher(None, word, term).ratio()) for term in close],
+        default=Value(0.0), output_field=FloatField(),
+    )
+
+
+def search(business, kind, query, limit=MATCH_LIMIT):
+    """Returns the ids of the business' rows of kind matching query, best first.
+
+    Returns None when the business' index is not built yet or query has no words; the
+    caller then searches the tables themselves.
+    """
+    query_words = list(dict.fromkeys(words(query)))[:MAX_QUERY_WORDS]
+
+    if not business.search_indexed or not query_words:
+        return None
+
+    terms = models.search_term.objects.filter(business=business, kind=kind)
+    matches = Q()
+    scores = {}
+
+    for number, word in enumerate(query_words):
+        scored = _score(terms, word)
+
+        if scored is None:
+            return []
+
+        condition, score = scored
+        matches |= condition
+        scores[f'word_{number}'] = Max(score)
+
+    # rows are grouped per object in the database, so every word must match before the limit applies
+    ranked = terms.filter(matches).values('object_id').annotate(**scores).filter(
+        **{f'{name}__gt': 0 for name in scores}
+    ).annotate(
+        total=sum((F(name) for name in scores), Value(0.0))
+    ).order_by('-total', 'object_id')
+
+    return list(ranked.values_list('object_id', flat=True)[:limit])
+
+
+def _state(instance, fields):
+    # __dict__ rather than getattr so a deferred field is not loaded just to be remembered
+    return {field: instance.__dict__.get(field, _MISSING) for field in fields}
+
+
+def _changed(instance, fields):
+    before = getattr(instance, '_search_state', {})
+
+    return any(
+        before.get(field, _MISSING) is not _MISSING and before[field] != instance.__dict__.get(field, _MISSING)
+        for field in fields
+    )
+
+
+def _fields(sender):
+    fields = set(WATCHED.get(MODEL_KINDS.get(sender), ()))
+
+    if sender in DEPENDENTS:
+        fields.add(DEPENDENTS[sender][0])
+
+    return fields
+
+
+def remember(sender, instance, **kwargs):
+    instance._search_state = _state(instance, _fields(sender))
+
+
+def on_save(sender, instance, created, **kwargs):
+    kind = MODEL_KINDS.get(sender)
+
+    if kind and (created or _changed(instance, WATCHED[kind])):
+        index(instance.bussiness_name_id, kind, [instance.pk], replace=not created)
+
+    if sender in DEPENDENTS and not created:
+        field, dependent, key = DEPENDENTS[sender]
+
+        if _changed(instance, (field,)):
+            _reindex_where(instance.bussiness_name_id, dependent, **{key: instance})
+
+    remember(sender, instance)
+
+
+@contextmanager
+def suspended():
+    """Stops rows deleted inside the block from removing their terms, or dropping the
+    item catalogue, one by one.
+
+    For deletions that clear up after themselves, such as a tenant purge.
+    """
+    _local.suspended = True
+
+    try:
+        yield
+    finally:
+        _local.suspended = False
+
+
+def is_suspended():
+    return getattr(_local, 'suspended', False)
+
+
+def on_delete(sender, instance, **kwargs):
+    if is_suspended():
+        return
+
+    remove(instance.bussiness_name_id, MODEL_KINDS[sender], [instance.pk])
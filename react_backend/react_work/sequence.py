@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from . import models
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = getattr(settings, 'DOCUMENT_SEQUENCE_BLOCK_SIZE', 1)
+
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+
+def _locked_row(business, doc_type, year, seed):
+    query = models.document_sequence.objects.select_for_update()
+    row = query.filter(business=business, doc_type=doc_type, year=year).first()
+
+    if row is not None:
+        return row
+
+    try:
+        with transaction.atomic():
+            models.document_sequence.objects.create(
+                business=business, doc_type=doc_type, year=year,
+                last_value=seed() if seed else 0
+            )
+    except IntegrityError:
+        logger.info(f"Sequence {doc_type}/{year} for business {business.pk} created concurrently.")
+
+    return query.get(business=business, doc_type=doc_type, year=year)
+
+
+def reserve(business, doc_type, year=0, count=1, seed=None):
+    """Reserves count consecutive numbers and returns the first one.
+
+    Inside a transaction the row stays locked until commit, so a rollback hands the numbers back.
+    seed() gives the last number already used when the sequence row does not exist yet.
+    """
+    if count < 1:
+        raise ValueError('count must be at least 1')
+
+    with transaction.atomic():
+        row = _locked_row(business, doc_type, year, seed)
+        first = row.last_value + 1
+        row.last_value += count
+        row.save(update_fields=['last_value'])
+
+    return first
+
+
+def _publish(key, start, end):
+    with _blocks_lock:
+        _blocks[key] = [start, end]
+
+
+def next_number(business, doc_type, year=0, seed=None):
+    """Returns the next number; with DOCUMENT_SEQUENCE_BLOCK_SIZE > 1 each worker pre-allocates a block."""
+    if BLOCK_SIZE <= 1:
+        return reserve(business, doc_type, year, 1, seed)
+
+    key = (business.pk, doc_type, year)
+
+    with _blocks_lock:
+        block = _blocks.get(key)
+        if block and block[0] <= block[1]:
+            number = block[0]
+            block[0] += 1
+            return number
+
+    first = reserve(business, doc_type, year, BLOCK_SIZE, seed)
+
+    # the rest of the block is only usable once the reservation is committed
+    transaction.on_commit(lambda: _publish(key, first + 1, first + BLOCK_SIZE - 1))
+
+    return first
+
+
+def last_code_seed(model, code_field, **filters):
+    def seed():
+        last = model.objects.filter(**filters).order_by('-id').first()
+        if not last:
+            return 0
+
+        try:
+            return int(getattr(last, code_field)[-5:])
+        except (TypeError, ValueError):
+            return model.objects.filter(**filters).count()
+
+    return seed
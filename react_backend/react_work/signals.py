@@ -1,21 +1,17 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
-from . import models
+from . import models, account_cache, location_provisioning, search_index, item_catalogue, daily_summary
 from datetime import date
 
 @receiver(post_save, sender=models.items)
 def create_item_in_all_locations(sender, instance, created, **kwargs):
     if created:
-        locations = models.inventory_location.objects.filter(bussiness_name=instance.bussiness_name)
-        for i in locations:
-            models.location_items.objects.get_or_create(item_name=instance, location=i, quantity=0, defaults={'bussiness_name': instance.bussiness_name, 'sales_price': instance.sales_price})
+        location_provisioning.on_item_created(instance)
 
 @receiver(post_save, sender=models.inventory_location)
 def create_location_items_for_new_location(sender, instance, created, **kwargs):
     if created:
-        items = models.items.objects.filter(bussiness_name=instance.bussiness_name)
-        for i in items:
-            models.location_items.objects.get_or_create(item_name=i, location=instance, quantity=0, defaults={'bussiness_name': i.bussiness_name})
+        location_provisioning.on_location_created(instance)
         
 @receiver(post_save, sender=models.bussiness)
 def create_default_chart_of_accounts(sender, instance, created, **kwargs):
@@ -120,5 +116,79 @@ def create_default_chart_of_accounts(sender, instance, created, **kwargs):
         models.supplier.objects.create(bussiness_name=instance, name='Default Supplier', account=f'SUP{instance.id}-00001')
         models.customer.objects.create(bussiness_name=instance, name='Regular Customer', account=f'CUST{instance.id}-00001')
         models.customer.objects.create(bussiness_name=instance, name='Default Registered Customer', account=f'CUST{instance.id}-00002')
-        
-        
\ No newline at end of file
+
+
+@receiver([post_save, post_delete], sender=models.real_account)
+@receiver([post_save, post_delete], sender=models.sub_account)
+@receiver([post_save, post_delete], sender=models.account)
+def invalidate_chart_of_accounts(sender, instance, **kwargs):
+    account_cache.invalidate(instance.bussiness_name_id)
+
+
+@receiver([post_save, post_delete], sender=models.month_period)
+def invalidate_current_period(sender, instance, **kwargs):
+    account_cache.invalidate(instance.business_id)
+
+
+# stock movements and item imports write in bulk and drop the dashboard themselves
+@receiver([post_save, post_delete], sender=models.items)
+@receiver([post_save, post_delete], sender=models.inventory_location)
+def invalidate_dashboard(sender, instance, **kwargs):
+    if not search_index.is_suspended():
+        daily_summary.invalidate_dashboard(instance.bussiness_name_id)
+
+
+@receiver(post_init, sender=models.items)
+@receiver(post_init, sender=models.customer)
+@receiver(post_init, sender=models.supplier)
+@receiver(post_init, sender=models.sale)
+@receiver(post_init, sender=models.inventory_category)
+@receiver(post_init, sender=models.inventory_brand)
+@receiver(post_init, sender=models.inventory_location)
+def remember_search_fields(sender, instance, **kwargs):
+    search_index.remember(sender, instance)
+
+
+@receiver(post_save, sender=models.items)
+@receiver(post_save, sender=models.customer)
+@receiver(post_save, sender=models.supplier)
+@receiver(post_save, sender=models.sale)
+@receiver(post_save, sender=models.inventory_category)
+@receiver(post_save, sender=models.inventory_brand)
+@receiver(post_save, sender=models.inventory_location)
+def update_search_index(sender, instance, created, **kwargs):
+    search_index.on_save(sender, instance, created)
+
+
+@receiver(post_delete, sender=models.items)
+@receiver(post_delete, sender=models.customer)
+@receiver(post_delete, sender=models.supplier)
+@receiver(post_delete, sender=models.sale)
+def remove_from_search_index(sender, instance, **kwargs):
+    search_index.on_delete(sender, instance)
+
+
+@receiver(post_init, sender=models.items)
+@receiver(post_init, sender=models.location_items)
+def remember_catalogue_fields(sender, instance, **kwargs):
+    item_catalogue.remember(sender, instance)
+
+
+@receiver(post_save, sender=models.items)
+@receiver(post_save, sender=models.location_items)
+@receiver(post_save, sender=models.inventory_category)
+@receiver(post_save, sender=models.inventory_brand)
+@receiver(post_save, sender=models.inventory_unit)
+@receiver(post_save, sender=models.inventory_location)
+def update_item_catalogue(sender, instance, created, **kwargs):
+    item_catalogue.on_save(sender, instance, created)
+
+
+# location rows are only deleted with their item or their location
+@receiver(post_delete, sender=models.items)
+@receiver(post_delete, sender=models.inventory_category)
+@receiver(post_delete, sender=models.inventory_brand)
+@receiver(post_delete, sender=models.inventory_unit)
+@receiver(post_delete, sender=models.inventory_location)
+def drop_item_catalogue(sender, instance, **kwargs):
+    item_catalogue.on_delete(sender, instance)
@@ -0,0 +1,147 @@
+from . import models, daily_summary, location_provisioning, item_catalogue
+from decimal import Decimal
+from collections import defaultdict
+from django.db.models import F
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StockMovement:
+    """Locks the items and location_items touched by a document and moves stock in bulk.
+
+    Must be used inside transaction.atomic(); rows stay locked until the transaction ends.
+    """
+
+    def __init__(self, business, location):
+        self.business = business
+        self.location = location
+        self.items = {}
+        self.items_by_pk = {}
+        self.location_items = {}
+
+    def lock(self, names=None, item_ids=None):
+        query = models.items.objects.select_for_update().filter(bussiness_name=self.business)
+
+        if names is not None:
+            query = query.filter(item_name__in=set(names))
+
+        if item_ids is not None:
+            query = query.filter(pk__in=set(item_ids))
+
+        self.items = {i.item_name: i for i in query.order_by('pk')}
+        self.items_by_pk = {i.pk: i for i in self.items.values()}
+
+        # businesses that opted in only get a location's row when stock first moves there
+        if self.business.lazy_location_items:
+            location_provisioning.materialize(self.business, self.location, list(self.items_by_pk))
+
+        loc_query = models.location_items.objects.select_for_update().filter(
+            bussiness_name=self.business, location=self.location,
+            item_name__in=list(self.items_by_pk)
+        ).order_by('pk')
+
+        self.location_items = {l.item_name_id: l for l in loc_query}
+
+        return self
+
+    def validate(self, lines, outgoing=True, check_active=True):
+        """Returns a list of per-line errors; lines are dicts with 'name' and 'qty'."""
+        errors = []
+        requested = defaultdict(Decimal)
+
+        for number, line in enumerate(lines, start=1):
+            name = line.get('name', '')
+            item = self.items.get(name)
+
+            if item is None:
+                errors.append({'line': number, 'item': name, 'message': f"Item '{name}' not found"})
+                continue
+
+            loc_item = self.location_items.get(item.pk)
+            if loc_item is None:
+                errors.append({'line': number, 'item': name, 'message': f"Item '{name}' not found in location '{self.location.location_name}'"})
+                continue
+
+            if check_active and item.is_active is False:
+                errors.append({'line': number, 'item': name, 'message': f"Item '{name}' is inactive"})
+                continue
+
+            try:
+                qty = Decimal(str(line['qty']))
+            except Exception:
+                errors.append({'line': number, 'item': name, 'message': f"Invalid quantity for '{name}'"})
+                continue
+
+            if qty <= 0:
+                errors.append({'line': number, 'item': name, 'message': f"Invalid quantity for '{name}'"})
+                continue
+
+            requested[item.pk] += qty
+
+            if outgoing and loc_item.quantity - requested[item.pk] < 0:
+                errors.append({'line': number, 'item': name,
+                               'message': f"{name} does not have enough quantity at {self.location.location_name}"})
+
+        return errors
+
+    def apply(self, deltas, last_sales=None, sync_purchase_price=False, location_only=False):
+        """Applies signed quantity changes keyed by item pk with one UPDATE per table.
+
+        location_only leaves items.quantity alone, e.g. for stock moving between locations.
+        """
+        item_rows = []
+        loc_rows = []
+        new_values = []
+        repriced = False
+
+        for item_pk, delta in deltas.items():
+            delta = Decimal(str(delta))
+            item = self.items_by_pk[item_pk]
+            loc_item = self.location_items[item_pk]
+
+            new_values.append((loc_item, loc_item.quantity + delta))
+            loc_item.quantity = F('quantity') + delta
+
+            if not location_only:
+                new_values.append((item, item.quantity + int(delta)))
+                item.quantity = F('quantity') + int(delta)
+
+            if last_sales is not None:
+                item.last_sales = last_sales
+                loc_item.last_sales = last_sales
+
+            if sync_purchase_price and loc_item.purchase_price != item.purchase_price:
+                loc_item.purchase_price = item.purchase_price
+                repriced = True
+
+            item_rows.append(item)
+            loc_rows.append(loc_item)
+
+        item_fields = ['quantity'] + (['last_sales'] if last_sales is not None else [])
+        loc_fields = list(item_fields) + (['purchase_price'] if sync_purchase_price else [])
+
+        if loc_rows:
+            models.location_items.objects.bulk_update(loc_rows, loc_fields)
+
+            if not location_only:
+                models.items.objects.bulk_update(item_rows, item_fields)
+
+        for row, quantity in new_values:
+            row.quantity = quantity
+
+        if loc_rows:
+            daily_summary.invalidate_dashboard(self.business.pk)
+
+            # the select shows the location's cost, so only a cost that moved drops the catalogue
+            if repriced:
+                item_catalogue.invalidate(self.business.pk)
+
+    def deltas(self, lines, sign=1):
+        result = defaultdict(Decimal)
+
+        for line in lines:
+            item = self.items[line['name']]
+            result[item.pk] += Decimal(str(line['qty'])) * sign
+
+        return result
@@ -1 +1,7 @@
-import react_work.account_closure
\ No newline at end of file
+from .account_closure import auto_close_periods, close_business_periods, summarize_period_closing
+from .export_jobs import run_export_job, cleanup_export_jobs
+from .item_valuation import reconcile_item_balances
+from .idempotency import cleanup_idempotency_keys
+from .location_provisioning import provision_location_items
+from .tenant_purge import purge_tenant, resume_tenant_purges
+from .activity_log import archive_activity_log
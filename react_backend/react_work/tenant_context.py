@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from typing import Optional
+from django.conf import settings
+from django.core.cache import cache
+from . import models
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TTL = getattr(settings, 'TENANT_CONTEXT_TTL', 60)
+
+
+class ForeignUser(models.current_user.DoesNotExist):
+    """The user exists in the business but belongs to another signed in account.
+
+    A DoesNotExist, so the services report it like any user that is not found.
+    """
+
+
+@dataclass(frozen=True)
+class TenantContext:
+    business: models.bussiness
+    user: models.current_user
+    report_permissions: Optional[models.report_permissions] = None
+    setting_permissions: Optional[models.setting_permissions] = None
+
+    @property
+    def business_name(self):
+        return self.business.bussiness_name
+
+    @property
+    def user_name(self):
+        return self.user.user_name
+
+
+def _entry_key(business, user):
+    return f'tenant_context:{business}:{user}'
+
+
+def _version_key(business):
+    return f'tenant_context:version:{business}'
+
+
+def _related_or_none(instance, name):
+    try:
+        return getattr(instance, name)
+    except models.report_permissions.DoesNotExist:
+        return None
+    except models.setting_permissions.DoesNotExist:
+        return None
+
+
+def _load(business, user):
+    try:
+        user_query = models.current_user.objects.select_related(
+            'bussiness_name', 'report_user', 'setting_user'
+        ).get(bussiness_name__bussiness_name=business, bussiness_name__pending_deletion=False, user_name=user)
+
+    except models.current_user.DoesNotExist:
+        # keep the same exception the callers already handle for a missing business
+        models.bussiness.objects.get(bussiness_name=business)
+        raise
+
+    return TenantContext(
+        business=user_query.bussiness_name,
+        user=user_query,
+        report_permissions=_related_or_none(user_query, 'report_user'),
+        setting_permissions=_related_or_none(user_query, 'setting_user'),
+    )
+
+
+def _check_owner(context, company):
+    if company is not None and context.user.user_id != int(company):
+        raise ForeignUser(f'{context.user_name} does not belong to the signed in account')
+
+    return context
+
+
+def get_context(business, user, company=None):
+    """The cached context of user in business; with company, only if the user belongs to that account."""
+    entry_key = _entry_key(business, user)
+    version_key = _version_key(business)
+
+    try:
+        cached = cache.get_many([entry_key, version_key])
+    except Exception as error:
+        logger.warning(error)
+        return _check_owner(_load(business, user), company)
+
+    version = cached.get(version_key, 0)
+    entry = cached.get(entry_key)
+
+    if entry is not None and entry[0] == version:
+        return _check_owner(entry[1], company)
+
+    context = _load(business, user)
+
+    try:
+        cache.set(entry_key, (version, context), CONTEXT_TTL)
+    except Exception as error:
+        logger.warning(error)
+
+    return _check_owner(context, company)
+
+
+def resolve(business, user, context=None, company=None):
+    """The context a view resolved, or the one of business and user; company is the signed in
+    account, which the user must belong to either way."""
+    if context is not None:
+        return _check_owner(context, company)
+
+    return get_context(business, user, company)
+
+
+def from_request(request, business=None, user=None):
+    base = getattr(request, '_request', request)
+
+    business = business if business is not None else request.data.get('business')
+    user = user if user is not None else request.data.get('user')
+
+    if not isinstance(business, str) or not isinstance(user, str):
+        raise ValueError('Invalid business or user submitted')
+
+    business = business.strip()
+    user = user.strip()
+
+    contexts = getattr(base, '_tenant_contexts', None)
+    if contexts is None:
+        contexts = {}
+        base._tenant_contexts = contexts
+
+    key = (business, user)
+    if key not in contexts:
+        contexts[key] = get_context(business, user, request.user.id)
+
+    return contexts[key]
+
+
+def invalidate_user(business, user):
+    try:
+        cache.delete(_entry_key(business, user))
+    except Exception as error:
+        logger.warning(error)
+
+
+def invalidate_business(business):
+    version_key = _version_key(business)
+
+    try:
+        cache.add(version_key, 0, None)
+        cache.incr(version_key)
+    except Exception as error:
+        logger.warning(error)
+
+
+def try_from_request(request, business=None, user=None):
+    # None leaves the lookup, and the account check, to the resolve() of the service the view calls
+    try:
+        return from_request(request, business=business, user=user)
+
+    except (models.bussiness.DoesNotExist, models.current_user.DoesNotExist, ValueError):
+        return None
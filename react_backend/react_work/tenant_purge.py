@@ -0,0 +1,209 @@
+from celery import shared_task
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from . import models, tenant_context, search_index
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'TENANT_PURGE_BATCH_SIZE', 2000)
+
+# pause between batches so a purge does not starve the live tenants of the same tables
+PAUSE = getattr(settings, 'TENANT_PURGE_PAUSE_SECONDS', 0.2)
+
+# one task run stops after this long and queues the next run from where it stopped
+TIME_BUDGET = getattr(settings, 'TENANT_PURGE_TIME_BUDGET_SECONDS', 240)
+
+RESUME_AFTER = timedelta(minutes=getattr(settings, 'TENANT_PURGE_RESUME_MINUTES', 15))
+
+PENDING = 'Pending'
+RUNNING = 'Running'
+DONE = 'Done'
+FAILED = 'Failed'
+
+# leaf tables first, so nothing deleted is still referenced through a PROTECT key
+PURGE_ORDER = (
+    (models.search_term, 'business'),
+    (models.idempotency_key, 'business'),
+    (models.report_snapshot, 'business'),
+    (models.ledger_balance_head, 'business'),
+    (models.daily_item_sales, 'business'),
+    (models.daily_stock_summary, 'business'),
+    (models.export_job, 'business'),
+    (models.activity_archive, 'business'),
+    (models.document_sequence, 'business'),
+
+    (models.account_balance, 'business'),
+    (models.customer_balance, 'business'),
+    (models.supplier_balance, 'business'),
+    (models.item_balance, 'business'),
+
+    (models.gl_entry, 'bussiness_name'),
+    (models.customer_ledger, 'bussiness_name'),
+    (models.supplier_ledger, 'bussiness_name'),
+    (models.journal, 'bussiness_name'),
+    (models.journal_head, 'bussiness_name'),
+
+    (models.sale_history, 'bussiness_name'),
+    (models.sale, 'bussiness_name'),
+    (models.purchase_history, 'bussiness_name'),
+    (models.purchase, 'bussiness_name'),
+    (models.payment, 'bussiness_name'),
+    (models.cash_receipt, 'bussiness_name'),
+
+    (models.transfer_history, 'bussiness_name'),
+    (models.inventory_transfer, 'bussiness_name'),
+    (models.location_items, 'bussiness_name'),
+    (models.items, 'bussiness_name'),
+    (models.inventory_location, 'bussiness_name'),
+    (models.inventory_category, 'bussiness_name'),
+    (models.inventory_brand, 'bussiness_name'),
+    (models.inventory_unit, 'bussiness_name'),
+
+    (models.customer, 'bussiness_name'),
+    (models.supplier, 'bussiness_name'),
+    (models.taxes_levies, 'bussiness_name'),
+    (models.currency, 'bussiness_name'),
+
+    (models.real_account, 'bussiness_name'),
+    (models.sub_account, 'bussiness_name'),
+    (models.account, 'bussiness_name'),
+
+    (models.month_period, 'business'),
+    (models.quarter_period, 'bussiness_name'),
+    (models.year_period, 'bussiness_name'),
+
+    (models.tracking_history, 'bussiness_name'),
+    (models.report_permissions, 'bussiness_name'),
+    (models.setting_permissions, 'bussiness_name'),
+    (models.current_user, 'bussiness_name'),
+)
+
+
+def request_purge(business_query, requested_by=''):
+    """Takes the business offline and queues its purge; returns the tenant_purge record.
+
+    The business is flagged and its users deactivated at once, so nothing can post to it
+    while the worker deletes its rows.
+    """
+    with transaction.atomic():
+        user_ids = list(models.current_user.objects.filter(bussiness_name=business_query).values_list('user_id', flat=True))
+
+        business_query.pending_deletion = True
+        business_query.save(update_fields=['pending_deletion'])
+        User.objects.filter(pk__in=user_ids).update(is_active=False)
+
+        purge = models.tenant_purge.objects.create(
+            business_id=business_query.pk, business_name=business_query.bussiness_name,
+            requested_by=requested_by, user_ids=user_ids,
+        )
+
+        transaction.on_commit(lambda: purge_tenant.delay(purge.pk))
+
+    tenant_context.invalidate_business(business_query.bussiness_name)
+    logger.info(f"Queued deletion of business '{business_query.bussiness_name}' (purge {purge.pk})")
+
+    return purge
+
+
+def _delete_batch(query):
+    """Deletes the lowest BATCH_SIZE primary keys of query; returns ({model label: rows}, more left)."""
+    upper = list(query.order_by('pk').values_list('pk', flat=True)[BATCH_SIZE - 1:BATCH_SIZE])
+    batch = query.filter(pk__lte=upper[0]) if upper else query
+
+    with transaction.atomic():
+        if query.model in (models.export_job, models.activity_archive):
+            for row in batch.exclude(file=''):
+                row.file.delete(save=False)
+
+        _, deleted = batch.delete()
+
+    return deleted, bool(upper)
+
+
+def _record(purge, deleted):
+    for label, count in deleted.items():
+        if count:
+            purge.deleted[label] = purge.deleted.get(label, 0) + count
+
+
+def _finish(purge):
+    with transaction.atomic():
+        # whatever a newer table added without being listed above goes with the business row
+        _, deleted = models.bussiness.objects.filter(pk=purge.business_id).delete()
+        _record(purge, deleted)
+
+        _, deleted = User.objects.filter(pk__in=purge.user_ids).delete()
+        _record(purge, deleted)
+
+        purge.status = DONE
+        purge.step = ''
+        purge.finished_at = timezone.now()
+        purge.save()
+
+    tenant_context.invalidate_business(purge.business_name)
+    logger.info(f"Business '{purge.business_name}' deleted: {sum(purge.deleted.values())} rows")
+
+
+@shared_task(name="react_work.tenant_purge.purge_tenant")
+def purge_tenant(purge_id):
+    """Deletes one business in bounded batches; safe to run again after a crash."""
+    purge = models.tenant_purge.objects.filter(pk=purge_id).first()
+
+    if purge is None or purge.status == DONE:
+        return None
+
+    purge.status = RUNNING
+    purge.message = ''
+    purge.save(update_fields=['status', 'message', 'updated_at'])
+
+    deadline = time.monotonic() + TIME_BUDGET
+
+    try:
+        # search_term goes first, so the deleted rows need not clear their terms one by one
+        with search_index.suspended():
+            for model, field in PURGE_ORDER:
+                query = model.objects.filter(**{f'{field}_id': purge.business_id})
+                more = True
+
+                while more:
+                    deleted, more = _delete_batch(query)
+
+                    _record(purge, deleted)
+                    purge.step = model._meta.model_name
+                    purge.save(update_fields=['step', 'deleted', 'updated_at'])
+
+                    if more and time.monotonic() > deadline:
+                        # batches already deleted stay deleted, so the next run just carries on
+                        purge_tenant.delay(purge_id)
+                        return purge.status
+
+                    if more and PAUSE:
+                        time.sleep(PAUSE)
+
+            _finish(purge)
+
+    except Exception as error:
+        logger.exception(f"Purge {purge_id} of business '{purge.business_name}' failed at {purge.step}")
+        purge.status = FAILED
+        purge.message = str(error)[:255]
+        purge.save(update_fields=['status', 'message', 'updated_at'])
+
+    return purge.status
+
+
+@shared_task(name="react_work.tenant_purge.resume_tenant_purges")
+def resume_tenant_purges():
+    """Requeues purges whose worker died or failed and that have not moved for RESUME_AFTER."""
+    stalled = models.tenant_purge.objects.filter(
+        status__in=[PENDING, RUNNING, FAILED], updated_at__lt=timezone.now() - RESUME_AFTER
+    ).values_list('pk', flat=True)
+
+    for purge_id in stalled:
+        purge_tenant.delay(purge_id)
+
+    return len(stalled)
@@ -1,3 +1,949 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from unittest import mock
+from . import models, sequence, inventory_sales, item_valuation, payment_journal, tenant_context, report_snapshot, report_math, keyset, search_index, item_catalogue, tenant_purge, ledger_posting
+from .journal_batch import JournalBatch, UnbalancedJournal
+from .stock_movement import StockMovement
+import importlib
+import json
 
-# Create your tests here.
+
+class BusinessSetup:
+    """A business with an admin user, two locations and five items holding 10 units at Main."""
+
+    def setUp(self):
+        # tenant contexts and catalogues are cached by name, which the rolled back tests reuse
+        cache.clear()
+
+        self.company = User.objects.create(username='owner')
+        self.business = models.bussiness.objects.create(bussiness_name='Shop', company=self.company)
+        self.user = models.current_user.objects.create(user=self.company, user_name='bob', bussiness_name=self.business, admin=True)
+        self.location = models.inventory_location.objects.create(location_name='Main', bussiness_name=self.business, created_by=self.user)
+        self.other_location = models.inventory_location.objects.create(location_name='Second', bussiness_name=self.business, created_by=self.user)
+
+        category = models.inventory_category.objects.create(name='Cat', bussiness_name=self.business)
+        unit = models.inventory_unit.objects.create(name='Piece', suffix='pcs', bussiness_name=self.business)
+
+        self.items = [
+            models.items.objects.create(
+                item_name=f'Item{n}', bussiness_name=self.business, category=category, unit=unit,
+                created_by=self.user, purchase_price=2, sales_price=5,
+            )
+            for n in range(5)
+        ]
+
+        models.location_items.objects.filter(bussiness_name=self.business, location=self.location).update(quantity=10)
+        models.items.objects.filter(bussiness_name=self.business).update(quantity=20)
+
+    def quantity_at(self, location, name):
+        return models.location_items.objects.get(location=location, item_name__item_name=name).quantity
+
+
+class BusinessTestCase(BusinessSetup, TestCase):
+    pass
+
+
+class StockMovementTests(BusinessTestCase):
+    def stock(self, names):
+        return StockMovement(self.business, self.location).lock(names=names)
+
+    def test_lock_loads_only_the_named_items(self):
+        stock = self.stock(['Item0', 'Item2', 'Nope'])
+
+        self.assertEqual(set(stock.items), {'Item0', 'Item2'})
+        self.assertEqual(set(stock.location_items), {item.pk for item in stock.items.values()})
+        self.assertTrue(all(row.location_id == self.location.pk for row in stock.location_items.values()))
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_lock_selects_items_and_location_items_for_update(self):
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            self.stock(['Item0'])
+
+        self.assertEqual(sum('FOR UPDATE' in query['sql'] for query in queries.captured_queries), 2)
+
+    def test_validate_accepts_stock_on_hand(self):
+        stock = self.stock(['Item0', 'Item1'])
+
+        self.assertEqual(stock.validate([{'name': 'Item0', 'qty': 10}, {'name': 'Item1', 'qty': '2.5'}]), [])
+
+    def test_validate_adds_up_lines_of_the_same_item(self):
+        stock = self.stock(['Item0'])
+
+        errors = stock.validate([{'name': 'Item0', 'qty': 6}, {'name': 'Item0', 'qty': 5}])
+
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0]['line'], 2)
+        self.assertEqual(errors[0]['message'], 'Item0 does not have enough quantity at Main')
+
+    def test_validate_allows_incoming_stock_beyond_the_quantity(self):
+        stock = self.stock(['Item0'])
+
+        self.assertEqual(stock.validate([{'name': 'Item0', 'qty': 50}], outgoing=False), [])
+
+    def test_validate_reports_unknown_inactive_and_invalid_lines(self):
+        models.items.objects.filter(pk=self.items[1].pk).update(is_active=False)
+        stock = self.stock(['Item0', 'Item1', 'Nope'])
+
+        errors = stock.validate([
+            {'name': 'Nope', 'qty': 1},
+            {'name': 'Item1', 'qty': 1},
+            {'name': 'Item0', 'qty': 0},
+            {'name': 'Item0', 'qty': 'abc'},
+        ])
+
+        self.assertEqual([error['message'] for error in errors], [
+            "Item 'Nope' not found",
+            "Item 'Item1' is inactive",
+            "Invalid quantity for 'Item0'",
+            "Invalid quantity for 'Item0'",
+        ])
+
+    def test_apply_moves_item_and_location_quantities(self):
+        stock = self.stock(['Item0', 'Item1'])
+        lines = [{'name': 'Item0', 'qty': 3}, {'name': 'Item1', 'qty': 1}, {'name': 'Item0', 'qty': 2}]
+
+        stock.apply(stock.deltas(lines, sign=-1), last_sales=date.today().isoformat())
+
+        self.assertEqual(self.quantity_at(self.location, 'Item0'), 5)
+        self.assertEqual(self.quantity_at(self.location, 'Item1'), 9)
+        self.assertEqual(models.items.objects.get(pk=self.items[0].pk).quantity, 15)
+
+        # the locked rows in memory carry the new quantities for the next document
+        self.assertEqual(stock.location_items[self.items[0].pk].quantity, Decimal(5))
+        self.assertEqual(stock.validate([{'name': 'Item0', 'qty': 6}])[0]['item'], 'Item0')
+
+    def test_apply_location_only_leaves_the_item_total(self):
+        stock = self.stock(['Item2'])
+
+        stock.apply({self.items[2].pk: -4}, location_only=True)
+
+        self.assertEqual(self.quantity_at(self.location, 'Item2'), 6)
+        self.assertEqual(models.items.objects.get(pk=self.items[2].pk).quantity, 20)
+
+
+class SequenceTests(BusinessTestCase):
+    def setUp(self):
+        super().setUp()
+
+        # published blocks outlive the rolled back test transaction
+        blocks = mock.patch.dict(sequence._blocks, clear=True)
+        blocks.start()
+        self.addCleanup(blocks.stop)
+
+    def test_reserve_hands_out_consecutive_blocks(self):
+        self.assertEqual(sequence.reserve(self.business, 'TEST', 2026, count=5), 1)
+        self.assertEqual(sequence.reserve(self.business, 'TEST', 2026), 6)
+        self.assertEqual(sequence.reserve(self.business, 'TEST', 2027), 1)
+
+        row = models.document_sequence.objects.get(business=self.business, doc_type='TEST', year=2026)
+        self.assertEqual(row.last_value, 6)
+
+    def test_reserve_seeds_a_new_sequence_only(self):
+        self.assertEqual(sequence.reserve(self.business, 'TEST', seed=lambda: 41), 42)
+        self.assertEqual(sequence.reserve(self.business, 'TEST', seed=lambda: 100), 43)
+
+    def test_reserve_rejects_an_empty_block(self):
+        with self.assertRaises(ValueError):
+            sequence.reserve(self.business, 'TEST', count=0)
+
+    def test_rolled_back_reservation_is_handed_out_again(self):
+        sequence.reserve(self.business, 'TEST', count=3)
+
+        try:
+            with transaction.atomic():
+                self.assertEqual(sequence.reserve(self.business, 'TEST', count=2), 4)
+                raise RuntimeError('document failed')
+        except RuntimeError:
+            pass
+
+        self.assertEqual(sequence.reserve(self.business, 'TEST'), 4)
+
+    def test_next_number_uses_the_committed_block(self):
+        with mock.patch.object(sequence, 'BLOCK_SIZE', 3):
+            with self.captureOnCommitCallbacks(execute=True):
+                first = sequence.next_number(self.business, 'TEST')
+
+            numbers = [first] + [sequence.next_number(self.business, 'TEST') for _ in range(3)]
+
+        self.assertEqual(numbers, [1, 2, 3, 4])
+        self.assertEqual(models.document_sequence.objects.get(business=self.business, doc_type='TEST').last_value, 6)
+
+    def test_next_number_does_not_publish_an_uncommitted_block(self):
+        with mock.patch.object(sequence, 'BLOCK_SIZE', 3):
+            with self.captureOnCommitCallbacks(execute=False):
+                first = sequence.next_number(self.business, 'TEST')
+
+            second = sequence.next_number(self.business, 'TEST')
+
+        self.assertEqual((first, second), (1, 4))
+
+
+class JournalBatchTests(BusinessTestCase):
+    def setUp(self):
+        super().setUp()
+
+        today = date.today()
+        self.period = models.month_period.objects.get(business=self.business, start__lte=today, end__gte=today)
+        self.cash = models.real_account.objects.get(bussiness_name=self.business, code='10101')
+        self.revenue = models.real_account.objects.get(bussiness_name=self.business, code='40101')
+
+    def sale(self, batch, debit, credit, ledger_debit=None, ledger_credit=None):
+        head = batch.head(entry_type='Sale', transaction_number='SAL-1', amount=debit)
+        today = date.today()
+
+        batch.journal(head, entry_type='Sale', debit=10100, amount=debit, date=today, transaction_number='SAL-1')
+        batch.journal(head, entry_type='Sale', credit=40100, amount=credit, date=today, transaction_number='SAL-1')
+        batch.ledger('asset', head, period=self.period, account=self.cash, transaction_number='SAL-1', date=today,
+                     type='Sale', debit=debit if ledger_debit is None else ledger_debit)
+        batch.ledger('revenue', head, period=self.period, account=self.revenue, transaction_number='SAL-1', date=today,
+                     type='Sale', credit=credit if ledger_credit is None else ledger_credit)
+
+        return head
+
+    def test_save_writes_a_balanced_batch(self):
+        batch = JournalBatch(self.business, self.user)
+        head = self.sale(batch, Decimal('12.50'), Decimal('12.50'))
+
+        self.assertEqual(batch.save(), [head])
+        self.assertIsNotNone(head.pk)
+        self.assertTrue(head.code)
+        self.assertEqual(models.journal.objects.filter(head=head).count(), 2)
+        self.assertEqual(
+            sorted(models.gl_entry.objects.filter(head=head).values_list('account_class', 'debit', 'credit')),
+            [('asset', Decimal('12.50'), Decimal('0.00')), ('revenue', Decimal('0.00'), Decimal('12.50'))],
+        )
+
+    def test_unbalanced_journal_is_not_written(self):
+        heads = models.journal_head.objects.filter(bussiness_name=self.business).count()
+        batch = JournalBatch(self.business, self.user)
+        self.sale(batch, Decimal('10.00'), Decimal('9.50'), ledger_credit=Decimal('10.00'))
+
+        with self.assertRaisesMessage(UnbalancedJournal, 'journal debits and credits differ by 0.50'):
+            batch.save()
+
+        self.assertEqual(models.journal_head.objects.filter(bussiness_name=self.business).count(), heads)
+        self.assertFalse(models.journal.objects.filter(bussiness_name=self.business).exists())
+
+    def test_unbalanced_ledger_is_rejected(self):
+        batch = JournalBatch(self.business, self.user)
+        self.sale(batch, Decimal('10.00'), Decimal('10.00'), ledger_credit=Decimal('8.00'))
+
+        with self.assertRaisesMessage(UnbalancedJournal, 'ledger debits and credits differ by 2.00'):
+            batch.validate()
+
+    def test_a_cent_of_rounding_is_tolerated(self):
+        batch = JournalBatch(self.business, self.user)
+        self.sale(batch, Decimal('10.00'), Decimal('10.01'))
+
+        batch.validate()
+
+    def test_every_head_is_checked(self):
+        batch = JournalBatch(self.business, self.user)
+        self.sale(batch, Decimal('10.00'), Decimal('10.00'))
+        self.sale(batch, Decimal('5.00'), Decimal('4.00'), ledger_credit=Decimal('5.00'))
+
+        with self.assertRaises(UnbalancedJournal):
+            batch.validate()
+
+    def test_carried_amount_balances_an_open_head(self):
+        batch = JournalBatch(self.business, self.user)
+        head = self.sale(batch, Decimal('10.00'), Decimal('9.00'))
+        batch.carry(head, Decimal('1.00'))
+
+        batch.validate()
+
+    def test_subsidiary_ledgers_are_not_balanced(self):
+        customer = models.customer.objects.get(bussiness_name=self.business, name='Regular Customer')
+        batch = JournalBatch(self.business, self.user)
+        head = self.sale(batch, Decimal('10.00'), Decimal('10.00'))
+        batch.ledger('customer', head, period=self.period, account=customer, transaction_number='SAL-1', debit=Decimal('10.00'))
+
+        batch.validate()
+
+
+class SalesBatchTests(BusinessTestCase):
+    def sale(self, key, qty, name='Item0'):
+        today = date.today().isoformat()
+
+        return {
+            'key': key,
+            'data': {'date': today, 'dueDate': today, 'terms': 'Full Payment', 'type': 'regular',
+                     'customer': 'Walk in', 'account': '10101 - Cash', 'discount': 0},
+            'totals': {'grandTotal': qty * 5, 'subtotal': qty * 5, 'netTotal': qty * 5},
+            'items': [{'name': name, 'qty': qty, 'price': 5}],
+            'levy': [],
+        }
+
+    def post(self, sales):
+        result = inventory_sales.post_sales_batch('Shop', 'bob', self.company.pk, 'Main', sales)
+        self.assertEqual(result['status'], 'success')
+        return result['data']['results']
+
+    def test_a_rejected_sale_leaves_the_others_posted(self):
+        with self.assertLogs('react_work.inventory_sales', 'WARNING'):
+            results = self.post([self.sale('k1', 4), self.sale('k2', 7), self.sale('k3', 1, 'Nope'), self.sale('', 1), self.sale('k4', 6)])
+
+        self.assertEqual([result['status'] for result in results], ['success', 'error', 'error', 'error', 'success'])
+        self.assertEqual(results[1]['message'], 'Item0 does not have enough quantity at Main')
+        self.assertEqual(results[2]['message'], "Item 'Nope' not found")
+        self.assertEqual(results[3]['message'], 'Missing idempotency key')
+
+        self.assertEqual(self.quantity_at(self.location, 'Item0'), 0)
+        self.assertEqual(models.items.objects.get(pk=self.items[0].pk).quantity, 10)
+        self.assertEqual(models.sale.objects.filter(bussiness_name=self.business).count(), 2)
+        self.assertEqual(
+            set(models.idempotency_key.objects.filter(business=self.business).values_list('key', flat=True)), {'k1', 'k4'}
+        )
+
+    def test_a_sale_failing_after_its_stock_moved_gives_the_stock_back(self):
+        record_sale = item_valuation.record_sale
+        calls = []
+
+        def failing_second_sale(sale):
+            calls.append(sale)
+
+            if len(calls) == 2:
+                raise RuntimeError('valuation failed')
+
+            return record_sale(sale)
+
+        with mock.patch.object(item_valuation, 'record_sale', side_effect=failing_second_sale), \
+                self.assertLogs('react_work.inventory_sales', 'ERROR'):
+            results = self.post([self.sale('k1', 4), self.sale('k2', 5), self.sale('k3', 6)])
+
+        # k3 only fits if the locked rows in memory got k2's five units back
+        self.assertEqual([result['status'] for result in results], ['success', 'error', 'success'])
+        self.assertEqual(self.quantity_at(self.location, 'Item0'), 0)
+        self.assertEqual(models.items.objects.get(pk=self.items[0].pk).quantity, 10)
+        self.assertEqual(models.sale.objects.filter(bussiness_name=self.business).count(), 2)
+        self.assertFalse(models.idempotency_key.objects.filter(business=self.business, key='k2').exists())
+
+    def test_a_batch_sent_again_replays_posted_sales(self):
+        with self.assertLogs('react_work.inventory_sales', 'WARNING'):
+            first = self.post([self.sale('k1', 2), self.sale('k2', 20)])
+
+        again = self.post([self.sale('k1', 2), self.sale('k2', 3), self.sale('k1', 2)])
+
+        self.assertEqual([result['replayed'] for result in again], [True, False, True])
+        self.assertEqual(again[0]['data']['code'], first[0]['data']['code'])
+        self.assertEqual(again[1]['status'], 'success')
+        self.assertEqual(self.quantity_at(self.location, 'Item0'), 5)
+        self.assertEqual(models.sale.objects.filter(bussiness_name=self.business).count(), 2)
+
+    def test_a_key_reused_for_another_sale_is_refused(self):
+        first = self.post([self.sale('k1', 2)])
+
+        again = self.post([self.sale('k1', 3), self.sale('k2', 1), self.sale('k2', 4), self.sale('k1', 2)])
+
+        self.assertEqual([result['status'] for result in again], ['error', 'success', 'error', 'success'])
+        self.assertEqual(again[0]['message'], 'Idempotency key was already used for a different request')
+        self.assertEqual(again[2]['message'], 'Idempotency key was already used for a different request')
+        self.assertEqual(again[3]['data']['code'], first[0]['data']['code'])
+        self.assertEqual(self.quantity_at(self.location, 'Item0'), 7)
+        self.assertEqual(models.sale.objects.filter(bussiness_name=self.business).count(), 2)
+
+
+# requests really commit or roll back here, as the key is claimed in the request's own transaction
+class IdempotencyTests(BusinessSetup, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.company)
+
+    def form(self, qty=1, discount='0'):
+        today = date.today().isoformat()
+
+        return {
+            'business': 'Shop', 'user': 'bob', 'location': 'Main', 'terms': 'Full Payment', 'type': 'regular',
+            'customer': 'Walk in', 'account': '10101 - Cash', 'discount': discount, 'date': today, 'dueDate': today,
+            'items': [json.dumps({'name': 'Item3', 'qty': qty, 'price': 5})],
+            'totals': json.dumps({'grandTotal': qty * 5, 'subtotal': qty * 5, 'netTotal': qty * 5}),
+            'levy': '[]',
+        }
+
+    def post(self, form, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post('/api/add_sales/', form, **headers)
+
+    def sales(self):
+        return models.sale.objects.filter(bussiness_name=self.business).count()
+
+    def test_a_retry_replays_the_stored_response(self):
+        first = self.post(self.form(), 'key-1')
+        second = self.post(self.form(), 'key-1')
+
+        self.assertEqual(first.data['status'], 'success')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers.get('Idempotent-Replayed'), 'true')
+        self.assertEqual(self.sales(), 1)
+        self.assertEqual(self.quantity_at(self.location, 'Item3'), 9)
+
+    def test_a_key_reused_for_another_request_is_refused(self):
+        self.post(self.form(), 'key-1')
+        response = self.post(self.form(discount='5'), 'key-1')
+
+        self.assertEqual(response.data['status'], 'error')
+        self.assertEqual(response.data['message'], 'Idempotency key was already used for a different request')
+        self.assertEqual(self.sales(), 1)
+
+    def test_a_failed_request_releases_its_key(self):
+        with self.assertLogs('react_work.inventory_sales', 'WARNING'):
+            failed = self.post(self.form(qty=100), 'key-1')
+
+        self.assertEqual(failed.data['status'], 'error')
+        self.assertFalse(models.idempotency_key.objects.filter(business=self.business, key='key-1').exists())
+
+        # the key is free again, so the corrected request goes through under it
+        self.assertEqual(self.post(self.form(), 'key-1').data['status'], 'success')
+        self.assertEqual(self.sales(), 1)
+
+    def test_keys_are_scoped_to_the_business(self):
+        self.post(self.form(), 'key-1')
+
+        other = User.objects.create(username='other')
+        business = models.bussiness.objects.create(bussiness_name='Other', company=other)
+        models.idempotency_key.objects.create(business=business, scope='add_sales', key='key-2', fingerprint='x', response={})
+
+        self.assertEqual(self.post(self.form(), 'key-2').data['status'], 'success')
+        self.assertEqual(self.sales(), 2)
+
+    def test_requests_without_a_key_are_not_deduplicated(self):
+        self.post(self.form())
+        self.post(self.form())
+
+        self.assertEqual(self.sales(), 2)
+        self.assertFalse(models.idempotency_key.objects.filter(business=self.business).exists())
+
+
+class TenantContextTests(BusinessTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.stranger = User.objects.create(username='stranger')
+
+    def test_resolve_refuses_a_user_of_another_account(self):
+        context = tenant_context.resolve('Shop', 'bob', company=self.company.pk)
+
+        self.assertEqual(context.user, self.user)
+
+        with self.assertRaises(tenant_context.ForeignUser):
+            tenant_context.resolve('Shop', 'bob', company=self.stranger.pk)
+
+        # a context handed down is checked too
+        with self.assertRaises(tenant_context.ForeignUser):
+            tenant_context.resolve('Shop', 'bob', context, company=self.stranger.pk)
+
+    def test_services_report_a_user_of_another_account_as_not_found(self):
+        with self.assertLogs('react_work.payment_journal', 'WARNING'):
+            result = payment_journal.view_payment('Shop', 'bob', self.stranger.pk, 'PAY-1')
+
+        self.assertEqual(result['status'], 'error')
+        self.assertIn('not found', result['message'])
+
+    def test_an_idempotent_view_refuses_a_user_of_another_account(self):
+        client = APIClient()
+        client.force_authenticate(self.stranger)
+        today = date.today().isoformat()
+
+        with self.assertLogs('react_work.idempotency', 'WARNING'):
+            response = client.post('/api/add_sales/', {
+                'business': 'Shop', 'user': 'bob', 'location': 'Main', 'terms': 'Full Payment', 'type': 'regular',
+                'customer': 'Walk in', 'account': '10101 - Cash', 'discount': '0', 'date': today, 'dueDate': today,
+                'items': [json.dumps({'name': 'Item0', 'qty': 1, 'price': 5})],
+                'totals': json.dumps({'grandTotal': 5, 'subtotal': 5, 'netTotal': 5}), 'levy': '[]',
+            }, HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(response.data['status'], 'error')
+        self.assertFalse(models.sale.objects.filter(bussiness_name=self.business).exists())
+        self.assertFalse(models.idempotency_key.objects.exists())
+
+
+class ReportSnapshotTests(BusinessTestCase):
+    def setUp(self):
+        super().setUp()
+
+        today = date.today()
+        self.month = models.month_period.objects.get(business=self.business, start__lte=today, end__gte=today)
+        other = models.inventory_category.objects.create(name='Other', bussiness_name=self.business)
+        models.items.objects.create(item_name='Odd', bussiness_name=self.business, category=other, unit=self.items[0].unit, created_by=self.user)
+        models.month_period.objects.filter(pk=self.month.pk).update(is_closed=True)
+        self.month.refresh_from_db()
+
+    def test_filters_narrow_and_are_stored_apart(self):
+        everything = report_snapshot.closed_data('inventory_valuation', [self.month])[self.month.pk]
+        cat = report_snapshot.closed_data('inventory_valuation', [self.month], {'category': 'Cat'})[self.month.pk]
+        other = report_snapshot.closed_data('inventory_valuation', [self.month], {'category': 'Other'})[self.month.pk]
+
+        self.assertEqual(len(everything), 6)
+        self.assertEqual({row['category'] for row in cat}, {'Cat'})
+        self.assertEqual(len(cat), 5)
+        self.assertEqual([row['category'] for row in other], ['Other'])
+        self.assertEqual(models.report_snapshot.objects.filter(period=self.month, report='inventory_valuation').count(), 3)
+
+        # served from the stored snapshot afterwards
+        with self.assertNumQueries(1):
+            self.assertEqual(report_snapshot.closed_data('inventory_valuation', [self.month], {'category': 'Other'})[self.month.pk], other)
+
+
+class UserActivityTests(BusinessTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.company)
+        models.tracking_history.objects.bulk_create(
+            models.tracking_history(user=self.user, bussiness_name=self.business, area=f'Area{n}', head='Test')
+            for n in range(5)
+        )
+
+    def fetch(self, **data):
+        return self.client.post('/api/fetch_user_activities/', {'business': 'Shop', 'user': 'bob', 'username': 'All Users', **data}).data
+
+    def test_the_first_page_tells_the_client_there_is_more(self):
+        first = self.fetch(pageQuantity=3)
+
+        self.assertEqual(first['status'], 'success')
+        self.assertEqual(len(first['data']['activities']), 3)
+        self.assertTrue(first['data']['has_more'])
+
+        rest = self.fetch(pageQuantity=3, cursor=first['data']['next_cursor'])
+
+        self.assertFalse(rest['data']['has_more'])
+        self.assertIsNone(rest['data']['next_cursor'])
+        self.assertEqual(
+            [row['area'] for row in first['data']['activities'] + rest['data']['activities']],
+            [f'Area{n}' for n in reversed(range(5))],
+        )
+
+
+class ReportMathTests(SimpleTestCase):
+    def test_amounts_are_held_as_exact_hundredths(self):
+        rows = [{'value': Decimal('0.105')}, {'value': 0.1}, {'value': '-2.675'}, {'value': None}]
+
+        self.assertEqual(list(report_math.column(rows, 'value')), [11, 10, -268, 0])
+        self.assertEqual(report_math.to_decimal(-268), Decimal('-2.68'))
+        self.assertEqual(report_math.to_float(11), 0.11)
+
+    def test_ratio_rounds_half_away_from_zero(self):
+        values, defined = report_math.ratio([5, -5, 7, 4, 10], [2, 2, -2, 3, 0])
+
+        self.assertEqual(list(values), [3, -3, -4, 1, 0])
+        self.assertEqual(list(defined), [True, True, True, True, False])
+
+    def test_ratio_factor_gives_a_hundredths_quotient(self):
+        # 1.00 / 3.00 and 2.00 / 3.00 in hundredths
+        values, _ = report_math.ratio([100, 200], [300, 300], report_math.SCALE)
+
+        self.assertEqual(list(values), [33, 67])
+
+    def test_group_sum_adds_up_each_key_in_key_order(self):
+        keys, first, (quantity, value) = report_math.group_sum([3, 1, 3, 2, 1], [1, 2, 3, 4, 5], [10, 20, 30, 40, 50])
+
+        self.assertEqual(list(keys), [1, 2, 3])
+        self.assertEqual(list(first), [1, 3, 0])
+        self.assertEqual(list(quantity), [7, 4, 4])
+        self.assertEqual(list(value), [70, 40, 40])
+
+    def test_group_sum_of_nothing(self):
+        keys, first, (values,) = report_math.group_sum([], [])
+
+        self.assertEqual((len(keys), len(first), len(values)), (0, 0, 0))
+
+    def test_profit_and_loss_splits_cost_of_sales_from_expenses(self):
+        rows = [
+            {'account_type': 'Revenue', 'account__name': 'Sales Revenue', 'debit': '1.00', 'credit': '100.10'},
+            {'account_type': 'Expenses', 'account__name': 'Cost of Goods Sold', 'debit': '40.05', 'credit': 0},
+            {'account_type': 'Expenses', 'account__name': 'Rent', 'debit': '20.00', 'credit': 0},
+            {'account_type': 'Expenses', 'account__name': 'Rent', 'debit': '0.02', 'credit': 0},
+            {'account_type': 'Expenses', 'account__name': 'Power', 'debit': '5.00', 'credit': '1.00'},
+            {'account_type': 'Assets', 'account__name': 'Cash', 'debit': '99.00', 'credit': 0},
+        ]
+
+        result = report_math.profit_and_loss(rows, 'Jan')
+
+        self.assertEqual(result, {
+            'period': 'Jan', 'revenue': 99.1, 'cogs': 40.05,
+            'expenses': {'Power': 4.0, 'Rent': 20.02}, 'total_expenses': 24.02, 'net_profit': 35.03,
+        })
+
+
+class KeysetTests(BusinessTestCase):
+    def setUp(self):
+        super().setUp()
+
+        for item, price in zip(self.items, [7, 5, 5, 5, 3]):
+            models.items.objects.filter(pk=item.pk).update(sales_price=price)
+
+        self.rows = models.items.objects.filter(bussiness_name=self.business).values('item_name')
+
+    def pages(self, keys, page_quantity=2):
+        names, cursor = [], None
+
+        while True:
+            rows, cursor = keyset.keyset_page(self.rows, keys, cursor, page_quantity)
+            names.append([row['item_name'] for row in rows])
+
+            if cursor is None:
+                return names
+
+    def test_ties_are_broken_by_the_last_key(self):
+        self.assertEqual(
+            self.pages([('sales_price', True), ('id', False)]),
+            [['Item0', 'Item1'], ['Item2', 'Item3'], ['Item4']],
+        )
+        self.assertEqual(
+            self.pages([('sales_price', False), ('id', True)]),
+            [['Item4', 'Item3'], ['Item2', 'Item1'], ['Item0']],
+        )
+
+    def test_a_last_full_page_has_no_next_cursor(self):
+        self.assertEqual(self.pages([('id', False)], page_quantity=5), [['Item0', 'Item1', 'Item2', 'Item3', 'Item4']])
+
+    def test_cursors_round_trip_dates_and_decimals(self):
+        values = [date(2026, 1, 31), Decimal('5.10'), 'SAL-1', 7]
+
+        self.assertEqual(keyset.decode_cursor(keyset.encode_cursor(values), 4), ['2026-01-31', '5.10', 'SAL-1', 7])
+
+    def test_tampered_or_foreign_cursors_are_refused(self):
+        cursor = keyset.encode_cursor([5, 1])
+
+        for bad in (cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B'), 'nonsense'):
+            with self.assertRaises(keyset.InvalidCursor):
+                keyset.decode_cursor(bad, 2)
+
+        # a cursor of another ordering does not fit
+        with self.assertRaises(keyset.InvalidCursor):
+            keyset.decode_cursor(cursor, 3)
+
+
+class SearchIndexTests(BusinessTestCase):
+    def setUp(self):
+        super().setUp()
+
+        for item, (name, model) in zip(self.items, [('Blue Pen', ''), ('Pencil', ''), ('Red Marker', 'pen'), ('Stapler', ''), ('Blue Ink', '')]):
+            models.items.objects.filter(pk=item.pk).update(item_name=name, model=model)
+
+        search_index.rebuild(self.business, kinds=['item'])
+
+    def search(self, query):
+        ids = search_index.search(self.business, 'item', query)
+        names = dict(models.items.objects.filter(pk__in=ids or []).values_list('pk', 'item_name'))
+
+        return ids if ids is None else [names[pk] for pk in ids]
+
+    def test_exact_words_rank_above_prefixes_and_weaker_fields(self):
+        # pen: the name exactly (3 x 3), a name prefix (3 x 2), the model exactly (1 x 3)
+        self.assertEqual(self.search('pen'), ['Blue Pen', 'Pencil', 'Red Marker'])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('blue pen'), ['Blue Pen'])
+        # equal scores keep the older row first
+        self.assertEqual(self.search('BLUE'), ['Blue Pen', 'Blue Ink'])
+        self.assertEqual(self.search('blue stapler'), [])
+
+    def test_a_misspelt_word_falls_back_to_close_terms(self):
+        self.assertEqual(self.search('pencel'), ['Pencil'])
+        self.assertEqual(self.search('stapelr'), ['Stapler'])
+
+        # too short to guess at
+        self.assertEqual(self.search('qz'), [])
+
+    def test_an_unbuilt_index_or_an_empty_query_searches_the_tables(self):
+        self.assertIsNone(self.search('  ,, '))
+
+        models.bussiness.objects.filter(pk=self.business.pk).update(search_indexed=False)
+        self.business.refresh_from_db()
+
+        self.assertIsNone(self.search('pen'))
+
+
+class ItemCatalogueTests(BusinessTestCase):
+    def version(self):
+        return item_catalogue._version(self.business.pk)
+
+    def names(self, search=''):
+        return [row['item_name'] for row in item_catalogue.select(self.business.pk, search, 10) or []]
+
+    def test_a_shown_column_changing_rebuilds_the_catalogue(self):
+        self.assertIn('Item0', self.names())
+        version = self.version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item = models.items.objects.get(pk=self.items[0].pk)
+            item.item_name = 'Renamed'
+            item.save()
+
+        self.assertEqual(self.version(), version + 1)
+        self.assertEqual(self.names('renamed'), ['Renamed'])
+
+    def test_a_lookup_changing_rebuilds_the_catalogue(self):
+        version = self.version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category = models.inventory_category.objects.get(name='Cat')
+            category.name = 'Pens'
+            category.save()
+
+        self.assertEqual(self.version(), version + 1)
+
+    def test_other_columns_and_sales_leave_the_catalogue(self):
+        # a sale copies the item's cost to the location, which only shows when they differ
+        models.location_items.objects.filter(bussiness_name=self.business).update(purchase_price=2)
+        self.names()
+        version = self.version()
+        today = date.today().isoformat()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item = models.items.objects.get(pk=self.items[0].pk)
+            item.reorder_level = 7
+            item.save()
+
+            result = inventory_sales.post_sales_batch('Shop', 'bob', self.company.pk, 'Main', [{
+                'key': 'k1',
+                'data': {'date': today, 'dueDate': today, 'terms': 'Full Payment', 'type': 'regular',
+                         'customer': 'Walk in', 'account': '10101 - Cash', 'discount': 0},
+                'totals': {'grandTotal': 5, 'subtotal': 5, 'netTotal': 5},
+                'items': [{'name': 'Item1', 'qty': 1, 'price': 5}],
+                'levy': [],
+            }])
+
+        self.assertEqual(result['data']['results'][0]['status'], 'success')
+        self.assertEqual(self.version(), version)
+
+
+class TenantPurgeTests(BusinessTestCase):
+    def setUp(self):
+        super().setUp()
+
+        with mock.patch.object(tenant_purge.purge_tenant, 'delay'), self.captureOnCommitCallbacks(execute=True):
+            self.purge = tenant_purge.request_purge(self.business, 'owner')
+
+    def run_purge(self):
+        """Runs the purge and every run it queues for itself; returns the number of runs."""
+        runs = 0
+
+        with mock.patch.object(tenant_purge.purge_tenant, 'delay') as delay:
+            while True:
+                delay.reset_mock()
+                tenant_purge.purge_tenant(self.purge.pk)
+                runs += 1
+
+                if not delay.called:
+                    return runs
+
+    def test_a_request_takes_the_business_offline(self):
+        self.business.refresh_from_db()
+
+        self.assertTrue(self.business.pending_deletion)
+        self.assertFalse(User.objects.get(pk=self.company.pk).is_active)
+        self.assertEqual(self.purge.user_ids, [self.company.pk])
+
+    def test_a_purge_out_of_time_carries_on_where_it_stopped(self):
+        with mock.patch.object(tenant_purge, 'BATCH_SIZE', 3), mock.patch.object(tenant_purge, 'TIME_BUDGET', 0), \
+                mock.patch.object(tenant_purge, 'PAUSE', 0):
+            runs = self.run_purge()
+
+        self.purge.refresh_from_db()
+
+        self.assertGreater(runs, 1)
+        self.assertEqual(self.purge.status, tenant_purge.DONE)
+        self.assertEqual(self.purge.deleted['react_work.items'], 5)
+        self.assertEqual(self.purge.deleted['react_work.location_items'], 10)
+        self.assertFalse(models.bussiness.objects.filter(pk=self.business.pk).exists())
+        self.assertFalse(User.objects.filter(pk=self.company.pk).exists())
+
+    def test_a_failed_purge_is_resumed(self):
+        delete_batch = tenant_purge._delete_batch
+        calls = []
+
+        def failing_on_items(query):
+            if query.model is models.items and not calls:
+                calls.append(query)
+                raise RuntimeError('lost the database')
+
+            return delete_batch(query)
+
+        with mock.patch.object(tenant_purge, '_delete_batch', side_effect=failing_on_items), \
+                mock.patch.object(tenant_purge, 'PAUSE', 0), self.assertLogs('react_work.tenant_purge', 'ERROR'):
+            self.run_purge()
+
+        self.purge.refresh_from_db()
+        self.assertEqual((self.purge.status, self.purge.step), (tenant_purge.FAILED, 'location_items'))
+        self.assertTrue(models.items.objects.filter(bussiness_name=self.business).exists())
+
+        models.tenant_purge.objects.filter(pk=self.purge.pk).update(updated_at=timezone.now() - tenant_purge.RESUME_AFTER)
+
+        with mock.patch.object(tenant_purge.purge_tenant, 'delay') as delay:
+            self.assertEqual(tenant_purge.resume_tenant_purges(), 1)
+
+        delay.assert_called_once_with(self.purge.pk)
+
+        with mock.patch.object(tenant_purge, 'PAUSE', 0):
+            self.run_purge()
+
+        self.purge.refresh_from_db()
+        self.assertEqual(self.purge.status, tenant_purge.DONE)
+        self.assertEqual(self.purge.deleted['react_work.items'], 5)
+        self.assertFalse(models.bussiness.objects.filter(pk=self.business.pk).exists())
+
+    def test_recent_and_finished_purges_are_not_resumed(self):
+        models.tenant_purge.objects.create(business_id=0, business_name='Gone', status=tenant_purge.DONE)
+
+        with mock.patch.object(tenant_purge.purge_tenant, 'delay') as delay:
+            self.assertEqual(tenant_purge.resume_tenant_purges(), 0)
+
+        delay.assert_not_called()
+
+
+class LedgerBalanceTests(BusinessTestCase):
+    def setUp(self):
+        super().setUp()
+
+        today = date.today()
+        self.month = models.month_period.objects.get(business=self.business, start__lte=today, end__gte=today)
+        self.cash = models.real_account.objects.get(bussiness_name=self.business, code='10101')
+        self.head = models.journal_head.objects.create(created_by=self.user, bussiness_name=self.business)
+
+    def entry(self, day, debit=0, credit=0, ledger=models.asset_ledger, account=None):
+        return ledger(
+            head=self.head, account=account or self.cash, period=self.month, transaction_number=self.head.code,
+            date=self.month.start + timedelta(days=day), debit=Decimal(debit), credit=Decimal(credit),
+            bussiness_name=self.business,
+        )
+
+    def balances(self, ledger=models.asset_ledger):
+        rows = ledger.objects.filter(account=self.cash, period=self.month).order_by('date', 'id')
+        return [row.balance for row in rows]
+
+    def balance_head(self, ledger='asset'):
+        return models.ledger_balance_head.objects.get(ledger=ledger, account_id=self.cash.pk, period=self.month)
+
+    def test_a_batch_runs_on_from_the_head(self):
+        ledger_posting.post('asset', [self.entry(0, 100), self.entry(1, credit=30)])
+        ledger_posting.post('asset', [self.entry(2, 5)])
+
+        head = self.balance_head()
+
+        self.assertEqual(self.balances(), [100, 70, 75])
+        self.assertEqual((head.debit_total, head.credit_total, head.balance), (105, 30, 75))
+        self.assertEqual(head.last_date, self.month.start + timedelta(days=2))
+
+    def test_a_credit_ledger_grows_with_credits(self):
+        revenue = models.real_account.objects.get(bussiness_name=self.business, code='40101')
+        ledger_posting.post('revenue', [self.entry(0, credit=100, ledger=models.revenue_ledger, account=revenue)])
+
+        self.assertEqual(models.revenue_ledger.objects.get(account=revenue).balance, 100)
+
+    def test_a_backdated_entry_recomputes_the_later_balances(self):
+        ledger_posting.post('asset', [self.entry(9, 100), self.entry(19, credit=30)])
+
+        self.entry(4, 50).save()
+
+        head = self.balance_head()
+
+        self.assertEqual(self.balances(), [50, 150, 120])
+        self.assertEqual((head.balance, head.last_date), (120, self.month.start + timedelta(days=19)))
+
+    def test_entries_of_one_day_run_in_insert_order(self):
+        ledger_posting.post('asset', [self.entry(3, 10), self.entry(3, 20)])
+        self.entry(3, credit=5).save()
+
+        self.assertEqual(self.balances(), [10, 30, 25])
+
+    def test_a_head_is_seeded_from_rows_posted_before_it(self):
+        # bulk_create skips save(), as the rows of the old ledger tables did
+        models.gl_entry.objects.bulk_create([self.entry(0, 40), self.entry(1, 2)])
+
+        self.entry(2, 8).save()
+
+        self.assertEqual(self.balances()[-1], 50)
+        self.assertEqual(self.balance_head().debit_total, 50)
+
+    def test_recompute_repairs_balances_and_the_head(self):
+        ledger_posting.post('asset', [self.entry(0, 100), self.entry(1, credit=30), self.entry(2, 5)])
+        models.asset_ledger.objects.filter(account=self.cash).update(balance=0)
+        models.ledger_balance_head.objects.filter(ledger='asset', account_id=self.cash.pk).update(balance=0, debit_total=0)
+
+        changed = ledger_posting.recompute('asset', self.cash.pk, self.month.pk)
+
+        self.assertEqual(changed, 3)
+        self.assertEqual(self.balances(), [100, 70, 75])
+        self.assertEqual((self.balance_head().balance, self.balance_head().debit_total), (75, 105))
+
+        # from a date only the later rows are rewritten, carrying on from the earlier ones
+        models.asset_ledger.objects.filter(account=self.cash, date__gte=self.month.start + timedelta(days=1)).update(balance=0)
+
+        self.assertEqual(ledger_posting.recompute('asset', self.cash.pk, self.month.pk, from_date=self.month.start + timedelta(days=1)), 2)
+        self.assertEqual(self.balances(), [100, 70, 75])
+
+
+# migrates the test database back to the per-class ledger tables and forward again
+class GlEntryBackfillTests(BusinessSetup, TransactionTestCase):
+    before = [('react_work', '0006_ledger_balance_head')]
+    after = [('react_work', '0007_gl_entry')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        # 0010 reconciles the open month, whose quantities the setup wrote without postings
+        with self.assertLogs('react_work.item_valuation', 'WARNING'):
+            self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('react_work'))
+
+        super().tearDown()
+
+    def test_legacy_rows_are_copied_once_with_their_class(self):
+        today = date.today()
+        month = models.month_period.objects.get(business=self.business, start__lte=today, end__gte=today)
+        accounts = dict(models.real_account.objects.filter(bussiness_name=self.business).values_list('code', 'pk'))
+
+        apps = self.migrate(self.before)
+
+        head = apps.get_model('react_work', 'journal_head').objects.create(
+            code='JNL-T', created_by_id=self.user.pk, bussiness_name_id=self.business.pk
+        )
+        rows = {
+            'asset_ledger': [('10101', 100, 0), ('10101', 0, 30), ('10101', 5, 0)],
+            'revenue_ledger': [('40101', 0, 100)],
+        }
+
+        for ledger, entries in rows.items():
+            apps.get_model('react_work', ledger).objects.bulk_create([
+                apps.get_model('react_work', ledger)(
+                    head_id=head.pk, account_id=accounts[code], period_id=month.pk, bussiness_name_id=self.business.pk,
+                    transaction_number='JNL-T', date=today, debit=debit, credit=credit, balance=debit - credit,
+                )
+                for code, debit, credit in entries
+            ])
+
+        # small batches so the rows span several of them
+        backfill = importlib.import_module('react_work.migrations.0007_gl_entry')
+
+        with mock.patch.object(backfill, 'BATCH_SIZE', 2):
+            apps = self.migrate(self.after)
+
+        entries = apps.get_model('react_work', 'gl_entry').objects.exclude(legacy_id=None).order_by('account_class', 'legacy_id')
+
+        self.assertEqual(
+            [(row.account_class, row.account_id, row.debit, row.credit, row.balance) for row in entries],
+            [
+                ('asset', accounts['10101'], 100, 0, 100),
+                ('asset', accounts['10101'], 0, 30, -30),
+                ('asset', accounts['10101'], 5, 0, 5),
+                ('revenue', accounts['40101'], 0, 100, -100),
+            ],
+        )
+        self.assertEqual(len({row.legacy_id for row in entries if row.account_class == 'asset'}), 3)
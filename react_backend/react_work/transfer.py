@@ -1,4 +1,4 @@
-from . import models
+from . import models, keyset, activity_log
 from decimal import Decimal
 from django.core.paginator import Paginator
 from django.db.models import Q, F
@@ -7,10 +7,45 @@ import logging
 import json
 from datetime import date as date1, datetime
 from .export_format import XLSX, PDF, CSV
+from . import tenant_context, location_provisioning
+from .stock_movement import StockMovement
 
 logger = logging.getLogger(__name__)
 
-def fetch_transfer_main_view(search, date_search, business, company, page, user, format, page_quantity=30):
+def transfer_main_queryset(business_query, user_query, search, date_search):
+    transfers = models.inventory_transfer.objects.filter(bussiness_name=business_query)
+
+    if not user_query.admin:
+        transfers = transfers.filter(
+            Q(from_loc__location_name__in=user_query.per_location_access) |
+            Q(to_loc__location_name__in=user_query.per_location_access)
+        )
+
+    if search.strip():
+        search_filter = (
+            Q(description__icontains=search) |
+            Q(from_loc__location_name__icontains=search) |
+            Q(to_loc__location_name__icontains=search) |
+            Q(code__icontains=search) |
+            Q(status__icontains=search)
+        )
+        transfers = transfers.filter(search_filter)
+    
+    if date_search:
+
+        if date_search.get('start') and date_search.get('end'):
+            start_date = date_search.get('start')
+            end_date = date_search.get('end')
+            transfers = transfers.filter(date__range=(start_date, end_date))
+    
+    return transfers.order_by('-code').values(
+        'code', 'created_by__user_name', 'from_loc__location_name',
+        'date', 'description', 'total_quantity',
+        'to_loc__location_name', 'status'
+    )
+
+
+def fetch_transfer_main_view(search, date_search, business, company, page, user, format, page_quantity=30, cursor=None):
     try:
         business_query = models.bussiness.objects.get(bussiness_name=business)
         user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
@@ -18,36 +53,7 @@ def fetch_transfer_main_view(search, date_search, business, company, page, user,
         if not user_query.admin and not user_query.transfer_access:
             return {"status": "error", "message": "User has no access", "data": []}
 
-        transfers = models.inventory_transfer.objects.filter(bussiness_name=business_query)
-
-        if not user_query.admin:
-            transfers = transfers.filter(
-                Q(from_loc__location_name__in=user_query.per_location_access) |
-                Q(to_loc__location_name__in=user_query.per_location_access)
-            )
-
-        if search.strip():
-            search_filter = (
-                Q(description__icontains=search) |
-                Q(from_loc__location_name__icontains=search) |
-                Q(to_loc__location_name__icontains=search) |
-                Q(code__icontains=search) |
-                Q(status__icontains=search)
-            )
-            transfers = transfers.filter(search_filter)
-        
-        if date_search:
-
-            if date_search.get('start') and date_search.get('end'):
-                start_date = date_search.get('start')
-                end_date = date_search.get('end')
-                transfers = transfers.filter(date__range=(start_date, end_date))
-        
-        transfers = transfers.order_by('-code').values(
-            'code', 'created_by__user_name', 'from_loc__location_name',
-            'date', 'description', 'total_quantity',
-            'to_loc__location_name', 'status'
-        )
+        transfers = transfer_main_queryset(business_query, user_query, search, date_search)
 
         if format.strip():
 
@@ -78,6 +84,15 @@ def fetch_transfer_main_view(search, date_search, business, company, page, user,
                     "data": export_data
                 }
         
+        if cursor is not None:
+            transfers, next_cursor = keyset.keyset_page(transfers, keyset.BY_CODE_DESC, cursor, page_quantity)
+
+            return {
+                "status": "success",
+                "message": "Transfers fetched",
+                "data": {"transfer": transfers, "has_more": next_cursor is not None, "next_cursor": next_cursor}
+            }
+
         paginator = Paginator(transfers, page_quantity)
         current_page = paginator.get_page(page)
 
@@ -87,6 +102,9 @@ def fetch_transfer_main_view(search, date_search, business, company, page, user,
             "data": {"transfer": list(current_page.object_list), "has_more": current_page.has_next()}
         }
 
+    except keyset.InvalidCursor as error:
+        return {"status": "error", "message": str(error), "data": []}
+
     except models.bussiness.DoesNotExist:
         logger.warning(f"Business '{business}' not found.")
         return {"status": "error", "message": "Business not found", "data": []}
@@ -100,13 +118,14 @@ def fetch_transfer_main_view(search, date_search, business, company, page, user,
         return {"status": "error", "message": "Something went wrong", "data": []}
     
 
-def create_transfer(items, business, user, company, description, date, source, destination):
+def create_transfer(items, business, user, company, description, date, source, destination, context=None):
     try:
         if source.strip() == destination.strip():
             return {"status": "error", "message": "Source and destination cannot be the same"}
         
-        business_query = models.bussiness.objects.get(bussiness_name=business)
-        user_query = models.current_user.objects.get(bussiness_name=business_query, user_name=user)
+        context = tenant_context.resolve(business, user, context, company)
+        business_query = context.business
+        user_query = context.user
         source_query = models.inventory_location.objects.get(bussiness_name=business_query, location_name=source)
         destination_query = models.inventory_location.objects.get(bussiness_name=business_query, location_name=destination)
 
@@ -132,9 +151,16 @@ def create_transfer(items, business, user, company, description, date, source, d
         if current_date.month != today.month:
             return {"status": "error", "message": "Cannot post transfer to a different accounting period"}
         
-        total = sum([float(str(json.loads(i)['qty'])) for i in items])
+        lines = [json.loads(i) for i in items]
+        total = sum([float(str(i['qty'])) for i in lines])
 
         with transaction.atomic():
+            stock = StockMovement(business=business_query, location=source_query).lock(names=[i['name'] for i in lines])
+            errors = stock.validate(lines, outgoing=True)
+
+            if errors:
+                return {"status": "error", "message": errors[0]['message'], "data": {"errors": errors}}
+
             p = models.inventory_transfer(bussiness_name=business_query, creation_date=datetime.now())
             new_code = p.generate_next_code()
             transfer = models.inventory_transfer.objects.create(
@@ -144,28 +170,17 @@ def create_transfer(items, business, user, company, description, date, source, d
                 created_by=user_query, bussiness_name=business_query
             )
 
-            for i in items:
-                i = json.loads(i)
-                item = models.location_items.objects.get(
-                    bussiness_name=business_query,
-                    item_name__item_name=i['name'],
-                    location=source_query
-                )
+            stock.apply(stock.deltas(lines, sign=-1), location_only=True)
 
-                if item.item_name.is_active is False:
-                    return {"status": "error", "message": f"Item {i['name']} is inactive"}
-
-                if item.quantity - Decimal(str(i['qty'])) < 0:
-                    return {"status": "error", "message": f"Not enough quantity for {i['name']}"}
-                
-                item.quantity -= Decimal(str(i['qty']))
-                item.save()
-                models.transfer_history.objects.create(
-                    transfer=transfer, item_name=item.item_name,
+            models.transfer_history.objects.bulk_create([
+                models.transfer_history(
+                    transfer=transfer, item_name=stock.items[i['name']],
                     quantity=i['qty'], bussiness_name=business_query
                 )
+                for i in lines
+            ])
             
-            models.tracking_history.objects.create(
+            activity_log.record(
                 user=user_query, head=new_code,
                 area='Create transfer', bussiness_name=business_query
             )
@@ -285,7 +300,7 @@ def reject_transfer(business, user, company, number):
             transfer_query.status = 'Rejected'
             transfer_query.save()
 
-        models.tracking_history.objects.create(
+        activity_log.record(
             user=user_query, head=transfer_query.code, area='Reject transfer',
             bussiness_name=business_query
         )
@@ -319,6 +334,9 @@ def receive_transfer(business, user, company, number):
             return {"status": "error", "message": "No access to this transfer"}
 
         with transaction.atomic():
+            if business_query.lazy_location_items:
+                location_provisioning.materialize(business_query, transfer_query.to_loc, [i.item_name_id for i in history])
+
             for i in history:
                 item = models.location_items.objects.get(
                     bussiness_name=business_query, item_name=i.item_name, location=transfer_query.to_loc
@@ -330,7 +348,7 @@ def receive_transfer(business, user, company, number):
             transfer_query.status = 'Received'
             transfer_query.save()
 
-        models.tracking_history.objects.create(
+        activity_log.record(
             user=user_query, head=transfer_query.code, area='Receive transfer',
             bussiness_name=business_query
         )
@@ -63,19 +63,24 @@ urlpatterns = [
     path('fetch_user_activities/', views.fetch_user_activities, name='fetch_user_activities'),
     path('edit_user/', views.edit_user, name='edit_user'),
     path('fetch_items/', views.fetch_items, name='fetch_items'),
+    path('export_items/', views.export_items, name='export_items'),
     path('fetch_items_for_select/', views.fetch_items_for_select, name='fetch_items_for_select'),
     path('verify_item/', views.verify_item, name='verify_item'),
     path('add_items/', views.add_items, name='add_items'),
+    path('import_items/', views.import_items, name='import_items'),
     path('view_item/', views.view_item, name='view_item'),
     path('update_item/', views.update_item, name='update_item'),
     path('delete_item/', views.delete_item, name='delete_item'),
     path('fetch_sales/', views.fetch_sales, name='fetch_sales'),
+    path('export_sales/', views.export_sales, name='export_sales'),
     path('verify_sales_quantity/', views.verify_sales_quantity, name='verify_sales_quantity'),
     path('add_sales/', views.add_sales, name='add_sales'),
+    path('add_sales_batch/', views.add_sales_batch, name='add_sales_batch'),
     path('view_sale/', views.view_sale, name='view_sale'),
     path('edit_sale/', views.edit_sale, name='edit_sale'),
     path('delete_sale/', views.delete_sale, name='delete_sale'),
     path('fetch_purchase/', views.fetch_purchase, name='fetch_purchase'),
+    path('export_purchase/', views.export_purchase, name='export_purchase'),
     path('add_purchase/', views.add_purchase, name='add_purchase'),
     path('view_purchase/', views.view_purchase, name='view_purchase'),
     path('edit_purchase/', views.edit_purchase, name='edit_purchase'),
@@ -87,6 +92,7 @@ urlpatterns = [
     path('fetch_location/', views.fetch_location, name='fetch_location'),
     path('get_location/', views.get_location, name='get_location'),
     path('add_location/', views.add_location, name='add_location'),
+    path('location_provisioning_status/', views.location_provisioning_status, name='location_provisioning_status'),
     path('edit_location/', views.edit_location, name='edit_location'),
     path('delete_location/', views.delete_location, name='delete_location'),
     path('edit_location_item/', views.edit_location_item, name='edit_location_item'),
@@ -95,6 +101,10 @@ urlpatterns = [
     path('fetch_transfer_from/', views.fetch_transfer_from, name='fetch_transfer_from'),
     path('fetch_transfer_to/', views.fetch_transfer_to, name='fetch_transfer_to'),
     path('fetch_transfer/', views.fetch_transfer, name='fetch_transfer'),
+    path('export_transfer/', views.export_transfer, name='export_transfer'),
+    path('submit_export_job/', views.submit_export_job, name='submit_export_job'),
+    path('export_job_status/', views.export_job_status, name='export_job_status'),
+    path('download_export_job/', views.download_export_job, name='download_export_job'),
     path('verify_transfer_quantity/', views.verify_transfer_quantity, name='verify_transfer_quantity'),
     path('receive_transfer/', views.receive_transfer, name='receive_transfer'),
     path('reject_transfer/', views.reject_transfer, name='reject_transfer'),
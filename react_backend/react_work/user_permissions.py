@@ -1,9 +1,13 @@
 from . import models
 
 class Permissions:
-    def __init__(self, company, user, business):
-        self.business = models.bussiness.objects.get(bussiness_name=business)
-        self.user = models.current_user.objects.get(bussiness_name=self.business, user_name=user)
+    def __init__(self, company, user, business, context=None):
+        if context is not None:
+            self.business = context.business
+            self.user = context.user
+        else:
+            self.business = models.bussiness.objects.get(bussiness_name=business)
+            self.user = models.current_user.objects.get(bussiness_name=self.business, user_name=user)
 
     def general_permissions(self):
         if self.user.admin:
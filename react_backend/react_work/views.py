@@ -10,13 +10,15 @@ from rest_framework.decorators import api_view
 from google.oauth2 import id_token
 from google.auth.transport import requests
 from django.core.paginator import Paginator
+from django.http import FileResponse
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.core.validators import EmailValidator
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from . import models, coa, inventory_item, transfer, inventory_location, inventory_sales, inventory_purchase
-from . import payment_journal, cash_journal, general_journal, report, user_permissions, history
+from . import payment_journal, cash_journal, general_journal, report, user_permissions, history, tenant_context, export_stream, export_jobs
+from . import idempotency, item_import, location_provisioning, tenant_purge, activity_log, keyset, search_index
 from .utils import set_tokens_as_cookies
 from django.db.models import Sum, F, Count, Q, Value
 from django.db.models.functions import Concat
@@ -143,7 +145,7 @@ def register(request):
                 created_by=users, bussiness_name=new_business
             )
                 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 user=users, area="Create business", head=new_business.bussiness_name, bussiness_name=new_business
             )
 
@@ -282,7 +284,7 @@ def sign_in_google(request):
                     location_name='Initial Location', description='Created Initially With Business',
                     created_by=users, bussiness_name=business
                 )
-                models.tracking_history.objects.create(
+                activity_log.record(
                     user=users, area="Create business", head=business.bussiness_name, bussiness_name=business
                 )
 
@@ -304,7 +306,7 @@ def sign_in_google(request):
                         user.save()
                     users.save()
                 
-                models.tracking_history.objects.create(
+                activity_log.record(
                     user=users, area="Login with Google", head=business.bussiness_name, bussiness_name=business
                 )
         
@@ -360,7 +362,7 @@ def set_password(request):
             user_query.user.set_password(password)
             user_query.user.save()
 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 user=user_query,
                 area="Set User Password",
                 head=user_query.user_name,
@@ -407,7 +409,7 @@ def reset_password(request):
             user.set_password(new_password)
             user.save()
 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 user=models.current_user.objects.get(user=user),
                 area="Reset Password",
                 head=user.username,
@@ -484,7 +486,7 @@ def add_business(request):
                 user.user.set_password(password)
                 user.user.save()
 
-                models.tracking_history.objects.create(user=user, area="Create business", head=new_business.bussiness_name, bussiness_name=new_business)
+                activity_log.record(user=user, area="Create business", head=new_business.bussiness_name, bussiness_name=new_business)
 
                 default_units = [
                     ("Piece", "pc", "Individual piece"),
@@ -561,7 +563,7 @@ def verify_user(request):
 
             if state == True:
                 if user.checks_password(password):
-                    models.tracking_history.objects.create(user=user, area='Sign In', head=business, bussiness_name=business)
+                    activity_log.record(user=user, area='Sign In', head=business, bussiness_name=business)
                     return Response({'access':access, 'message':'verified'})
                 else:
                     return Response('')
@@ -569,7 +571,7 @@ def verify_user(request):
             if state == False:
                 with transaction.Atomic(using='default', savepoint=False, durable=False):
                     user.set_password(password)'''
-            models.tracking_history.objects.create(user=user_query, area='Set business', head=business.bussiness_name, bussiness_name=business)
+            activity_log.record(user=user_query, area='Set business', head=business.bussiness_name, bussiness_name=business)
 
         return Response({'status':'success', 'data':business.bussiness_name})
             
@@ -655,6 +657,7 @@ def edit_business(request):
                 if not user_query or (not user_query.admin and not user_query.settings_access):
                     return Response({'status': 'error', 'message': f'{user} does not have access to settings'})
 
+                previous_name = business.bussiness_name
                 business.bussiness_name = data['name']
                 business.location = data['location']
                 business.address = data['address']
@@ -664,7 +667,10 @@ def edit_business(request):
 
                 business.save()
                 
-                models.tracking_history.objects.create(user=user_query, area=f'Edit business: {business.bussiness_name}', head=business, bussiness_name=business)
+                activity_log.record(user=user_query, area=f'Edit business: {business.bussiness_name}', head=business, bussiness_name=business)
+
+                transaction.on_commit(lambda: tenant_context.invalidate_business(previous_name))
+                transaction.on_commit(lambda: tenant_context.invalidate_business(data['name']))
 
                 return Response({'status': 'success', 'message': 'Business info has been changed successfully'})
             
@@ -950,7 +956,7 @@ def add_tax(request):
                 bussiness_name=business
             )
 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 user=user_query,
                 head=f'Added new tax: {name}',
                 area='Add Tax',
@@ -1017,7 +1023,7 @@ def edit_tax(request):
             tax.description = description
             tax.save()
 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 user=user_query,
                 head=f'Edited tax: {original} to {name}',
                 area='Edit Tax',
@@ -1128,7 +1134,7 @@ def delete_tax(request):
         with transaction.atomic(durable=False, savepoint=False, using='default'):
             tax.delete()
 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 user=user_profile,
                 head=f'Deleted tax: {tax_name}',
                 area='Delete Tax',
@@ -1222,7 +1228,7 @@ def add_currency(request):
 
         with transaction.atomic(durable=False, savepoint=False, using='default'):
             models.currency.objects.create(name=name, rate=rate, symbol=symbol, bussiness_name=business)
-            models.tracking_history.objects.create(
+            activity_log.record(
                 business_name=business,
                 user=user_query,
                 head='Currency Added',
@@ -1287,7 +1293,7 @@ def edit_currency(request):
             cur.symbol = symbol
             cur.save()
 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 bussiness_name=business,
                 user=user_query,
                 head='Currency Edited',
@@ -1385,7 +1391,7 @@ def delete_currency(request):
         with transaction.atomic(durable=False, savepoint=False, using='default'):
             currency.delete()
 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 bussiness_name=business,
                 user=user_profile,
                 head='Currency Deleted',
@@ -1478,7 +1484,7 @@ def add_measurement_unit(request):
 
         with transaction.atomic(durable=False, savepoint=False, using='default'):
             models.inventory_unit.objects.create(name=name, suffix=suffix, description=description, bussiness_name=business)
-            models.tracking_history.objects.create(
+            activity_log.record(
                 bussiness_name=business,
                 user=user_query,
                 head='Add Measurement Unit',
@@ -1539,7 +1545,7 @@ def edit_measurement_unit(request):
             unit.description = description
             unit.save()
 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 bussiness_name=business,
                 user=user_query,
                 head='Edit Measurement Unit',
@@ -1630,7 +1636,7 @@ def delete_measurement_unit(request):
         with transaction.atomic(durable=False, savepoint=False, using='default'):
             unit.delete()
 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 bussiness_name=user_profile.bussiness_name,
                 user=user_profile,
                 head='Delete Measurement Unit',
@@ -1718,7 +1724,7 @@ def add_category(request):
 
         with transaction.atomic(durable=False, savepoint=False, using='default'):
             models.inventory_category.objects.create(name=name, description=description, bussiness_name=business)
-            models.tracking_history.objects.create(
+            activity_log.record(
                 bussiness_name=business,
                 user=user_query,
                 head='Category Added',
@@ -1777,7 +1783,7 @@ def edit_category(request):
             cat.description = description
             cat.save()
 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 bussiness_name=business,
                 user=user_query,
                 head='Category Edited',
@@ -1867,7 +1873,7 @@ def delete_category(request):
             
             with transaction.atomic(durable=False, savepoint=False, using='default'):
                 category_obj.delete()
-                models.tracking_history.objects.create(
+                activity_log.record(
                     bussiness_name=user_profile.bussiness_name,
                     user=user_profile,
                     head='Category Deletion',
@@ -1971,7 +1977,7 @@ def add_brand(request):
 
         with transaction.atomic(durable=False, savepoint=False, using='default'):
             models.inventory_brand.objects.create(name=name, description=description, bussiness_name=business)
-            models.tracking_history.objects.create(
+            activity_log.record(
                 bussiness_name=business,
                 user=user_query,
                 head='Brand Created',
@@ -2036,7 +2042,7 @@ def edit_brand(request):
             brand.description = description
             brand.save()
 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 bussiness_name=business,
                 user=user_query,
                 head='Brand Edited',
@@ -2126,7 +2132,7 @@ def delete_brand(request):
         with transaction.atomic(durable=False, savepoint=False, using='default'):
             brand.delete()
 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 bussiness_name=user_profile.bussiness_name,
                 user=user_profile,
                 head='Delete Brand',
@@ -2235,6 +2241,7 @@ def add_user(request):
             main_user.save()
 
             models.current_user.objects.create(user_name=user_name, email=email, admin=admin_flag, bussiness_name=business, user=main_user)
+            transaction.on_commit(lambda: tenant_context.invalidate_user(business_name, user_name))
 
         return Response({'status': 'success', 'message': f'{user_name} created successfully', 'data': {}})
     
@@ -2279,7 +2286,7 @@ def edit_user(request):
         if not user_query.admin and not user_query.settings_access:
             return Response({'status': 'error', 'message': f'{user} does not have access to settings', 'data': {}})
 
-        if models.current_user.objects.filter(user_name=user, user=request.user_name, bussiness_name=business).exclude(user_name=original).exists():
+        if models.current_user.objects.filter(user_name=user_name, bussiness_name=business).exclude(user_name=original).exists():
             return Response({'status': 'error', 'message': f'{user_name} already exist', 'data': {}})
 
         with transaction.atomic(durable=False, savepoint=False, using='default'):
@@ -2288,7 +2295,11 @@ def edit_user(request):
             cu.admin = bool(admin_flag)
             cu.save()
 
-            models.tracking_history.objects.create(
+            # the cached context still carries the old name and admin flag
+            transaction.on_commit(lambda: tenant_context.invalidate_user(business_name, original))
+            transaction.on_commit(lambda: tenant_context.invalidate_user(business_name, user_name))
+
+            activity_log.record(
                 bussiness_name=business,
                 user=user_query,
                 head='User Edited',
@@ -2339,7 +2350,8 @@ def delete_user(request):
         
         with transaction.atomic(durable=False, savepoint=False, using='default'):
             user_to_delete.user.delete()
-            models.tracking_history.objects.create(
+            transaction.on_commit(lambda: tenant_context.invalidate_user(user_profile.bussiness_name.bussiness_name, user_name))
+            activity_log.record(
                 bussiness_name=user_profile.bussiness_name,
                 head='User Deletion',
                 user=user_profile,
@@ -2511,13 +2523,15 @@ def edit_user_permissions(request):
             user_obj.date_access = data['date_access']
             user_obj.save()
 
-            models.tracking_history.objects.create(
+            activity_log.record(
                 bussiness_name=business,
                 user=caller_query,
                 head='User Permissions Edited',
                 area=f'Permissions for user {data.get("user_name")} were edited by {caller_query.user_name}',
             )
 
+            transaction.on_commit(lambda: tenant_context.invalidate_user(business_name, data['user_name']))
+
         return Response({'status': 'success', 'message': f'{data.get('user_name')}`s permissions updated successfully', 'data': {}})
 
     except models.current_user.DoesNotExist:
@@ -2659,6 +2673,8 @@ def update_report_permissions(request):
         report_permissions.sales_profit = data.get('sales_profit', False)
         report_permissions.save()
 
+        transaction.on_commit(lambda: tenant_context.invalidate_user(user_profile.bussiness_name.bussiness_name, chosen_user))
+
         return Response({'status': 'success', 'message': 'User report permissions updated successfully', 'data': {}})
     
     except ValueError as ve:
@@ -2777,6 +2793,8 @@ def update_setting_permissions(request):
         setting_permissions.user_management_settings = data.get('user_management_settings', False)
         setting_permissions.save()
 
+        transaction.on_commit(lambda: tenant_context.invalidate_user(user_profile.bussiness_name.bussiness_name, chosen_user))
+
         return Response({'status': 'success', 'message': 'User setting permissions updated successfully', 'data': {}})
     
     except ValueError as ve:
@@ -2813,25 +2831,32 @@ def fetch_user_activities(request):
         if not caller_query.admin and not caller_query.settings_access:
             return Response({'status': 'error', 'message': f'{user} does not have access to settings', 'data': {}})
         
-        if username.lower() == 'all users':
-            result = models.tracking_history.objects.filter(bussiness_name=business).order_by('-date').values(
-                'date', 'area', 'head', 'user__user_name'
-            )
-            return Response({'status': 'success', 'message': 'All user activities fetched', 'data': result})
+        cursor = request.data.get('cursor')
+        user_obj = None
 
-        user_obj = models.current_user.objects.filter(bussiness_name=business, user_name=username).first()
-        if not user_obj:
-            return Response({'status': 'error', 'message': f'{username} not found in this business', 'data': {}})
-        
-        result = models.tracking_history.objects.filter(user=user_obj).order_by('-date').values(
-            'date', 'area', 'head', 'user__user_name'
-        )
+        if username.lower() != 'all users':
+            user_obj = models.current_user.objects.filter(bussiness_name=business, user_name=username).first()
+            if not user_obj:
+                return Response({'status': 'error', 'message': f'{username} not found in this business', 'data': {}})
+
+        result = activity_log.activities(business, user=user_obj, area=request.data.get('search'),
+                                         start=request.data.get('startDate'), end=request.data.get('endDate'))
+        message = 'All user activities fetched' if user_obj is None else 'User activities fetched'
 
-        return Response({'status': 'success', 'message': 'User activities fetched', 'data': result})
+        page_quantity = int(request.data.get('pageQuantity') or activity_log.PAGE_SIZE)
+
+        # no cursor is the first page; next_cursor tells the caller there is more to load
+        result, next_cursor = activity_log.page(result, cursor, page_quantity)
+        return Response({'status': 'success', 'message': message,
+                         'data': {'activities': result, 'has_more': next_cursor is not None, 'next_cursor': next_cursor}})
 
     except models.current_user.DoesNotExist:
         return Response({'status': 'error', 'message': f'{user} not found', 'data': {}})
     
+    except keyset.InvalidCursor as error:
+        logger.warning(error)
+        return Response({'status': 'error', 'message': 'Invalid cursor', 'data': {}})
+
     except ValueError as ve:
         logger.warning(ve)
         return Response({'status': 'error', 'message': 'Invalid data was submitted', 'data': {}})
@@ -2920,7 +2945,7 @@ def fetch_items(request):
         if not verify_data:
             return Response({'status':'error', 'message':'invalid data was submitted'})
         
-        result = inventory_item.fetch_items_for_main_view(business=business, page=page, company=company, search=search, user=user, location=location, format=format, category=category, brand=brand, count=count)
+        result = inventory_item.fetch_items_for_main_view(business=business, page=page, company=company, search=search, user=user, location=location, format=format, category=category, brand=brand, count=count, context=tenant_context.try_from_request(request, business, user), cursor=request.data.get('cursor'))
     
         return Response(result)
     
@@ -2940,7 +2965,7 @@ def fetch_items_for_select(request):
         if not verify_data:
             return Response({'status':'error', 'message':'invalid data was submitted'})
         
-        result = inventory_item.fetch_items_for_select(business=business, company=company, search=search, user=user, location=location)
+        result = inventory_item.fetch_items_for_select(business=business, company=company, search=search, user=user, location=location, context=tenant_context.try_from_request(request, business, user))
     
         return Response(result)
 
@@ -3040,6 +3065,28 @@ def view_item(request):
     
     return Response('')
  
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser])
+def import_items(request):
+    if request.method == 'POST':
+        data = request.data
+        business = data.get('business')
+        user = data.get('user')
+        upload = request.FILES.get('file')
+
+        verify_data = (isinstance(business, str) and business.strip() and isinstance(user, str) and user.strip()
+                       and upload is not None and upload.name.lower().endswith(('.csv', '.xlsx')))
+
+        if not verify_data:
+            return Response({'status':'error', 'message':'invalid data was submitted'})
+
+        result = item_import.import_items(business=business, user=user, rows=item_import.read_rows(upload.file, upload.name))
+
+        return Response(result)
+
+    return Response('')
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 @parser_classes([MultiPartParser])
@@ -3113,7 +3160,7 @@ def delete_item(request):
             with transaction.atomic(savepoint=False, durable=False, using='default'):
                 item.delete()
 
-                models.tracking_history.objects.create(
+                activity_log.record(
                     user=user_profile,
                     bussiness_name=business,
                     area='Inventory - Items',
@@ -3150,7 +3197,7 @@ def fetch_sales(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
         
-        result = inventory_sales.fetch_sales_for_main_view(user=user, date_search=date_search, business=business, search=search, company=company, page=page, format=format)
+        result = inventory_sales.fetch_sales_for_main_view(user=user, date_search=date_search, business=business, search=search, company=company, page=page, format=format, cursor=request.data.get('cursor'))
     
     return Response(result)
 
@@ -3190,6 +3237,7 @@ def verify_sales_quantity(request):
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@idempotency.idempotent
 def add_sales(request):
     if request.method == 'POST':
         data = request.data
@@ -3212,12 +3260,39 @@ def add_sales(request):
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
                 
         result = inventory_sales.post_and_save_sales(real_levy=real_levy, data=data, totals=totals, levy=levy, items=items,
-                                                     business=business, company=company, user=user,location=location)
+                                                     business=business, company=company, user=user,location=location, context=tenant_context.try_from_request(request, business, user))
 
         return Response(result)
         
     return Response('')
 
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def add_sales_batch(request):
+    if request.method == 'POST':
+        data = request.data
+        business = data.get('business')
+        user = data.get('user')
+        location = data.get('location')
+        sales = data.get('sales')
+        company = request.user.id
+
+        verify_data = (isinstance(business, str) and business.strip() and isinstance(user, str) and user.strip()
+                       and isinstance(location, str) and location.strip() and isinstance(sales, list) and sales
+                       and all(isinstance(sale, dict) and isinstance(sale.get('data'), dict) and isinstance(sale.get('items'), list)
+                               and isinstance(sale.get('totals'), dict) for sale in sales))
+
+        if not verify_data:
+            logger.warning('text error')
+            return Response({'status': 'error', 'message': 'Invalid data was submitted'})
+
+        result = inventory_sales.post_sales_batch(business=business, user=user, company=company, location=location, sales=sales,
+                                                  context=tenant_context.try_from_request(request, business, user))
+
+        return Response(result)
+
+    return Response('')
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 def view_sale(request):
@@ -3352,12 +3427,13 @@ def fetch_purchase(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'invalid dats was submitted'})
         
-        result = inventory_purchase.fetch_purchase_for_main_view(user=user, date_search=date_search, business=business, search=search, company=company, page=page, format=format)
+        result = inventory_purchase.fetch_purchase_for_main_view(user=user, date_search=date_search, business=business, search=search, company=company, page=page, format=format, cursor=request.data.get('cursor'))
     
     return Response(result)
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@idempotency.idempotent
 def add_purchase(request):
 
     if request.method == 'POST':
@@ -3382,7 +3458,7 @@ def add_purchase(request):
             return Response({'status': 'error', 'message': 'invalid dats was submitted'})
         
         result = inventory_purchase.post_and_save_purchase(real_levy=real_levy, data=data, totals=totals, levy=levy, items=items,
-                                                     business=business, company=company, user=user,location=location, supplier=supplier)
+                                                     business=business, company=company, user=user,location=location, supplier=supplier, context=tenant_context.try_from_request(request, business, user))
 
         return Response(result)
         
@@ -3582,6 +3658,37 @@ def get_location(request):
     
     return Response(loc_detail)
 
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def location_provisioning_status(request):
+    if request.method == 'POST':
+        business = request.data.get('business')
+        user = request.data.get('user')
+        location = request.data.get('location')
+
+        verify_data = (isinstance(business, str) and isinstance(user, str) and isinstance(location, str) and
+                       user.strip() and business.strip() and location.strip())
+
+        if not verify_data:
+            return Response({'status': 'error', 'message': 'Invalid data was submitted'})
+
+        context = tenant_context.try_from_request(request, business, user)
+
+        if context is None:
+            return Response({'status': 'error', 'message': f'User {user} not found'})
+
+        location_query = models.inventory_location.objects.filter(bussiness_name=context.business, location_name=location).first()
+
+        if location_query is None:
+            return Response({'status': 'error', 'message': f'Location {location} not found'})
+
+        # locations provisioned in the request itself never report progress
+        data = location_provisioning.progress(location_query.pk) or {'status': 'Done'}
+
+        return Response({'status': 'success', 'data': data})
+
+    return Response('')
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 def add_location(request):
@@ -3611,7 +3718,7 @@ def add_location(request):
                 models.inventory_location.objects.create(location_name=name, description=data['description'], created_by=user_query, 
                                             bussiness_name=business_query)
                 
-                models.tracking_history.objects.create(user=user_query, area=f'created location {name}', head='Location creation', bussiness_name=business_query)
+                activity_log.record(user=user_query, area=f'created location {name}', head='Location creation', bussiness_name=business_query)
 
                 return Response({'status': 'success', 'message': f'Location {name} created successfully'})
                 
@@ -3664,7 +3771,7 @@ def edit_location(request):
                 loc.description = description
                 loc.save()
 
-                models.tracking_history.objects.create(user=user_query, area=f'edited {loc.location_name}', head='Edit Location', bussiness_name=business_query)
+                activity_log.record(user=user_query, area=f'edited {loc.location_name}', head='Edit Location', bussiness_name=business_query)
 
                 return Response({'status': 'success', 'message': f'Location {new} edited successfully'})
 
@@ -3727,7 +3834,7 @@ def delete_location(request):
             models.location_items.objects.filter(location=location, bussiness_name=business).delete()
             location.delete()
 
-            models.tracking_history.objects.create(user=user_profile, area=f'deleted location {location_name}', head='Location Deletion', bussiness_name=business)
+            activity_log.record(user=user_profile, area=f'deleted location {location_name}', head='Location Deletion', bussiness_name=business)
 
             return Response({'status': 'success', 'message': f'Location {location_name} deleted successfully'})
     
@@ -3849,7 +3956,7 @@ def fetch_transfer(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
         
-        result = transfer.fetch_transfer_main_view(user=user, date_search=date_search, business=business, search=search, company=company, page=page, format=format)
+        result = transfer.fetch_transfer_main_view(user=user, date_search=date_search, business=business, search=search, company=company, page=page, format=format, cursor=request.data.get('cursor'))
     
     return Response(result)
 
@@ -3920,6 +4027,7 @@ def reject_transfer(request):
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@idempotency.idempotent
 def create_transfer(request):
     if request.method == 'POST':
         data = request.data
@@ -3942,7 +4050,7 @@ def create_transfer(request):
         if source.strip() == destination.strip():
             return Response({'status': 'error', 'message': 'Source and Destination cannot be the same'})
 
-        result = transfer.create_transfer(business=business, user=user, company=company, date=date, items=items, description=description, source=source, destination=destination)
+        result = transfer.create_transfer(business=business, user=user, company=company, date=date, items=items, description=description, source=source, destination=destination, context=tenant_context.try_from_request(request, business, user))
        
         return Response(result)
 
@@ -4016,7 +4124,7 @@ def fetch_journals(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
         
-        result = general_journal.fetch_journal_for_main_view(user=user, date_search=date_search, business=business, search=search, company=company, page=page)
+        result = general_journal.fetch_journal_for_main_view(user=user, date_search=date_search, business=business, search=search, company=company, page=page, cursor=request.data.get('cursor'), context=tenant_context.try_from_request(request, business, user))
     
     return Response(result)
 
@@ -4035,13 +4143,14 @@ def view_journal(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
         
-        result = general_journal.view_gl_journal(code=code, company=company, user=user, business=business)
+        result = general_journal.view_gl_journal(code=code, company=company, user=user, business=business, context=tenant_context.try_from_request(request, business, user))
         
         return Response(result)
     return Response('')
 
 @api_view(['GET', 'POST'])
 @permission_classes({IsAuthenticated})
+@idempotency.idempotent
 def add_journal(request):
     if request.method == 'POST':
         data = request.data['entries']
@@ -4055,7 +4164,7 @@ def add_journal(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
         
-        result = general_journal.add_gl_journal(company=company, user=user, business=business, data=data)
+        result = general_journal.add_gl_journal(company=company, user=user, business=business, data=data, context=tenant_context.try_from_request(request, business, user))
 
         return Response(result)           
 
@@ -4076,7 +4185,7 @@ def reverse_journal(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
         
-        result = general_journal.reverse_gl_journal(company=company, user=user, business=business, number=number)
+        result = general_journal.reverse_gl_journal(company=company, user=user, business=business, number=number, context=tenant_context.try_from_request(request, business, user))
 
         return Response(result)
     return Response('')
@@ -4100,7 +4209,7 @@ def fetch_cash_receipts(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
         
-        result = cash_journal.fetch_cash_for_main_view(user=user, date_search=date_search, business=business, search=search, company=company, page=page)
+        result = cash_journal.fetch_cash_for_main_view(user=user, date_search=date_search, business=business, search=search, company=company, page=page, cursor=request.data.get('cursor'), context=tenant_context.try_from_request(request, business, user))
     
     return Response(result)
 
@@ -4119,13 +4228,14 @@ def view_cash_receipt(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
         
-        result = cash_journal.view_cash_receipt(code=code, company=company, user=user, business=business)
+        result = cash_journal.view_cash_receipt(code=code, company=company, user=user, business=business, context=tenant_context.try_from_request(request, business, user))
         
         return Response(result)
     return Response('')
 
 @api_view(['GET', 'POST'])
 @permission_classes({IsAuthenticated})
+@idempotency.idempotent
 def add_cash_receipts(request):
     if request.method == 'POST':
         data = request.data['entries']
@@ -4140,7 +4250,7 @@ def add_cash_receipts(request):
             logger.warning('Invalid data was submitted for adding cash receipt')
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
 
-        result = cash_journal.add_cash_receipt(company=company, user=user, data=data, business=business)
+        result = cash_journal.add_cash_receipt(company=company, user=user, data=data, business=business, context=tenant_context.try_from_request(request, business, user))
 
         return Response(result)
 
@@ -4161,7 +4271,7 @@ def reverse_cash_receipt(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
             
-        result = cash_journal.reverse_cash_receipt(company=company, user=user, business=business, number=number)
+        result = cash_journal.reverse_cash_receipt(company=company, user=user, business=business, number=number, context=tenant_context.try_from_request(request, business, user))
 
         return Response(result)
     
@@ -4186,7 +4296,7 @@ def fetch_payments(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
         
-        result = payment_journal.fetch_payment_for_main_view(user=user, date_search=date_search, business=business, search=search, company=company, page=page)
+        result = payment_journal.fetch_payment_for_main_view(user=user, date_search=date_search, business=business, search=search, company=company, page=page, cursor=request.data.get('cursor'), context=tenant_context.try_from_request(request, business, user))
     
     return Response(result)
 
@@ -4205,7 +4315,7 @@ def view_payment(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
         
-        result = payment_journal.view_payment(code=code, company=company, user=user, business=business)
+        result = payment_journal.view_payment(code=code, company=company, user=user, business=business, context=tenant_context.try_from_request(request, business, user))
         
         return Response(result)
     return Response('')
@@ -4213,6 +4323,7 @@ def view_payment(request):
 
 @api_view(['GET', 'POST'])
 @permission_classes({IsAuthenticated})
+@idempotency.idempotent
 def add_payments(request):
     if request.method == 'POST':
         data = request.data['entries']
@@ -4226,7 +4337,7 @@ def add_payments(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
         
-        result = payment_journal.add_payment(user=user, data=data, business=business, company=company)
+        result = payment_journal.add_payment(user=user, data=data, business=business, company=company, context=tenant_context.try_from_request(request, business, user))
 
         return Response(result)           
 
@@ -4248,7 +4359,7 @@ def reverse_payment(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
             
-        result = payment_journal.reverse_payment(company=company, user=user, business=business, number=number)
+        result = payment_journal.reverse_payment(company=company, user=user, business=business, number=number, context=tenant_context.try_from_request(request, business, user))
 
             
         return Response(result)
@@ -4283,15 +4394,20 @@ def fetch_customers(request):
             customers = models.customer.objects.filter(bussiness_name=business_query).exclude(name='Regular Customer')
 
             if search.strip():
-                filter = (
-                    Q(account__icontains=search) |
-                    Q(name__icontains=search) |
-                    Q(contact__icontains=search) |
-                    Q(address__icontains=search) |
-                    Q(email__icontains=search)
-                )
+                ids = search_index.search(business_query, 'customer', search)
+
+                if ids is None:
+                    filter = (
+                        Q(account__icontains=search) |
+                        Q(name__icontains=search) |
+                        Q(contact__icontains=search) |
+                        Q(address__icontains=search) |
+                        Q(email__icontains=search)
+                    )
 
-                customers = customers.filter(filter)
+                    customers = customers.filter(filter)
+                else:
+                    customers = customers.filter(pk__in=ids)
 
             customers = customers.order_by('-account').values(
                 'account', 'name', 'contact', 'address', 'email', 'debit', 'credit'
@@ -4363,7 +4479,7 @@ def add_customer(request):
                 models.customer.objects.create(name=name.strip(), address=address, contact=contact,
                                                 email=email, bussiness_name=business_query)
                 
-                models.tracking_history.objects.create(user=user_query, bussiness_name=business_query, area=f'creating new Customer {name}', head='create customer')
+                activity_log.record(user=user_query, bussiness_name=business_query, area=f'creating new Customer {name}', head='create customer')
                 return Response({'status':'success', 'message':f'Customer {name} created successfully'})
             
         except models.bussiness.DoesNotExist:
@@ -4422,7 +4538,7 @@ def edit_customer(request):
                 customer.email = data['email']
                 customer.save()
 
-                models.tracking_history.objects.create(user=user_query, bussiness_name=business_query, area=f'edited customer {new} info', head='edit customer')
+                activity_log.record(user=user_query, bussiness_name=business_query, area=f'edited customer {new} info', head='edit customer')
                 return Response({'status':'success', 'message':f'Customer {old} edited successfully'})
             
         except models.bussiness.DoesNotExist:
@@ -4489,7 +4605,7 @@ def delete_customer(request):
         
         with transaction.atomic(savepoint=False, durable=True, using='default'):
             customer.delete()
-            models.tracking_history.objects.create(
+            activity_log.record(
                 user=user_profile,
                 bussiness_name=business_query,
                 area=f'deleted customer {customer_name}',
@@ -4530,15 +4646,20 @@ def fetch_suppliers(request):
             suppliers = models.supplier.objects.filter(bussiness_name=business_query)
 
             if search.strip():
-                filter = (
-                    Q(account__icontains=search) |
-                    Q(name__icontains=search) |
-                    Q(contact__icontains=search) |
-                    Q(address__icontains=search) |
-                    Q(email__icontains=search)
-                )
+                ids = search_index.search(business_query, 'supplier', search)
+
+                if ids is None:
+                    filter = (
+                        Q(account__icontains=search) |
+                        Q(name__icontains=search) |
+                        Q(contact__icontains=search) |
+                        Q(address__icontains=search) |
+                        Q(email__icontains=search)
+                    )
 
-                suppliers = suppliers.filter(filter)
+                    suppliers = suppliers.filter(filter)
+                else:
+                    suppliers = suppliers.filter(pk__in=ids)
 
             suppliers = suppliers.order_by('-account').values(
                 'account', 'name', 'contact', 'address', 'email', 'debit', 'credit'
@@ -4610,7 +4731,7 @@ def add_supplier(request):
                 models.supplier.objects.create(name=name.strip(), address=address, contact=contact,
                                                 email=email, bussiness_name=business_query)
                 
-                models.tracking_history.objects.create(user=user_query, bussiness_name=business_query, area=f'creating new supplier {name}', head='create supplier')
+                activity_log.record(user=user_query, bussiness_name=business_query, area=f'creating new supplier {name}', head='create supplier')
                 return Response({'status':'success', 'message':f'Supplier {name} created successfully'})
             
         except models.bussiness.DoesNotExist:
@@ -4669,7 +4790,7 @@ def edit_supplier(request):
                 supplier.email = data['email']
                 supplier.save()
 
-                models.tracking_history.objects.create(user=user_query, bussiness_name=business_query, area=f'edited supplier {new} info', head='edit supplier')
+                activity_log.record(user=user_query, bussiness_name=business_query, area=f'edited supplier {new} info', head='edit supplier')
                 return Response({'status':'success', 'message':f'Supplier {old} edited successfully'})
             
         except models.bussiness.DoesNotExist:
@@ -4734,7 +4855,7 @@ def delete_supplier(request):
 
         with transaction.atomic(savepoint=False, durable=True, using='default'):
             supplier.delete()
-            models.tracking_history.objects.create(
+            activity_log.record(
                 user=user_profile,
                 bussiness_name=business_query,
                 area=f'deleted supplier {supplier_name}',
@@ -4762,7 +4883,7 @@ def fetch_coa(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
 
-        result = coa.fetch_coa(business=business, company=company, user=user)
+        result = coa.fetch_coa(business=business, company=company, user=user, context=tenant_context.try_from_request(request, business, user))
         return Response(result)
 
 @api_view(['GET', 'POST'])
@@ -4778,7 +4899,7 @@ def create_account(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data was submitted'})
         
-        result = coa.create_account(data=request.data, company=request.user.id)
+        result = coa.create_account(data=request.data, company=request.user.id, context=tenant_context.try_from_request(request, business, user))
 
         return Response(result)
     
@@ -4829,7 +4950,7 @@ def fetch_items_for_report(request):
         if not verify_data:
             return Response('Invalid data submitted')
         
-        result = report.fetch_items_for_report(business=business, company=company, user=user, location=location)
+        result = report.fetch_items_for_report(business=business, company=company, user=user, location=location, context=tenant_context.try_from_request(request, business, user))
     
         return Response(result)
 
@@ -4850,7 +4971,7 @@ def fetch_report_data_movements(request):
         if not verify_data:
             return Response('Invalid data submitted')
         
-        result = report.fetch_data_for_report_movements(business=business, company=company, user=user, location=location, start=start, end=end)
+        result = report.fetch_data_for_report_movements(business=business, company=company, user=user, location=location, start=start, end=end, context=tenant_context.try_from_request(request, business, user))
     
         return Response(result)
 
@@ -4871,7 +4992,7 @@ def fetch_report_data_sales_performance(request):
         if not verify_data:
             return Response('Invalid data submitted')
         
-        result = report.fetch_data_for_sales_performance(business=business, company=company, user=user, location=location, start=start, end=end, reference='sales_performance')
+        result = report.fetch_data_for_sales_performance(business=business, company=company, user=user, location=location, start=start, end=end, reference='sales_performance', context=tenant_context.try_from_request(request, business, user))
     
         return Response(result)
     
@@ -4895,7 +5016,7 @@ def fetch_sales_records(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data submitted'})
         
-        result = report.fetch_data_for_sales_performance(business=business, company=company, user=user, location=location, start=start, end=end,  category=category, brand=brand,reference='sales_records')
+        result = report.fetch_data_for_sales_performance(business=business, company=company, user=user, location=location, start=start, end=end,  category=category, brand=brand,reference='sales_records', context=tenant_context.try_from_request(request, business, user))
 
     
         return Response(result)
@@ -4921,7 +5042,7 @@ def fetch_purchase_records(request):
         if not verify_data:
             return Response({'status': 'error', 'message': 'Invalid data submitted'})
         
-        result = report.fetch_data_for_sales_performance(business=business, company=company, user=user, location=location, start=start, end=end,  category=category, brand=brand, supplier=supplier, reference='purchase_records')
+        result = report.fetch_data_for_sales_performance(business=business, company=company, user=user, location=location, start=start, end=end,  category=category, brand=brand, supplier=supplier, reference='purchase_records', context=tenant_context.try_from_request(request, business, user))
 
     
         return Response(result)
@@ -4942,7 +5063,7 @@ def fetch_customer_aging(request):
         if not verify_data:
             return Response('Invalid data submitted')
         
-        result = report.fetch_data_for_sales_performance(business=business, company=company, user=user, location=location, end=end, start='', reference='customer_aging')
+        result = report.fetch_data_for_sales_performance(business=business, company=company, user=user, location=location, end=end, start='', reference='customer_aging', context=tenant_context.try_from_request(request, business, user))
     
         return Response(result)
     
@@ -4963,7 +5084,7 @@ def fetch_report_data_purchase_metric(request):
         if not verify_data:
             return Response('Invalid data submitted')
         
-        result = report.fetch_data_for_sales_performance(business=business, company=company, user=user, location=location, start=start, end=end, reference='purchase_metric')
+        result = report.fetch_data_for_sales_performance(business=business, company=company, user=user, location=location, start=start, end=end, reference='purchase_metric', context=tenant_context.try_from_request(request, business, user))
     
         return Response(result)
     
@@ -4983,7 +5104,7 @@ def fetch_supplier_performance(request):
         if not verify_data:
             return Response('Invalid data submitted')
         
-        result = report.fetch_data_for_sales_performance(business=business, company=company, user=user, location=location, end=end, start='', reference='supplier_performance')
+        result = report.fetch_data_for_sales_performance(business=business, company=company, user=user, location=location, end=end, start='', reference='supplier_performance', context=tenant_context.try_from_request(request, business, user))
     
         return Response(result)
 
@@ -4996,16 +5117,20 @@ def fetch_profit_loss(request):
         period_type = request.data['timeframe']
         start = request.data['startDate']
         end = request.data['endDate']
+        compare = request.data.get('compare')
+        budget = request.data.get('budget')
         company = request.user.id
 
         verify_data = (isinstance(business, str) and business.strip() and isinstance(start, str) and isinstance(end, str) and
-                       isinstance(user, str) and user.strip() and isinstance(period_type, str) and period_type.strip())
+                       isinstance(user, str) and user.strip() and isinstance(period_type, str) and period_type.strip() and
+                       compare in (None, '', 'yoy') and (budget is None or isinstance(budget, dict)))
 
         if not verify_data:
             return Response('Invalid data submitted for processing')
 
         result = report.fetch_pl_report(business=business, user=user, company=company,
-                                        start=start, end=end, period_type=period_type)
+                                        start=start, end=end, period_type=period_type, compare=compare or None, budget=budget,
+                                        context=tenant_context.try_from_request(request, business, user))
         
         return Response(result)
     
@@ -5027,7 +5152,7 @@ def fetch_inventory_valuation(request):
             return Response('Invalid data submitted for processing')
 
         result = report.fetch_iv_report(business=business, user=user, company=company,
-                                        start=start, end=end, category=category)
+                                        start=start, end=end, category=category, context=tenant_context.try_from_request(request, business, user))
         
         return Response(result)
     
@@ -5048,7 +5173,7 @@ def fetch_trial_balance(request):
             return Response('Invalid data submitted for processing')
 
         result = report.fetch_tb_report(business=business, user=user, company=company,
-                                        start=start, end=end)
+                                        start=start, end=end, context=tenant_context.try_from_request(request, business, user))
         
         return Response(result)
 
@@ -5070,7 +5195,7 @@ def dashboard_stock(request):
         if not verify_data:
             return Response('Invalid data submitted')
         
-        result = report.fetch_data_for_dashboard(business=business, company=company, user=user, location=location)
+        result = report.fetch_data_for_dashboard(business=business, company=company, user=user, location=location, context=tenant_context.try_from_request(request, business, user))
     
         return Response(result)
     
@@ -5094,7 +5219,7 @@ def fetch_item_history(request):
             if not verify_data:
                 return Response({'status': 'error', 'message': 'Invalid data was submitted'})
             
-            result = history.FetchHistory(business=business, company=company, location=location, user=user, reference=reference).fetch_items()
+            result = history.FetchHistory(business=business, company=company, location=location, user=user, reference=reference, context=tenant_context.try_from_request(request, business, user)).fetch_items()
 
             return Response(result)
 
@@ -5120,7 +5245,7 @@ def fetch_customer_history(request):
             if not verify_data:
                 return Response({'status': 'error', 'message': 'Invalid data was submitted'})
             
-            result = history.FetchHistory(business=business, company=company, location=None, user=user, reference=reference).fetch_customer_ledgers(page=page)
+            result = history.FetchHistory(business=business, company=company, location=None, user=user, reference=reference, context=tenant_context.try_from_request(request, business, user)).fetch_customer_ledgers(page=page)
 
             return Response(result)
 
@@ -5146,7 +5271,7 @@ def fetch_supplier_history(request):
             if not verify_data:
                 return Response({'status': 'error', 'message': 'Invalid data was submitted'})
             
-            result = history.FetchHistory(business=business, company=company, location=None, user=user, reference=reference).fetch_supplier_ledgers(page=page)
+            result = history.FetchHistory(business=business, company=company, location=None, user=user, reference=reference, context=tenant_context.try_from_request(request, business, user)).fetch_supplier_ledgers(page=page)
 
             return Response(result)
 
@@ -5172,7 +5297,7 @@ def fetch_account_history(request):
             if not verify_data:
                 return Response({'status': 'error', 'message': 'Invalid data was submitted'})
             
-            result = history.FetchHistory(business=business, company=company, location=None, user=user, reference=reference).fetch_account_ledgers(page=page)
+            result = history.FetchHistory(business=business, company=company, location=None, user=user, reference=reference, context=tenant_context.try_from_request(request, business, user)).fetch_account_ledgers(page=page)
 
             return Response(result)
 
@@ -5240,86 +5365,23 @@ def delete_business(request):
                 company_id=company
             )
 
-            with transaction.atomic():
-                logger.info(f"Deleting business and related data for: {business_name}")
-
-                # 3️⃣ Financial balances
-                models.account_balance.objects.filter(business=business_query).delete()
-                models.customer_balance.objects.filter(business=business_query).delete()
-                models.supplier_balance.objects.filter(business=business_query).delete()
-                models.item_balance.objects.filter(business=business_query).delete()
-
-                # 4️⃣ Ledgers and journals
-                models.asset_ledger.objects.filter(bussiness_name=business_query).delete()
-                models.liabilities_ledger.objects.filter(bussiness_name=business_query).delete()
-                models.equity_ledger.objects.filter(bussiness_name=business_query).delete()
-                models.revenue_ledger.objects.filter(bussiness_name=business_query).delete()
-                models.expenses_ledger.objects.filter(bussiness_name=business_query).delete()
-                models.customer_ledger.objects.filter(bussiness_name=business_query).delete()
-                models.supplier_ledger.objects.filter(bussiness_name=business_query).delete()
-                models.journal.objects.filter(bussiness_name=business_query).delete()
-                models.journal_head.objects.filter(bussiness_name=business_query).delete()
-
-                # 5️⃣ Transactions and histories
-                models.sale_history.objects.filter(bussiness_name=business_query).delete()
-                models.sale.objects.filter(bussiness_name=business_query).delete()
-                models.purchase_history.objects.filter(bussiness_name=business_query).delete()
-                models.purchase.objects.filter(bussiness_name=business_query).delete()
-                models.payment.objects.filter(bussiness_name=business_query).delete()
-                models.cash_receipt.objects.filter(bussiness_name=business_query).delete()
-
-                # 6️⃣ Inventory and transfers
-                models.transfer_history.objects.filter(bussiness_name=business_query).delete()
-                models.inventory_transfer.objects.filter(bussiness_name=business_query).delete()
-                models.location_items.objects.filter(bussiness_name=business_query).delete()
-                models.items.objects.filter(bussiness_name=business_query).delete()
-                models.inventory_location.objects.filter(bussiness_name=business_query).delete()
-                models.inventory_category.objects.filter(bussiness_name=business_query).delete()
-                models.inventory_brand.objects.filter(bussiness_name=business_query).delete()
-                models.inventory_unit.objects.filter(bussiness_name=business_query).delete()
-
-                # 7️⃣ Customers, suppliers, taxes
-                models.customer.objects.filter(bussiness_name=business_query).delete()
-                models.supplier.objects.filter(bussiness_name=business_query).delete()
-                models.taxes_levies.objects.filter(bussiness_name=business_query).delete()
-                models.currency.objects.filter(bussiness_name=business_query).delete()
-
-                # 8️⃣ Accounts
-                models.real_account.objects.filter(bussiness_name=business_query).delete()
-                models.sub_account.objects.filter(bussiness_name=business_query).delete()
-                models.account.objects.filter(bussiness_name=business_query).delete()
-
-                # 9️⃣ Periods
-                models.month_period.objects.filter(business=business_query).delete()
-                models.quarter_period.objects.filter(bussiness_name=business_query).delete()
-                models.year_period.objects.filter(bussiness_name=business_query).delete()
-
-                # 🔟 Logs and tracking
-                models.tracking_history.objects.filter(bussiness_name=business_query).delete()
-
-                # 1️⃣ Delete all current_user accounts linked to this business
-                users_in_business = models.current_user.objects.filter(bussiness_name=business_query)
-                user_ids = [u.user.pk for u in users_in_business]
-                users_in_business.delete()
-
-                logout(request)
-
-                # 2️⃣ Delete User accounts (auth_user table)
-                User.objects.filter(id__in=user_ids).delete()
-
-                # 11️⃣ Finally delete the business itself
-                business_query.delete()
-            
+            if business_query.pending_deletion:
+                return Response({'status': 'error', 'message': f'Business {business_name} is already being deleted'})
+
+            tenant_purge.request_purge(business_query, requested_by=request.user.username)
+
+            logout(request)
+
             response = Response({
                 'status': 'success',
-                'message': f'Business {business_name} and all related data deleted successfully. You have been logged out.'
+                'message': f'Business {business_name} is being deleted. You have been logged out.'
             })
             response.delete_cookie('access')
             response.delete_cookie('refresh')
             response.delete_cookie('csrftoken')
             response.delete_cookie('sessionid')
 
-            logger.info(f"✅ Business {business_name} deleted and user logged out.")
+            logger.info(f"✅ Business {business_name} queued for deletion and user logged out.")
             return response
 
         except models.bussiness.DoesNotExist:
@@ -5329,3 +5391,121 @@ def delete_business(request):
         except Exception as error:
             logger.error(f"Error deleting business {business_name}: {error}")
             return Response({'status': 'error', 'message': f'Failed to delete {business_name}'})
+
+
+def _export_document(request, kind):
+    format = export_stream.normalize_format(request.data.get('format'))
+
+    if format not in export_stream.WRITERS:
+        return Response({'status': 'error', 'message': 'Invalid export format'})
+
+    try:
+        context = tenant_context.from_request(request)
+        user_query = context.user
+
+        if not user_query.admin and not getattr(user_query, export_stream.EXPORT_ACCESS[kind]):
+            return Response({'status': 'error', 'message': f'{user_query.user_name} has no access'})
+
+        queryset, location = export_stream.export_queryset(kind, context, request.data)
+        return export_stream.export_response(kind, format, queryset, user_query, location)
+
+    except (models.bussiness.DoesNotExist, models.current_user.DoesNotExist):
+        return Response({'status': 'error', 'message': 'Business or user not found'})
+
+    except PermissionError as error:
+        return Response({'status': 'error', 'message': str(error)})
+
+    except (ValueError, TypeError) as error:
+        logger.warning(error)
+        return Response({'status': 'error', 'message': 'Invalid data was submitted'})
+
+    except Exception as error:
+        logger.exception(error)
+        return Response({'status': 'error', 'message': 'Something happened', 'data': {}})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def export_sales(request):
+    return _export_document(request, 'sales')
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def export_purchase(request):
+    return _export_document(request, 'purchase')
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def export_transfer(request):
+    return _export_document(request, 'transfer')
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def export_items(request):
+    return _export_document(request, 'items')
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def submit_export_job(request):
+    kind = request.data.get('kind')
+    format = request.data.get('format', '')
+    params = request.data.get('params', {})
+
+    if isinstance(params, str):
+        try:
+            params = json.loads(params)
+        except ValueError:
+            params = None
+
+    if not isinstance(kind, str) or not isinstance(format, str) or not isinstance(params, dict):
+        return Response({'status': 'error', 'message': 'Invalid data was submitted'})
+
+    try:
+        context = tenant_context.from_request(request)
+        return Response(export_jobs.submit(context, kind, format, params))
+
+    except (models.bussiness.DoesNotExist, models.current_user.DoesNotExist):
+        return Response({'status': 'error', 'message': 'Business or user not found'})
+
+    except ValueError as error:
+        logger.warning(error)
+        return Response({'status': 'error', 'message': 'Invalid data was submitted'})
+
+
+def _user_export_job(request):
+    job_id = request.data.get('id', request.query_params.get('id'))
+    return models.export_job.objects.get(pk=int(job_id), user__user=request.user)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def export_job_status(request):
+    try:
+        job = _user_export_job(request)
+        return Response({'status': 'success', 'data': export_jobs.job_status(job)})
+
+    except (models.export_job.DoesNotExist, TypeError, ValueError):
+        return Response({'status': 'error', 'message': 'Export not found'})
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def download_export_job(request):
+    try:
+        job = _user_export_job(request)
+
+        if job.status != export_jobs.COMPLETED or not job.file:
+            return Response({'status': 'error', 'message': f'Export is {job.status.lower()}'})
+
+        content_type = export_stream.CONTENT_TYPES.get(job.format, 'application/json')
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.filename, content_type=content_type)
+
+    except (models.export_job.DoesNotExist, TypeError, ValueError):
+        return Response({'status': 'error', 'message': 'Export not found'})
+
+    except FileNotFoundError:
+        return Response({'status': 'error', 'message': 'Export file has expired'})